@@ -7,7 +7,10 @@ from .schema import (
     CONTEXT_IDX, WEEKDAY_IDX, OVERRIDE_IDX, DYNAMICS_IDX, TEMPORAL_IDX,
     OVERRIDE_TYPES, OVERRIDE_TYPE_NAMES, TIME_SINCE_CAP_MIN,
 )
-from .encoder import FixtureEncoder, CGMDataset, load_fixtures_to_dataset, generate_training_vectors
+from .encoder import (
+    FixtureEncoder, CGMDataset, WindowedDataset, load_fixtures_to_dataset,
+    generate_training_vectors,
+)
 from .sim_adapter import load_conformance_to_dataset, load_conformance_vectors
 from .model import CGMTransformerAE, CGMGroupedEncoder, train_one_epoch, eval_loss
 from .toolbox import CGMTransformerVAE, ConditionedTransformer, CGMDenoisingDiffusion, ContrastiveLoss
@@ -55,6 +58,7 @@ __all__ = [
     # Data pipeline
     'FixtureEncoder',
     'CGMDataset',
+    'WindowedDataset',
     'load_fixtures_to_dataset',
     'generate_training_vectors',
     'load_conformance_to_dataset',
@@ -25,6 +25,8 @@ from typing import Callable, Dict, Optional
 import numpy as np
 import pandas as pd
 
+from ..pk_convolution import exponential_action_fraction
+
 ISF_POP_DEFAULT = 50.0  # mg/dL/U, EXP-2756 population median
 
 
@@ -81,9 +83,8 @@ def kernel_oref0_exponential(extra_insulin: pd.Series,
     # approximation; for the simple form below τ ≈ peak_min works well.
     tau = peak_min / 1.0
     t_mid = (duration_min / 2.0).clip(lower=1.0).to_numpy()
-    frac = 1.0 - (1.0 + t_mid / tau) * np.exp(-t_mid / tau)
-    # Cap at 1.0 (cannot deliver more effect than the insulin contains)
-    frac = np.clip(frac, 0.0, 1.0)
+    # Clipped to [0, 1] (cannot deliver more effect than the insulin contains)
+    frac = exponential_action_fraction(t_mid, tau)
     return extra_insulin * isf_used * pd.Series(frac, index=extra_insulin.index)
 
 
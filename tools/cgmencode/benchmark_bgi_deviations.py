@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+benchmark_bgi_deviations.py — Columnar vs row-loop BGI deviation extraction
+============================================================================
+
+Times ``BGISubtraction.compute_deviations`` (columnar) against the
+pre-vectorization row loop kept in
+``production/deconfounding_reference.py`` on the full training grid, and
+checks that both produce the same events.
+
+Falls back to a synthetic terrarium-shaped grid when the training
+parquet is not present (``--synthetic-patients`` × ``--synthetic-days``).
+
+Usage:
+    python3 benchmark_bgi_deviations.py [--trials 3] [--egp] [--skip-loop]
+    python3 benchmark_bgi_deviations.py --grid path/to/grid.parquet
+"""
+
+import sys, time, json, argparse
+from pathlib import Path
+
+_REPO = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(_REPO))
+
+import numpy as np
+import pandas as pd
+
+from tools.cgmencode.production.deconfounding import BGISubtraction
+from tools.cgmencode.production.deconfounding_reference import (
+    assert_same_events, loop_compute_deviations, make_grid,
+)
+
+GRID = _REPO / 'externals' / 'ns-parquet' / 'training' / 'grid.parquet'
+
+_COLUMNS = ['patient_id', 'time', 'glucose', 'bolus', 'bolus_smb', 'net_basal',
+            'carbs', 'iob', 'scheduled_isf', 'scheduled_basal_rate']
+
+
+def load_grid(path: Path, n_patients: int, days: int) -> pd.DataFrame:
+    if path.exists():
+        import pyarrow.parquet as pq
+        names = set(pq.read_schema(path).names)
+        grid = pd.read_parquet(path, columns=[c for c in _COLUMNS if c in names])
+        grid['controller'] = 'unknown'
+        print(f"Loaded {path} ({len(grid):,} rows, "
+              f"{grid['patient_id'].nunique()} patients)")
+        return grid
+    grid = make_grid(0, n_patients=n_patients, n=days * 288)
+    print(f"{path} not found — synthetic grid ({len(grid):,} rows, "
+          f"{n_patients} patients)")
+    return grid
+
+
+def timed(fn, trials: int):
+    times, out = [], None
+    for _ in range(trials):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, times
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    ap.add_argument('--grid', type=Path, default=GRID)
+    ap.add_argument('--trials', type=int, default=3)
+    ap.add_argument('--egp', action='store_true',
+                    help='EGP-aware mode with counter_reg_k=0.3')
+    ap.add_argument('--skip-loop', action='store_true',
+                    help='time only the columnar implementation')
+    ap.add_argument('--synthetic-patients', type=int, default=20)
+    ap.add_argument('--synthetic-days', type=int, default=140)
+    ap.add_argument('--json', type=Path, help='write results as JSON')
+    args = ap.parse_args()
+
+    grid = load_grid(args.grid, args.synthetic_patients, args.synthetic_days)
+    bgi = (BGISubtraction(egp_enabled=True, counter_reg_k=0.3) if args.egp
+           else BGISubtraction())
+
+    fast, fast_t = timed(lambda: bgi.compute_deviations(grid), args.trials)
+    results = {'rows': len(grid), 'events': len(fast),
+               'columnar_s': float(np.median(fast_t))}
+    print(f"columnar : {results['columnar_s']:8.3f} s (median of {args.trials}), "
+          f"{len(fast):,} events")
+
+    if not args.skip_loop:
+        slow, slow_t = timed(lambda: loop_compute_deviations(bgi, grid), 1)
+        assert_same_events(fast, slow)
+        results['loop_s'] = slow_t[0]
+        results['speedup'] = slow_t[0] / results['columnar_s']
+        print(f"row loop : {slow_t[0]:8.3f} s — events identical, "
+              f"speed-up {results['speedup']:.0f}×")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,8 +10,16 @@ Measures wall-clock time for data loading operations via:
 Runs multiple trials per operation, reports median/mean/min with
 confidence intervals. Outputs machine-readable JSON + human table.
 
+``--convert`` instead times the JSON → Parquet conversion itself: the
+two-pass path (json.load + normalize_*, then build_grid re-reading the
+files) against the single streaming pass cmd_convert uses
+(normalize_json_dir feeding a GridSource), with tracemalloc peaks. It
+runs on the first --patients export in externals/ns-data, or on a
+synthetic export built from the patient_b fixture (--convert-days).
+
 Usage:
     python3 benchmark_parquet_vs_json.py [--trials 3] [--patients a,b,c]
+    python3 benchmark_parquet_vs_json.py --convert [--convert-days 30]
 """
 
 import sys, os, time, json, gc, argparse, platform, subprocess
@@ -34,6 +42,13 @@ from cgmencode.real_data_adapter import (
 )
 from cgmencode.continuous_pk import build_continuous_pk_features
 from cgmencode.exp_metabolic_flux import load_patients as json_load_patients
+from ns2parquet.grid import GridSource, build_grid
+from ns2parquet.normalize import (
+    normalize_entries, normalize_treatments, normalize_devicestatus,
+    normalize_json_dir,
+)
+
+NS_FIXTURES = _REPO / 'tools' / 'ns2parquet' / 'fixtures'
 
 
 def get_system_info():
@@ -172,6 +187,115 @@ def bench_parquet_filtered_read(patient_id, columns=None, trials=5):
     return {'times': times, 'rows': rows}
 
 
+def _shift_record(rec, days):
+    """Copy of a Nightscout record moved ``days`` later, with a fresh _id."""
+    out = dict(rec)
+    if '_id' in out:
+        out['_id'] = f"{out['_id']}-{days}"
+    if isinstance(out.get('date'), (int, float)):
+        out['date'] = out['date'] + days * 86_400_000
+    for field in ('dateString', 'sysTime', 'created_at', 'timestamp'):
+        value = out.get(field)
+        if not isinstance(value, str):
+            continue
+        ts = pd.Timestamp(value) + pd.Timedelta(days=days)
+        if value.endswith('Z'):
+            out[field] = ts.tz_convert(None).isoformat(timespec='milliseconds') + 'Z'
+        else:
+            out[field] = ts.isoformat()
+    return out
+
+
+def make_synthetic_export(out_dir, days, prefix='patient_b'):
+    """Tile a one-day fixture export ``days`` times into ``out_dir``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in ('entries', 'treatments', 'devicestatus'):
+        with open(NS_FIXTURES / f'{prefix}_{name}.json') as f:
+            records = json.load(f)
+        with open(out_dir / f'{name}.json', 'w') as f:
+            json.dump([_shift_record(r, d) for d in range(days) for r in records], f)
+    (out_dir / 'profile.json').write_bytes(
+        (NS_FIXTURES / f'{prefix}_profile.json').read_bytes())
+    return out_dir
+
+
+def convert_two_pass(data_dir, patient_id='bench'):
+    """Pre-streaming convert: json.load + normalize, then build_grid re-reads."""
+    frames = {}
+    for name, fn in (('entries', normalize_entries),
+                     ('treatments', normalize_treatments),
+                     ('devicestatus', normalize_devicestatus)):
+        with open(Path(data_dir) / f'{name}.json') as f:
+            frames[name] = fn(json.load(f), patient_id)
+    return frames, build_grid(str(data_dir), patient_id)
+
+
+def convert_streaming(data_dir, patient_id='bench'):
+    """cmd_convert path: one streaming parse feeds normalizers and grid."""
+    source = GridSource()
+    frames = normalize_json_dir(data_dir, patient_id, source)
+    return frames, build_grid(str(data_dir), patient_id, source=source)
+
+
+def bench_convert(data_dir, trials=3):
+    """Benchmark: JSON → normalized frames + grid, two-pass vs streaming."""
+    import tracemalloc
+    out = {}
+    for label, fn in (('two_pass', convert_two_pass),
+                      ('streaming', convert_streaming)):
+        times = []
+        for _ in range(trials):
+            (frames, grid), elapsed = timed(fn, data_dir)
+            times.append(elapsed)
+        gc.collect()
+        tracemalloc.start()
+        fn(data_dir)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out[label] = {'times': times, 'peak_bytes': peak,
+                      'rows': {k: len(v) for k, v in frames.items()},
+                      'grid_rows': 0 if grid is None else len(grid)}
+    return out
+
+
+def run_convert_benchmark(args, patients):
+    import tempfile
+    json_dir = NS_DATA / patients[0] / 'training'
+    tmp = None
+    if not (json_dir / 'entries.json').exists():
+        tmp = tempfile.TemporaryDirectory()
+        json_dir = make_synthetic_export(tmp.name, args.convert_days)
+        print(f"  {NS_DATA / patients[0]} not found — synthetic export "
+              f"({args.convert_days} days of the patient_b fixture)")
+    size = sum(f.stat().st_size for f in json_dir.glob('*.json'))
+    print(f"  Input: {json_dir} ({format_size(size)})")
+
+    r = bench_convert(json_dir, trials=args.trials)
+    two, one = r['two_pass'], r['streaming']
+    ts, ss = stats_summary(two['times']), stats_summary(one['times'])
+    speedup = ts['median'] / ss['median'] if ss['median'] > 0 else float('inf')
+    print(f"\n  {'Path':<12} {'Median':<10} {'Peak (tracemalloc)':<20} Rows")
+    print(f"  {'─'*55}")
+    for label, b, st in (('two-pass', two, ts), ('streaming', one, ss)):
+        print(f"  {label:<12} {format_time(st['median']):<10} "
+              f"{format_size(b['peak_bytes']):<20} "
+              f"{sum(b['rows'].values()):,} + {b['grid_rows']:,} grid")
+    print(f"  Speedup: {speedup:.1f}×, peak memory "
+          f"{two['peak_bytes'] / max(one['peak_bytes'], 1):.1f}× lower")
+    if tmp is not None:
+        tmp.cleanup()
+
+    results = {'system': get_system_info(), 'input_bytes': size,
+               'synthetic_days': args.convert_days if tmp is not None else None,
+               'two_pass': {**two, 'stats': ts}, 'streaming': {**one, 'stats': ss},
+               'speedup': round(speedup, 2)}
+    outpath = str(_REPO / 'externals' / 'experiments' / 'benchmark-json-convert.json')
+    with open(outpath, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\n  Results → {outpath}")
+
+
 def stats_summary(times):
     """Compute summary statistics for a list of times."""
     arr = np.array(times)
@@ -216,11 +340,23 @@ def main():
                         help='Comma-separated patient IDs for single-patient benchmarks')
     parser.add_argument('--skip-json-all', action='store_true',
                         help='Skip the slow full JSON benchmark')
+    parser.add_argument('--convert', action='store_true',
+                        help='Only benchmark JSON → Parquet conversion '
+                             '(two-pass vs streaming)')
+    parser.add_argument('--convert-days', type=int, default=30,
+                        help='Days of synthetic export when ns-data is absent')
     args = parser.parse_args()
 
     patients = args.patients.split(',') if args.patients else ['a', 'b', 'c']
     trials = args.trials
 
+    if args.convert:
+        print("=" * 70)
+        print("  JSON → Parquet Conversion Benchmark")
+        print("=" * 70)
+        run_convert_benchmark(args, patients)
+        return
+
     print("=" * 70)
     print("  Parquet vs JSON Performance Benchmark")
     print("=" * 70)
@@ -44,6 +44,13 @@ import numpy as np
 import pandas as pd
 from typing import Tuple, Dict, Optional
 
+try:
+    from ..ns2parquet.grid_kernels import schedule_at
+except ImportError:  # cgmencode imported as a top-level package
+    from ns2parquet.grid_kernels import schedule_at
+
+from .pk_convolution import cached_kernel, convolve_doses, remaining_fraction
+
 
 # ── Insulin Activity Curve (oref0/cgmsim-lib exponential model) ────────
 
@@ -88,13 +95,14 @@ def _insulin_activity_at_t(t_min: float, dose: float, dia_min: float,
     return max(activity, 0.0)
 
 
+@cached_kernel
 def _build_activity_kernel(dia_hours: float = 5.0, peak_min: float = 55.0,
                            interval_min: int = 5) -> np.ndarray:
     """Pre-compute the insulin activity kernel for convolution.
 
     The kernel represents the activity curve for a 1-unit dose, sampled at
-    interval_min resolution. This is computed once and reused for all doses
-    via convolution, avoiding the O(N × DIA_steps) nested loop.
+    interval_min resolution. It is built once per (dia_hours, peak_min,
+    interval_min) and shared (read-only) by every caller.
 
     Returns:
         (K,) array where K = DIA / interval_min, representing activity per
@@ -109,34 +117,34 @@ def _build_activity_kernel(dia_hours: float = 5.0, peak_min: float = 55.0,
     return kernel
 
 
+@cached_kernel
+def _build_iob_kernel(dia_hours: float = 5.0, peak_min: float = 55.0,
+                      interval_min: int = 5) -> np.ndarray:
+    """IOB-remaining kernel: fraction of a 1-unit dose still on board.
+
+    iob_kernel[k] = 1 - cumsum(activity_kernel)[k] × interval_min, so
+    convolving doses (U) with it gives insulin on board in units.
+    """
+    return remaining_fraction(_build_activity_kernel(dia_hours, peak_min, interval_min),
+                              interval_min)
+
+
 def _convolve_doses_with_kernel(dose_series: np.ndarray,
                                  kernel: np.ndarray) -> np.ndarray:
-    """Convolve a sparse dose time series with the activity kernel.
+    """Convolve a dose time series with the activity kernel.
 
     Each nonzero entry in dose_series creates a scaled copy of the kernel
-    extending forward in time. This is equivalent to the nested loop but
-    uses numpy for efficiency.
+    extending forward in time. Delegates to pk_convolution.convolve_doses,
+    which scatters sparse series and convolves dense (basal) ones.
 
     Args:
-        dose_series: (N,) array of doses at each timestep (most are 0)
+        dose_series: (N,) array of doses at each timestep, or (P, N) batch
         kernel: (K,) activity-per-unit kernel from _build_activity_kernel
 
     Returns:
-        (N,) array of total activity at each timestep
+        (N,) / (P, N) array of total activity at each timestep
     """
-    N = len(dose_series)
-    K = len(kernel)
-    activity = np.zeros(N)
-
-    # Sparse iteration: only process nonzero doses
-    nonzero_idx = np.nonzero(dose_series)[0]
-    for i in nonzero_idx:
-        dose = dose_series[i]
-        end = min(i + K, N)
-        length = end - i
-        activity[i:end] += dose * kernel[:length]
-
-    return activity
+    return convolve_doses(dose_series, kernel)
 
 
 def compute_insulin_activity(bolus_series: pd.Series,
@@ -191,11 +199,12 @@ def compute_insulin_activity(bolus_series: pd.Series,
     sched_basal_doses = sched_basal_vals * interval_min / 60.0
     net_basal_doses = actual_basal_doses - sched_basal_doses
 
-    # Convolve each source with the activity kernel
-    bolus_activity = _convolve_doses_with_kernel(bolus_vals, kernel)
-    actual_basal_activity = _convolve_doses_with_kernel(actual_basal_doses, kernel)
-    sched_basal_activity = _convolve_doses_with_kernel(sched_basal_doses, kernel)
-    net_basal_activity = _convolve_doses_with_kernel(net_basal_doses, kernel)
+    # Convolve each source with the activity kernel (one batched call:
+    # boluses scatter, the dense basal rows go through direct/FFT)
+    (bolus_activity, actual_basal_activity,
+     sched_basal_activity, net_basal_activity) = convolve_doses(
+        np.stack([bolus_vals, actual_basal_doses,
+                  sched_basal_doses, net_basal_doses]), kernel)
 
     # Total = everything actually delivered
     total_activity = bolus_activity + actual_basal_activity
@@ -306,8 +315,9 @@ def _carb_absorption_rate_at_t(t_min: float, carbs: float,
     return max(rate, 0.0)
 
 
+@cached_kernel
 def _build_carb_kernel(abs_hours: float = 3.0, interval_min: int = 5) -> np.ndarray:
-    """Pre-compute carb absorption kernel for convolution."""
+    """Pre-compute carb absorption kernel for convolution (cached, read-only)."""
     abs_min = abs_hours * 60
     K = int(abs_min / interval_min)
     kernel = np.zeros(K)
@@ -496,24 +506,7 @@ def expand_schedule(timestamps: pd.DatetimeIndex, schedule: list,
         (N,) array of schedule values at each timestep
     """
     idx = local_index if local_index is not None else timestamps
-    N = len(idx)
-    values = np.full(N, default, dtype=np.float64)
-
-    if not schedule:
-        return values
-
-    # Pre-sort schedule by timeAsSeconds for correct lookup
-    sorted_sched = sorted(schedule, key=lambda e: e.get('timeAsSeconds', 0))
-
-    for i, ts in enumerate(idx):
-        sec_of_day = ts.hour * 3600 + ts.minute * 60 + ts.second
-        val = sorted_sched[0].get('value', default)
-        for entry in sorted_sched:
-            if entry.get('timeAsSeconds', 0) <= sec_of_day:
-                val = entry.get('value', default)
-        values[i] = float(val)
-
-    return values
+    return schedule_at(idx, schedule, default)
 
 
 # ── Numerical Derivatives (acceleration of absorption) ────────────────
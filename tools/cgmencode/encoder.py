@@ -1,7 +1,9 @@
+import copy
 import json
 import pandas as pd
 import numpy as np
 import torch
+from numpy.lib.stride_tricks import sliding_window_view
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
@@ -194,8 +196,46 @@ def generate_training_vectors(df: pd.DataFrame, window_size: int = 72, lead_time
     # time_sin/cos are already -1..1
     
     total_len = window_size + lead_time + result_window
-    vectors = [data[i : i + total_len] for i in range(len(data) - total_len + 1)]
-    return np.array(vectors) if vectors else np.empty((0, total_len, 8), dtype=np.float64)
+    if len(data) < total_len:
+        return np.empty((0, total_len, 8), dtype=np.float64)
+    # Read-only strided view: overlapping vectors share the normalized copy
+    return sliding_window_view(data, (total_len, data.shape[1]))[:, 0]
+
+
+# ── Strided windows ──────────────────────────────────────────────────
+
+def valid_window_starts(glucose: np.ndarray, seq_len: int, stride: int = 1,
+                        min_valid_fraction: float = 0.0) -> np.ndarray:
+    """Start offsets (every ``stride`` steps) of the ``seq_len`` windows
+    whose glucose is at least ``min_valid_fraction`` non-NaN."""
+    n = len(glucose)
+    if n < seq_len:
+        return np.empty(0, dtype=np.int64)
+    starts = np.arange(0, n - seq_len + 1, stride, dtype=np.int64)
+    valid = np.concatenate([[0], np.cumsum(~np.isnan(glucose))])
+    counts = valid[starts + seq_len] - valid[starts]
+    return starts[counts / seq_len >= min_valid_fraction]
+
+
+def fill_gaps(features: np.ndarray) -> np.ndarray:
+    """Linearly interpolate NaNs per column over the whole array.
+
+    Edges hold the nearest value; a column with fewer than two values is
+    zero-filled. Returns ``features`` itself (no copy) when nothing is NaN.
+    """
+    nan = np.isnan(features)
+    if not nan.any():
+        return features
+    out = np.array(features, copy=True)
+    for col in np.flatnonzero(nan.any(axis=0)):
+        mask = nan[:, col]
+        valid = ~mask
+        if valid.sum() >= 2:
+            out[mask, col] = np.interp(np.flatnonzero(mask), np.flatnonzero(valid),
+                                       out[valid, col])
+        else:
+            out[mask, col] = 0.0
+    return out
 
 class CGMDataset(torch.utils.data.Dataset):
     """
@@ -211,10 +251,14 @@ class CGMDataset(torch.utils.data.Dataset):
         
     def __len__(self):
         return len(self.vectors)
-    
+
+    def _window(self, idx) -> torch.Tensor:
+        return self.vectors[idx]
+
     def __getitem__(self, idx):
-        x = self.vectors[idx].clone()
-        y = self.vectors[idx].clone()
+        window = self._window(idx)
+        x = window.clone()
+        y = window.clone()
 
         if self.task == 'fill_actions':
             x[:self.window_size, ACTION_IDX] = 0.0
@@ -234,6 +278,83 @@ class CGMDataset(torch.utils.data.Dataset):
 
         return x, y
 
+class WindowedDataset(CGMDataset):
+    """
+    CGMDataset over strided windows of per-patient feature arrays.
+
+    Windows are (patient, start offset) rows of ``index`` into
+    ``sliding_window_view``s of the arrays, so overlapping windows share
+    the underlying (possibly memory-mapped) array; an item is copied out
+    only when it is fetched. Valid starts are those whose glucose
+    (channel 0) is at least ``min_valid_fraction`` non-NaN; gaps are
+    filled once per array (fill_gaps) rather than per window.
+
+    ``window_size`` is the history length used by the task masking, as
+    in CGMDataset (default: the whole window).
+    """
+    def __init__(self, arrays, seq_len: int, task: str = 'reconstruct',
+                 window_size: Optional[int] = None, stride: Optional[int] = None,
+                 min_valid_fraction: float = 0.8):
+        if isinstance(arrays, np.ndarray):
+            arrays = [arrays]
+        self.seq_len = seq_len
+        self.task = task
+        self.window_size = seq_len if window_size is None else window_size
+        stride = stride or max(seq_len // 2, 1)  # 50% overlap
+        self.arrays, self._views, index = [], [], []
+        for p, arr in enumerate(arrays):
+            starts = valid_window_starts(arr[:, 0], seq_len, stride, min_valid_fraction)
+            if len(starts):
+                arr = fill_gaps(arr)
+            self.arrays.append(arr)
+            self._views.append(sliding_window_view(arr, (seq_len, arr.shape[1]))[:, 0]
+                               if len(arr) >= seq_len else None)
+            index.append(np.column_stack([np.full(len(starts), p, dtype=np.int64), starts]))
+        self.index = np.concatenate(index) if index else np.empty((0, 2), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _window(self, idx) -> torch.Tensor:
+        p, start = self.index[idx]
+        return torch.from_numpy(np.array(self._views[p][start], dtype=np.float32))
+
+    def subset(self, index: np.ndarray) -> 'WindowedDataset':
+        """Dataset over the given (patient, start) rows, sharing the arrays."""
+        sub = copy.copy(self)
+        sub.index = np.asarray(index, dtype=np.int64).reshape(-1, 2)
+        return sub
+
+    def split(self, val_fraction: float = 0.2) -> Tuple['WindowedDataset', 'WindowedDataset']:
+        """Chronological split per patient: each patient's first
+        (1 - val_fraction) windows train, the rest validate."""
+        train, val = [], []
+        for p in range(len(self.arrays)):
+            rows = self.index[self.index[:, 0] == p]
+            split_idx = int(len(rows) * (1 - val_fraction))
+            train.append(rows[:split_idx])
+            val.append(rows[split_idx:])
+        return (self.subset(np.concatenate(train) if train else self.index[:0]),
+                self.subset(np.concatenate(val) if val else self.index[:0]))
+
+    def windows(self) -> np.ndarray:
+        """All windows as one (n, seq_len, F) float32 array (a copy)."""
+        if not len(self.index):
+            width = self.arrays[0].shape[1] if self.arrays else NUM_FEATURES
+            return np.empty((0, self.seq_len, width), dtype=np.float32)
+        return np.stack([self._views[p][s] for p, s in self.index]).astype(np.float32)
+
+    @property
+    def vectors(self) -> torch.Tensor:
+        # Materialized copy for callers written against CGMDataset.vectors
+        return torch.from_numpy(self.windows())
+
+    @property
+    def tensors(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        # Materialized (x, x) for callers written against TensorDataset
+        vectors = self.vectors
+        return vectors, vectors
+
 class ConditionedDataset(torch.utils.data.Dataset):
     """
     Dataset for Action-Conditioned Prediction.
@@ -22,6 +22,7 @@ from pathlib import Path
 from torch.utils.data import DataLoader
 
 from .device import resolve_device, batch_to_device
+from .encoder import valid_window_starts
 from .model import CGMTransformerAE, CGMGroupedEncoder, AttentionPooling, train_one_epoch, eval_loss
 from .real_data_adapter import (
     load_nightscout_to_dataset, load_multipatient_nightscout,
@@ -512,10 +513,10 @@ def build_16f_windows(patient_paths, window_size):
             if feat8 is None:
                 continue
             feat16 = build_extended_features(grid_df, feat8, verbose=False)
-            for start in range(0, feat16.shape[0] - ws, stride):
-                w = feat16[start:start + ws]
-                if not np.isnan(w[:, 0]).any():
-                    windows.append(w)
+            starts = valid_window_starts(feat16[:, 0], ws, stride, 1.0)
+            # The last full window is not used (starts < N - ws)
+            windows.extend(feat16[start:start + ws]
+                           for start in starts[starts < feat16.shape[0] - ws])
         except Exception:
             continue
     return windows
@@ -0,0 +1,427 @@
+"""
+feature_store.py — Persistent per-patient feature arrays for cgmencode.
+
+Building continuous PK channels (kernel convolutions, hepatic production,
+schedule expansion) and the extended / enriched feature sets takes most
+of an experiment's start-up, and every run rebuilds the same arrays for
+the same cohort. The store keeps them next to the terrarium as ``.npy``
+files that load memory-mapped:
+
+    <terrarium>/_features/<feature_set>/<patient>/<key>.npy   (+ .json)
+
+``key`` hashes the patient's data, the feature builder's code and the
+builder parameters:
+
+- patient data: the ns2parquet catalog content hashes of the patient's
+  grid and profiles rows (no grid decoding needed), or a hash of the
+  loaded grid + attrs for terrariums without a catalog;
+- code: the source of the modules the builder runs (plus
+  STORE_VERSION), so editing a builder invalidates its arrays;
+- parameters: the builder's keyword arguments, defaults filled in.
+
+Writing a new key for a patient removes that patient's older keys;
+``invalidate`` / ``clear`` removes entries explicitly.
+
+Feature sets:
+    pk        (N, 8)  build_continuous_pk_features
+    extended  (N, 21) build_extended_features
+    enriched  (N, 39) build_enriched_features (on top of extended)
+
+Usage:
+    from tools.cgmencode.feature_store import FeatureStore
+    store = FeatureStore('externals/ns-parquet/training')
+    pk = store.get('a')                       # built once, then memory-mapped
+    pk = store.get('a', dia_hours=6.0)        # separate entry per parameters
+
+    # or straight from the cohort loader
+    patients = load_parquet_patients(terrarium, feature_store=True)
+
+    # precompute the cohort
+    python3 -m tools.cgmencode.feature_store warm \\
+        --parquet-dir externals/ns-parquet/training --sets pk extended --workers 8
+    python3 -m tools.cgmencode.feature_store clear --parquet-dir ... [--patients a b]
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from . import continuous_pk, pk_convolution, real_data_adapter, schema
+from .continuous_pk import build_continuous_pk_features
+from .real_data_adapter import (
+    Terrarium, _parquet_patient_grid, _parquet_patient_ids,
+    build_enriched_features, build_extended_features,
+)
+try:
+    from ..ns2parquet import grid_kernels
+    from ..ns2parquet.catalog import catalog_path
+except ImportError:  # cgmencode imported as a top-level package
+    from ns2parquet import grid_kernels
+    from ns2parquet.catalog import catalog_path
+
+# Bump when the on-disk layout or key scheme changes
+STORE_VERSION = 1
+
+STORE_DIR = '_features'
+
+
+# ── Feature sets ─────────────────────────────────────────────────────
+
+def _build_pk(store, patient_id, df, grid, params):
+    return build_continuous_pk_features(df, **params)
+
+
+def _build_extended(store, patient_id, df, grid, params):
+    return build_extended_features(df, grid)
+
+
+def _build_enriched(store, patient_id, df, grid, params):
+    extended = store.get(patient_id, 'extended', df=df, grid=grid)
+    return build_enriched_features(df, np.array(extended))
+
+
+# name → (builder, keyword parameters the key covers, modules the code hash covers)
+FEATURE_SETS = {
+    'pk': (_build_pk, build_continuous_pk_features,
+           (continuous_pk, pk_convolution, real_data_adapter, grid_kernels)),
+    'extended': (_build_extended, None, (real_data_adapter, schema, grid_kernels)),
+    'enriched': (_build_enriched, None, (real_data_adapter, schema, grid_kernels)),
+}
+
+# Keyword arguments of a parameterized builder that do not change its output
+_IGNORED_PARAMS = {'df', 'verbose'}
+
+_code_hashes: Dict[str, str] = {}
+
+
+def code_version(feature_set: str) -> str:
+    """SHA-256 (16 hex) over the source of the modules a feature set runs."""
+    if feature_set not in _code_hashes:
+        h = hashlib.sha256(f'store-v{STORE_VERSION}:{feature_set}'.encode())
+        for module in FEATURE_SETS[feature_set][2]:
+            h.update(Path(inspect.getsourcefile(module)).read_bytes())
+        _code_hashes[feature_set] = h.hexdigest()[:16]
+    return _code_hashes[feature_set]
+
+
+def builder_params(feature_set: str, **params) -> dict:
+    """Builder keyword arguments with defaults filled in (what the key covers)."""
+    fn = FEATURE_SETS[feature_set][1]
+    if fn is None:
+        if params:
+            raise TypeError(f'feature set {feature_set!r} takes no parameters')
+        return {}
+    sig = inspect.signature(fn)
+    unknown = set(params) - set(sig.parameters) | (set(params) & _IGNORED_PARAMS)
+    if unknown:
+        raise TypeError(f'unknown {feature_set} parameters: {sorted(unknown)}')
+    out = {name: p.default for name, p in sig.parameters.items()
+           if name not in _IGNORED_PARAMS and p.default is not inspect.Parameter.empty}
+    out.update(params)
+    return out
+
+
+def _frame_hash(df: pd.DataFrame) -> str:
+    """Content hash of a loaded grid and its attrs (catalog-less fallback)."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df.index.to_series(), index=False)
+             .to_numpy().tobytes())
+    for col in sorted(df.columns, key=str):
+        try:
+            values = pd.util.hash_pandas_object(df[col], index=False)
+        except TypeError:  # unhashable cells (lists, dicts)
+            values = pd.util.hash_pandas_object(df[col].astype(str), index=False)
+        h.update(str(col).encode())
+        h.update(values.to_numpy().tobytes())
+    h.update(json.dumps(df.attrs, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+# ── Store ────────────────────────────────────────────────────────────
+
+class FeatureStore:
+    """Per-patient feature arrays for one terrarium, built on first use."""
+
+    def __init__(self, parquet_dir, root=None):
+        self.terrarium = Terrarium(parquet_dir)
+        self.root = Path(root) if root is not None else self.terrarium.path / STORE_DIR
+        # collection → (catalog file (mtime_ns, size), catalog)
+        self._catalogs: Dict[str, tuple] = {}
+
+    # ── Keys ─────────────────────────────────────────────────────────
+
+    def _catalog(self, collection: str) -> Optional[pd.DataFrame]:
+        """The collection's catalog, re-read whenever its file changes."""
+        try:
+            st = catalog_path(self.terrarium.path, collection).stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        cached = self._catalogs.get(collection)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, self.terrarium.catalog(collection))
+            self._catalogs[collection] = cached
+        return cached[1]
+
+    def patient_hash(self, patient_id: str,
+                     df: Optional[pd.DataFrame] = None) -> Optional[str]:
+        """Hash of the patient's grid + profiles rows.
+
+        Taken from the catalog when both collections have one (profiles
+        may be absent); otherwise hashed from ``df``, or None when no
+        ``df`` was given.
+        """
+        collections = self.terrarium.collections()
+        parts = []
+        for collection in ('grid', 'profiles'):
+            if collection not in collections:
+                parts.append(f'{collection}:-')
+                continue
+            cat = self._catalog(collection)
+            if cat is None:
+                return _frame_hash(df) if df is not None else None
+            rows = cat.loc[cat['patient_id'] == str(patient_id), 'content_hash']
+            parts.append(f'{collection}:' + ','.join(sorted(rows)))
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+    def key(self, patient_id: str, feature_set: str = 'pk',
+            df: Optional[pd.DataFrame] = None, **params) -> Optional[str]:
+        """Entry key for the patient / feature set / parameters (see module doc)."""
+        data = self.patient_hash(patient_id, df)
+        if data is None:
+            return None
+        spec = json.dumps({
+            'patient': data,
+            'feature_set': feature_set,
+            'code': code_version(feature_set),
+            'params': builder_params(feature_set, **params),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(spec.encode()).hexdigest()[:24]
+
+    def _patient_dir(self, patient_id: str, feature_set: str) -> Path:
+        return self.root / feature_set / quote(str(patient_id), safe='')
+
+    # ── Read / write ─────────────────────────────────────────────────
+
+    def load(self, patient_id: str, feature_set: str = 'pk',
+             df: Optional[pd.DataFrame] = None, **params) -> Optional[np.ndarray]:
+        """Stored array (memory-mapped, copy-on-write), or None if not stored."""
+        key = self.key(patient_id, feature_set, df, **params)
+        if key is None:
+            return None
+        path = self._patient_dir(patient_id, feature_set) / f'{key}.npy'
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode='c')
+
+    def get(self, patient_id: str, feature_set: str = 'pk',
+            df: Optional[pd.DataFrame] = None, grid: Optional[np.ndarray] = None,
+            **params) -> Optional[np.ndarray]:
+        """Stored array, building and storing it first when missing.
+
+        ``df`` / ``grid`` are the patient's load_parquet_grid entry; they
+        are read from the terrarium when needed and not given. ``df``
+        must be the full grid: a column-projected frame would be built
+        and stored under the full grid's key. Returns
+        None when the builder does (e.g. PK for an unusable grid).
+        """
+        if feature_set not in FEATURE_SETS:
+            raise KeyError(f'unknown feature set {feature_set!r}; '
+                           f'expected one of {sorted(FEATURE_SETS)}')
+        cached = self.load(patient_id, feature_set, df, **params)
+        if cached is not None:
+            return cached
+        if df is None:
+            df, grid = _parquet_patient_grid(self.terrarium, patient_id)
+        elif grid is None:
+            grid = _parquet_patient_grid(self.terrarium, patient_id)[1]
+        values = FEATURE_SETS[feature_set][0](
+            self, patient_id, df, grid, builder_params(feature_set, **params))
+        if values is None:
+            return None
+        key = self.key(patient_id, feature_set, df, **params)
+        self._write(patient_id, feature_set, key, np.asarray(values),
+                    builder_params(feature_set, **params))
+        return np.load(self._patient_dir(patient_id, feature_set) / f'{key}.npy',
+                       mmap_mode='c')
+
+    def _write(self, patient_id, feature_set, key, values, params):
+        out = self._patient_dir(patient_id, feature_set)
+        out.mkdir(parents=True, exist_ok=True)
+        tmp = out / f'.{key}.{os.getpid()}.npy'
+        np.save(tmp, values)
+        os.replace(tmp, out / f'{key}.npy')
+        meta = {
+            'patient_id': str(patient_id),
+            'feature_set': feature_set,
+            'key': key,
+            'shape': list(values.shape),
+            'dtype': str(values.dtype),
+            'params': params,
+            'code': code_version(feature_set),
+            'built_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        }
+        with open(out / f'{key}.json', 'w') as f:
+            json.dump(meta, f, indent=2, default=str)
+        # Older keys for this patient belong to stale data, code or params
+        # only when the parameters match; other parameter sets stay valid.
+        for stale in out.glob('*.json'):
+            if stale.stem == key:
+                continue
+            try:
+                with open(stale) as f:
+                    old = json.load(f)
+            except (OSError, ValueError):
+                old = {}
+            if old.get('params', params) == json.loads(json.dumps(params, default=str)):
+                stale.unlink(missing_ok=True)
+                stale.with_suffix('.npy').unlink(missing_ok=True)
+
+    def invalidate(self, patient_id: Optional[str] = None,
+                   feature_set: Optional[str] = None) -> int:
+        """Remove stored entries (all, one patient, and/or one feature set).
+
+        Returns the number of arrays removed.
+        """
+        sets = [feature_set] if feature_set else sorted(FEATURE_SETS)
+        removed = 0
+        for name in sets:
+            dirs = ([self._patient_dir(patient_id, name)] if patient_id is not None
+                    else [d for d in (self.root / name).glob('*') if d.is_dir()])
+            for d in dirs:
+                if d.is_dir():
+                    removed += sum(1 for _ in d.glob('*.npy'))
+                    shutil.rmtree(d)
+        return removed
+
+    def entries(self) -> pd.DataFrame:
+        """One row per stored array, from the entry metadata."""
+        rows = []
+        for meta in sorted(self.root.glob('*/*/*.json')):
+            try:
+                with open(meta) as f:
+                    rows.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return pd.DataFrame(rows, columns=['patient_id', 'feature_set', 'key',
+                                           'shape', 'dtype', 'params', 'code',
+                                           'built_at'])
+
+    # ── Warm ─────────────────────────────────────────────────────────
+
+    def warm(self, patient_ids: Optional[List[str]] = None,
+             feature_sets=('pk',), workers: int = 1, **params):
+        """Build missing arrays for a cohort ``workers`` patients at a time.
+
+        ``params`` apply to the pk set. Yields one result dict per patient
+        in input order: {patient, status (OK / ERROR), seconds, built,
+        error?}.
+        """
+        if patient_ids is None:
+            patient_ids = _parquet_patient_ids(self.terrarium)
+        jobs = [(str(self.terrarium.path), str(self.root), pid,
+                 tuple(feature_sets), params) for pid in patient_ids]
+        if workers <= 1:
+            for job in jobs:
+                yield _warm_worker(job)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for fut in [pool.submit(_warm_worker, job) for job in jobs]:
+                yield fut.result()
+
+
+def _warm_worker(job):
+    parquet_dir, root, patient_id, feature_sets, params = job
+    t0 = time.time()
+    result = {'patient': patient_id, 'status': 'OK', 'built': []}
+    try:
+        store = FeatureStore(parquet_dir, root)
+        df, grid = _parquet_patient_grid(store.terrarium, patient_id)
+        for name in feature_sets:
+            kwargs = params if name == 'pk' else {}
+            if store.load(patient_id, name, df, **kwargs) is None:
+                store.get(patient_id, name, df=df, grid=grid, **kwargs)
+                result['built'].append(name)
+    except Exception as e:
+        result.update(status='ERROR', error=str(e))
+    result['seconds'] = round(time.time() - t0, 3)
+    return result
+
+
+# ── CLI ──────────────────────────────────────────────────────────────
+
+def cmd_warm(args):
+    store = FeatureStore(args.parquet_dir, args.store_dir)
+    pk_params = {}
+    if args.dia_hours is not None:
+        pk_params['dia_hours'] = args.dia_hours
+    if args.carb_abs_hours is not None:
+        pk_params['carb_abs_hours'] = args.carb_abs_hours
+    t0 = time.time()
+    results = []
+    for r in store.warm(args.patients, args.sets, workers=args.workers, **pk_params):
+        results.append(r)
+        built = ', '.join(r['built']) or 'cached'
+        line = f"  {r['patient']:>12}  {r['status']:<5} {r['seconds']:7.2f}s  {built}"
+        print(line + (f"  ({r['error']})" if 'error' in r else ''))
+    failed = sum(1 for r in results if r['status'] != 'OK')
+    print(f"\n  Warmed {len(results) - failed}/{len(results)} patients "
+          f"[{', '.join(args.sets)}] in {time.time() - t0:.1f}s → {store.root}")
+    return 1 if failed else 0
+
+
+def cmd_clear(args):
+    store = FeatureStore(args.parquet_dir, args.store_dir)
+    removed = 0
+    for pid in args.patients or [None]:
+        for name in args.sets or [None]:
+            removed += store.invalidate(pid, name)
+    print(f"  Removed {removed} stored arrays from {store.root}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='cgmencode feature store')
+    sub = parser.add_subparsers(dest='command')
+
+    for name, help_text in [('warm', 'Precompute feature arrays for a cohort'),
+                            ('clear', 'Remove stored feature arrays')]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('--parquet-dir', '-p', required=True,
+                       help='Terrarium directory (contains grid.parquet)')
+        p.add_argument('--store-dir', default=None,
+                       help=f'Store location (default: <parquet-dir>/{STORE_DIR})')
+        p.add_argument('--patients', nargs='+', default=None,
+                       help='Patient IDs (default: all)')
+        p.add_argument('--sets', nargs='+', choices=sorted(FEATURE_SETS),
+                       default=['pk'] if name == 'warm' else None,
+                       help='Feature sets (default: pk for warm, all for clear)')
+        if name == 'warm':
+            p.add_argument('--workers', type=int, default=1,
+                           help='Patients to build in parallel')
+            p.add_argument('--dia-hours', type=float, default=None)
+            p.add_argument('--carb-abs-hours', type=float, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == 'warm':
+        return cmd_warm(args)
+    if args.command == 'clear':
+        return cmd_clear(args)
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
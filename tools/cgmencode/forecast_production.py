@@ -694,6 +694,34 @@ class ProductionPipeline:
         return results
 
 
+def benchmark_seed_ensemble(n_patients: int = 11, window: str = 'w48',
+                            n_iterations: int = 20,
+                            models_dir: Optional[str] = None,
+                            device: str = 'cpu') -> Dict:
+    """Benchmark production.glucose_forecast: per-seed loop vs stacked ensemble."""
+    try:
+        from .production.glucose_forecast import benchmark_ensemble
+    except ImportError:  # run as a script / cgmencode on sys.path
+        from cgmencode.production.glucose_forecast import benchmark_ensemble
+
+    print(f"\nBenchmarking 5-seed ensemble inference ({window}, "
+          f"{n_patients} patients, {n_iterations} iterations)...")
+    results = benchmark_ensemble(n_patients, window, n_iterations,
+                                 models_dir, device)
+    cfg = results['_config']
+    print(f"  weights={cfg['weights']}, device={cfg['device']}, "
+          f"threads={cfg['threads']}")
+    print(f"  {'workload':<9} {'loop':>10} {'stacked':>10} {'speedup':>8} "
+          f"{'forecasts/s':>18}")
+    for name, r in results.items():
+        if name.startswith('_'):
+            continue
+        print(f"  {name:<9} {r['loop_ms']:>8.2f}ms {r['grouped_ms']:>8.2f}ms "
+              f"{r['speedup']:>7.2f}x {r['forecasts_per_s_loop']:>8.1f} → "
+              f"{r['forecasts_per_s_grouped']:<8.1f}")
+    return results
+
+
 # ─── CLI ───
 
 def cmd_benchmark(args):
@@ -709,6 +737,10 @@ def cmd_benchmark(args):
     print(f"  Total memory: {caps['total_memory_kb']:.1f} KB")
 
     bench = pipeline.full_benchmark(args.iterations)
+    if args.ensemble_patients > 0:
+        bench['ensemble'] = benchmark_seed_ensemble(
+            args.ensemble_patients, args.ensemble_window,
+            args.ensemble_iterations, args.ensemble_models_dir, args.device)
 
     out_path = os.path.join(args.output_dir, 'production_benchmark.json')
     os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
@@ -879,6 +911,14 @@ def main():
     bench.add_argument('--device', default='cpu')
     bench.add_argument('--iterations', type=int, default=100)
     bench.add_argument('--output-dir', default='externals/experiments')
+    bench.add_argument('--ensemble-patients', type=int, default=11,
+                       help='Patients in the seed-ensemble benchmark (0 = skip)')
+    bench.add_argument('--ensemble-window', default='w48',
+                       choices=['w48', 'w72', 'w96', 'w144'])
+    bench.add_argument('--ensemble-iterations', type=int, default=20)
+    bench.add_argument('--ensemble-models-dir', default=None,
+                       help='EXP-619 checkpoints (default: externals/experiments; '
+                            'random-init weights where missing)')
 
     export_cfg = sub.add_parser('export-config', help='Export production config')
     export_cfg.add_argument('--output-dir', default='externals/experiments')
@@ -864,6 +864,21 @@ COMMANDS = {
     'report': ('Full clinical summary (all capabilities)', cmd_report),
 }
 
+# PipelineResult fields each command reads; run_pipeline only executes
+# the stages they depend on. None = full pipeline (quality reports the
+# warnings of every stage; report renders everything).
+COMMAND_OUTPUTS = {
+    'status': {'cleaned', 'clinical_report', 'hypo_alert', 'recommendations'},
+    'triage': {'clinical_report', 'patterns', 'settings_recs', 'period_metrics',
+               'correction_energy', 'aid_compensation', 'bolus_safety'},
+    'meals': {'meal_history', 'meal_prediction', 'meal_responses'},
+    'patterns': {'patterns'},
+    'quality': None,
+    'experiments': {'natural_experiments'},
+    'recommend': {'recommendations'},
+    'report': None,
+}
+
 
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
@@ -944,7 +959,8 @@ def main():
         current_hour = datetime.now().hour + datetime.now().minute / 60.0
 
     # ── Run pipeline ──────────────────────────────────────────────
-    result = run_pipeline(patient, current_hour=current_hour)
+    result = run_pipeline(patient, current_hour=current_hour,
+                          outputs=COMMAND_OUTPUTS[args.command])
 
     # ── Execute command ───────────────────────────────────────────
     _, cmd_func = COMMANDS[args.command]
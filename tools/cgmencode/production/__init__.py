@@ -21,7 +21,7 @@ Usage:
 from .types import (
     PatientData, PatientProfile, CleanedData, MetabolicState,
     RiskAssessment, ClinicalReport, PatternProfile, CircadianFit,
-    HypoAlert, PipelineResult, OnboardingState,
+    HypoAlert, PipelineResult, OnboardingState, TimeIndex,
     DetectedMeal, MealHistory, MealTimingModel, MealPrediction,
     SettingsRecommendation, ActionRecommendation,
     MealResponse, MealResponseType, PeriodMetrics, CorrectionEnergy,
@@ -29,7 +29,7 @@ from .types import (
     GlycemicGrade, BasalAssessment, EventType, OnboardingPhase, Phenotype,
     MealWindow, SettingsParameter, TIR_LOW, TIR_HIGH,
     OptimalSettings, SettingScheduleEntry, SettingsOptimizationResult,
-    PatientPhenotype, PatientPhenotypeResult,
+    PatientPhenotype, PatientPhenotypeResult, StageMetrics, SessionUpdate,
 )
 from .data_quality import clean_glucose, detect_spikes, interpolate_spikes
 from .metabolic_engine import compute_metabolic_state
@@ -56,19 +56,31 @@ from .prediction_validator import (
     PredictionValidationResult, ValidationSummary,
 )
 from .forward_simulator import (
-    forward_simulate, compare_scenarios, simulate_typical_day,
+    forward_simulate, forward_simulate_batch, compare_scenarios, simulate_typical_day,
     TherapySettings, InsulinEvent, CarbEvent,
-    SimulationResult, ScenarioComparison,
+    SimulationResult, BatchSimulationResult, ScenarioComparison,
 )
 from .patient_phenotyper import classify_patient_phenotype
-from .pipeline import run_pipeline, run_pipeline_batch
+from .pipeline import run_pipeline, run_pipeline_batch, PIPELINE_GRAPH, PIPELINE_OUTPUTS
+from .stage_graph import StageGraph, StageNode
+from .physics_cache import PhysicsCache, configure_physics_cache, cached_metabolic_state
+from .time_index import build_time_index
+from .batch_runner import (
+    run_pipeline_parallel, iter_pipeline_parallel,
+    PipelineError, BatchThroughput, ParallelBatchResult,
+)
+from .instrumentation import (
+    StageRecorder, register_stage_hook, unregister_stage_hook,
+    JsonLinesExporter, PrometheusTextExporter,
+)
+from .pipeline_session import PipelineSession
 from .validators import run_validation
 
 __all__ = [
     # Types
     'PatientData', 'PatientProfile', 'CleanedData', 'MetabolicState',
     'RiskAssessment', 'ClinicalReport', 'PatternProfile', 'CircadianFit',
-    'HypoAlert', 'PipelineResult', 'OnboardingState',
+    'HypoAlert', 'PipelineResult', 'OnboardingState', 'TimeIndex',
     'DetectedMeal', 'MealHistory', 'MealTimingModel', 'MealPrediction',
     'SettingsRecommendation', 'ActionRecommendation',
     'MealResponse', 'MealResponseType', 'PeriodMetrics', 'CorrectionEnergy',
@@ -79,6 +91,15 @@ __all__ = [
     'PatientPhenotype', 'PatientPhenotypeResult', 'classify_patient_phenotype',
     # Pipeline
     'run_pipeline', 'run_pipeline_batch',
+    'run_pipeline_parallel', 'iter_pipeline_parallel',
+    'PipelineError', 'BatchThroughput', 'ParallelBatchResult',
+    'PipelineSession', 'SessionUpdate',
+    'PIPELINE_GRAPH', 'PIPELINE_OUTPUTS', 'StageGraph', 'StageNode',
+    'PhysicsCache', 'configure_physics_cache', 'cached_metabolic_state',
+    'build_time_index',
+    # Stage instrumentation
+    'StageMetrics', 'StageRecorder', 'register_stage_hook', 'unregister_stage_hook',
+    'JsonLinesExporter', 'PrometheusTextExporter',
     # Individual modules
     'clean_glucose', 'detect_spikes', 'interpolate_spikes',
     'compute_metabolic_state',
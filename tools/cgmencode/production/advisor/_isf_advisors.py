@@ -9,7 +9,7 @@ from ..types import (
     PeriodMetrics,
 )
 from ..forward_simulator import (
-    forward_simulate as _fwd_simulate,
+    forward_simulate_batch as _fwd_simulate_batch,
     TherapySettings as _TherapySettings,
     InsulinEvent as _InsulinEvent,
     CarbEvent as _CarbEvent,
@@ -58,6 +58,7 @@ __all__ = [
     '_evaluate_joint_settings',
     '_extract_correction_windows',
     '_extract_meal_windows_from_arrays',
+    '_simulate_correction_drops',
     'advise_circadian_isf',
     'advise_circadian_isf_profiled',
     'advise_correction_denominator_isf',  # Wave-12: multi-factor deconfounding
@@ -482,36 +483,98 @@ def _extract_meal_windows_from_arrays(
 def _evaluate_joint_settings(windows: list, isf_mult: float, cr_mult: float) -> Optional[float]:
     """Evaluate a single ISF×CR multiplier pair across meal windows.
 
-    Returns mean TIR (70-180 mg/dL) as a fraction, or None if evaluation fails.
+    Returns mean TIR (70-180 mg/dL) as a fraction over the windows that
+    simulate, or None if none do. All windows are simulated together
+    through the batched engine; if the batch raises, its windows are
+    re-run one at a time so a single bad window only drops itself.
     """
-    tirs = []
-    for w in windows:
+    idx, settings = [], []
+    for i, w in enumerate(windows):
         try:
             # Use decoupled CSF when carbs are present (EXP-2596)
-            csf = _POPULATION_CSF if w['c'] > 1.0 else None
-            s = _TherapySettings(
+            settings.append(_TherapySettings(
                 isf=w['isf'] * isf_mult,
                 cr=w['cr'] * cr_mult,
                 basal_rate=w['basal'],
                 dia_hours=5.0,
-                carb_sensitivity=csf,
-            )
-            r = _fwd_simulate(
-                initial_glucose=w['g'], settings=s,
-                duration_hours=_SIM_DURATION_HOURS,
-                start_hour=w['h'],
-                bolus_events=[_InsulinEvent(0, w['b'])],
-                carb_events=[_CarbEvent(0, w['c'])],
-                initial_iob=w['iob'],
-                noise_std=0, seed=42,
-            )
-            gluc = np.array(r.glucose)
-            tirs.append(float(np.mean((gluc >= 70) & (gluc <= 180))))
+                carb_sensitivity=_POPULATION_CSF if w['c'] > 1.0 else None,
+            ))
+            idx.append(i)
         except Exception:
             pass
+
+    def run(rows, row_settings):
+        ws = [windows[i] for i in rows]
+        r = _fwd_simulate_batch(
+            initial_glucose=[w['g'] for w in ws], settings=row_settings,
+            duration_hours=_SIM_DURATION_HOURS,
+            start_hour=[w['h'] for w in ws],
+            bolus_events=[[_InsulinEvent(0, w['b'])] for w in ws],
+            carb_events=[[_CarbEvent(0, w['c'])] for w in ws],
+            initial_iob=[w['iob'] for w in ws],
+            noise_std=0, seed=42,
+        )
+        gluc = r.glucose
+        return list(np.mean((gluc >= 70) & (gluc <= 180), axis=1))
+
+    if not idx:
+        return None
+    try:
+        tirs = run(idx, settings)
+    except Exception:
+        tirs = []
+        for i, s in zip(idx, settings):
+            try:
+                tirs.extend(run([i], [s]))
+            except Exception:
+                pass
     return float(np.mean(tirs)) if tirs else None
 
 
+def _simulate_correction_drops(windows: list, isf_mult: float, k: float) -> np.ndarray:
+    """Simulated 2h glucose change for every correction window at once.
+
+    A window the simulator rejects gets NaN without failing the others:
+    if the batch raises, its windows are re-run one at a time.
+    """
+    drops = np.full(len(windows), np.nan)
+    idx, settings = [], []
+    for i, w in enumerate(windows):
+        try:
+            settings.append(_TherapySettings(
+                isf=w['isf'] * isf_mult, cr=w['cr'],
+                basal_rate=w['basal'], dia_hours=5.0,
+            ))
+            idx.append(i)
+        except Exception:
+            pass
+
+    def run(rows, row_settings):
+        ws = [windows[i] for i in rows]
+        r = _fwd_simulate_batch(
+            initial_glucose=[w['g'] for w in ws], settings=row_settings,
+            duration_hours=_CORR_SIM_HOURS,
+            start_hour=[w['h'] for w in ws],
+            bolus_events=[[_InsulinEvent(0, w['b'])] for w in ws],
+            carb_events=None,
+            initial_iob=[w['iob'] for w in ws],
+            noise_std=0, seed=42, counter_reg_k=k,
+        )
+        drops[rows] = r.glucose[:, -1] - np.array([w['g'] for w in ws])
+
+    if not idx:
+        return drops
+    try:
+        run(idx, settings)
+    except Exception:
+        for i, s in zip(idx, settings):
+            try:
+                run([i], [s])
+            except Exception:
+                pass
+    return drops
+
+
 def advise_forward_sim_optimization(
     glucose: np.ndarray,
     hours: np.ndarray,
@@ -700,26 +763,11 @@ def _calibrate_counter_reg_k(windows: list) -> float:
     best_k = _POPULATION_K
     best_dist = float('inf')
 
+    actual = np.array([w['actual_drop'] for w in windows])
     for k in _CR_K_GRID:
-        ratios = []
-        for w in windows:
-            try:
-                s = _TherapySettings(
-                    isf=w['isf'], cr=w['cr'],
-                    basal_rate=w['basal'], dia_hours=5.0,
-                )
-                r = _fwd_simulate(
-                    initial_glucose=w['g'], settings=s,
-                    duration_hours=_CORR_SIM_HOURS, start_hour=w['h'],
-                    bolus_events=[_InsulinEvent(0, w['b'])],
-                    carb_events=[], initial_iob=w['iob'],
-                    noise_std=0, seed=42, counter_reg_k=k,
-                )
-                sim_drop = r.glucose[-1] - w['g']
-                if abs(sim_drop) > 1.0:
-                    ratios.append(w['actual_drop'] / sim_drop)
-            except Exception:
-                pass
+        sim_drop = _simulate_correction_drops(windows, 1.0, k)
+        usable = np.isfinite(sim_drop) & (np.abs(sim_drop) > 1.0)
+        ratios = actual[usable] / sim_drop[usable]
 
         if len(ratios) >= 10:
             mean_ratio = float(np.mean(ratios))
@@ -762,27 +810,13 @@ def _calibrate_correction_isf(windows: list, k: float) -> Optional[float]:
     best_mult = 1.0
     best_mae = float('inf')
 
+    actual = np.array([w['actual_drop'] for w in windows])
     for isf_m in _CORR_ISF_GRID:
-        errors = []
-        for w in windows:
-            try:
-                s = _TherapySettings(
-                    isf=w['isf'] * isf_m, cr=w['cr'],
-                    basal_rate=w['basal'], dia_hours=5.0,
-                )
-                r = _fwd_simulate(
-                    initial_glucose=w['g'], settings=s,
-                    duration_hours=_CORR_SIM_HOURS, start_hour=w['h'],
-                    bolus_events=[_InsulinEvent(0, w['b'])],
-                    carb_events=[], initial_iob=w['iob'],
-                    noise_std=0, seed=42, counter_reg_k=k,
-                )
-                sim_drop = r.glucose[-1] - w['g']
-                errors.append(abs(w['actual_drop'] - sim_drop))
-            except Exception:
-                pass
+        sim_drop = _simulate_correction_drops(windows, isf_m, k)
+        simulated = np.isfinite(sim_drop)
+        errors = np.abs(actual[simulated] - sim_drop[simulated])
 
-        if errors:
+        if len(errors):
             mae = float(np.mean(errors))
             if mae < best_mae:
                 best_mae = mae
@@ -0,0 +1,419 @@
+"""
+batch_runner.py — Parallel cohort execution of ``run_pipeline``.
+
+``run_pipeline_batch`` runs patients one after another on a single core.
+This module fans a cohort out over a pool of worker processes:
+
+  - Patient arrays are staged as ``.npy`` files (``/dev/shm`` when
+    available) and opened copy-on-write with ``np.load(mmap_mode='c')``
+    in the worker, so glucose/IOB/bolus/carbs/basal are never pickled
+    through the task pipe.
+  - Each patient gets a wall-clock deadline. A worker that overruns is
+    terminated and replaced; the patient comes back as a timed-out
+    ``PipelineError`` and the rest of the batch continues. Every worker
+    reports on its own result pipe, discarded with it, so a worker killed
+    mid-send cannot corrupt or deadlock the others' results.
+  - Any exception inside ``run_pipeline`` becomes a ``PipelineError``
+    (type, message, traceback) instead of aborting the batch.
+  - Results stream back either in input order or as they complete.
+  - ``BatchThroughput`` reports patients/s and p50/p95 per-patient
+    latency against the module's <500 ms/patient target.
+
+Usage:
+    from tools.cgmencode.production.batch_runner import run_pipeline_parallel
+
+    batch = run_pipeline_parallel(patients, workers=8, timeout_s=60)
+    print(batch.throughput.summary())
+    for r in batch.results:
+        if isinstance(r, PipelineError):
+            ...
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import shutil
+import tempfile
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .instrumentation import clear_stage_hooks, emit_stage_metrics
+from .types import PatientData, PipelineResult
+
+# Per-patient latency target from pipeline.py ("<500ms per patient").
+TARGET_LATENCY_MS = 500.0
+
+_ARRAY_FIELDS = ('glucose', 'timestamps', 'iob', 'cob', 'bolus', 'carbs', 'basal_rate')
+_POLL_SECONDS = 0.05
+
+
+# ── Data Contracts ────────────────────────────────────────────────────
+
+@dataclass
+class PipelineError:
+    """Structured per-patient failure from a parallel batch."""
+    index: int                  # position in the input sequence
+    patient_id: str
+    error_type: str             # exception class name, or 'Timeout'
+    message: str
+    traceback: str = ''
+    elapsed_ms: float = 0.0
+    timed_out: bool = False
+
+
+BatchItem = Union[PipelineResult, PipelineError]
+
+
+@dataclass
+class BatchThroughput:
+    """Throughput and latency report for one batch run."""
+    n_patients: int
+    n_ok: int
+    n_failed: int
+    n_timed_out: int
+    workers: int
+    wall_seconds: float
+    latencies_ms: np.ndarray = field(repr=False, default_factory=lambda: np.zeros(0))
+
+    @property
+    def patients_per_second(self) -> float:
+        return self.n_patients / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    @property
+    def p50_ms(self) -> float:
+        return float(np.percentile(self.latencies_ms, 50)) if len(self.latencies_ms) else 0.0
+
+    @property
+    def p95_ms(self) -> float:
+        return float(np.percentile(self.latencies_ms, 95)) if len(self.latencies_ms) else 0.0
+
+    @property
+    def max_ms(self) -> float:
+        return float(np.max(self.latencies_ms)) if len(self.latencies_ms) else 0.0
+
+    @property
+    def fraction_within_target(self) -> float:
+        """Fraction of patients finishing under TARGET_LATENCY_MS."""
+        if not len(self.latencies_ms):
+            return 0.0
+        return float(np.mean(self.latencies_ms < TARGET_LATENCY_MS))
+
+    def summary(self) -> Dict:
+        return {
+            'n_patients': self.n_patients,
+            'n_ok': self.n_ok,
+            'n_failed': self.n_failed,
+            'n_timed_out': self.n_timed_out,
+            'workers': self.workers,
+            'wall_seconds': round(self.wall_seconds, 3),
+            'patients_per_second': round(self.patients_per_second, 3),
+            'p50_ms': round(self.p50_ms, 1),
+            'p95_ms': round(self.p95_ms, 1),
+            'max_ms': round(self.max_ms, 1),
+            'target_ms': TARGET_LATENCY_MS,
+            'fraction_within_target': round(self.fraction_within_target, 3),
+        }
+
+
+@dataclass
+class ParallelBatchResult:
+    """Results (input order) plus the throughput report."""
+    results: List[BatchItem]
+    throughput: BatchThroughput
+
+    @property
+    def errors(self) -> List[PipelineError]:
+        return [r for r in self.results if isinstance(r, PipelineError)]
+
+
+# ── Array staging (memory-mapped, never pickled) ──────────────────────
+
+def _staging_root() -> Optional[str]:
+    """Prefer RAM-backed /dev/shm for staged arrays when present."""
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _stage_patient(patient: PatientData, directory: str, index: int) -> Dict:
+    """Write patient arrays to .npy files; return a small picklable descriptor."""
+    arrays = {}
+    for name in _ARRAY_FIELDS:
+        arr = getattr(patient, name, None)
+        if arr is None:
+            arrays[name] = None
+            continue
+        path = os.path.join(directory, f'{index}_{name}.npy')
+        np.save(path, np.ascontiguousarray(arr))
+        arrays[name] = path
+    return {
+        'arrays': arrays,
+        'profile': patient.profile,
+        'patient_id': patient.patient_id,
+        'metadata': patient.metadata,
+    }
+
+
+def _unstage_patient(desc: Dict) -> None:
+    for path in desc['arrays'].values():
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _attach_patient(desc: Dict) -> PatientData:
+    """Rebuild PatientData over copy-on-write memory maps of the staged arrays."""
+    arrays = {name: (np.load(path, mmap_mode='c') if path is not None else None)
+              for name, path in desc['arrays'].items()}
+    return PatientData(
+        profile=desc['profile'],
+        patient_id=desc['patient_id'],
+        metadata=desc['metadata'],
+        **arrays,
+    )
+
+
+# ── Worker process ────────────────────────────────────────────────────
+
+def _worker_main(task_q, conn, pipeline_kwargs: Dict) -> None:
+    """Worker loop: run_pipeline on staged patients until a None sentinel.
+
+    Results go to ``conn``, the write end of this worker's own pipe.
+    """
+    from .pipeline import run_pipeline
+
+    # Stage-metric hooks run in the parent as results arrive; hooks
+    # inherited through fork would otherwise export twice.
+    clear_stage_hooks()
+
+    while True:
+        task = task_q.get()
+        if task is None:
+            return
+        index, desc = task
+        t0 = time.perf_counter()
+        try:
+            patient = _attach_patient(desc)
+            result: BatchItem = run_pipeline(patient, **pipeline_kwargs)
+        except Exception as e:
+            result = PipelineError(
+                index=index,
+                patient_id=desc['patient_id'],
+                error_type=type(e).__name__,
+                message=str(e),
+                traceback=traceback.format_exc(),
+            )
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        if isinstance(result, PipelineError):
+            result.elapsed_ms = elapsed_ms
+        try:
+            conn.send((index, result, elapsed_ms))
+        except Exception as e:  # unpicklable result (nothing was written)
+            conn.send((index, PipelineError(
+                index=index, patient_id=desc['patient_id'],
+                error_type=type(e).__name__, message=str(e),
+                elapsed_ms=elapsed_ms,
+            ), elapsed_ms))
+
+
+@dataclass
+class _Worker:
+    proc: mp.process.BaseProcess
+    task_q: object
+    conn: object                  # read end of the worker's result pipe
+    index: Optional[int] = None   # patient currently assigned
+    started: float = 0.0
+
+
+# ── Public API ────────────────────────────────────────────────────────
+
+def iter_pipeline_parallel(
+    patients: Sequence[PatientData],
+    workers: Optional[int] = None,
+    timeout_s: Optional[float] = None,
+    ordered: bool = True,
+    mp_context: Optional[str] = None,
+    latencies_out: Optional[List[float]] = None,
+    **pipeline_kwargs,
+) -> Iterator[Tuple[int, BatchItem]]:
+    """Run ``run_pipeline`` over a cohort in worker processes.
+
+    Yields ``(index, PipelineResult | PipelineError)``. With ``ordered``
+    results come back in input order (buffering early finishers);
+    otherwise each one is yielded as soon as its worker reports.
+
+    Args:
+        patients: PatientData per patient.
+        workers: process count (default: ``os.cpu_count()``, capped at
+            the number of patients).
+        timeout_s: per-patient wall-clock deadline. An overrunning worker
+            is terminated and replaced. None disables the deadline.
+        ordered: preserve input order instead of as-completed streaming.
+        mp_context: multiprocessing start method ('fork', 'spawn', ...).
+        latencies_out: if given, per-patient latencies (ms) are appended.
+        **pipeline_kwargs: forwarded to ``run_pipeline``.
+    """
+    n = len(patients)
+    if n == 0:
+        return
+    n_workers = max(1, min(workers or os.cpu_count() or 1, n))
+    ctx = mp.get_context(mp_context)
+    stage_dir = tempfile.mkdtemp(prefix='cgm_batch_', dir=_staging_root())
+    staged: Dict[int, Dict] = {}
+    pool: List[_Worker] = []
+
+    def spawn() -> _Worker:
+        task_q = ctx.Queue()
+        reader, writer = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_worker_main,
+                           args=(task_q, writer, pipeline_kwargs),
+                           daemon=True)
+        proc.start()
+        writer.close()   # the worker holds the only write end
+        return _Worker(proc=proc, task_q=task_q, conn=reader)
+
+    def discard(w: _Worker):
+        """Drop a (terminated) worker's pipe and task queue."""
+        w.conn.close()
+        w.task_q.cancel_join_thread()
+        w.task_q.close()
+
+    next_index = 0
+    next_yield = 0
+    buffered: Dict[int, BatchItem] = {}
+    done = 0
+
+    def record(index: int, item: BatchItem, elapsed_ms: float):
+        if latencies_out is not None:
+            latencies_out.append(elapsed_ms)
+        if isinstance(item, PipelineResult):
+            emit_stage_metrics(item.patient_id, item.stage_metrics,
+                               item.pipeline_latency_ms)
+        desc = staged.pop(index, None)
+        if desc is not None:
+            _unstage_patient(desc)
+
+    try:
+        pool = [spawn() for _ in range(n_workers)]
+        while done < n:
+            # Hand out work to idle workers
+            for w in pool:
+                if w.index is None and next_index < n:
+                    desc = _stage_patient(patients[next_index], stage_dir, next_index)
+                    staged[next_index] = desc
+                    w.index = next_index
+                    w.started = time.perf_counter()
+                    w.task_q.put((next_index, desc))
+                    next_index += 1
+
+            finished: List[Tuple[int, BatchItem]] = []
+            by_conn = {w.conn: w for w in pool}
+            for conn in mp.connection.wait(list(by_conn), timeout=_POLL_SECONDS):
+                w = by_conn[conn]
+                try:
+                    index, item, elapsed_ms = conn.recv()
+                except (EOFError, OSError):
+                    # Worker died: a busy one is reported below; replace an
+                    # idle one now so its closed pipe is not polled again
+                    if w.index is None:
+                        w.proc.join(timeout=1.0)
+                        discard(w)
+                        pool[pool.index(w)] = spawn()
+                    continue
+                if w.index == index:
+                    w.index = None
+                    record(index, item, elapsed_ms)
+                    finished.append((index, item))
+
+            # Enforce deadlines and detect crashed workers
+            now = time.perf_counter()
+            for wid, w in enumerate(pool):
+                if w.index is None:
+                    continue
+                overran = timeout_s is not None and now - w.started > timeout_s
+                crashed = not w.proc.is_alive()
+                if not (overran or crashed):
+                    continue
+                index = w.index
+                elapsed_ms = (now - w.started) * 1000.0
+                w.proc.terminate()
+                w.proc.join(timeout=1.0)
+                discard(w)
+                item = PipelineError(
+                    index=index,
+                    patient_id=patients[index].patient_id,
+                    error_type='Timeout' if overran else 'WorkerCrashed',
+                    message=(f'exceeded {timeout_s:.1f}s deadline' if overran
+                             else f'worker exited with code {w.proc.exitcode}'),
+                    elapsed_ms=elapsed_ms,
+                    timed_out=overran,
+                )
+                record(index, item, elapsed_ms)
+                finished.append((index, item))
+                pool[wid] = spawn()
+
+            for index, item in finished:
+                done += 1
+                if not ordered:
+                    yield index, item
+                    continue
+                buffered[index] = item
+                while next_yield in buffered:
+                    yield next_yield, buffered.pop(next_yield)
+                    next_yield += 1
+    finally:
+        for w in pool:
+            if w.proc.is_alive():
+                try:
+                    w.task_q.put(None)
+                except Exception:
+                    pass
+        for w in pool:
+            w.proc.join(timeout=1.0)
+            if w.proc.is_alive():
+                w.proc.terminate()
+                w.proc.join(timeout=1.0)
+            discard(w)
+        shutil.rmtree(stage_dir, ignore_errors=True)
+
+
+def run_pipeline_parallel(
+    patients: Sequence[PatientData],
+    workers: Optional[int] = None,
+    timeout_s: Optional[float] = None,
+    mp_context: Optional[str] = None,
+    **pipeline_kwargs,
+) -> ParallelBatchResult:
+    """Run a cohort in parallel; collect results in input order.
+
+    Failures and timeouts are returned in place as ``PipelineError``
+    rather than raising. See ``iter_pipeline_parallel`` for arguments
+    and for as-completed streaming.
+    """
+    latencies: List[float] = []
+    results: List[Optional[BatchItem]] = [None] * len(patients)
+    n_workers = max(1, min(workers or os.cpu_count() or 1, max(len(patients), 1)))
+    t0 = time.perf_counter()
+    for index, item in iter_pipeline_parallel(
+            patients, workers=n_workers, timeout_s=timeout_s, ordered=True,
+            mp_context=mp_context, latencies_out=latencies, **pipeline_kwargs):
+        results[index] = item
+    wall = time.perf_counter() - t0
+
+    errors = [r for r in results if isinstance(r, PipelineError)]
+    throughput = BatchThroughput(
+        n_patients=len(patients),
+        n_ok=len(patients) - len(errors),
+        n_failed=len(errors),
+        n_timed_out=sum(1 for e in errors if e.timed_out),
+        workers=n_workers,
+        wall_seconds=wall,
+        latencies_ms=np.asarray(latencies, dtype=np.float64),
+    )
+    return ParallelBatchResult(results=results, throughput=throughput)
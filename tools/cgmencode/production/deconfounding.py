@@ -31,6 +31,7 @@ Usage:
     # Approach B: EGP-aware subtraction (supply + demand, EXP-2728)
     bgi_physics = BGISubtraction(egp_enabled=True, counter_reg_k=0.3)
     events = bgi_physics.compute_deviations(grid_df, patient_isf)
+    table = bgi.compute_deviations(grid_df, as_arrow=True)   # pyarrow.Table
 
     # Approach C: Exclude confounded events (traditional)
     filt = IsolationFilter(ExperimentFilters(bg_floor=180, isolation_hours=2))
@@ -76,10 +77,10 @@ DEFAULT_COUNTER_REG_K = 0.3  # from forward_simulator default
 # ── EGP-aware BGI helpers (EXP-2727/2728) ────────────────────────────
 
 def _estimate_egp_over_horizon(
-    iob_start: float,
-    hour_start: float,
+    iob_start,
+    hour_start,
     horizon_steps: int = DEFAULT_HORIZON_STEPS,
-) -> float:
+):
     """Analytically estimate total EGP contribution over a horizon window.
 
     Uses the same Hill equation + circadian model as forward_simulator.py
@@ -91,20 +92,25 @@ def _estimate_egp_over_horizon(
     64.2 → 59.2 (8% improvement), and with counter-regulation → 46.9 (27%).
 
     Args:
-        iob_start: Insulin on board at start of window (Units).
-        hour_start: Hour of day at start (0-24).
+        iob_start: Insulin on board at start of window (Units), scalar
+            or (N,) array.
+        hour_start: Hour of day at start (0-24), scalar or (N,) array.
         horizon_steps: Number of 5-minute steps in window.
 
     Returns:
-        Total EGP contribution in mg/dL over the horizon window.
+        Total EGP contribution in mg/dL over the horizon window (float
+        for scalar inputs, (N,) array otherwise).
         Positive = glucose-raising (opposes insulin-driven drop).
     """
+    iob_start = np.asarray(iob_start, dtype=np.float64)
+    hour_start = np.asarray(hour_start, dtype=np.float64)
+
     # Sample EGP at a few points across the horizon for better integration
     n_samples = min(horizon_steps, 6)
     step_size = horizon_steps / n_samples
     hours_per_step = 5.0 / 60.0
 
-    total_egp = 0.0
+    total_egp = np.zeros(np.broadcast(iob_start, hour_start).shape)
     for s in range(n_samples):
         t_step = s * step_size
         # Approximate IOB decay (simple exponential, tau ~2h)
@@ -112,19 +118,16 @@ def _estimate_egp_over_horizon(
         iob_approx = iob_start * np.exp(-t_hours / 2.0)
         hour_approx = (hour_start + t_hours) % 24.0
 
-        egp_val = _compute_hepatic_production(
-            np.array([iob_approx]),
-            np.array([hour_approx]),
-        )
-        total_egp += float(egp_val[0]) * step_size
+        egp_val = _compute_hepatic_production(iob_approx, hour_approx)
+        total_egp += egp_val * step_size
 
-    return total_egp
+    return float(total_egp) if total_egp.ndim == 0 else total_egp
 
 
 def _estimate_counter_reg(
-    expected_drop_raw: float,
+    expected_drop_raw,
     counter_reg_k: float = DEFAULT_COUNTER_REG_K,
-) -> float:
+):
     """Estimate counter-regulation damping on an expected glucose drop.
 
     Counter-regulation (glucagon + hepatic response) opposes rapid drops.
@@ -135,12 +138,19 @@ def _estimate_counter_reg(
     when combined with EGP, but together they explain 94% of the gap.
 
     Args:
-        expected_drop_raw: Raw expected drop from insulin (positive = BG falls).
+        expected_drop_raw: Raw expected drop from insulin (positive = BG falls),
+            scalar or array.
         counter_reg_k: Counter-regulation coefficient.
 
     Returns:
         Damped expected drop (always <= raw drop magnitude).
     """
+    if np.ndim(expected_drop_raw):
+        if counter_reg_k <= 0:
+            return expected_drop_raw
+        return np.where(expected_drop_raw > 0,
+                        expected_drop_raw / (1.0 + counter_reg_k),
+                        expected_drop_raw)
     if expected_drop_raw <= 0 or counter_reg_k <= 0:
         return expected_drop_raw
     return expected_drop_raw / (1.0 + counter_reg_k)
@@ -256,14 +266,24 @@ class BGISubtraction:
         self,
         grid: pd.DataFrame,
         patient_isf: Optional[Dict[str, float]] = None,
-    ) -> pd.DataFrame:
+        as_arrow: bool = False,
+    ):
         """Compute deviation for every valid point in the grid.
 
+        Columnar: the grid is sorted once by (patient, time), horizon
+        sums come from per-patient cumulative sums, and the hour, EGP
+        and counter-regulation terms are evaluated as whole arrays, so
+        the cost is O(N) over the cohort rather than a Python loop per
+        row. Events are emitted in ``grid.patient_id.unique()`` order,
+        then by time, starting at the second row of each patient.
+
         Args:
             grid: DataFrame with columns: patient_id, time, glucose, bolus,
                   iob, scheduled_isf, scheduled_basal_rate,
                   and optionally bolus_smb, net_basal.
             patient_isf: Optional per-patient ISF override dict.
+            as_arrow: Return a ``pyarrow.Table`` instead of a DataFrame
+                (requires pyarrow).
 
         Returns:
             DataFrame of events with columns: patient_id, time, bg0, bg_end,
@@ -271,117 +291,151 @@ class BGISubtraction:
             excess_basal_2h, excess_insulin, iob_start, roc_start, carbs_2h,
             hour, controller.
         """
+        columns = self._deviation_columns(grid, patient_isf)
+        df = pd.DataFrame(columns) if columns else pd.DataFrame()
+        if as_arrow:
+            import pyarrow as pa
+            return pa.Table.from_pandas(df, preserve_index=False)
+        return df
+
+    def _deviation_columns(
+        self,
+        grid: pd.DataFrame,
+        patient_isf: Optional[Dict[str, float]],
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Event columns for ``compute_deviations`` (None if no events)."""
         h = self.horizon_steps
-        events = []
+        if len(grid) == 0:
+            return None
 
         has_smb = "bolus_smb" in grid.columns
         has_net_basal = "net_basal" in grid.columns
-        has_sched_basal = "scheduled_basal_rate" in grid.columns
         has_carbs = "carbs" in grid.columns
         has_controller = "controller" in grid.columns
-
-        for pid in grid["patient_id"].unique():
-            pg = grid[grid["patient_id"] == pid].sort_values("time").reset_index(drop=True)
-            if len(pg) < h + 2:
+        has_sched_isf = "scheduled_isf" in grid.columns
+
+        # One stable sort by (first-appearance patient order, time)
+        codes, uniques = pd.factorize(grid["patient_id"])
+        times_raw = grid["time"].values
+        order = pd.DataFrame({"p": codes, "t": times_raw}).sort_values(["p", "t"]).index.values
+        order = order[codes[order] >= 0]
+        codes = codes[order]
+
+        def column(name: str, default: float) -> np.ndarray:
+            if name in grid.columns:
+                return grid[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+            return np.full(len(order), default)
+
+        glucose = column("glucose", np.nan)
+        iob = column("iob", np.nan)
+        times = times_raw[order]
+
+        # Per-patient row ranges; keep patients with enough rows and an ISF
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(codes)]))
+        isf_col = column("scheduled_isf", np.nan) if has_sched_isf else None
+        ctrl_col = grid["controller"].values[order] if has_controller else None
+
+        sel_rows, isf_rows, ctrl_rows, pid_rows = [], [], [], []
+        for start, end in zip(starts, ends):
+            if end - start < h + 2:
                 continue
-
-            glucose = pg["glucose"].values
-            bolus = pg["bolus"].values
-            iob = pg["iob"].values if "iob" in pg.columns else np.full(len(pg), np.nan)
-            smb = pg["bolus_smb"].values if has_smb else np.zeros(len(pg))
-            net_basal = pg["net_basal"].values if has_net_basal else np.full(len(pg), np.nan)
-            sched_basal = pg["scheduled_basal_rate"].values if has_sched_basal else np.full(len(pg), np.nan)
-            carbs = pg["carbs"].values if has_carbs else np.zeros(len(pg))
-            times = pg["time"].values
-
-            # Get ISF for this patient
+            pid = uniques[codes[start]]
             if patient_isf and pid in patient_isf:
                 isf_val = patient_isf[pid]
-            elif "scheduled_isf" in pg.columns:
-                isf_val = np.nanmedian(pg["scheduled_isf"].values)
+            elif has_sched_isf:
+                isf_val = np.nanmedian(isf_col[start:end])
             else:
                 continue  # can't compute BGI without ISF
+            rows = np.arange(start + 1, end - h)
+            rows = rows[~(np.isnan(glucose[rows]) | np.isnan(glucose[rows + h]))]
+            if len(rows) == 0:
+                continue
+            sel_rows.append(rows)
+            isf_rows.append(np.full(len(rows), isf_val, dtype=np.float64))
+            ctrl_rows.append(np.full(len(rows), ctrl_col[start] if has_controller
+                                     else "unknown", dtype=object))
+            pid_rows.append(np.full(len(rows), pid, dtype=object))
+        if not sel_rows:
+            return None
+        i = np.concatenate(sel_rows)
+        isf_val = np.concatenate(isf_rows)
+
+        # Horizon sums over [i, i + h) — never crosses a patient boundary
+        # because i + h <= end - 1 for every selected row. The prefix sum
+        # restarts at each patient so its round-off does not grow with
+        # the cohort: csum[k] sums the patient's rows before k.
+        def horizon_sum(values: np.ndarray) -> np.ndarray:
+            finite = np.nan_to_num(values, nan=0.0)
+            csum = np.zeros(len(finite) + 1)
+            for start, end in zip(starts, ends):
+                np.cumsum(finite[start:end - 1], out=csum[start + 1:end])
+            nz = np.concatenate(([0], np.cumsum(finite != 0)))
+            total = csum[i + h] - csum[i]
+            # Windows with no nonzero samples are exactly 0, as np.nansum gives
+            total[nz[i + h] == nz[i]] = 0.0
+            return total
+
+        bolus_2h = horizon_sum(column("bolus", np.nan))
+        smb_2h = horizon_sum(column("bolus_smb", 0.0)) if has_smb else np.zeros(len(i))
+        carbs_2h = horizon_sum(column("carbs", 0.0)) if has_carbs else np.zeros(len(i))
+        # Excess basal = actual - scheduled (in units over 2h); only
+        # available from net_basal.
+        if has_net_basal:
+            excess_basal_2h = horizon_sum(column("net_basal", np.nan)) / STEPS_PER_HOUR
+        else:
+            excess_basal_2h = np.zeros(len(i))
+
+        excess_insulin = bolus_2h + smb_2h + excess_basal_2h
+        expected_drop_raw = excess_insulin * isf_val
+
+        try:
+            stamps = pd.DatetimeIndex(times[i])
+            hour = np.asarray(stamps.hour + stamps.minute / 60.0, dtype=np.float64)
+        except Exception:
+            hour = np.zeros(len(i))
+
+        iob_start = np.nan_to_num(iob[i], nan=0.0)
+        # EGP correction (EXP-2728): subtract hepatic glucose production
+        # EGP opposes insulin action — liver produces glucose, reducing net drop.
+        if self.egp_enabled:
+            egp_contribution = _estimate_egp_over_horizon(iob_start, hour, h)
+        else:
+            egp_contribution = np.zeros(len(i))
 
-            ctrl = pg["controller"].iloc[0] if has_controller else "unknown"
-
-            for i in range(1, len(pg) - h):
-                bg0 = glucose[i]
-                bg_end = glucose[i + h]
-                if np.isnan(bg0) or np.isnan(bg_end):
-                    continue
-
-                # Accumulate insulin over horizon window
-                bolus_2h = float(np.nansum(bolus[i:i + h]))
-                smb_2h = float(np.nansum(smb[i:i + h]))
-
-                # Excess basal = actual - scheduled (in units over 2h)
-                if has_net_basal:
-                    excess_basal_2h = float(np.nansum(net_basal[i:i + h])) / STEPS_PER_HOUR
-                elif has_sched_basal:
-                    actual = float(np.nansum(bolus[i:i + h])) + float(np.nansum(smb[i:i + h]))
-                    scheduled_total = float(np.nansum(sched_basal[i:i + h])) / STEPS_PER_HOUR
-                    excess_basal_2h = 0.0  # can't compute without net_basal
-                else:
-                    excess_basal_2h = 0.0
-
-                excess_insulin = bolus_2h + smb_2h + excess_basal_2h
-                expected_drop_raw = excess_insulin * isf_val
-
-                # Extract hour first (needed for EGP circadian + event record)
-                try:
-                    ts = pd.Timestamp(times[i])
-                    hour = ts.hour + ts.minute / 60.0
-                except Exception:
-                    hour = 0.0
-
-                # EGP correction (EXP-2728): subtract hepatic glucose production
-                # EGP opposes insulin action — liver produces glucose, reducing net drop.
-                egp_contribution = 0.0
-                if self.egp_enabled:
-                    iob_start_val = float(iob[i]) if not np.isnan(iob[i]) else 0.0
-                    egp_contribution = _estimate_egp_over_horizon(
-                        iob_start=iob_start_val,
-                        hour_start=hour,
-                        horizon_steps=h,
-                    )
-
-                # Counter-regulation correction (EXP-2728): dampen expected drop
-                expected_drop_after_egp = max(0.0, expected_drop_raw - egp_contribution)
-                expected_drop = _estimate_counter_reg(
-                    expected_drop_after_egp, self.counter_reg_k
-                )
-
-                observed_drop = bg0 - bg_end
-                deviation = observed_drop - expected_drop
-
-                # Rate of change at start (mg/dL per 5min)
-                roc_start = float(glucose[i] - glucose[i - 1]) if i > 0 and not np.isnan(glucose[i - 1]) else 0.0
-
-                carbs_2h = float(np.nansum(carbs[i:i + h]))
-
-                events.append({
-                    "patient_id": pid,
-                    "time": times[i],
-                    "bg0": bg0,
-                    "bg_end": bg_end,
-                    "observed_drop": observed_drop,
-                    "expected_drop": expected_drop,
-                    "expected_drop_raw": expected_drop_raw,
-                    "egp_contribution": egp_contribution,
-                    "deviation": deviation,
-                    "bolus_2h": bolus_2h,
-                    "smb_2h": smb_2h,
-                    "excess_basal_2h": excess_basal_2h,
-                    "excess_insulin": excess_insulin,
-                    "iob_start": float(iob[i]) if not np.isnan(iob[i]) else 0.0,
-                    "roc_start": roc_start,
-                    "carbs_2h": carbs_2h,
-                    "hour": hour,
-                    "controller": ctrl,
-                    "isf_used": isf_val,
-                })
-
-        return pd.DataFrame(events)
+        # Counter-regulation correction (EXP-2728): dampen expected drop
+        expected_drop_after_egp = np.maximum(0.0, expected_drop_raw - egp_contribution)
+        expected_drop = _estimate_counter_reg(expected_drop_after_egp, self.counter_reg_k)
+
+        bg0 = glucose[i]
+        bg_end = glucose[i + h]
+        observed_drop = bg0 - bg_end
+        prev = glucose[i - 1]
+        # Rate of change at start (mg/dL per 5min)
+        roc_start = np.where(np.isnan(prev), 0.0, bg0 - prev)
+
+        return {
+            "patient_id": np.concatenate(pid_rows),
+            "time": times[i],
+            "bg0": bg0,
+            "bg_end": bg_end,
+            "observed_drop": observed_drop,
+            "expected_drop": expected_drop,
+            "expected_drop_raw": expected_drop_raw,
+            "egp_contribution": egp_contribution,
+            "deviation": observed_drop - expected_drop,
+            "bolus_2h": bolus_2h,
+            "smb_2h": smb_2h,
+            "excess_basal_2h": excess_basal_2h,
+            "excess_insulin": excess_insulin,
+            "iob_start": iob_start,
+            "roc_start": roc_start,
+            "carbs_2h": carbs_2h,
+            "hour": hour,
+            "controller": np.concatenate(ctrl_rows),
+            "isf_used": isf_val,
+        }
 
 
 # ── Channel Decomposition ────────────────────────────────────────────
@@ -0,0 +1,199 @@
+"""
+deconfounding_reference.py — Row-loop reference for BGISubtraction.compute_deviations.
+
+``loop_compute_deviations`` is the pre-vectorization, per-row copy of
+``BGISubtraction.compute_deviations``. The columnar implementation must
+reproduce its events: ``test_bgi_deviations.py`` checks that on
+randomized grids and ``benchmark_bgi_deviations.py`` on the training
+grid, both through ``assert_same_events``. ``make_grid`` builds the
+synthetic terrarium-shaped grids both use.
+
+The float32 grid columns are summed in float64 by the columnar path,
+hence the tolerance in ``assert_same_events``.
+
+Usage:
+    from tools.cgmencode.production.deconfounding_reference import (
+        assert_same_events, loop_compute_deviations, make_grid,
+    )
+    grid = make_grid(0)
+    bgi = BGISubtraction()
+    assert_same_events(bgi.compute_deviations(grid),
+                       loop_compute_deviations(bgi, grid))
+"""
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .deconfounding import (
+    STEPS_PER_HOUR, BGISubtraction, _estimate_counter_reg,
+    _estimate_egp_over_horizon,
+)
+
+
+# ── Reference (loop) implementation ──────────────────────────────────
+
+def loop_compute_deviations(
+    bgi: BGISubtraction,
+    grid: pd.DataFrame,
+    patient_isf: Optional[Dict[str, float]] = None,
+) -> pd.DataFrame:
+    """Pre-vectorization per-row implementation (reference)."""
+    h = bgi.horizon_steps
+    events = []
+
+    has_smb = "bolus_smb" in grid.columns
+    has_net_basal = "net_basal" in grid.columns
+    has_sched_basal = "scheduled_basal_rate" in grid.columns
+    has_carbs = "carbs" in grid.columns
+    has_controller = "controller" in grid.columns
+
+    for pid in grid["patient_id"].unique():
+        pg = grid[grid["patient_id"] == pid].sort_values("time").reset_index(drop=True)
+        if len(pg) < h + 2:
+            continue
+
+        glucose = pg["glucose"].values
+        bolus = pg["bolus"].values
+        iob = pg["iob"].values if "iob" in pg.columns else np.full(len(pg), np.nan)
+        smb = pg["bolus_smb"].values if has_smb else np.zeros(len(pg))
+        net_basal = pg["net_basal"].values if has_net_basal else np.full(len(pg), np.nan)
+        sched_basal = pg["scheduled_basal_rate"].values if has_sched_basal else np.full(len(pg), np.nan)
+        carbs = pg["carbs"].values if has_carbs else np.zeros(len(pg))
+        times = pg["time"].values
+
+        # Get ISF for this patient
+        if patient_isf and pid in patient_isf:
+            isf_val = patient_isf[pid]
+        elif "scheduled_isf" in pg.columns:
+            isf_val = np.nanmedian(pg["scheduled_isf"].values)
+        else:
+            continue  # can't compute BGI without ISF
+
+        ctrl = pg["controller"].iloc[0] if has_controller else "unknown"
+
+        for i in range(1, len(pg) - h):
+            bg0 = glucose[i]
+            bg_end = glucose[i + h]
+            if np.isnan(bg0) or np.isnan(bg_end):
+                continue
+
+            # Accumulate insulin over horizon window
+            bolus_2h = float(np.nansum(bolus[i:i + h]))
+            smb_2h = float(np.nansum(smb[i:i + h]))
+
+            # Excess basal = actual - scheduled (in units over 2h)
+            if has_net_basal:
+                excess_basal_2h = float(np.nansum(net_basal[i:i + h])) / STEPS_PER_HOUR
+            elif has_sched_basal:
+                actual = float(np.nansum(bolus[i:i + h])) + float(np.nansum(smb[i:i + h]))
+                scheduled_total = float(np.nansum(sched_basal[i:i + h])) / STEPS_PER_HOUR
+                excess_basal_2h = 0.0  # can't compute without net_basal
+            else:
+                excess_basal_2h = 0.0
+
+            excess_insulin = bolus_2h + smb_2h + excess_basal_2h
+            expected_drop_raw = excess_insulin * isf_val
+
+            # Extract hour first (needed for EGP circadian + event record)
+            try:
+                ts = pd.Timestamp(times[i])
+                hour = ts.hour + ts.minute / 60.0
+            except Exception:
+                hour = 0.0
+
+            # EGP correction (EXP-2728): subtract hepatic glucose production
+            # EGP opposes insulin action — liver produces glucose, reducing net drop.
+            egp_contribution = 0.0
+            if bgi.egp_enabled:
+                iob_start_val = float(iob[i]) if not np.isnan(iob[i]) else 0.0
+                egp_contribution = _estimate_egp_over_horizon(
+                    iob_start=iob_start_val,
+                    hour_start=hour,
+                    horizon_steps=h,
+                )
+
+            # Counter-regulation correction (EXP-2728): dampen expected drop
+            expected_drop_after_egp = max(0.0, expected_drop_raw - egp_contribution)
+            expected_drop = _estimate_counter_reg(
+                expected_drop_after_egp, bgi.counter_reg_k
+            )
+
+            observed_drop = bg0 - bg_end
+            deviation = observed_drop - expected_drop
+
+            # Rate of change at start (mg/dL per 5min)
+            roc_start = float(glucose[i] - glucose[i - 1]) if i > 0 and not np.isnan(glucose[i - 1]) else 0.0
+
+            carbs_2h = float(np.nansum(carbs[i:i + h]))
+
+            events.append({
+                "patient_id": pid,
+                "time": times[i],
+                "bg0": bg0,
+                "bg_end": bg_end,
+                "observed_drop": observed_drop,
+                "expected_drop": expected_drop,
+                "expected_drop_raw": expected_drop_raw,
+                "egp_contribution": egp_contribution,
+                "deviation": deviation,
+                "bolus_2h": bolus_2h,
+                "smb_2h": smb_2h,
+                "excess_basal_2h": excess_basal_2h,
+                "excess_insulin": excess_insulin,
+                "iob_start": float(iob[i]) if not np.isnan(iob[i]) else 0.0,
+                "roc_start": roc_start,
+                "carbs_2h": carbs_2h,
+                "hour": hour,
+                "controller": ctrl,
+                "isf_used": isf_val,
+            })
+
+    return pd.DataFrame(events)
+
+
+# ── Synthetic grids ──────────────────────────────────────────────────
+
+def make_grid(seed: int = 0, n_patients: int = 4, n: int = 600,
+              dtype=np.float32) -> pd.DataFrame:
+    """Synthetic terrarium-shaped grid, rows shuffled across patients."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for p in range(n_patients):
+        m = n + 37 * p
+        t0 = pd.Timestamp("2025-03-01", tz="UTC") + pd.Timedelta(hours=5 * p)
+        glucose = 140 + 50 * np.sin(np.arange(m) / 40.0) + rng.normal(0, 8, m)
+        glucose[rng.random(m) < 0.05] = np.nan
+        bolus = np.where(rng.random(m) < 0.03, rng.uniform(0.5, 6, m), 0.0)
+        bolus[rng.random(m) < 0.01] = np.nan
+        smb = np.where(rng.random(m) < 0.1, rng.uniform(0.05, 0.5, m), 0.0)
+        carbs = np.where(rng.random(m) < 0.02, rng.uniform(10, 60, m), 0.0)
+        frames.append(pd.DataFrame({
+            "patient_id": f"p{p}",
+            "time": t0 + pd.to_timedelta(np.arange(m) * 5, unit="min"),
+            "glucose": glucose.astype(dtype),
+            "bolus": bolus.astype(dtype),
+            "bolus_smb": smb.astype(dtype),
+            "net_basal": rng.normal(0, 0.4, m).astype(dtype),
+            "carbs": carbs.astype(dtype),
+            "iob": np.where(rng.random(m) < 0.03, np.nan,
+                            rng.uniform(0, 5, m)).astype(dtype),
+            "scheduled_isf": np.full(m, 40.0 + 5 * p, dtype=dtype),
+            "controller": ["loop", "trio", "openaps", "loop"][p % 4],
+        }))
+    grid = pd.concat(frames, ignore_index=True)
+    return grid.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def assert_same_events(fast: pd.DataFrame, slow: pd.DataFrame) -> None:
+    assert list(fast.columns) == list(slow.columns)
+    assert len(fast) == len(slow)
+    for col in ("patient_id", "controller"):
+        assert fast[col].tolist() == slow[col].tolist()
+    np.testing.assert_array_equal(fast["time"].values, slow["time"].values)
+    for col in fast.columns.drop(["patient_id", "controller", "time"]):
+        np.testing.assert_allclose(
+            fast[col].to_numpy(np.float64), slow[col].to_numpy(np.float64),
+            rtol=1e-5, atol=1e-4, err_msg=col)
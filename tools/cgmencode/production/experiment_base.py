@@ -2,7 +2,8 @@
 experiment_base.py — Shared base class for observational AID experiments.
 
 Eliminates copy-paste across 300+ experiments by providing:
-  - Standard data loading (grid + devicestatus + controller map + qualified patients)
+  - Standard data loading (grid + devicestatus + controller map + qualified patients),
+    projected to the declared GRID_COLUMNS and shared via grid_cache
   - Declarative filter specification via ExperimentFilters
   - BGI subtraction as default preprocessing (EXP-2698: +0.418 R²)
   - Event categorization (correction/meal/UAM/basal/mixed)
@@ -53,6 +54,7 @@ from .deconfounding import (
     IsolationFilter,
     ValidationChecks,
 )
+from .grid_cache import GridCache, default_grid_cache
 
 warnings.filterwarnings("ignore")
 
@@ -65,6 +67,14 @@ MANIFEST_PATH = Path("externals/experiments/autoprepare-qualified.json")
 EXPERIMENTS_DIR = Path("externals/experiments")
 VIS_DIR = Path("visualizations")
 
+# Grid columns each deconfounding strategy reads (patient_id and time are
+# always loaded). Columns missing from the parquet are skipped.
+STRATEGY_COLUMNS: Dict[str, List[str]] = {
+    "bgi_subtraction": ["glucose", "bolus", "iob", "bolus_smb", "net_basal",
+                        "carbs", "scheduled_isf"],
+    "isolation": ["glucose", "bolus", "carbs"],
+}
+
 
 # ── Base Class ───────────────────────────────────────────────────────
 
@@ -84,6 +94,10 @@ class ObservationalExperiment:
             "categorize"          — Classify events into categories
             "isolation"           — Apply exclusion-based isolation filters
         CONTROLLER_STRATIFY: bool — Whether to run per-controller analysis
+        GRID_COLUMNS: list | None — Extra grid columns analyze() needs on
+            top of those the DECONFOUNDING strategies read. None loads
+            every column (backward compatible); declaring a list lets
+            load_data skip decoding the rest.
     """
 
     EXP_ID: str = "EXP-0000"
@@ -91,6 +105,7 @@ class ObservationalExperiment:
     FILTERS: ExperimentFilters = ExperimentFilters.permissive()
     DECONFOUNDING: List[str] = ["bgi_subtraction", "categorize"]
     CONTROLLER_STRATIFY: bool = True
+    GRID_COLUMNS: Optional[List[str]] = None
 
     def __init__(
         self,
@@ -98,10 +113,12 @@ class ObservationalExperiment:
         ds_path: Optional[Path] = None,
         manifest_path: Optional[Path] = None,
         output_dir: Optional[Path] = None,
+        grid_cache: Optional[GridCache] = None,
     ):
         self.grid_path = grid_path or GRID_PATH
         self.ds_path = ds_path or DS_PATH
         self.manifest_path = manifest_path or MANIFEST_PATH
+        self.grid_cache = grid_cache or default_grid_cache()
         self.output_dir = output_dir or VIS_DIR / self.EXP_ID.lower().replace("-", "_")
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -157,25 +174,30 @@ class ObservationalExperiment:
 
     # ── Data Loading ─────────────────────────────────────────────────
 
+    def grid_columns(self) -> Optional[List[str]]:
+        """Grid columns to load: GRID_COLUMNS + strategy needs (None = all)."""
+        if self.GRID_COLUMNS is None:
+            return None
+        cols = list(self.GRID_COLUMNS)
+        for strategy in self.DECONFOUNDING:
+            cols.extend(STRATEGY_COLUMNS.get(strategy, []))
+        return list(dict.fromkeys(cols))
+
     def load_data(self):
         """Load grid, devicestatus, controller map, and qualified patients.
 
         This is the 8-line block that was copy-pasted across every experiment.
-        Now it's done once, correctly.
+        Now it's done once, correctly: the qualified-patient filter and the
+        grid_columns() projection are pushed into the parquet reads, and the
+        decoded grid is shared through the process-level grid cache, so a
+        batch of experiments in one process reads the grid once.
         """
-        self.grid = pd.read_parquet(self.grid_path)
-        ds = pd.read_parquet(self.ds_path)
-        self.ctrl_map = ds.groupby("patient_id")["controller"].first().to_dict()
-        self.grid["controller"] = self.grid["patient_id"].map(self.ctrl_map)
-
         manifest = json.loads(self.manifest_path.read_text())
         self.qualified = manifest["qualified_patients"]
-        self.grid = self.grid[self.grid["patient_id"].isin(self.qualified)].copy()
-
-        # Ensure time is datetime
-        if not pd.api.types.is_datetime64_any_dtype(self.grid["time"]):
-            self.grid["time"] = pd.to_datetime(self.grid["time"], utc=True)
-        self.grid = self.grid.sort_values(["patient_id", "time"]).reset_index(drop=True)
+        self.grid, self.ctrl_map = self.grid_cache.load(
+            self.grid_path, self.ds_path,
+            patients=self.qualified, columns=self.grid_columns(),
+        )
 
     # ── Event Extraction ─────────────────────────────────────────────
 
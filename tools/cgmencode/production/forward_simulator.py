@@ -35,7 +35,7 @@ by using profile settings, not extracted settings, unless explicitly overridden.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
@@ -259,6 +259,39 @@ def _schedule_value_at(schedule: List[Tuple[float, float]],
     return result
 
 
+def _schedule_values_at(schedule: List[Tuple[float, float]],
+                        hours: np.ndarray, default: float) -> np.ndarray:
+    """Vectorized ``_schedule_value_at`` over an array of hours."""
+    hours = np.asarray(hours, dtype=np.float64)
+    if not schedule:
+        return np.full(hours.shape, float(default))
+    sched_hours = np.array([h for h, _ in schedule], dtype=np.float64)
+    sched_vals = np.array([v for _, v in schedule], dtype=np.float64)
+    idx = np.searchsorted(sched_hours, hours, side='right') - 1
+    # Wrap-around: before the first entry, the last entry is in effect
+    idx = np.where(idx < 0, len(schedule) - 1, idx)
+    return sched_vals[idx]
+
+
+def _insulin_kernels(dia_hours: float, n_steps: int) -> Tuple[np.ndarray, np.ndarray]:
+    """IOB activity values and per-step absorption fractions for a DIA.
+
+    Returns ``(activity_values, absorption_fractions)`` where
+    ``activity_values`` has ``max_lookback + 1`` entries and
+    ``absorption_fractions[k] = activity[k] - activity[k + 1]``.
+    Shared by the scalar and batched engines so both integrate against
+    bit-identical kernels.
+    """
+    max_lookback = min(n_steps, int(dia_hours * _STEPS_PER_HOUR) + 1)
+    activity_values = np.array([
+        _insulin_activity_curve(k * _STEP_MINUTES, dia_hours)
+        for k in range(max_lookback + 1)
+    ])
+    # Absorption fraction per step: activity[k] - activity[k+1]
+    absorption_fractions = -np.diff(activity_values)
+    return activity_values, absorption_fractions
+
+
 def _insulin_activity_curve(t_minutes: float, dia_hours: float) -> float:
     """Fraction of insulin still active at time t after delivery.
 
@@ -410,13 +443,8 @@ def forward_simulate(
 
     # Pre-compute the insulin activity curve values for efficiency
     max_lookback = min(n_steps, int(settings.dia_hours * _STEPS_PER_HOUR) + 1)
-    activity_values = np.array([
-        _insulin_activity_curve(k * _STEP_MINUTES, settings.dia_hours)
-        for k in range(max_lookback + 1)
-    ])
-    # Absorption fraction per step: activity[k] - activity[k+1]
-    absorption_fractions = np.diff(activity_values)  # negative (activity decreases)
-    absorption_fractions = -absorption_fractions  # make positive
+    activity_values, absorption_fractions = _insulin_kernels(
+        settings.dia_hours, n_steps)
 
     # Initialize
     glucose[0] = initial_glucose
@@ -552,6 +580,319 @@ def forward_simulate(
     )
 
 
+# ── Batched Simulation Engine ─────────────────────────────────────────
+
+@dataclass
+class BatchSimulationResult:
+    """Output from ``forward_simulate_batch`` — one row per scenario."""
+    glucose: np.ndarray         # (S, N) simulated glucose traces, mg/dL
+    iob: np.ndarray             # (S, N) insulin on board
+    cob: np.ndarray             # (S, N) carbs on board
+    supply: np.ndarray          # (S, N) supply flux per step
+    demand: np.ndarray          # (S, N) demand flux per step
+    timestamps_min: np.ndarray  # (N,) minutes from start
+    hours_of_day: np.ndarray    # (S, N) fractional hour (0-24)
+
+    def __len__(self) -> int:
+        return self.glucose.shape[0]
+
+    @property
+    def n_steps(self) -> int:
+        return self.glucose.shape[1]
+
+    @property
+    def tir(self) -> np.ndarray:
+        """(S,) time in range (70-180 mg/dL) as fraction 0-1."""
+        return np.mean((self.glucose >= TIR_LOW) & (self.glucose <= TIR_HIGH), axis=1)
+
+    @property
+    def tbr(self) -> np.ndarray:
+        """(S,) time below range (<70 mg/dL) as fraction 0-1."""
+        return np.mean(self.glucose < TIR_LOW, axis=1)
+
+    @property
+    def tar(self) -> np.ndarray:
+        """(S,) time above range (>180 mg/dL) as fraction 0-1."""
+        return np.mean(self.glucose > TIR_HIGH, axis=1)
+
+    def scenario(self, i: int) -> SimulationResult:
+        """Single-scenario view as a regular SimulationResult."""
+        return SimulationResult(
+            glucose=self.glucose[i],
+            iob=self.iob[i],
+            cob=self.cob[i],
+            supply=self.supply[i],
+            demand=self.demand[i],
+            timestamps_min=self.timestamps_min,
+            hours_of_day=self.hours_of_day[i],
+        )
+
+
+def _broadcast_param(value, n: int, name: str) -> np.ndarray:
+    """Broadcast a scalar or length-n sequence to a (n,) float array."""
+    arr = np.asarray(value, dtype=np.float64)
+    if arr.ndim == 0:
+        return np.full(n, float(arr))
+    if arr.shape != (n,):
+        raise ValueError(f"{name} must be a scalar or length-{n} sequence, "
+                         f"got shape {arr.shape}")
+    return arr
+
+
+def _per_scenario_events(events, n: int, name: str) -> List[list]:
+    """Normalise shared or per-scenario event lists to one list per scenario."""
+    if not events:
+        return [[] for _ in range(n)]
+    if isinstance(events[0], (InsulinEvent, CarbEvent)):
+        return [events] * n
+    if len(events) != n:
+        raise ValueError(f"{name} must be a shared event list or one list "
+                         f"per scenario ({n}), got {len(events)}")
+    return [list(e or []) for e in events]
+
+
+def forward_simulate_batch(
+    initial_glucose: Union[float, Sequence[float], np.ndarray],
+    settings: Union[TherapySettings, Sequence[TherapySettings]],
+    duration_hours: float = 24.0,
+    start_hour: Union[float, Sequence[float], np.ndarray] = 0.0,
+    bolus_events: Optional[Sequence] = None,
+    carb_events: Optional[Sequence] = None,
+    initial_iob: Union[float, Sequence[float], np.ndarray] = 0.0,
+    noise_std: float = 0.0,
+    seed: Union[None, int, Sequence[int]] = None,
+    metabolic_basal_rate: Union[None, float, Sequence[float], np.ndarray] = None,
+    counter_reg_k: Union[float, Sequence[float], np.ndarray] = 0.0,
+    egp_enabled: bool = False,
+) -> BatchSimulationResult:
+    """Run many forward simulations at once as (scenarios × steps) arrays.
+
+    Numerically equivalent to calling ``forward_simulate`` once per
+    scenario (agreement to ~1e-12), but everything except the glucose
+    recurrence itself is computed up front with array operations:
+
+      - insulin absorption / IOB: direct convolution of the delivery
+        matrix with the DIA kernel (one shifted add per kernel tap,
+        accumulated in the same order as the scalar engine)
+      - persistent 12h excess: prefix sums instead of per-step slices
+      - carb absorption / COB: one broadcast pass per carb event slot
+      - EGP: a single ``_compute_hepatic_production`` call over (S, N)
+
+    The remaining loop over time steps is O(N) vectorized NumPy ops,
+    independent of the number of scenarios. Used by the ISF/CR advisors
+    that sweep multiplier grids over every meal or correction window.
+
+    Args:
+        initial_glucose: Starting glucose, scalar or (S,).
+        settings: One TherapySettings shared by all scenarios, or one per
+            scenario. The number of scenarios S is taken from this when
+            it is a sequence, otherwise from the first array argument.
+        duration_hours: Simulation length (shared).
+        start_hour: Hour of day at start, scalar or (S,).
+        bolus_events: Shared list of InsulinEvent, or one list per scenario.
+        carb_events: Shared list of CarbEvent, or one list per scenario.
+        initial_iob: Starting IOB, scalar or (S,).
+        noise_std: Gaussian noise σ per step (shared), 0=deterministic.
+        seed: Random seed, scalar (shared) or one per scenario. Scenario i
+            draws the same noise sequence as ``forward_simulate(seed=seed_i)``.
+        metabolic_basal_rate: True basal need, scalar or (S,). Defaults to
+            each scenario's ``settings.basal_rate``.
+        counter_reg_k: Counter-regulation strength, scalar or (S,).
+        egp_enabled: Enable hepatic glucose production (shared).
+
+    Returns:
+        BatchSimulationResult with (S, N) traces.
+    """
+    # ── Resolve scenario count and per-scenario parameters ────────
+    if isinstance(settings, TherapySettings):
+        n_scen = None
+    else:
+        settings = list(settings)
+        n_scen = len(settings)
+    if n_scen is None:
+        for value in (initial_glucose, start_hour, initial_iob,
+                      metabolic_basal_rate, counter_reg_k):
+            arr = np.asarray(value) if value is not None else np.asarray(0.0)
+            if arr.ndim == 1:
+                n_scen = len(arr)
+                break
+        else:
+            n_scen = 1
+        settings = [settings] * n_scen
+
+    n_steps = int(duration_hours * _STEPS_PER_HOUR)
+    g0 = _broadcast_param(initial_glucose, n_scen, 'initial_glucose')
+    start = _broadcast_param(start_hour, n_scen, 'start_hour')
+    iob0 = _broadcast_param(initial_iob, n_scen, 'initial_iob')
+    k_cr = _broadcast_param(counter_reg_k, n_scen, 'counter_reg_k')
+    if metabolic_basal_rate is None:
+        met_basal = np.array([s.basal_rate for s in settings], dtype=np.float64)
+    else:
+        met_basal = _broadcast_param(metabolic_basal_rate, n_scen,
+                                     'metabolic_basal_rate')
+    boluses = _per_scenario_events(bolus_events, n_scen, 'bolus_events')
+    carbs = _per_scenario_events(carb_events, n_scen, 'carb_events')
+
+    timestamps_min = np.arange(n_steps) * _STEP_MINUTES
+    hours_of_day = (start[:, None] + timestamps_min[None, :] / 60.0) % 24.0
+
+    glucose = np.zeros((n_scen, n_steps))
+    iob_trace = np.zeros((n_scen, n_steps))
+    cob_trace = np.zeros((n_scen, n_steps))
+    supply_trace = np.zeros((n_scen, n_steps))
+    demand_trace = np.zeros((n_scen, n_steps))
+    if n_steps == 0:
+        return BatchSimulationResult(glucose, iob_trace, cob_trace, supply_trace,
+                                     demand_trace, timestamps_min, hours_of_day)
+
+    # ── Per-step schedules (ISF, basal, carb sensitivity) ─────────
+    isf = np.empty((n_scen, n_steps))
+    csf = np.empty((n_scen, n_steps))
+    insulin_per_step = np.empty((n_scen, n_steps))
+    for i, s in enumerate(settings):
+        h = hours_of_day[i]
+        isf[i] = _schedule_values_at(s.isf_schedule, h, s.isf)
+        insulin_per_step[i] = (_schedule_values_at(s.basal_schedule, h, s.basal_rate)
+                               * _STEP_MINUTES / 60.0)
+        if s.carb_sensitivity is not None:
+            csf[i] = s.carb_sensitivity
+        else:
+            cr = _schedule_values_at(s.cr_schedule, h, s.cr)
+            csf[i] = isf[i] / np.maximum(cr, 1.0)
+    basal_need_per_step = np.repeat(
+        (met_basal * _STEP_MINUTES / 60.0)[:, None], n_steps, axis=1)
+
+    rows, cols, units = [], [], []
+    for i, events in enumerate(boluses):
+        for event in events:
+            step_idx = int(event.time_minutes / _STEP_MINUTES)
+            if 0 <= step_idx < n_steps:
+                rows.append(i)
+                cols.append(step_idx)
+                units.append(event.units)
+    if rows:
+        np.add.at(insulin_per_step, (np.array(rows), np.array(cols)),
+                  np.array(units, dtype=np.float64))
+
+    # ── Insulin absorption and IOB by direct convolution ──────────
+    total_absorption = np.zeros((n_scen, n_steps))
+    basal_absorption = np.zeros((n_scen, n_steps))
+    iob = np.zeros((n_scen, n_steps))
+    dias = np.array([s.dia_hours for s in settings], dtype=np.float64)
+    for dia in np.unique(dias):
+        sel = np.flatnonzero(dias == dia)
+        activity_values, absorption_fractions = _insulin_kernels(float(dia), n_steps)
+        max_lookback = len(absorption_fractions)
+        ins = insulin_per_step[sel]
+        need = basal_need_per_step[sel]
+        tot = np.zeros((len(sel), n_steps))
+        bas = np.zeros((len(sel), n_steps))
+        act = np.zeros((len(sel), n_steps))
+        for k in range(max_lookback):
+            tot[:, k:] += ins[:, :n_steps - k] * absorption_fractions[k]
+            bas[:, k:] += need[:, :n_steps - k] * absorption_fractions[k]
+            act[:, k:] += ins[:, :n_steps - k] * activity_values[k]
+        # Initial IOB decays along the same curve
+        if max_lookback > 1:
+            tail = slice(1, max_lookback)
+            pos = iob0[sel] > 0
+            act[:, tail] += np.where(pos[:, None],
+                                     iob0[sel][:, None] * activity_values[tail], 0.0)
+            tot[:, tail] += np.where(pos[:, None],
+                                     iob0[sel][:, None] * absorption_fractions[tail], 0.0)
+        total_absorption[sel] = tot
+        basal_absorption[sel] = bas
+        iob[sel] = act
+
+    iob_trace[:, 1:] = np.maximum(iob[:, 1:], 0.0)
+    iob_trace[:, 0] = iob0
+
+    # ── Demand: fast excess + persistent 12h excess (prefix sums) ─
+    excess_absorption = total_absorption - basal_absorption
+    demand_fast = excess_absorption * isf * _FAST_FRACTION
+
+    persistent_window = int(_PERSISTENT_WINDOW_HOURS * _STEPS_PER_HOUR)
+    cum_ins = np.concatenate(
+        [np.zeros((n_scen, 1)), np.cumsum(insulin_per_step, axis=1)], axis=1)
+    cum_need = np.concatenate(
+        [np.zeros((n_scen, 1)), np.cumsum(basal_need_per_step, axis=1)], axis=1)
+    t_idx = np.arange(n_steps)
+    start_step = np.maximum(0, t_idx - persistent_window)
+    total_excess_12h = ((cum_ins[:, t_idx + 1] - cum_ins[:, start_step])
+                        - (cum_need[:, t_idx + 1] - cum_need[:, start_step]))
+    persistent_demand = np.where(
+        total_excess_12h > 0.01,
+        total_excess_12h * isf / persistent_window * _PERSISTENT_FRACTION,
+        0.0)
+    demand_trace[:, 1:] = (demand_fast + persistent_demand)[:, 1:]
+
+    # ── Carb absorption → glucose rise ────────────────────────────
+    carb_absorbed = np.zeros((n_scen, n_steps))
+    cob = np.zeros((n_scen, n_steps))
+    max_events = max((len(c) for c in carbs), default=0)
+    for e in range(max_events):
+        present = np.array([e < len(c) for c in carbs])
+        ev_time = np.array([c[e].time_minutes if e < len(c) else 0.0 for c in carbs])
+        ev_grams = np.array([c[e].grams if e < len(c) else 0.0 for c in carbs])
+        ev_abs = np.array([c[e].absorption_hours if e < len(c) else 1.0 for c in carbs])
+        ev_delay = np.array([c[e].delay_minutes if e < len(c) else 0.0 for c in carbs])
+
+        elapsed = timestamps_min[None, :] - ev_time[:, None]
+        active = present[:, None] & (elapsed >= 0)
+        abs_min = (ev_abs * 60.0)[:, None]
+        grams = ev_grams[:, None]
+        cob += np.where(active, grams * np.maximum(0.0, 1.0 - elapsed / abs_min), 0.0)
+
+        absorbing = active & (elapsed < abs_min) & (grams > 0)
+        t_peak = np.maximum(ev_delay, 1.0)[:, None]
+        ratio = elapsed / t_peak
+        with np.errstate(over='ignore', invalid='ignore'):
+            gamma_rate = grams * (ratio * np.exp(1.0 - ratio)) / (t_peak * np.e)
+        linear_rate = np.broadcast_to(grams / abs_min, elapsed.shape)
+        rate_per_min = np.where((ev_delay <= 0)[:, None], linear_rate, gamma_rate)
+        carb_absorbed += np.where(absorbing, rate_per_min * _STEP_MINUTES, 0.0)
+    cob_trace[:, 1:] = cob[:, 1:]
+
+    carb_rise = carb_absorbed * csf
+    egp_flux = np.zeros((n_scen, n_steps))
+    if egp_enabled:
+        egp_flux[:, 1:] = _compute_hepatic_production(
+            iob_trace[:, 1:], hours_of_day[:, 1:])
+    supply_trace[:, 1:] = carb_rise[:, 1:] + egp_flux[:, 1:]
+
+    # ── Noise: per-scenario streams matching the scalar engine ────
+    noise = None
+    if noise_std > 0:
+        seeds = (list(seed) if isinstance(seed, (list, tuple, np.ndarray))
+                 else [seed] * n_scen)
+        noise = np.zeros((n_scen, n_steps))
+        for i, sd in enumerate(seeds):
+            rng = np.random.RandomState(sd) if sd is not None else np.random.RandomState()
+            noise[i, 1:] = rng.normal(0, noise_std, size=n_steps - 1)
+
+    # ── Glucose recurrence (decay, counter-regulation, clipping) ──
+    cr_scale = 1.0 / (1.0 + k_cr)
+    cr_on = k_cr > 0.0
+    glucose[:, 0] = g0
+    for t in range(1, n_steps):
+        decay = (_DECAY_TARGET - glucose[:, t - 1]) * _DECAY_RATE
+        dBG = -demand_trace[:, t] + carb_rise[:, t] + egp_flux[:, t] + decay
+        if noise is not None:
+            dBG += noise[:, t]
+        dBG = np.where(cr_on & (dBG < 0.0), dBG * cr_scale, dBG)
+        glucose[:, t] = np.clip(glucose[:, t - 1] + dBG, _MIN_BG, _MAX_BG)
+
+    return BatchSimulationResult(
+        glucose=glucose,
+        iob=iob_trace,
+        cob=cob_trace,
+        supply=supply_trace,
+        demand=demand_trace,
+        timestamps_min=timestamps_min,
+        hours_of_day=hours_of_day,
+    )
+
+
 # ── Scenario Comparison ──────────────────────────────────────────────
 
 def compare_scenarios(
@@ -599,23 +940,10 @@ def compare_scenarios(
     """
     met_basal = metabolic_basal_rate or baseline_settings.basal_rate
 
-    baseline = forward_simulate(
-        initial_glucose=initial_glucose,
-        settings=baseline_settings,
-        duration_hours=duration_hours,
-        start_hour=start_hour,
-        bolus_events=bolus_events,
-        carb_events=carb_events,
-        initial_iob=initial_iob,
-        seed=seed,
-        metabolic_basal_rate=met_basal,
-        counter_reg_k=counter_reg_k,
-        egp_enabled=egp_enabled,
-    )
-
-    modified = forward_simulate(
+    # Both arms share events, seed and basal reference — one batched run.
+    batch = forward_simulate_batch(
         initial_glucose=initial_glucose,
-        settings=modified_settings,
+        settings=[baseline_settings, modified_settings],
         duration_hours=duration_hours,
         start_hour=start_hour,
         bolus_events=bolus_events,
@@ -626,6 +954,8 @@ def compare_scenarios(
         counter_reg_k=counter_reg_k,
         egp_enabled=egp_enabled,
     )
+    baseline = batch.scenario(0)
+    modified = batch.scenario(1)
 
     return ScenarioComparison(
         baseline=baseline,
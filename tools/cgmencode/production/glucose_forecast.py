@@ -13,11 +13,18 @@ Architecture:
   PKGroupedEncoder: 3-group projection (state/action/extra) → transformer
   8 channels: glucose, IOB, COB, net_basal, insulin_net, carb_rate, sin_time, net_balance
   PK mode: future glucose masked, PK channels kept (deterministic from past)
+
+Inference:
+  SeedEnsemble stacks the seed weights and runs all seeds (and, through
+  predict_trajectories, all patients of a cohort) in one grouped forward.
+  CPU timings vs the per-seed loop: forecast_production benchmark.
 """
 
 from __future__ import annotations
 
 import math
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -141,15 +148,158 @@ def _build_model(input_dim: int = 8, d_model: int = 64, nhead: int = 4,
     return PKGroupedEncoder()
 
 
+# ── Stacked Seed Ensemble ─────────────────────────────────────────────
+
+def _grouped_linear(x, weight, bias):
+    """Per-member linear layer: x (M, ..., in), weight (M, out, in) → (M, ..., out)."""
+    M = weight.shape[0]
+    y = torch.baddbmm(bias.unsqueeze(1), x.reshape(M, -1, x.shape[-1]),
+                      weight.transpose(1, 2))
+    return y.reshape(*x.shape[:-1], weight.shape[1])
+
+
+def _grouped_layer_norm(x, weight, bias, eps):
+    shape = (weight.shape[0],) + (1,) * (x.dim() - 2) + (weight.shape[-1],)
+    y = torch.nn.functional.layer_norm(x, x.shape[-1:], eps=eps)
+    return y * weight.reshape(shape) + bias.reshape(shape)
+
+
+class SeedEnsemble:
+    """Seed models of a forecast ensemble with their weights stacked.
+
+    ``forward`` runs every member on a batch of windows in one grouped
+    pass: each PKGroupedEncoder layer becomes a batched matmul over the
+    member axis (M, B·T, d) instead of M forward passes at batch size 1.
+    Members can come from several patients (``concat``), so a cohort
+    forecast is one pass over all patients' seeds.
+
+    Each member module's parameters are views into the stacked tensors,
+    so iterating ``(model, seed)`` pairs costs no second copy.
+    """
+
+    def __init__(self, members: list, params: Optional[Dict[str, 'torch.Tensor']] = None):
+        self.members = list(members)
+        models = [model for model, _ in self.members]
+        ref = models[0]
+        if params is None:
+            params = {name: torch.stack([dict(m.named_parameters())[name].detach()
+                                         for m in models])
+                      for name, _ in ref.named_parameters()}
+            for i, model in enumerate(models):
+                for name, param in model.named_parameters():
+                    param.data = params[name][i]
+        self.params = params
+        self.pe = ref.pos_encoder.pe[0]                    # (max_len, d_model)
+        layers = ref.transformer_encoder.layers
+        self.num_layers = len(layers)
+        self.nhead = layers[0].self_attn.num_heads
+        self.eps = layers[0].norm1.eps
+
+    @classmethod
+    def concat(cls, ensembles: list) -> 'SeedEnsemble':
+        """One ensemble over the members of several (copies the stacked weights)."""
+        if len(ensembles) == 1:
+            return ensembles[0]
+        members = [m for e in ensembles for m in e.members]
+        params = {name: torch.cat([e.params[name] for e in ensembles])
+                  for name in ensembles[0].params}
+        return cls(members, params)
+
+    @property
+    def seeds(self) -> List[int]:
+        return [seed for _, seed in self.members]
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def forward(self, x, causal: bool = True):
+        """Run all members.
+
+        Args:
+            x: (B, T, C) windows shared by every member, or (M, B, T, C)
+               with one batch per member.
+            causal: causal attention mask (as PKGroupedEncoder.forward).
+
+        Returns:
+            (M, B, T, C) predictions.
+        """
+        P = self.params
+        M = len(self.members)
+        if x.dim() == 3:
+            x = x.unsqueeze(0).expand(M, *x.shape)
+        _, B, T, _ = x.shape
+
+        with torch.no_grad():
+            parts = [_grouped_linear(x[..., :3], P['state_proj.weight'], P['state_proj.bias']),
+                     _grouped_linear(x[..., 3:6], P['action_proj.weight'], P['action_proj.bias'])]
+            if 'extra_proj.weight' in P and x.shape[-1] > 6:
+                parts.append(_grouped_linear(x[..., 6:], P['extra_proj.weight'],
+                                             P['extra_proj.bias']))
+            z = torch.cat(parts, dim=-1) + self.pe[:T]
+            d = z.shape[-1]
+            hd = d // self.nhead
+            mask = (torch.triu(torch.full((T, T), float('-inf'), device=x.device),
+                               diagonal=1) if causal else None)
+
+            # norm_first TransformerEncoderLayer (ReLU FFN, no final norm)
+            for i in range(self.num_layers):
+                lp = f'transformer_encoder.layers.{i}.'
+                h = _grouped_layer_norm(z, P[lp + 'norm1.weight'], P[lp + 'norm1.bias'], self.eps)
+                qkv = _grouped_linear(h, P[lp + 'self_attn.in_proj_weight'],
+                                      P[lp + 'self_attn.in_proj_bias'])
+                q, k, v = qkv.view(M, B, T, 3, self.nhead, hd).permute(3, 0, 1, 4, 2, 5)
+                scores = torch.matmul(q, k.transpose(-1, -2)) / math.sqrt(hd)
+                if mask is not None:
+                    scores = scores + mask
+                attn = torch.matmul(torch.softmax(scores, dim=-1), v)
+                attn = attn.transpose(-3, -2).reshape(M, B, T, d)
+                z = z + _grouped_linear(attn, P[lp + 'self_attn.out_proj.weight'],
+                                        P[lp + 'self_attn.out_proj.bias'])
+                h = _grouped_layer_norm(z, P[lp + 'norm2.weight'], P[lp + 'norm2.bias'], self.eps)
+                h = torch.relu(_grouped_linear(h, P[lp + 'linear1.weight'], P[lp + 'linear1.bias']))
+                z = z + _grouped_linear(h, P[lp + 'linear2.weight'], P[lp + 'linear2.bias'])
+
+            return _grouped_linear(z, P['output_projection.weight'],
+                                   P['output_projection.bias'])
+
+    __call__ = forward
+
+
 # ── Model Loading ─────────────────────────────────────────────────────
 
-_model_cache: Dict[str, list] = {}
+# Per-patient ensembles kept in memory (least recently used evicted first);
+# a 5-seed ensemble is ~2.7 MB of weights.
+MODEL_CACHE_SIZE = 16
+
+# Cohort stacks copy one ensemble per patient, so they live in their own
+# cache bounded by weight bytes rather than by entries.
+COHORT_CACHE_BYTES = 256 * 2**20
+
+_model_cache: 'OrderedDict[str, SeedEnsemble]' = OrderedDict()
+_cohort_cache: 'OrderedDict[str, tuple]' = OrderedDict()
+
+
+def _cache_get(key: str) -> Optional[SeedEnsemble]:
+    ensemble = _model_cache.get(key)
+    if ensemble is not None:
+        _model_cache.move_to_end(key)
+    return ensemble
+
+
+def _cache_put(key: str, ensemble: SeedEnsemble) -> None:
+    _model_cache[key] = ensemble
+    _model_cache.move_to_end(key)
+    while len(_model_cache) > MODEL_CACHE_SIZE:
+        _model_cache.popitem(last=False)
 
 
 def load_ensemble(patient_id: str, window: str = 'w48',
                   models_dir: Optional[str] = None,
                   device: str = 'cpu',
-                  input_dim: int = 8) -> list:
+                  input_dim: int = 8) -> Optional[SeedEnsemble]:
     """Load 5-seed ensemble for a patient from EXP-619 checkpoints.
 
     Args:
@@ -160,14 +310,16 @@ def load_ensemble(patient_id: str, window: str = 'w48',
         input_dim: model input channels (8 for champion).
 
     Returns:
-        List of (model, seed) tuples, all in eval mode.
+        SeedEnsemble (iterates as (model, seed) tuples, all in eval mode),
+        or None if no checkpoint exists.
     """
     if not _torch_available:
         raise ImportError("PyTorch required for glucose forecasting")
 
     cache_key = f"{patient_id}_{window}_{device}"
-    if cache_key in _model_cache:
-        return _model_cache[cache_key]
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
 
     if models_dir is None:
         models_dir = str(
@@ -187,14 +339,56 @@ def load_ensemble(patient_id: str, window: str = 'w48',
         model = model.to(dev).eval()
         models.append((model, seed))
 
-    if models:
-        _model_cache[cache_key] = models
-    return models
+    if not models:
+        return None
+    ensemble = SeedEnsemble(models)
+    _cache_put(cache_key, ensemble)
+    return ensemble
+
+
+def _ensemble_bytes(ensemble: SeedEnsemble) -> int:
+    return sum(p.numel() * p.element_size() for p in ensemble.params.values())
+
+
+def _cohort_ensemble(patient_ids: List[str], window: str,
+                     models_dir: Optional[str], device: str,
+                     ) -> Optional[Tuple[SeedEnsemble, List[str], List[int]]]:
+    """Stacked ensemble over several patients' seeds (cached per cohort).
+
+    Returns (ensemble, patient ids with models, seeds per patient), or None
+    when no patient has models. Per-patient ensembles are only loaded when
+    the cohort stack is not cached.
+    """
+    cache_key = '|'.join(f"{pid}_{window}_{device}" for pid in patient_ids)
+    cached = _cohort_cache.get(cache_key)
+    if cached is not None:
+        _cohort_cache.move_to_end(cache_key)
+        return cached
+
+    ensembles = {pid: load_ensemble(pid, window, models_dir, device)
+                 for pid in patient_ids}
+    pids = [pid for pid in patient_ids if ensembles[pid]]
+    if not pids:
+        return None
+    entry = (SeedEnsemble.concat([ensembles[pid] for pid in pids]), pids,
+             [len(ensembles[pid]) for pid in pids])
+    if len(pids) == 1:                 # the patient's own ensemble, no copy
+        return entry
+
+    size = _ensemble_bytes(entry[0])
+    if size <= COHORT_CACHE_BYTES:
+        _cohort_cache[cache_key] = entry
+        used = sum(_ensemble_bytes(e[0]) for e in _cohort_cache.values())
+        while used > COHORT_CACHE_BYTES:
+            _, (evicted, _, _) = _cohort_cache.popitem(last=False)
+            used -= _ensemble_bytes(evicted)
+    return entry
 
 
 def clear_model_cache():
     """Free cached models from memory."""
     _model_cache.clear()
+    _cohort_cache.clear()
 
 
 # ── Input Preparation ─────────────────────────────────────────────────
@@ -337,33 +531,76 @@ def predict_trajectory(
     Returns:
         ForecastResult or None if models unavailable.
     """
-    if not _torch_available:
-        return None
+    return predict_trajectories(
+        [dict(patient=patient, metabolic=metabolic, hours=hours,
+              glucose=glucose, patient_id=patient_id, isf=isf)],
+        window=window, models_dir=models_dir, device=device)[0]
 
-    # Load ensemble
-    ensemble = load_ensemble(patient_id, window, models_dir, device)
-    if not ensemble:
-        return None
 
-    # Prepare input
-    input_arr, hist_len = prepare_input_window(
-        glucose, metabolic, patient, hours, window, isf)
+def predict_trajectories(
+    requests: List[dict],
+    window: str = 'w48',
+    models_dir: Optional[str] = None,
+    device: str = 'cpu',
+) -> List[Optional[ForecastResult]]:
+    """Cohort forecast: all patients' seed ensembles in one grouped forward.
+
+    Args:
+        requests: one dict per forecast with predict_trajectory's
+            per-patient arguments: patient, metabolic, hours, glucose,
+            patient_id and optionally isf. A patient may appear several
+            times (e.g. different forecast times).
+        window: window size (w48, w72, w96, w144).
+        models_dir: directory containing .pth files.
+        device: 'cpu' or 'cuda'.
 
-    x = torch.tensor(input_arr, dtype=torch.float32).unsqueeze(0)  # (1, T, 8)
-    x = x.to(torch.device(device))
+    Returns:
+        ForecastResult per request (None where the patient has no models).
+    """
+    results: List[Optional[ForecastResult]] = [None] * len(requests)
+    if not _torch_available or not requests:
+        return results
+
+    # Group requests by patient ensemble: each member sees its patient's
+    # windows, padded to the largest group
+    groups: Dict[str, List[int]] = {}
+    for i, req in enumerate(requests):
+        groups.setdefault(req['patient_id'], []).append(i)
+    found = _cohort_ensemble(list(groups), window, models_dir, device)
+    if found is None:
+        return results
+    cohort, pids, sizes = found
 
-    # Run ensemble predictions
-    all_preds = []
-    for model, seed in ensemble:
-        with torch.no_grad():
-            x_in = x.clone()
-            # Mask future glucose (channel 0) — PK channels stay
-            x_in[:, hist_len:, 0] = 0.0
-            pred = model(x_in, causal=True)  # (1, T, 8)
-            future_gluc = pred[0, hist_len:, 0].cpu().numpy()
-            all_preds.append(future_gluc)
-
-    preds = np.array(all_preds)  # (n_seeds, future_len)
+    cfg = WINDOW_CONFIG[window]
+    hist_len = cfg['history']
+    B = max(len(groups[pid]) for pid in pids)
+    inputs = np.zeros((len(pids), B, cfg['total'], 8), dtype=np.float32)
+    for g, pid in enumerate(pids):
+        for b, i in enumerate(groups[pid]):
+            req = requests[i]
+            inputs[g, b], _ = prepare_input_window(
+                req['glucose'], req['metabolic'], req['patient'],
+                req['hours'], window, req.get('isf'))
+    # Mask future glucose (channel 0) — PK channels stay
+    inputs[:, :, hist_len:, 0] = 0.0
+
+    x = torch.from_numpy(np.repeat(inputs, sizes, axis=0)).to(torch.device(device))
+    preds = cohort(x, causal=True)[:, :, hist_len:, 0].cpu().numpy()  # (M, B, future)
+
+    start = 0
+    for pid, size in zip(pids, sizes):
+        member_preds = preds[start:start + size]
+        start += size
+        for b, i in enumerate(groups[pid]):
+            req = requests[i]
+            results[i] = _forecast_result(member_preds[:, b], req['patient'],
+                                          window, req.get('isf'))
+    return results
+
+
+def _forecast_result(preds: np.ndarray, patient: PatientData, window: str,
+                     isf: Optional[float]) -> ForecastResult:
+    """ForecastResult from (n_seeds, future_len) normalized predictions."""
     mean_pred = np.mean(preds, axis=0)
     std_pred = np.std(preds, axis=0)
 
@@ -405,9 +642,112 @@ def predict_trajectory(
         ensemble_std=std_pred_mg,
         horizons_minutes=horizons_minutes,
         timestamps_ms=forecast_ts,
-        ensemble_size=len(ensemble),
+        ensemble_size=len(preds),
         mae_expected=mae_metrics,
         confidence=confidence,
         model_window=window,
         uses_isf_norm=isf is not None,
     )
+
+
+# ── Benchmark ─────────────────────────────────────────────────────────
+
+def benchmark_ensemble(n_patients: int = 11, window: str = 'w48',
+                       n_iterations: int = 20,
+                       models_dir: Optional[str] = None,
+                       device: str = 'cpu') -> Dict[str, dict]:
+    """CPU latency / throughput: per-seed loop vs stacked grouped forward.
+
+    Uses the EXP-619 checkpoints of patients a, b, … where models_dir
+    (default: externals/experiments) has them, otherwise randomly
+    initialised 5-seed ensembles (timing does not depend on the weights). Three workloads:
+
+    - ``patient``: one patient's forecast (latency)
+    - ``cohort``: one forecast per patient, each with its own ensemble
+    - ``windows``: n_patients windows through one patient's ensemble
+
+    The loop baseline is the pre-stacking path: clone the input and run
+    each seed model at batch size 1.
+
+    Returns:
+        {workload: {'loop_ms', 'grouped_ms', 'speedup',
+                    'forecasts_per_s_loop', 'forecasts_per_s_grouped',
+                    'max_abs_diff'}, '_config': {...}}
+    """
+    if not _torch_available:
+        raise ImportError("PyTorch required for glucose forecasting")
+    dev = torch.device(device)
+    pids = [chr(ord('a') + i) for i in range(n_patients)]
+    ensembles, source = [], 'checkpoints'
+    for pid in pids:
+        ens = load_ensemble(pid, window, models_dir, device)
+        if ens is None:
+            torch.manual_seed(len(ensembles))
+            ens = SeedEnsemble([(_build_model().to(dev).eval(), seed)
+                                for seed in PRODUCTION_SEEDS])
+            source = 'random-init'
+        ensembles.append(ens)
+    cohort = SeedEnsemble.concat(ensembles)
+
+    cfg = WINDOW_CONFIG[window]
+    hist_len = cfg['history']
+    rng = np.random.RandomState(0)
+    x = torch.tensor(rng.rand(n_patients, cfg['total'], 8), dtype=torch.float32,
+                     device=dev)
+    x[:, hist_len:, 0] = 0.0
+
+    def loop(ens, windows):
+        out = []
+        with torch.no_grad():
+            for w in windows:
+                preds = []
+                for model, _ in ens:
+                    x_in = w.unsqueeze(0).clone()
+                    preds.append(model(x_in, causal=True)[0, hist_len:, 0])
+                out.append(torch.stack(preds))
+        return torch.cat(out)                                 # (B·S, future)
+
+    sizes = [len(e) for e in ensembles]
+    per_member = torch.repeat_interleave(x, torch.tensor(sizes), dim=0).unsqueeze(1)
+
+    def grouped(ens, windows):
+        out = ens(windows)[:, :, hist_len:, 0]               # (S, B, future)
+        return out.transpose(0, 1).reshape(-1, out.shape[-1])
+
+    workloads = {
+        'patient': (lambda: loop(ensembles[0], x[:1]),
+                    lambda: grouped(ensembles[0], x[:1]), 1),
+        'cohort': (lambda: torch.cat([loop(e, x[i:i + 1])
+                                      for i, e in enumerate(ensembles)]),
+                   lambda: cohort(per_member)[:, 0, hist_len:, 0], n_patients),
+        'windows': (lambda: loop(ensembles[0], x),
+                    lambda: grouped(ensembles[0], x), n_patients),
+    }
+
+    def timed(fn):
+        result = fn()                                         # warmup
+        times = []
+        for _ in range(n_iterations):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        return float(np.median(times)) * 1000, result
+
+    report = {}
+    for name, (loop_fn, grouped_fn, n_forecasts) in workloads.items():
+        loop_ms, ref = timed(loop_fn)
+        grouped_ms, got = timed(grouped_fn)
+        report[name] = {
+            'loop_ms': round(loop_ms, 2),
+            'grouped_ms': round(grouped_ms, 2),
+            'speedup': round(loop_ms / grouped_ms, 2),
+            'forecasts_per_s_loop': round(n_forecasts * 1000 / loop_ms, 1),
+            'forecasts_per_s_grouped': round(n_forecasts * 1000 / grouped_ms, 1),
+            'max_abs_diff': float((got - ref).abs().max()),
+        }
+    report['_config'] = {
+        'n_patients': n_patients, 'window': window, 'seeds': sizes[0],
+        'weights': source, 'device': device,
+        'threads': torch.get_num_threads(), 'iterations': n_iterations,
+    }
+    return report
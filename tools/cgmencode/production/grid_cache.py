@@ -0,0 +1,307 @@
+"""
+grid_cache.py — Projected terrarium reads shared across experiments in a process.
+
+``ObservationalExperiment.load_data`` used to read every column of
+``grid.parquet`` and ``devicestatus.parquet`` for every patient, filter
+and sort in pandas, and repeat all of it for each experiment in a batch.
+This module pushes the qualified-patient filter and the column
+projection into the parquet read (row groups and columns that are not
+needed are never decoded), builds the controller map from a two-column
+devicestatus read, and keeps the resulting sorted grid in a
+process-level ``GridCache`` so a suite of experiments decodes it once.
+
+Cache entries are keyed by the grid/devicestatus sources (path, size,
+mtime — for a hive-partitioned directory, of every fragment), the
+patient set and the column set; a request whose columns are a subset of
+a cached entry is served from that entry. The cache holds at most
+``max_entries`` grids and evicts the least recently used one beyond that.
+
+Every caller shares the cached grid's columns: numpy-backed columns are
+marked read-only, so in-place element writes raise instead of reaching
+another experiment, while adding or replacing whole columns only touches
+the caller's frame. Extension-typed columns (the tz-aware ``time``) can't
+be frozen and are copied per call. Pass ``copy=True`` for a private,
+writable frame.
+
+Optionally (``ipc_dir``, or ``CGM_GRID_CACHE_DIR``) each decoded grid is
+also written as an uncompressed Arrow IPC file and later reads — in any
+process — memory-map it instead of decoding parquet again. The cached
+grid's numeric columns without nulls are then views into the page
+cache, which is shared between concurrent experiment processes as long
+as callers don't ask for a copy.
+
+Usage:
+    from tools.cgmencode.production.grid_cache import default_grid_cache
+    grid, ctrl_map = default_grid_cache().load(
+        GRID_PATH, DS_PATH, patients=qualified,
+        columns=['glucose', 'bolus', 'iob', 'scheduled_isf'])
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ENV_GRID_CACHE_DIR = 'CGM_GRID_CACHE_DIR'
+
+# Always read, whatever an experiment declares
+GRID_KEY_COLUMNS = ('patient_id', 'time')
+
+# Decoded grids kept per process before the least recently used is evicted
+DEFAULT_MAX_ENTRIES = 8
+
+
+# ── Projected reads ──────────────────────────────────────────────────
+
+def parquet_columns(path: Union[str, Path]) -> List[str]:
+    """Column names of a parquet file or hive-partitioned directory."""
+    import pyarrow.dataset as pads
+    return list(pads.dataset(str(path), format='parquet',
+                             partitioning='hive').schema.names)
+
+
+def read_projected(
+    path: Union[str, Path],
+    columns: Optional[Iterable[str]] = None,
+    patients: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """Read only ``columns`` of only ``patients`` from a parquet source.
+
+    Columns absent from the file are skipped silently (optional grid
+    columns such as ``bolus_smb`` vary by export). None means all
+    columns / all patients.
+    """
+    if columns is not None:
+        available = set(parquet_columns(path))
+        columns = [c for c in dict.fromkeys(columns) if c in available]
+    filters = None
+    if patients is not None:
+        filters = [('patient_id', 'in', sorted(set(patients)))]
+    return pd.read_parquet(path, columns=columns, filters=filters)
+
+
+def controller_map(
+    ds_path: Union[str, Path],
+    patients: Optional[Iterable[str]] = None,
+) -> Dict[str, str]:
+    """patient_id → first reported controller, from a projected read."""
+    ds = read_projected(ds_path, ['patient_id', 'controller'], patients)
+    return ds.groupby('patient_id')['controller'].first().to_dict()
+
+
+def load_grid(
+    grid_path: Union[str, Path],
+    ds_path: Union[str, Path],
+    patients: Optional[Iterable[str]] = None,
+    columns: Optional[Iterable[str]] = None,
+) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """Projected grid with controller column, sorted by (patient_id, time).
+
+    Equivalent to reading both files in full, mapping the controller,
+    filtering to ``patients`` and sorting — without decoding the rest.
+    """
+    patients = None if patients is None else list(patients)
+    if columns is not None:
+        columns = [*GRID_KEY_COLUMNS,
+                   *(c for c in columns if c not in GRID_KEY_COLUMNS
+                     and c != 'controller')]
+    ctrl_map = controller_map(ds_path, patients)
+    grid = read_projected(grid_path, columns, patients)
+    grid['controller'] = grid['patient_id'].map(ctrl_map)
+    if not pd.api.types.is_datetime64_any_dtype(grid['time']):
+        grid['time'] = pd.to_datetime(grid['time'], utc=True)
+    grid = grid.sort_values(['patient_id', 'time']).reset_index(drop=True)
+    return grid, ctrl_map
+
+
+# ── Process-level cache ──────────────────────────────────────────────
+
+def _source_id(path: Union[str, Path]) -> Tuple[str, int, int]:
+    """(path, bytes, mtime) of a parquet file; for a dataset directory,
+    total bytes and a hash over every fragment's (path, size, mtime)."""
+    p = Path(path).resolve()
+    if not p.is_dir():
+        st = p.stat()
+        return str(p), st.st_size, st.st_mtime_ns
+    listing = []
+    for f in sorted(p.rglob('*.parquet')):
+        st = f.stat()
+        listing.append((str(f.relative_to(p)), st.st_size, st.st_mtime_ns))
+    digest = hashlib.blake2b(json.dumps(listing).encode(), digest_size=8).digest()
+    return str(p), sum(size for _, size, _ in listing), int.from_bytes(digest, 'big')
+
+
+def _freeze(grid: pd.DataFrame) -> pd.DataFrame:
+    """Same columns, with every numpy-backed one marked read-only (no copy)."""
+    cols = {}
+    for col in grid.columns:
+        values = grid[col]
+        if isinstance(values.dtype, np.dtype):
+            values = values.to_numpy(copy=False).view()
+            values.flags.writeable = False
+        cols[col] = values
+    return pd.DataFrame(cols, index=grid.index, copy=False)
+
+
+def _share(grid: pd.DataFrame, copy: bool) -> pd.DataFrame:
+    """A caller's frame over a cached (frozen) grid."""
+    if copy:
+        return grid.copy(deep=True)
+    out = grid.copy(deep=False)
+    for col in grid.columns:
+        if not isinstance(grid[col].dtype, np.dtype):
+            out[col] = grid[col].copy()
+    return out
+
+
+class GridCache:
+    """Decoded, projected grids shared by every experiment in a process.
+
+    Args:
+        ipc_dir: optional directory for memory-mapped Arrow IPC copies of
+            each decoded grid (shared across processes and runs).
+        max_entries: grids kept in memory; the least recently used one is
+            evicted beyond this.
+    """
+
+    def __init__(self, ipc_dir: Optional[Union[str, Path]] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be >= 1, got {max_entries}")
+        self.ipc_dir = Path(ipc_dir) if ipc_dir else None
+        if self.ipc_dir is not None:
+            self.ipc_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, Tuple[Optional[frozenset], pd.DataFrame,
+                                                Dict[str, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(
+        self,
+        grid_path: Union[str, Path],
+        ds_path: Union[str, Path],
+        patients: Optional[Iterable[str]] = None,
+        columns: Optional[Iterable[str]] = None,
+        copy: bool = False,
+    ) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """``load_grid`` through the cache; returns (grid, controller map).
+
+        The grid shares the cached, read-only columns unless ``copy`` is
+        set, in which case it is a private deep copy safe to edit in place.
+        """
+        patients = None if patients is None else frozenset(patients)
+        wanted = None if columns is None else frozenset(columns)
+        source = (_source_id(grid_path), _source_id(ds_path), patients)
+        with self._lock:
+            for key, (cols, grid, ctrl) in self._entries.items():
+                if key[0] == source and (cols is None or
+                                         (wanted is not None and wanted <= cols)):
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return _share(grid, copy), dict(ctrl)
+            self.misses += 1
+            grid, ctrl = self._load_ipc_or_parquet(
+                source, wanted, grid_path, ds_path, patients, columns)
+            grid = _freeze(grid)
+            self._entries[(source, wanted)] = (wanted, grid, ctrl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return _share(grid, copy), dict(ctrl)
+
+    def _load_ipc_or_parquet(self, source, wanted, grid_path, ds_path,
+                             patients, columns):
+        ipc_path = None
+        if self.ipc_dir is not None:
+            digest = hashlib.blake2b(json.dumps(
+                [source[0], source[1],
+                 None if patients is None else sorted(patients),
+                 None if wanted is None else sorted(wanted)]).encode(),
+                digest_size=16).hexdigest()
+            ipc_path = self.ipc_dir / f'grid-{digest}.arrow'
+            if ipc_path.exists():
+                try:
+                    return _read_ipc(ipc_path)
+                except Exception as exc:   # truncated/foreign file: rebuild
+                    logger.warning("Ignoring unreadable grid IPC %s: %s", ipc_path, exc)
+        grid, ctrl = load_grid(grid_path, ds_path, patients, columns)
+        if ipc_path is not None:
+            try:
+                _write_ipc(ipc_path, grid, ctrl)
+                return _read_ipc(ipc_path)
+            except OSError as exc:
+                logger.warning("Grid IPC write to %s failed: %s", ipc_path, exc)
+        return grid, ctrl
+
+    def clear(self) -> None:
+        """Drop in-process entries (IPC files are left on disk)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            rows = sum(len(g) for _, g, _ in self._entries.values())
+            nbytes = sum(int(g.memory_usage(deep=False).sum())
+                         for _, g, _ in self._entries.values())
+            return {'entries': len(self._entries), 'rows': rows,
+                    'bytes': nbytes, 'hits': self.hits, 'misses': self.misses}
+
+
+def _write_ipc(path: Path, grid: pd.DataFrame, ctrl: Dict[str, str]) -> None:
+    import pyarrow as pa
+    table = pa.Table.from_pandas(grid, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'controller_map': json.dumps(ctrl).encode()})
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh, pa.ipc.new_file(fh, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _read_ipc(path: Path) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    import pyarrow as pa
+    with pa.memory_map(str(path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    ctrl = json.loads((table.schema.metadata or {}).get(b'controller_map', b'{}'))
+    return table.to_pandas(split_blocks=True), ctrl
+
+
+_DEFAULT: Optional[GridCache] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def configure_grid_cache(ipc_dir: Optional[Union[str, Path]] = None,
+                         max_entries: int = DEFAULT_MAX_ENTRIES) -> GridCache:
+    """Replace the process-wide cache (optionally backed by ``ipc_dir``)."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        _DEFAULT = GridCache(ipc_dir, max_entries)
+        return _DEFAULT
+
+
+def default_grid_cache() -> GridCache:
+    """The process-wide cache; IPC-backed if $CGM_GRID_CACHE_DIR is set."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = GridCache(os.environ.get(ENV_GRID_CACHE_DIR) or None)
+        return _DEFAULT
@@ -204,7 +204,15 @@ def calibrate_threshold(glucose_history: np.ndarray,
     # Patient's glucose variability determines threshold
     cv = float(np.std(valid) / np.mean(valid))
     tbr = float(np.mean(valid < HYPO_LEVEL_1))
+    return _threshold_from_distribution(cv, tbr)
 
+
+def _threshold_from_distribution(cv: float, tbr: float) -> float:
+    """Alert threshold from glucose CV and time-below-range (EXP-695).
+
+    Split out of ``calibrate_threshold`` so streaming callers can feed
+    running statistics instead of the full glucose history.
+    """
     # High variability or frequent lows → lower threshold (more sensitive)
     if tbr > 0.05 or cv > 0.36:
         return CONSERVATIVE_THRESHOLD
@@ -132,10 +132,9 @@ class InferredMealsLoader:
         from tools.cgmencode.production.types import (
             PatientData, PatientProfile,
         )
-        from tools.cgmencode.production.metabolic_engine import (
-            compute_metabolic_state, _extract_hours,
+        from tools.cgmencode.production.physics_cache import (
+            cached_clean_glucose, cached_hours, cached_metabolic_state,
         )
-        from tools.cgmencode.production.data_quality import clean_glucose
         from tools.cgmencode.production.meal_detector import (
             detect_meal_events, classify_meal_archetypes,
         )
@@ -173,13 +172,13 @@ class InferredMealsLoader:
                 if "actual_basal_rate" in grid_df else None,
             patient_id=str(patient_id),
         )
-        cleaned = clean_glucose(
+        cleaned = cached_clean_glucose(
             patient.glucose,
             bolus=patient.bolus,
             carbs=patient.carbs,
         )
-        metabolic = compute_metabolic_state(patient)
-        hours = _extract_hours(patient.timestamps, profile.timezone)
+        metabolic = cached_metabolic_state(patient)
+        hours = cached_hours(patient.timestamps, profile.timezone)
         meals = detect_meal_events(
             cleaned.glucose, metabolic, hours, ts_ms, profile,
         )
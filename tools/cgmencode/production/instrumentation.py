@@ -0,0 +1,253 @@
+"""
+instrumentation.py — Per-stage timing and memory metrics for run_pipeline.
+
+``run_pipeline`` wraps each of its stages in ``StageRecorder.stage()``,
+which records wall time, CPU time, peak allocated memory (only when
+``tracemalloc`` is tracing), the stage's input sample count, and its
+status ('ok' / 'skipped' / 'failed' with the exception type). The
+records land on ``PipelineResult.stage_metrics``.
+
+Exporters plug in without touching the pipeline: anything registered
+with ``register_stage_hook`` receives every finished pipeline's
+metrics. Parallel runs (batch_runner) emit from the parent process as
+results arrive, so exporters see every patient exactly once. Two
+exporters ship here:
+
+  - ``PrometheusTextExporter`` — accumulates counters/sums and renders
+    the Prometheus text exposition format.
+  - ``JsonLinesExporter`` — appends one JSON object per stage to a
+    file or stream.
+
+Usage:
+    from tools.cgmencode.production.instrumentation import (
+        JsonLinesExporter, register_stage_hook,
+    )
+    register_stage_hook(JsonLinesExporter('stage_metrics.jsonl'))
+    result = run_pipeline(patient, trace_memory=True)
+    slowest = max(result.stage_metrics, key=lambda m: m.wall_ms)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Protocol, TextIO, Union
+
+from .types import StageMetrics
+
+logger = logging.getLogger(__name__)
+
+
+# ── Recorder ──────────────────────────────────────────────────────────
+
+class _StageHandle:
+    """Mutable handle yielded by ``StageRecorder.stage``."""
+
+    def __init__(self, metrics: StageMetrics):
+        self.metrics = metrics
+
+    def fail(self, exc: BaseException) -> None:
+        """Mark the stage failed (for stages that swallow their exceptions)."""
+        self.metrics.status = "failed"
+        self.metrics.error_type = type(exc).__name__
+
+    def skip(self) -> None:
+        """Mark the stage skipped after entering it (e.g. no models found)."""
+        self.metrics.status = "skipped"
+
+
+class StageRecorder:
+    """Collects StageMetrics for one pipeline run.
+
+    Args:
+        trace_memory: measure per-stage peak allocation with tracemalloc.
+            If tracemalloc is not already tracing it is started here and
+            stopped again by ``close()``. When False, peak memory is still
+            reported if the caller has tracemalloc running.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.metrics: List[StageMetrics] = []
+        self._owns_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    @contextmanager
+    def stage(self, name: str, n_samples: int = 0) -> Iterator[_StageHandle]:
+        """Time a block; an exception escaping it is recorded and re-raised."""
+        m = StageMetrics(name=name, n_samples=int(n_samples))
+        handle = _StageHandle(m)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall0 = time.perf_counter()
+        cpu0 = time.thread_time()
+        try:
+            yield handle
+        except BaseException as e:
+            handle.fail(e)
+            raise
+        finally:
+            m.wall_ms = (time.perf_counter() - wall0) * 1000.0
+            m.cpu_ms = (time.thread_time() - cpu0) * 1000.0
+            if tracing and tracemalloc.is_tracing():
+                m.peak_mem_bytes = max(0, tracemalloc.get_traced_memory()[1] - base)
+            self.metrics.append(m)
+
+    def skip(self, name: str, n_samples: int = 0) -> None:
+        """Record a stage whose preconditions were not met."""
+        self.metrics.append(StageMetrics(name=name, status="skipped",
+                                         n_samples=int(n_samples)))
+
+    def close(self) -> None:
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+
+# ── Hooks ─────────────────────────────────────────────────────────────
+
+class StageHook(Protocol):
+    """Receives the stage metrics of every finished pipeline run."""
+
+    def on_pipeline(self, patient_id: str, metrics: List[StageMetrics],
+                    total_ms: float) -> None:
+        ...
+
+
+_HOOKS: List[StageHook] = []
+_HOOKS_LOCK = threading.Lock()
+
+
+def register_stage_hook(hook: StageHook) -> StageHook:
+    """Register an exporter; returns it so it can be used as a decorator."""
+    with _HOOKS_LOCK:
+        if hook not in _HOOKS:
+            _HOOKS.append(hook)
+    return hook
+
+
+def unregister_stage_hook(hook: StageHook) -> None:
+    with _HOOKS_LOCK:
+        if hook in _HOOKS:
+            _HOOKS.remove(hook)
+
+
+def clear_stage_hooks() -> None:
+    """Drop all registered hooks (used by worker processes)."""
+    with _HOOKS_LOCK:
+        _HOOKS.clear()
+
+
+def emit_stage_metrics(patient_id: str, metrics: List[StageMetrics],
+                       total_ms: float) -> None:
+    """Fan metrics out to registered hooks. Hook errors are logged, not raised."""
+    with _HOOKS_LOCK:
+        hooks = list(_HOOKS)
+    for hook in hooks:
+        try:
+            hook.on_pipeline(patient_id, metrics, total_ms)
+        except Exception as e:
+            logger.warning("Stage metrics hook %r failed: %s", hook, e)
+
+
+# ── Exporters ─────────────────────────────────────────────────────────
+
+class JsonLinesExporter:
+    """Append one JSON object per stage (plus patient_id) to a file or stream."""
+
+    def __init__(self, target: Union[str, TextIO]):
+        self._target = target
+        self._lock = threading.Lock()
+
+    def on_pipeline(self, patient_id: str, metrics: List[StageMetrics],
+                    total_ms: float) -> None:
+        lines = [json.dumps({'patient_id': patient_id, **m.to_dict()})
+                 for m in metrics]
+        text = '\n'.join(lines) + '\n'
+        with self._lock:
+            if isinstance(self._target, str):
+                with open(self._target, 'a') as f:
+                    f.write(text)
+            else:
+                self._target.write(text)
+
+
+class PrometheusTextExporter:
+    """Accumulate stage metrics and render Prometheus text format.
+
+    Exposes per-stage counters by status and wall/CPU time sums, plus a
+    pipeline run counter and total latency sum. Serve ``render()`` from
+    any HTTP handler or write it to a node-exporter textfile.
+    """
+
+    def __init__(self, prefix: str = 'cgm_pipeline'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._total_ms = 0.0
+        self._stage_count: Dict[tuple, int] = {}
+        self._wall_ms: Dict[str, float] = {}
+        self._cpu_ms: Dict[str, float] = {}
+        self._peak_bytes: Dict[str, int] = {}
+
+    def on_pipeline(self, patient_id: str, metrics: List[StageMetrics],
+                    total_ms: float) -> None:
+        with self._lock:
+            self._runs += 1
+            self._total_ms += total_ms
+            for m in metrics:
+                key = (m.name, m.status)
+                self._stage_count[key] = self._stage_count.get(key, 0) + 1
+                self._wall_ms[m.name] = self._wall_ms.get(m.name, 0.0) + m.wall_ms
+                self._cpu_ms[m.name] = self._cpu_ms.get(m.name, 0.0) + m.cpu_ms
+                if m.peak_mem_bytes is not None:
+                    self._peak_bytes[m.name] = max(self._peak_bytes.get(m.name, 0),
+                                                   m.peak_mem_bytes)
+
+    def render(self) -> str:
+        p = self.prefix
+        with self._lock:
+            out = [
+                f'# HELP {p}_runs_total Completed pipeline runs.',
+                f'# TYPE {p}_runs_total counter',
+                f'{p}_runs_total {self._runs}',
+                f'# HELP {p}_latency_seconds_sum Total pipeline wall time.',
+                f'# TYPE {p}_latency_seconds_sum counter',
+                f'{p}_latency_seconds_sum {self._total_ms / 1000.0:.6f}',
+                f'# HELP {p}_stage_total Stage executions by status.',
+                f'# TYPE {p}_stage_total counter',
+            ]
+            for (name, status), n in sorted(self._stage_count.items()):
+                out.append(f'{p}_stage_total{{stage="{name}",status="{status}"}} {n}')
+            out += [f'# HELP {p}_stage_wall_seconds_sum Stage wall time.',
+                    f'# TYPE {p}_stage_wall_seconds_sum counter']
+            for name, ms in sorted(self._wall_ms.items()):
+                out.append(f'{p}_stage_wall_seconds_sum{{stage="{name}"}} {ms / 1000.0:.6f}')
+            out += [f'# HELP {p}_stage_cpu_seconds_sum Stage CPU time.',
+                    f'# TYPE {p}_stage_cpu_seconds_sum counter']
+            for name, ms in sorted(self._cpu_ms.items()):
+                out.append(f'{p}_stage_cpu_seconds_sum{{stage="{name}"}} {ms / 1000.0:.6f}')
+            if self._peak_bytes:
+                out += [f'# HELP {p}_stage_peak_bytes Max traced allocation per stage.',
+                        f'# TYPE {p}_stage_peak_bytes gauge']
+                for name, b in sorted(self._peak_bytes.items()):
+                    out.append(f'{p}_stage_peak_bytes{{stage="{name}"}} {b}')
+        return '\n'.join(out) + '\n'
+
+
+def summarize_stage_metrics(metrics: List[StageMetrics]) -> str:
+    """Human-readable table, slowest stage first."""
+    rows = sorted(metrics, key=lambda m: m.wall_ms, reverse=True)
+    lines = [f"{'stage':<28} {'status':<8} {'wall_ms':>9} {'cpu_ms':>9} {'peak_kb':>9}"]
+    for m in rows:
+        peak = f"{m.peak_mem_bytes / 1024:.0f}" if m.peak_mem_bytes is not None else '-'
+        lines.append(f"{m.name:<28} {m.status:<8} {m.wall_ms:>9.1f} "
+                     f"{m.cpu_ms:>9.1f} {peak:>9}")
+    return '\n'.join(lines)
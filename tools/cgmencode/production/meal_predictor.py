@@ -35,7 +35,7 @@ from typing import Dict, List, Optional, Tuple
 import numpy as np
 
 from .types import (
-    MealHistory, MealPrediction, MealTimingModel, MealWindow,
+    MealHistory, MealPrediction, MealTimingModel, MealWindow, TimeIndex,
 )
 
 
@@ -152,7 +152,8 @@ class MealMLModel:
               glucose: np.ndarray,
               net_flux: Optional[np.ndarray] = None,
               supply: Optional[np.ndarray] = None,
-              days_of_data: float = 0.0) -> bool:
+              days_of_data: float = 0.0,
+              time_index: Optional[TimeIndex] = None) -> bool:
         """Train dual-mode meal prediction models.
 
         Args:
@@ -161,6 +162,10 @@ class MealMLModel:
             net_flux: (N,) metabolic net flux. Optional.
             supply: (N,) insulin supply signal for IOB proxy. Optional.
             days_of_data: total days of data.
+            time_index: patient clock (``PatientData.time_index``). Gives
+                the hour features and day boundaries the same local-time
+                meaning as ``predict_proba``'s ``hour``; without it the
+                grid is assumed to start at local midnight.
 
         Returns:
             True if training succeeded.
@@ -200,12 +205,18 @@ class MealMLModel:
                     prev_meal_dist[i] = dist
 
         # Meals so far today
+        if time_index is not None:
+            day_of = time_index.day
+            step_hours = time_index.hours
+        else:
+            day_of = np.arange(N) // STEPS_PER_DAY
+            step_hours = (np.arange(N) % STEPS_PER_DAY) * 5.0 / 60.0
         meals_today = np.zeros(N)
         meal_set = set(meal_steps)
         current_day = -1
         count = 0
         for i in range(N):
-            day = i // STEPS_PER_DAY
+            day = day_of[i]
             if day != current_day:
                 current_day = day
                 count = 0
@@ -225,7 +236,7 @@ class MealMLModel:
 
         # Build 16-feature matrix
         features = self._build_features(
-            N, glucose, net_flux, supply, prev_meal_dist, meals_today)
+            N, glucose, net_flux, supply, prev_meal_dist, meals_today, step_hours)
         features = np.nan_to_num(features, nan=0.0, posinf=0.0, neginf=0.0)
 
         label_30 = (next_meal_dist <= 30).astype(int)
@@ -330,14 +341,14 @@ class MealMLModel:
     def _build_features(self, N: int, glucose: np.ndarray,
                         net_flux: np.ndarray, supply: np.ndarray,
                         prev_meal_dist: np.ndarray,
-                        meals_today: np.ndarray) -> np.ndarray:
+                        meals_today: np.ndarray,
+                        step_hours: np.ndarray) -> np.ndarray:
         """Build 22-feature matrix for all timesteps (4-harmonic upgrade)."""
         n_feat = len(ML_FEATURE_NAMES)  # 22
         features = np.zeros((N, n_feat))
         from .pattern_analyzer import compute_harmonic_features
 
         # Pre-compute 4-harmonic features for all timesteps
-        step_hours = np.array([(i % STEPS_PER_DAY) * 5.0 / 60.0 for i in range(N)])
         harmonics = compute_harmonic_features(step_hours)  # (N, 8)
 
         for i in range(N):
@@ -20,9 +20,13 @@ Physics model:
 
 from __future__ import annotations
 
+from typing import Optional
+
 import numpy as np
 
+from ..pk_convolution import cached_kernel, convolve_doses
 from .types import MetabolicState, PatientData, PatientProfile, DIADiscrepancy, ResponderType, TwoComponentDIA
+from .time_index import local_datetimes
 
 
 # Hill equation parameters for hepatic production (from continuous_pk.py)
@@ -90,18 +94,11 @@ def _extract_hours(timestamps: np.ndarray, tz: str = "UTC") -> np.ndarray:
     Drives every circadian analysis in the production pipeline (ISF
     blocks, basal slope, dawn detection, period analysis). UTC default
     preserves existing test fixtures, but real patients should pass
-    their profile timezone.
+    their profile timezone. With a PatientData at hand, prefer
+    ``patient.time_index(tz).hours`` (same values, computed once).
     """
     try:
-        import pandas as pd
-        dt = pd.to_datetime(timestamps, unit='ms', utc=True)
-        if tz and tz != 'UTC':
-            try:
-                dt = dt.tz_convert(tz)
-            except Exception:
-                # Unknown TZ string — fall back to UTC silently;
-                # caller may have not yet plumbed normalize_timezone.
-                pass
+        dt = local_datetimes(timestamps, tz)
         return np.asarray(dt.hour + dt.minute / 60.0, dtype=np.float64)
     except Exception:
         # Fallback: assume timestamps are already in seconds or ms (UTC)
@@ -126,9 +123,21 @@ def _calibrate_demand(demand: np.ndarray,
     EXP-1772 validation: fasting RMSE 19.6 → 10.2 (48% reduction),
     fasting bias -5.2 → -0.1, 10/11 patients improve.
     """
+    cal_factor = _demand_calibration_factor(basal_rate, isf)
+    if cal_factor is None:
+        return demand
+    return demand * cal_factor
+
+
+def _demand_calibration_factor(basal_rate: float, isf: float) -> Optional[float]:
+    """Scale factor applied by ``_calibrate_demand`` (None = no calibration).
+
+    Depends only on profile scalars, so incremental callers
+    (pipeline_session) compute it once per patient.
+    """
     demand_at_basal = basal_rate * isf / 12.0  # mg/dL per step at scheduled basal
     if demand_at_basal < 0.01:
-        return demand
+        return None
 
     # Mean hepatic production at typical IOB (basal accumulation ≈ rate × DIA/2)
     typical_iob = basal_rate * 2.5  # ~half of 5h DIA accumulation
@@ -136,8 +145,7 @@ def _calibrate_demand(demand: np.ndarray,
     mean_hepatic = float(np.mean(_compute_hepatic_production(
         np.full(288, typical_iob), reference_hours)))
 
-    cal_factor = mean_hepatic / demand_at_basal
-    return demand * cal_factor
+    return mean_hepatic / demand_at_basal
 
 
 def compute_metabolic_state(patient: PatientData) -> MetabolicState:
@@ -156,7 +164,7 @@ def compute_metabolic_state(patient: PatientData) -> MetabolicState:
     """
     N = patient.n_samples
     glucose = np.nan_to_num(patient.glucose.astype(np.float64), nan=120.0)
-    hours = _extract_hours(patient.timestamps)
+    hours = patient.time_index('UTC').hours
     profile = patient.profile
 
     # Extract scalar ISF (always mg/dL) and CR from profile schedules
@@ -247,13 +255,14 @@ def _compute_total_insulin_delivered(bolus: np.ndarray,
     """
     # Per-interval insulin delivery: bolus + basal converted to per-step
     per_step = bolus + basal_rate * (5.0 / 60.0)
-    # Cumulative sum for efficient rolling window
-    cumsum = np.concatenate([[0.0], np.cumsum(per_step)])
-    total = np.zeros(len(bolus))
-    for i in range(len(bolus)):
-        start = max(0, i + 1 - window_steps)
-        total[i] = cumsum[i + 1] - cumsum[start]
-    return total
+    # Rolling window sum = convolution with a box kernel of window_steps
+    return convolve_doses(per_step, _window_kernel(window_steps))
+
+
+@cached_kernel
+def _window_kernel(window_steps: int) -> np.ndarray:
+    """Box kernel: every dose counts fully for window_steps steps."""
+    return np.ones(max(int(window_steps), 0))
 
 
 def decompose_two_component_dia(patient: PatientData,
@@ -259,17 +259,15 @@ def _exp_decay_fit(bg_segment: np.ndarray, bolus_size: float):
     return best_params
 
 
-def _hour_from_timestamps(timestamps: np.ndarray, idx: int) -> float:
-    """Fractional hour of day from Unix-ms timestamp."""
-    ts_sec = timestamps[idx] / 1000.0
-    hour = (ts_sec % 86400) / 3600.0
-    return round(hour, 2)
+def _hour_at(hours: np.ndarray, idx: int) -> float:
+    """Local fractional hour of day at ``idx`` (from the patient TimeIndex)."""
+    return round(float(hours[idx]), 2)
 
 
 # ── Individual Detectors ──────────────────────────────────────────────
 
 def _detect_fasting(glucose: np.ndarray, bolus: np.ndarray,
-                    carbs: np.ndarray, timestamps: np.ndarray) -> List[NaturalExperiment]:
+                    carbs: np.ndarray, hours: np.ndarray) -> List[NaturalExperiment]:
     """Detect fasting basal test windows (≥3h no food/bolus)."""
     N = len(glucose)
     experiments = []
@@ -300,7 +298,7 @@ def _detect_fasting(glucose: np.ndarray, bolus: np.ndarray,
             exp_type=NaturalExperimentType.FASTING,
             start_idx=start, end_idx=end,
             duration_minutes=duration,
-            hour_of_day=_hour_from_timestamps(timestamps, start),
+            hour_of_day=_hour_at(hours, start),
             quality=round(quality, 3),
             measurements={
                 'drift_mg_dl_per_hour': round(drift, 3) if not math.isnan(drift) else None,
@@ -313,8 +311,7 @@ def _detect_fasting(glucose: np.ndarray, bolus: np.ndarray,
 
 
 def _detect_overnight(glucose: np.ndarray, bolus: np.ndarray,
-                      carbs: np.ndarray, hours: np.ndarray,
-                      timestamps: np.ndarray) -> List[NaturalExperiment]:
+                      carbs: np.ndarray, hours: np.ndarray) -> List[NaturalExperiment]:
     """Detect overnight basal test windows (midnight to 6 AM)."""
     N = len(glucose)
     experiments = []
@@ -338,7 +335,7 @@ def _detect_overnight(glucose: np.ndarray, bolus: np.ndarray,
             exp_type=NaturalExperimentType.OVERNIGHT,
             start_idx=start, end_idx=end,
             duration_minutes=duration,
-            hour_of_day=_hour_from_timestamps(timestamps, start),
+            hour_of_day=_hour_at(hours, start),
             quality=round(quality, 3),
             measurements={
                 'drift_mg_dl_per_hour': round(drift, 3) if not math.isnan(drift) else None,
@@ -351,7 +348,7 @@ def _detect_overnight(glucose: np.ndarray, bolus: np.ndarray,
 
 
 def _detect_meals(glucose: np.ndarray, bolus: np.ndarray,
-                  carbs: np.ndarray, timestamps: np.ndarray,
+                  carbs: np.ndarray, hours: np.ndarray,
                   meal_config: MealConfig,
                   residuals: Optional[np.ndarray] = None,
                   profile_isf: float = 50.0,
@@ -439,7 +436,7 @@ def _detect_meals(glucose: np.ndarray, bolus: np.ndarray,
             exp_type=NaturalExperimentType.MEAL,
             start_idx=meal_idx, end_idx=end_idx,
             duration_minutes=(end_idx - meal_idx) * STEP_MINUTES,
-            hour_of_day=_hour_from_timestamps(timestamps, meal_idx),
+            hour_of_day=_hour_at(hours, meal_idx),
             quality=round(quality, 3),
             measurements=measurements,
         ))
@@ -448,7 +445,7 @@ def _detect_meals(glucose: np.ndarray, bolus: np.ndarray,
 
 def _detect_corrections(glucose: np.ndarray, bolus: np.ndarray,
                         carbs: np.ndarray,
-                        timestamps: np.ndarray) -> List[NaturalExperiment]:
+                        hours: np.ndarray) -> List[NaturalExperiment]:
     """Detect correction bolus response windows."""
     N = len(glucose)
     experiments = []
@@ -512,7 +509,7 @@ def _detect_corrections(glucose: np.ndarray, bolus: np.ndarray,
             exp_type=NaturalExperimentType.CORRECTION,
             start_idx=bi, end_idx=obs_end,
             duration_minutes=(obs_end - bi) * STEP_MINUTES,
-            hour_of_day=_hour_from_timestamps(timestamps, bi),
+            hour_of_day=_hour_at(hours, bi),
             quality=round(quality, 3),
             measurements=measurements,
         ))
@@ -522,7 +519,7 @@ def _detect_corrections(glucose: np.ndarray, bolus: np.ndarray,
 def _detect_uam(glucose: np.ndarray, carbs: np.ndarray,
                 bolus: np.ndarray,
                 net_flux: np.ndarray,
-                timestamps: np.ndarray,
+                hours: np.ndarray,
                 profile_isf: float = 50.0,
                 profile_cr: float = 10.0) -> List[NaturalExperiment]:
     """Detect unannounced meal (UAM) windows from physics residuals.
@@ -564,7 +561,7 @@ def _detect_uam(glucose: np.ndarray, carbs: np.ndarray,
         mean_res = float(np.mean(seg_res))
         bg_rise = float(np.nanmax(seg_bg) - np.nanmin(seg_bg)) if np.any(~np.isnan(seg_bg)) else 0
 
-        hour = _hour_from_timestamps(timestamps, start)
+        hour = _hour_at(hours, start)
         if 4 <= hour < 8 and mean_res < 3.0:
             subtype = 'hepatic'
         elif peak_res > 5.0 and duration < 30:
@@ -624,8 +621,7 @@ def _detect_uam(glucose: np.ndarray, carbs: np.ndarray,
 
 
 def _detect_dawn(glucose: np.ndarray, carbs: np.ndarray,
-                 bolus: np.ndarray, hours: np.ndarray,
-                 timestamps: np.ndarray) -> List[NaturalExperiment]:
+                 bolus: np.ndarray, hours: np.ndarray) -> List[NaturalExperiment]:
     """Detect dawn phenomenon windows (4–8 AM glucose acceleration)."""
     N = len(glucose)
     experiments = []
@@ -666,7 +662,7 @@ def _detect_dawn(glucose: np.ndarray, carbs: np.ndarray,
             exp_type=NaturalExperimentType.DAWN,
             start_idx=start, end_idx=end,
             duration_minutes=(end - start) * STEP_MINUTES,
-            hour_of_day=_hour_from_timestamps(timestamps, start),
+            hour_of_day=_hour_at(hours, start),
             quality=round(quality, 3),
             measurements={
                 'is_fasting': is_fasting,
@@ -682,7 +678,7 @@ def _detect_dawn(glucose: np.ndarray, carbs: np.ndarray,
 
 def _detect_exercise(glucose: np.ndarray, bolus: np.ndarray,
                      net_flux: np.ndarray,
-                     timestamps: np.ndarray) -> List[NaturalExperiment]:
+                     hours: np.ndarray) -> List[NaturalExperiment]:
     """Detect exercise windows from sustained BG drops without bolus."""
     N = min(len(glucose), len(net_flux))
     experiments = []
@@ -720,7 +716,7 @@ def _detect_exercise(glucose: np.ndarray, bolus: np.ndarray,
             exp_type=NaturalExperimentType.EXERCISE,
             start_idx=start, end_idx=end,
             duration_minutes=duration,
-            hour_of_day=_hour_from_timestamps(timestamps, start),
+            hour_of_day=_hour_at(hours, start),
             quality=round(quality, 3),
             measurements={
                 'mean_residual': round(mean_res, 2),
@@ -732,7 +728,7 @@ def _detect_exercise(glucose: np.ndarray, bolus: np.ndarray,
 
 
 def _detect_aid_response(glucose: np.ndarray, basal_rate: np.ndarray,
-                         timestamps: np.ndarray,
+                         hours: np.ndarray,
                          profile_basal: float) -> List[NaturalExperiment]:
     """Detect AID algorithm response windows from temp basal deviations."""
     N = len(glucose)
@@ -758,7 +754,7 @@ def _detect_aid_response(glucose: np.ndarray, basal_rate: np.ndarray,
                 exp_type=NaturalExperimentType.AID_RESPONSE,
                 start_idx=start, end_idx=end,
                 duration_minutes=duration,
-                hour_of_day=_hour_from_timestamps(timestamps, start),
+                hour_of_day=_hour_at(hours, start),
                 quality=round(quality, 3),
                 measurements={
                     'subtype': subtype,
@@ -774,7 +770,7 @@ def _detect_aid_response(glucose: np.ndarray, basal_rate: np.ndarray,
 
 def _detect_stable(glucose: np.ndarray, bolus: np.ndarray,
                    carbs: np.ndarray,
-                   timestamps: np.ndarray) -> List[NaturalExperiment]:
+                   hours: np.ndarray) -> List[NaturalExperiment]:
     """Detect stable/flat glucose reference windows."""
     N = len(glucose)
     experiments = []
@@ -804,7 +800,7 @@ def _detect_stable(glucose: np.ndarray, bolus: np.ndarray,
             exp_type=NaturalExperimentType.STABLE,
             start_idx=start, end_idx=end,
             duration_minutes=STABLE_MIN_STEPS * STEP_MINUTES,
-            hour_of_day=_hour_from_timestamps(timestamps, start),
+            hour_of_day=_hour_at(hours, start),
             quality=round(quality, 3),
             measurements={
                 'mean_bg': round(mean_bg, 1),
@@ -837,7 +833,6 @@ def detect_natural_experiments(
         NaturalExperimentCensus with all detected experiments.
     """
     glucose = patient.glucose
-    timestamps = patient.timestamps
     N = len(glucose)
 
     bolus = patient.bolus if patient.bolus is not None else np.zeros(N)
@@ -848,7 +843,8 @@ def detect_natural_experiments(
     bolus = np.nan_to_num(bolus.astype(np.float64), nan=0.0)
     carbs = np.nan_to_num(carbs.astype(np.float64), nan=0.0)
 
-    hours = ((timestamps / 1000.0) % 86400) / 3600.0
+    # Local clock hours, shared with every other circadian stage
+    hours = patient.time_index().hours
     mc = meal_config or MealConfig()
 
     experiments: List[NaturalExperiment] = []
@@ -876,32 +872,32 @@ def detect_natural_experiments(
                 break
 
     # BG-only detectors (always available)
-    experiments.extend(_detect_fasting(glucose, bolus, carbs, timestamps))
-    experiments.extend(_detect_overnight(glucose, bolus, carbs, hours, timestamps))
-    experiments.extend(_detect_meals(glucose, bolus, carbs, timestamps, mc,
+    experiments.extend(_detect_fasting(glucose, bolus, carbs, hours))
+    experiments.extend(_detect_overnight(glucose, bolus, carbs, hours))
+    experiments.extend(_detect_meals(glucose, bolus, carbs, hours, mc,
                                      residuals=meal_residuals,
                                      profile_isf=meal_isf,
                                      profile_cr=meal_cr))
-    experiments.extend(_detect_corrections(glucose, bolus, carbs, timestamps))
-    experiments.extend(_detect_stable(glucose, bolus, carbs, timestamps))
+    experiments.extend(_detect_corrections(glucose, bolus, carbs, hours))
+    experiments.extend(_detect_stable(glucose, bolus, carbs, hours))
 
     # Dawn detection (needs only hours)
-    experiments.extend(_detect_dawn(glucose, carbs, bolus, hours, timestamps))
+    experiments.extend(_detect_dawn(glucose, carbs, bolus, hours))
 
     # Physics-based detectors (need metabolic state)
     if metabolic is not None:
         net_flux = metabolic.net_flux if hasattr(metabolic, 'net_flux') else None
         if net_flux is not None and len(net_flux) > 0:
             experiments.extend(_detect_uam(glucose, carbs, bolus, net_flux,
-                                          timestamps,
+                                          hours,
                                           profile_isf=meal_isf,
                                           profile_cr=meal_cr))
-            experiments.extend(_detect_exercise(glucose, bolus, net_flux, timestamps))
+            experiments.extend(_detect_exercise(glucose, bolus, net_flux, hours))
 
     # AID response (needs basal_rate)
     if basal_rate is not None:
         profile_basal = patient.profile.basal_schedule[0].get('value', 0.8) if patient.profile else 0.8
-        experiments.extend(_detect_aid_response(glucose, basal_rate, timestamps, profile_basal))
+        experiments.extend(_detect_aid_response(glucose, basal_rate, hours, profile_basal))
 
     # Build census
     by_type = {}
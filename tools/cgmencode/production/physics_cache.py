@@ -0,0 +1,342 @@
+"""
+physics_cache.py — Content-addressed on-disk cache for physics intermediates.
+
+``compute_metabolic_state`` (~100 ms/patient), ``_extract_hours`` and
+``clean_glucose`` are pure functions of the patient arrays, the profile
+schedules and the physics code. Report generators, trajectory builders,
+benchmarks and every ``run_pipeline`` call recompute them for data that
+has not changed. This module keys their outputs by a BLAKE2b digest of
+exactly those inputs plus ``PHYSICS_VERSION`` and persists them under
+one directory:
+
+    <cache_dir>/metabolic/<key>.npy   (6, N) float64: supply, demand,
+                                      hepatic, carb_supply, net_flux,
+                                      residual
+    <cache_dir>/hours/<key>.npy       (N,) float64
+    <cache_dir>/cleaned/<key>.npz     CleanedData arrays + scalars
+
+``.npy`` blobs are opened with ``mmap_mode='c'`` (copy-on-write): pages
+load lazily, and callers that modify a returned array never write
+through to the cache. Writes are atomic (temp file + ``os.replace``), so
+concurrent readers, threads and worker processes can share a directory.
+Total size is capped; least-recently-used blobs (by mtime, refreshed on
+every hit) are evicted after each write.
+
+The cache is opt-in. Pass a ``PhysicsCache`` to ``run_pipeline`` or the
+``cached_*`` helpers, or set ``CGM_PHYSICS_CACHE_DIR`` (and optionally
+``CGM_PHYSICS_CACHE_MAX_MB``) so every entry point that goes through
+``default_physics_cache()`` shares one store.
+
+Usage:
+    from tools.cgmencode.production.physics_cache import PhysicsCache
+    cache = PhysicsCache('/tmp/physics', max_bytes=2 << 30)
+    metabolic = cache.metabolic_state(patient)   # computed once, then hit
+    result = run_pipeline(patient, physics_cache=cache)
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+
+from .data_quality import DEFAULT_SIGMA, clean_glucose
+from .metabolic_engine import _extract_hours, compute_metabolic_state
+from .types import CleanedData, MetabolicState, PatientData
+
+logger = logging.getLogger(__name__)
+
+# Bump when compute_metabolic_state, _extract_hours or clean_glucose
+# change numerically; old entries then miss and age out via LRU.
+PHYSICS_VERSION = "1"
+
+DEFAULT_MAX_BYTES = 1 << 30   # 1 GiB
+ENV_CACHE_DIR = 'CGM_PHYSICS_CACHE_DIR'
+ENV_CACHE_MAX_MB = 'CGM_PHYSICS_CACHE_MAX_MB'
+
+_METABOLIC_FIELDS = ('supply', 'demand', 'hepatic', 'carb_supply',
+                     'net_flux', 'residual')
+
+
+# ── Keys ──────────────────────────────────────────────────────────────
+
+def _update_array(h, arr: Optional[np.ndarray]) -> None:
+    if arr is None:
+        h.update(b'<none>')
+        return
+    a = np.asarray(arr)
+    if a.dtype == object:
+        a = a.astype(np.float64)
+    a = np.ascontiguousarray(a)
+    h.update(f'{a.dtype.str}{a.shape}'.encode())
+    h.update(memoryview(a).cast('B'))
+
+
+def physics_key(kind: str, *arrays: Optional[np.ndarray], **params) -> str:
+    """Digest of ``kind``, arrays (dtype, shape, bytes), params and version."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f'{kind}|{PHYSICS_VERSION}|'.encode())
+    for a in arrays:
+        _update_array(h, a)
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _profile_params(patient: PatientData) -> dict:
+    return dataclasses.asdict(patient.profile)
+
+
+# ── Cache ─────────────────────────────────────────────────────────────
+
+class PhysicsCache:
+    """Size-capped LRU store of physics outputs under ``cache_dir``.
+
+    Args:
+        cache_dir: root directory (created on first write).
+        max_bytes: total size cap across all kinds.
+        mmap: open ``.npy`` hits copy-on-write memory-mapped (default)
+            instead of reading them fully into memory.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path],
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 mmap: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    # ── Public API ────────────────────────────────────────────────
+
+    def metabolic_state(self, patient: PatientData) -> MetabolicState:
+        """Cached ``compute_metabolic_state(patient)``."""
+        key = physics_key(
+            'metabolic', patient.glucose, patient.timestamps, patient.iob,
+            patient.cob, patient.bolus, patient.carbs, patient.basal_rate,
+            profile=_profile_params(patient))
+        stacked = self._get_npy('metabolic', key)
+        if stacked is not None:
+            return MetabolicState(**dict(zip(_METABOLIC_FIELDS, stacked)))
+        state = compute_metabolic_state(patient)
+        self._put_npy('metabolic', key, np.stack(
+            [np.asarray(getattr(state, f), dtype=np.float64) for f in _METABOLIC_FIELDS]))
+        return state
+
+    def hours(self, timestamps: np.ndarray, tz: str = 'UTC') -> np.ndarray:
+        """Cached ``_extract_hours(timestamps, tz)``."""
+        key = physics_key('hours', timestamps, tz=tz)
+        hours = self._get_npy('hours', key)
+        if hours is not None:
+            return hours
+        hours = _extract_hours(timestamps, tz=tz)
+        self._put_npy('hours', key, np.asarray(hours, dtype=np.float64))
+        return hours
+
+    def cleaned(self, glucose: np.ndarray,
+                sigma_mult: float = DEFAULT_SIGMA,
+                *,
+                bolus: Optional[np.ndarray] = None,
+                carbs: Optional[np.ndarray] = None,
+                detect_artifacts: bool = True) -> CleanedData:
+        """Cached ``clean_glucose(...)`` (same signature)."""
+        key = physics_key('cleaned', glucose, bolus, carbs,
+                          sigma_mult=float(sigma_mult),
+                          detect_artifacts=bool(detect_artifacts))
+        hit = self._get_cleaned(key)
+        if hit is not None:
+            return hit
+        cleaned = clean_glucose(glucose, sigma_mult, bolus=bolus, carbs=carbs,
+                                detect_artifacts=detect_artifacts)
+        self._put_cleaned(key, cleaned)
+        return cleaned
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current on-disk size."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'bytes': sum(size for _, size, _ in self._entries())}
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+
+    # ── Storage ───────────────────────────────────────────────────
+
+    def _path(self, kind: str, key: str, ext: str) -> Path:
+        return self.cache_dir / kind / f'{key}{ext}'
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _touch(self, path: Path) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _get_npy(self, kind: str, key: str) -> Optional[np.ndarray]:
+        path = self._path(kind, key, '.npy')
+        try:
+            arr = np.load(path, mmap_mode='c' if self.mmap else None)
+        except (FileNotFoundError, ValueError, OSError):
+            # Missing, evicted mid-read, or truncated by a crashed writer
+            self._count(False)
+            return None
+        self._touch(path)
+        self._count(True)
+        return np.asarray(arr)   # plain ndarray view; the mapping stays alive
+
+    def _put_npy(self, kind: str, key: str, arr: np.ndarray) -> None:
+        self._write(self._path(kind, key, '.npy'),
+                    lambda f: np.save(f, arr, allow_pickle=False))
+
+    def _get_cleaned(self, key: str) -> Optional[CleanedData]:
+        path = self._path('cleaned', key, '.npz')
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                comp = z['compression_low_indices'] if z['has_compression'] else None
+                gain = float(z['cleaning_r2_gain'])
+                cleaned = CleanedData(
+                    glucose=z['glucose'],
+                    original_glucose=z['original_glucose'],
+                    spike_indices=z['spike_indices'],
+                    n_spikes=int(z['n_spikes']),
+                    sigma_threshold=float(z['sigma_threshold']),
+                    cleaning_r2_gain=None if np.isnan(gain) else gain,
+                    compression_low_indices=comp,
+                    n_compression_lows=int(z['n_compression_lows']),
+                )
+        except (FileNotFoundError, ValueError, OSError, KeyError):
+            self._count(False)
+            return None
+        self._touch(path)
+        self._count(True)
+        return cleaned
+
+    def _put_cleaned(self, key: str, c: CleanedData) -> None:
+        arrays = dict(
+            glucose=c.glucose,
+            original_glucose=c.original_glucose,
+            spike_indices=c.spike_indices,
+            n_spikes=c.n_spikes,
+            sigma_threshold=c.sigma_threshold,
+            cleaning_r2_gain=np.nan if c.cleaning_r2_gain is None else c.cleaning_r2_gain,
+            has_compression=c.compression_low_indices is not None,
+            compression_low_indices=(c.compression_low_indices
+                                     if c.compression_low_indices is not None
+                                     else np.zeros(0, dtype=np.int64)),
+            n_compression_lows=c.n_compression_lows,
+        )
+        self._write(self._path('cleaned', key, '.npz'),
+                    lambda f: np.savez(f, **arrays))
+
+    def _write(self, path: Path, dump: Callable) -> None:
+        """Atomic write, then enforce the size cap. Failures only log."""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    dump(f)
+                os.replace(tmp, path)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+        except OSError as e:
+            logger.warning("Physics cache write failed (%s): %s", path, e)
+            return
+        self._evict()
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        out = []
+        for path in self.cache_dir.glob('*/*.np[yz]'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def _evict(self) -> int:
+        """Drop least-recently-used blobs until under ``max_bytes``."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+# ── Process-wide default ──────────────────────────────────────────────
+
+_DEFAULT: Optional[PhysicsCache] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def configure_physics_cache(cache_dir: Optional[Union[str, Path]],
+                            max_bytes: int = DEFAULT_MAX_BYTES) -> Optional[PhysicsCache]:
+    """Set (or clear, with None) the process-wide default cache."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        _DEFAULT = PhysicsCache(cache_dir, max_bytes) if cache_dir else None
+        return _DEFAULT
+
+
+def default_physics_cache() -> Optional[PhysicsCache]:
+    """The configured default cache, else one from $CGM_PHYSICS_CACHE_DIR, else None."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        env_dir = os.environ.get(ENV_CACHE_DIR)
+        if _DEFAULT is None and env_dir:
+            mb = os.environ.get(ENV_CACHE_MAX_MB)
+            _DEFAULT = PhysicsCache(
+                env_dir, int(float(mb) * (1 << 20)) if mb else DEFAULT_MAX_BYTES)
+        return _DEFAULT
+
+
+def cached_metabolic_state(patient: PatientData,
+                           cache: Optional[PhysicsCache] = None) -> MetabolicState:
+    """``compute_metabolic_state`` through ``cache`` (or the default, if any)."""
+    cache = cache or default_physics_cache()
+    if cache is None:
+        return compute_metabolic_state(patient)
+    return cache.metabolic_state(patient)
+
+
+def cached_hours(timestamps: np.ndarray, tz: str = 'UTC',
+                 cache: Optional[PhysicsCache] = None) -> np.ndarray:
+    """``_extract_hours`` through ``cache`` (or the default, if any)."""
+    cache = cache or default_physics_cache()
+    if cache is None:
+        return _extract_hours(timestamps, tz=tz)
+    return cache.hours(timestamps, tz=tz)
+
+
+def cached_clean_glucose(glucose: np.ndarray, *,
+                         bolus: Optional[np.ndarray] = None,
+                         carbs: Optional[np.ndarray] = None,
+                         cache: Optional[PhysicsCache] = None) -> CleanedData:
+    """``clean_glucose`` through ``cache`` (or the default, if any)."""
+    cache = cache or default_physics_cache()
+    if cache is None:
+        return clean_glucose(glucose, bolus=bolus, carbs=carbs)
+    return cache.cleaned(glucose, bolus=bolus, carbs=carbs)
@@ -19,6 +19,7 @@ import time
 from typing import Iterable, List, Optional
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +28,10 @@ from .types import (
     ControllerType, TIR_LOW, TIR_HIGH,
 )
 from .data_quality import clean_glucose
-from .meal_filter import is_real_meal, is_real_carb_event, TREAT_OF_LOW_GLUCOSE_FLOOR_MGDL
-from .metabolic_engine import compute_metabolic_state, _extract_hours, estimate_dia_discrepancy, decompose_two_component_dia
+from .meal_filter import (
+    REAL_CARB_EVENT_THRESHOLD_G, REAL_MEAL_FLOOR_G, TREAT_OF_LOW_GLUCOSE_FLOOR_MGDL,
+)
+from .metabolic_engine import compute_metabolic_state, estimate_dia_discrepancy, decompose_two_component_dia
 from .event_detector import classify_risk_simple
 from .hypo_predictor import predict_hypo, calibrate_threshold
 from .clinical_rules import generate_clinical_report
@@ -51,6 +54,47 @@ from .clinical_rules import (
 )
 from .natural_experiment_detector import detect_natural_experiments
 from .settings_optimizer import optimize_settings
+from .instrumentation import StageRecorder, emit_stage_metrics
+from .stage_graph import StageGraph, StageNode
+from .physics_cache import PhysicsCache, default_physics_cache
+
+
+_CORRECTION_CARB_HALF_WINDOW = 12   # ±1 h carb guard around a correction
+_EVENT_HORIZON = 48                 # 4 h post-event window
+_MEAL_BOLUS_HALF_WINDOW = 2         # ±10 min bolus match for a meal
+
+
+def _prior_glucose_min_array(glucose: np.ndarray,
+                             n_steps: int = 6) -> np.ndarray:
+    """``_prior_glucose_min`` at every index at once.
+
+    Returns (N,) minima of ``glucose[i - n_steps:i]``; ``inf`` where the
+    scalar helper returns None (empty or all-NaN window), so a
+    ``>= floor`` test passes exactly when ``_passes_treat_of_low`` does.
+    """
+    g = np.where(np.isnan(glucose), np.inf, glucose.astype(np.float64))
+    padded = np.concatenate([np.full(n_steps, np.inf), g])
+    return sliding_window_view(padded, n_steps)[:len(glucose)].min(axis=1)
+
+
+def _hours_at(hours: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """``hours[i]`` for each index, 0.0 past the end of ``hours``."""
+    out = np.zeros(len(idx))
+    inside = idx < len(hours)
+    out[inside] = np.asarray(hours, dtype=np.float64)[idx[inside]]
+    return out
+
+
+def _tir_fraction_rows(windows: np.ndarray) -> np.ndarray:
+    """Per-row fraction of valid readings in 70–180 (0.0 if none valid)."""
+    valid = ~np.isnan(windows)
+    n_valid = valid.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        in_range = valid & (windows >= TIR_LOW) & (windows <= TIR_HIGH)
+    frac = np.zeros(len(windows))
+    has = n_valid > 0
+    frac[has] = in_range.sum(axis=1)[has] / n_valid[has]
+    return frac
 
 
 def _extract_correction_events(
@@ -74,122 +118,97 @@ def _extract_correction_events(
     excluded. Mitigates the under-logger bias documented in EXP-2739:
     post-meal corrections were being mis-classified as fasting corrections,
     deflating ISF estimates by 20–45 % on heavy under-loggers.
+
+    Vectorized: candidate masks are built for every index at once, the
+    ±1 h carb guard is a windowed sum over per-index carb totals, and the
+    4 h window statistics are computed on one (E, 49) gather.
     """
     if bolus is None or len(glucose) < 49:
         return []
 
+    glucose = np.asarray(glucose, dtype=np.float64)
+    bolus = np.asarray(bolus, dtype=np.float64)
     N = len(glucose)
+    H = _EVENT_HORIZON
+    W = _CORRECTION_CARB_HALF_WINDOW
     target_high = getattr(profile, 'target_high', 180.0)
-    events: List[dict] = []
 
-    inferred_meal_idx_carbs: List[tuple] = []
+    # ── Candidate mask: dose, above target, complete 4 h window ───
+    end_bg = np.full(N, np.nan)
+    end_bg[:N - H] = glucose[H:]
+    with np.errstate(invalid='ignore'):
+        cand = (bolus > 0.1) & (glucose > target_high) & ~np.isnan(end_bg)
+    n_valid = sliding_window_view(~np.isnan(glucose), H + 1).sum(axis=1)
+    cand[:N - H] &= n_valid >= 6
+    idx = np.flatnonzero(cand)
+
+    # ── ±1 h carb guard: logged real carbs + inferred meals ───────
+    # Treats-of-low (small carbs taken at low BG) don't count as carbs,
+    # so they don't suppress legitimate correction events. Inferred
+    # meals (EXP-2739 under-loggers) are bucketed by index, which acts
+    # as an interval index over the ±1 h windows.
+    carb_at = np.zeros(N)
+    if carbs is not None:
+        c = np.asarray(carbs, dtype=np.float64)
+        prior_min = _prior_glucose_min_array(glucose, n_steps=6)
+        with np.errstate(invalid='ignore'):
+            real = ((c >= REAL_CARB_EVENT_THRESHOLD_G)
+                    & (prior_min >= TREAT_OF_LOW_GLUCOSE_FLOOR_MGDL))
+        carb_at[real] = c[real]
     if inferred_meals:
         for m in inferred_meals:
             try:
-                idx = int(getattr(m, 'index'))
+                im_idx = int(getattr(m, 'index'))
                 cg = float(getattr(m, 'estimated_carbs_g', 0.0))
             except (TypeError, ValueError, AttributeError):
                 continue
-            if cg >= inferred_meal_min_carbs_g and 0 <= idx < N:
-                inferred_meal_idx_carbs.append((idx, cg))
-
-    for i in range(N):
-        if np.isnan(bolus[i]) or bolus[i] <= 0.1:
-            continue
-
-        # Skip if glucose at bolus time is missing or below target
-        if np.isnan(glucose[i]) or glucose[i] <= target_high:
-            continue
-
-        # Skip if significant carbs within ±12 steps (1 hour)
-        carb_window_lo = max(0, i - 12)
-        carb_window_hi = min(N, i + 13)
-        # Skip if significant carbs within ±12 steps (1 hour). Treats-of-low
-        # (small carbs taken at low BG) are excluded from this guard so they
-        # don't suppress legitimate correction events.
-        real_carbs = 0.0
-        if carbs is not None:
-            carb_lo, carb_hi = carb_window_lo, carb_window_hi
-            for j in range(carb_lo, carb_hi):
-                cj = carbs[j]
-                if np.isnan(cj) or cj <= 0:
-                    continue
-                prior_min_j = _prior_glucose_min(glucose, j, n_steps=6)
-                if is_real_carb_event(float(cj),
-                                      prior_glucose_30min_min=prior_min_j):
-                    real_carbs += float(cj)
-
-        # Inferred meals (under-logger correction): treat as additional
-        # ±1 h carb window. EXP-2739: under-loggers had post-meal boluses
-        # mis-classified as fasting corrections, deflating ISF.
-        if inferred_meal_idx_carbs:
-            for (im_idx, im_cg) in inferred_meal_idx_carbs:
-                if carb_window_lo <= im_idx < carb_window_hi:
-                    real_carbs += im_cg
-
-        if real_carbs > 5.0:
-            continue
-
-        # Need 48 steps (4h) of future glucose
-        end_idx = i + 48
-        if end_idx >= N:
-            continue
-
-        start_bg = float(glucose[i])
-        end_bg = float(glucose[end_idx])
-        if np.isnan(end_bg):
-            continue
-
-        window = glucose[i:end_idx + 1]
-        valid_mask = ~np.isnan(window)
-        if valid_mask.sum() < 6:
-            continue
-
-        drop = start_bg - end_bg
-
-        # Check if glucose went below 70 in the window
-        went_below_70 = bool(np.nanmin(window) < TIR_LOW)
-
-        # Rebound detection: find nadir, check if BG rose >30 above nadir after it
-        nadir_val = float(np.nanmin(window))
-        nadir_pos = int(np.nanargmin(np.where(valid_mask, window, np.inf)))
-        rebound = False
-        rebound_magnitude = 0.0
-        if nadir_pos < len(window) - 1:
-            post_nadir = window[nadir_pos + 1:]
-            post_valid = post_nadir[~np.isnan(post_nadir)]
-            if len(post_valid) > 0:
-                peak_after_nadir = float(np.max(post_valid))
-                rebound_magnitude = peak_after_nadir - nadir_val
-                rebound = rebound_magnitude > 30.0
-
-        # TIR change: fraction of readings 70-180 in 48 steps pre vs post
-        pre_start = max(0, i - 48)
-        pre_window = glucose[pre_start:i]
-        post_window = glucose[i:end_idx + 1]
-
-        def _tir_frac(arr: np.ndarray) -> float:
-            v = arr[~np.isnan(arr)]
-            if len(v) == 0:
-                return 0.0
-            return float(np.mean((v >= TIR_LOW) & (v <= TIR_HIGH)))
-
-        tir_change = _tir_frac(post_window) - _tir_frac(pre_window)
-
-        hour = float(hours[i]) if i < len(hours) else 0.0
-
-        events.append({
-            'start_bg': start_bg,
-            'drop_4h': drop,
-            'dose': float(bolus[i]),
-            'hour': hour,
-            'tir_change': tir_change,
-            'rebound': rebound,
-            'rebound_magnitude': rebound_magnitude,
-            'went_below_70': went_below_70,
-        })
-
-    return events
+            if cg >= inferred_meal_min_carbs_g and 0 <= im_idx < N:
+                carb_at[im_idx] += cg
+    if len(idx) and carb_at.any():
+        padded = np.concatenate([np.zeros(W), carb_at, np.zeros(W)])
+        real_carbs = sliding_window_view(padded, 2 * W + 1)[idx].sum(axis=1)
+        idx = idx[real_carbs <= 5.0]
+    if len(idx) == 0:
+        return []
+
+    # ── Batched 4 h window statistics ─────────────────────────────
+    win = sliding_window_view(glucose, H + 1)[idx]        # (E, 49)
+    valid = ~np.isnan(win)
+    rows = np.arange(len(idx))
+    low_first = np.where(valid, win, np.inf)
+    nadir_pos = np.argmin(low_first, axis=1)
+    nadir_val = low_first[rows, nadir_pos]
+    went_below_70 = nadir_val < TIR_LOW
+
+    # Rebound: peak strictly after the nadir rose >30 above it
+    after = np.arange(H + 1)[None, :] > nadir_pos[:, None]
+    peak_after = np.where(valid & after, win, -np.inf).max(axis=1)
+    has_post = np.isfinite(peak_after)
+    rebound_magnitude = np.where(has_post, peak_after - nadir_val, 0.0)
+    rebound = rebound_magnitude > 30.0
+
+    # TIR change: fraction of readings 70-180 in 48 steps pre vs post
+    pre = sliding_window_view(np.concatenate([np.full(H, np.nan), glucose]), H)[idx]
+    tir_change = _tir_fraction_rows(win) - _tir_fraction_rows(pre)
+
+    start_bg = glucose[idx]
+    drop = start_bg - end_bg[idx]
+    hour = _hours_at(hours, idx)
+    dose = bolus[idx]
+
+    return [
+        {
+            'start_bg': float(start_bg[k]),
+            'drop_4h': float(drop[k]),
+            'dose': float(dose[k]),
+            'hour': float(hour[k]),
+            'tir_change': float(tir_change[k]),
+            'rebound': bool(rebound[k]),
+            'rebound_magnitude': float(rebound_magnitude[k]),
+            'went_below_70': bool(went_below_70[k]),
+        }
+        for k in range(len(idx))
+    ]
 
 
 def _prior_glucose_min(glucose: np.ndarray, i: int,
@@ -226,48 +245,42 @@ def _extract_meal_events(
     if carbs is None or len(glucose) < 49:
         return []
 
+    glucose = np.asarray(glucose, dtype=np.float64)
+    c = np.asarray(carbs, dtype=np.float64)
     N = len(glucose)
-    events: List[dict] = []
-
-    for i in range(N):
-        if np.isnan(carbs[i]):
-            continue
-        prior_min = _prior_glucose_min(glucose, i, n_steps=6)
-        if not is_real_meal(float(carbs[i]),
-                            prior_glucose_30min_min=prior_min):
-            continue
-
-        # Sum bolus within ±2 steps
-        b_lo = max(0, i - 2)
-        b_hi = min(N, i + 3)
-        if bolus is not None:
-            bolus_sum = float(np.nansum(bolus[b_lo:b_hi]))
-        else:
-            bolus_sum = 0.0
-
-        pre_meal_bg = float(glucose[i]) if not np.isnan(glucose[i]) else np.nan
-        if np.isnan(pre_meal_bg):
-            continue
-
-        # 4-hour post-meal glucose
-        post_idx = i + 48
-        if post_idx >= N:
-            continue
-        post_meal_bg = float(glucose[post_idx])
-        if np.isnan(post_meal_bg):
-            continue
-
-        hour = float(hours[i]) if i < len(hours) else 0.0
-
-        events.append({
-            'carbs': float(carbs[i]),
-            'bolus': bolus_sum,
-            'pre_meal_bg': pre_meal_bg,
-            'post_meal_bg_4h': post_meal_bg,
-            'hour': hour,
-        })
+    H = _EVENT_HORIZON
+    B = _MEAL_BOLUS_HALF_WINDOW
+
+    post_bg = np.full(N, np.nan)
+    post_bg[:N - H] = glucose[H:]
+    prior_min = _prior_glucose_min_array(glucose, n_steps=6)
+    with np.errstate(invalid='ignore'):
+        meal = ((c >= REAL_MEAL_FLOOR_G)
+                & (prior_min >= TREAT_OF_LOW_GLUCOSE_FLOOR_MGDL)
+                & ~np.isnan(glucose) & ~np.isnan(post_bg))
+    idx = np.flatnonzero(meal)
+    if len(idx) == 0:
+        return []
 
-    return events
+    # Sum bolus within ±2 steps, accumulated left to right like nansum
+    bolus_sum = np.zeros(len(idx))
+    if bolus is not None:
+        b = np.nan_to_num(np.asarray(bolus, dtype=np.float64), nan=0.0)
+        padded = np.concatenate([np.zeros(B), b, np.zeros(B)])
+        for col in sliding_window_view(padded, 2 * B + 1)[idx].T:
+            bolus_sum += col
+    hour = _hours_at(hours, idx)
+
+    return [
+        {
+            'carbs': float(c[i]),
+            'bolus': float(bolus_sum[k]),
+            'pre_meal_bg': float(glucose[i]),
+            'post_meal_bg_4h': float(post_bg[i]),
+            'hour': float(hour[k]),
+        }
+        for k, i in enumerate(idx)
+    ]
 
 
 def run_pipeline(patient: PatientData,
@@ -276,6 +289,10 @@ def run_pipeline(patient: PatientData,
                  current_hour: Optional[float] = None,
                  forecast_config: Optional[dict] = None,
                  tz_offset_hours: Optional[float] = None,
+                 trace_memory: bool = False,
+                 outputs: Optional[Iterable[str]] = None,
+                 stage_threads: int = 1,
+                 physics_cache: Optional[PhysicsCache] = None,
                  ) -> PipelineResult:
     """Run complete inference pipeline on a single patient.
 
@@ -291,539 +308,915 @@ def run_pipeline(patient: PatientData,
             Keys: patient_id (str), window (str, default 'w48'),
             models_dir (str), device (str, default 'cpu'),
             isf (float, optional).
+        trace_memory: record per-stage peak allocation with tracemalloc
+            (adds overhead; off by default). Wall/CPU time are always
+            recorded in ``PipelineResult.stage_metrics``.
+        outputs: PipelineResult fields to compute (e.g.
+            ``{'hypo_alert', 'risk'}``). Only the stages they transitively
+            depend on run (see ``PIPELINE_GRAPH``); other fields are None.
+            Default: everything. Unknown names raise ValueError.
+        stage_threads: >1 runs independent stages (patterns, forecast,
+            natural experiments, phenotyping, loop quality, ...) on a
+            thread pool of this size. Results, warnings and metric order
+            are identical to the sequential run; per-stage peak memory
+            is approximate because tracemalloc is process-wide.
+        physics_cache: reuse cleaned glucose, hours and MetabolicState
+            for unchanged inputs (see physics_cache.py). Defaults to the
+            process-wide cache ($CGM_PHYSICS_CACHE_DIR), if configured.
 
     Returns:
         PipelineResult with all available inference outputs.
     """
-    start = time.perf_counter()
-    warnings: List[str] = []
-
-    # ── Resolve effective timezone ─────────────────────────────────
-    # Profile-derived IANA name is the canonical source of truth.
-    # tz_offset_hours kwarg is deprecated; if provided, it is converted
-    # to a Etc/GMT-style fixed-offset string for backward compatibility.
-    profile_tz = getattr(patient.profile, "timezone", "UTC") or "UTC"
-    if tz_offset_hours is not None and float(tz_offset_hours) != 0.0:
-        import warnings as _w
-        _w.warn(
-            "run_pipeline(tz_offset_hours=...) is deprecated. "
-            "Set PatientProfile.timezone to an IANA name "
-            "(e.g. 'America/Los_Angeles') instead.",
-            DeprecationWarning, stacklevel=2,
+    recorder = StageRecorder(trace_memory=trace_memory)
+    try:
+        result = _run_pipeline_stages(
+            patient, recorder,
+            personal_params=personal_params,
+            skip_patterns=skip_patterns,
+            current_hour=current_hour,
+            forecast_config=forecast_config,
+            tz_offset_hours=tz_offset_hours,
+            outputs=outputs,
+            stage_threads=stage_threads,
+            physics_cache=physics_cache or default_physics_cache(),
+        )
+    finally:
+        recorder.close()
+    emit_stage_metrics(result.patient_id, result.stage_metrics,
+                       result.pipeline_latency_ms)
+    return result
+
+
+# ── Stage graph ───────────────────────────────────────────────────────
+# Each stage below is a StageGraph node: ``fn(ctx, **inputs) -> dict``
+# keyed by the node's declared outputs. Artifact names match the
+# PipelineResult fields they populate; intermediate artifacts
+# (hours, meals_detected, clinical_report_base, ...) stay internal.
+# Every node times itself on its own StageRecorder and appends to its
+# own warnings list; run_pipeline merges both in declaration order, so
+# threaded runs produce the same result as sequential ones.
+
+class _StageContext:
+    """Per-node view of the run: patient, options, recorder, warnings."""
+
+    __slots__ = ('patient', 'n', 'personal_params', 'skip_patterns',
+                 'current_hour', 'forecast_config', 'effective_tz',
+                 'physics_cache', 'rec', 'warnings')
+
+    def __init__(self, patient: PatientData, options: dict):
+        self.patient = patient
+        self.n = patient.n_samples
+        self.personal_params = options['personal_params']
+        self.skip_patterns = options['skip_patterns']
+        self.current_hour = options['current_hour']
+        self.forecast_config = options['forecast_config']
+        self.effective_tz = options['effective_tz']
+        self.physics_cache = options['physics_cache']
+        self.rec = StageRecorder()
+        self.warnings: List[str] = []
+
+
+# ── Stage 1: Data Quality (spike cleaning) ────────────────────────────
+def _stage_cleaning(ctx):
+    patient = ctx.patient
+    clean = ctx.physics_cache.cleaned if ctx.physics_cache else clean_glucose
+    with ctx.rec.stage('cleaning', ctx.n):
+        cleaned = clean(
+            patient.glucose,
+            bolus=getattr(patient, 'bolus', None),
+            carbs=getattr(patient, 'carbs', None),
         )
-        # Etc/GMT signs are inverted: Etc/GMT+7 means UTC-7.
-        sign = "-" if tz_offset_hours > 0 else "+"
-        effective_tz = f"Etc/GMT{sign}{abs(int(tz_offset_hours))}"
-    else:
-        # tz_offset_hours is None or 0.0 — use profile timezone.
-        effective_tz = profile_tz
-
-    # ── Stage 1: Data Quality (spike cleaning) ────────────────────
-    cleaned = clean_glucose(
-        patient.glucose,
-        bolus=getattr(patient, 'bolus', None),
-        carbs=getattr(patient, 'carbs', None),
-    )
     if cleaned.n_spikes > 0:
         pct = cleaned.spike_rate * 100
-        warnings.append(f"Cleaned {cleaned.n_spikes} spikes ({pct:.1f}% of readings)")
+        ctx.warnings.append(f"Cleaned {cleaned.n_spikes} spikes ({pct:.1f}% of readings)")
+    return {'cleaned': cleaned}
+
+
+# ── Stage 2: Onboarding (determine what models to use) ────────────────
+def _stage_onboarding(ctx):
+    with ctx.rec.stage('onboarding', ctx.n):
+        onboarding = get_onboarding_state(
+            ctx.patient.days_of_data,
+            personal_params=ctx.personal_params,
+        )
+    return {'onboarding': onboarding}
 
-    # ── Stage 2: Onboarding (determine what models to use) ────────
-    onboarding = get_onboarding_state(
-        patient.days_of_data,
-        personal_params=personal_params,
-    )
 
-    # ── Stage 3: Metabolic Engine (physics layer) ─────────────────
+# ── Stage 3: Metabolic Engine (physics layer) ─────────────────────────
+def _stage_metabolic_engine(ctx):
     metabolic = None
-    if patient.has_insulin_data:
-        try:
-            metabolic = compute_metabolic_state(patient)
-        except Exception as e:
-            warnings.append(f"Metabolic engine failed: {e}")
+    if ctx.patient.has_insulin_data:
+        with ctx.rec.stage('metabolic_engine', ctx.n) as st:
+            try:
+                if ctx.physics_cache is not None:
+                    metabolic = ctx.physics_cache.metabolic_state(ctx.patient)
+                else:
+                    metabolic = compute_metabolic_state(ctx.patient)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Metabolic engine failed: {e}")
     else:
-        warnings.append("No insulin data — metabolic analysis skipped")
+        ctx.rec.skip('metabolic_engine', ctx.n)
+        ctx.warnings.append("No insulin data — metabolic analysis skipped")
+    return {'metabolic': metabolic}
 
-    # ── Stage 4a: Event Detection / Risk Classification ───────────
+
+# ── Stage 4a: Event Detection / Risk Classification ───────────────────
+def _stage_risk(ctx, cleaned, metabolic):
     risk = None
-    try:
-        risk = classify_risk_simple(cleaned.glucose, metabolic)
-    except Exception as e:
-        warnings.append(f"Event detection failed: {e}")
+    with ctx.rec.stage('risk', ctx.n) as st:
+        try:
+            risk = classify_risk_simple(cleaned.glucose, metabolic)
+        except Exception as e:
+            st.fail(e)
+            ctx.warnings.append(f"Event detection failed: {e}")
+    return {'risk': risk}
+
 
-    # ── Stage 4b: Hypo Prediction ─────────────────────────────────
+# ── Stage 4b: Hypo Prediction ─────────────────────────────────────────
+def _stage_hypo_prediction(ctx, cleaned, metabolic):
     hypo_alert = None
-    try:
-        threshold = None
-        if patient.days_of_data >= 3.0:
-            threshold = calibrate_threshold(patient.glucose)
-        hypo_alert = predict_hypo(
-            cleaned.glucose,
-            metabolic=metabolic,
-            personal_threshold=threshold,
-        )
-    except Exception as e:
-        warnings.append(f"Hypo prediction failed: {e}")
-
-    # ── Stage 4c-pre: Meal detection (hoisted from Stage 5) ───────
-    # Needed early so the clinical-report basal assessment can exclude
-    # post-meal windows. Full meal_history / responses / timing happen
-    # later in Stage 5.
-    hours = _extract_hours(patient.timestamps, tz=effective_tz)
-    meals_for_basal: list = []
-    meal_indices_for_basal = None
-    if metabolic is not None:
+    with ctx.rec.stage('hypo_prediction', ctx.n) as st:
         try:
-            meals_for_basal = detect_meal_events(
-                cleaned.glucose, metabolic, hours,
-                patient.timestamps, patient.profile,
-                sizing_method="residual_plus_insulin")
-            annotate_meals_with_hybrid_support(
-                meals_for_basal,
-                glucose=cleaned.glucose,
+            threshold = None
+            if ctx.patient.days_of_data >= 3.0:
+                threshold = calibrate_threshold(ctx.patient.glucose)
+            hypo_alert = predict_hypo(
+                cleaned.glucose,
                 metabolic=metabolic,
-                bolus=patient.bolus,
-                iob=patient.iob,
-                basal_rate=patient.basal_rate,
+                personal_threshold=threshold,
             )
-            if meals_for_basal:
-                meal_indices_for_basal = np.array(
-                    [m.index for m in meals_for_basal], dtype=int
-                )
         except Exception as e:
-            warnings.append(f"Early meal detection (for basal) failed: {e}")
-
-    # ── Stage 4c: Clinical Report ─────────────────────────────────
-    clinical_report = generate_clinical_report(
-        glucose=cleaned.glucose,
-        metabolic=metabolic,
-        profile=patient.profile,
-        carbs=patient.carbs,
-        bolus=patient.bolus,
-        hours=hours,
-        iob=patient.iob,
-        cob=patient.cob,
-        inferred_meal_indices=meal_indices_for_basal,
-    )
+            st.fail(e)
+            ctx.warnings.append(f"Hypo prediction failed: {e}")
+    return {'hypo_alert': hypo_alert}
+
+
+def _stage_extract_hours(ctx):
+    with ctx.rec.stage('extract_hours', ctx.n):
+        if ctx.physics_cache is not None:
+            hours = ctx.physics_cache.hours(ctx.patient.timestamps, tz=ctx.effective_tz)
+        else:
+            hours = ctx.patient.time_index(ctx.effective_tz).hours
+    return {'hours': hours}
+
 
-    # ── Stage 4c′: Fidelity Assessment (EXP-1531–1538) ───────────
+# ── Stage 4c-pre: Meal detection (hoisted from Stage 5) ───────────────
+# Needed early so the clinical-report basal assessment can exclude
+# post-meal windows. Full meal_history / responses / timing happen
+# later in Stage 5.
+def _stage_meal_detection(ctx, cleaned, metabolic, hours):
+    patient = ctx.patient
+    meals_for_basal: list = []
+    meal_indices_for_basal = None
     if metabolic is not None:
-        try:
-            fidelity = compute_fidelity_grade(
-                metabolic=metabolic,
-                glucose=cleaned.glucose,
-                hours=hours,
-                days_of_data=patient.days_of_data,
-                ada_grade=clinical_report.grade,
-            )
-            clinical_report.fidelity = fidelity
-        except Exception as e:
-            warnings.append(f"Fidelity assessment failed: {e}")
+        with ctx.rec.stage('meal_detection', ctx.n) as st:
+            try:
+                meals_for_basal = detect_meal_events(
+                    cleaned.glucose, metabolic, hours,
+                    patient.timestamps, patient.profile,
+                    sizing_method="residual_plus_insulin")
+                annotate_meals_with_hybrid_support(
+                    meals_for_basal,
+                    glucose=cleaned.glucose,
+                    metabolic=metabolic,
+                    bolus=patient.bolus,
+                    iob=patient.iob,
+                    basal_rate=patient.basal_rate,
+                )
+                if meals_for_basal:
+                    meal_indices_for_basal = np.array(
+                        [m.index for m in meals_for_basal], dtype=int
+                    )
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Early meal detection (for basal) failed: {e}")
+    else:
+        ctx.rec.skip('meal_detection', ctx.n)
+    return {'meals_detected': meals_for_basal, 'meal_indices': meal_indices_for_basal}
+
 
-    # ── Stage 4d: Pattern Analysis ────────────────────────────────
+# ── Stage 4c: Clinical Report ─────────────────────────────────────────
+def _stage_clinical_report(ctx, cleaned, metabolic, hours, meal_indices):
+    patient = ctx.patient
+    with ctx.rec.stage('clinical_report', ctx.n):
+        clinical_report = generate_clinical_report(
+            glucose=cleaned.glucose,
+            metabolic=metabolic,
+            profile=patient.profile,
+            carbs=patient.carbs,
+            bolus=patient.bolus,
+            hours=hours,
+            iob=patient.iob,
+            cob=patient.cob,
+            inferred_meal_indices=meal_indices,
+        )
+    return {'clinical_report_base': clinical_report}
+
+
+# ── Stage 4c′: Fidelity Assessment (EXP-1531–1538) ───────────────────
+# Completes the clinical report in place; downstream stages read the
+# 'clinical_report' artifact, which is only published after this node.
+def _stage_fidelity(ctx, cleaned, metabolic, hours, clinical_report_base):
+    clinical_report = clinical_report_base
+    if metabolic is not None:
+        with ctx.rec.stage('fidelity', ctx.n) as st:
+            try:
+                fidelity = compute_fidelity_grade(
+                    metabolic=metabolic,
+                    glucose=cleaned.glucose,
+                    hours=hours,
+                    days_of_data=ctx.patient.days_of_data,
+                    ada_grade=clinical_report.grade,
+                )
+                clinical_report.fidelity = fidelity
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Fidelity assessment failed: {e}")
+    else:
+        ctx.rec.skip('fidelity', ctx.n)
+    return {'clinical_report': clinical_report}
+
+
+# ── Stage 4d: Pattern Analysis ────────────────────────────────────────
+def _stage_patterns(ctx, cleaned, metabolic, hours):
     patterns = None
-    if not skip_patterns and patient.days_of_data >= 7.0:
-        try:
-            patterns = analyze_patterns(cleaned.glucose, metabolic, hours)
-        except Exception as e:
-            warnings.append(f"Pattern analysis failed: {e}")
-    elif not skip_patterns:
-        warnings.append(f"Only {patient.days_of_data:.1f} days — patterns need ≥7 days")
+    if not ctx.skip_patterns and ctx.patient.days_of_data >= 7.0:
+        with ctx.rec.stage('patterns', ctx.n) as st:
+            try:
+                patterns = analyze_patterns(cleaned.glucose, metabolic, hours)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Pattern analysis failed: {e}")
+    else:
+        ctx.rec.skip('patterns', ctx.n)
+        if not ctx.skip_patterns:
+            ctx.warnings.append(f"Only {ctx.patient.days_of_data:.1f} days — patterns need ≥7 days")
+    return {'patterns': patterns}
+
 
-    # ── Stage 4e: Glucose Forecast (transformer ensemble) ─────────
+# ── Stage 4e: Glucose Forecast (transformer ensemble) ─────────────────
+def _stage_forecast(ctx, cleaned, metabolic, hours):
+    patient = ctx.patient
     forecast = None
-    if forecast_config and metabolic is not None:
-        try:
-            from .glucose_forecast import predict_trajectory
-            fc = forecast_config
-            forecast = predict_trajectory(
-                patient=patient,
-                metabolic=metabolic,
-                hours=hours,
-                glucose=cleaned.glucose,
-                patient_id=fc.get('patient_id', patient.patient_id),
-                window=fc.get('window', 'w48'),
-                models_dir=fc.get('models_dir'),
-                device=fc.get('device', 'cpu'),
-                isf=fc.get('isf'),
-            )
-            if forecast is None:
-                warnings.append("Forecast models not found — skipped")
-        except ImportError:
-            warnings.append("PyTorch not available — forecast skipped")
-        except Exception as e:
-            warnings.append(f"Glucose forecast failed: {e}")
+    if ctx.forecast_config and metabolic is not None:
+        with ctx.rec.stage('forecast', ctx.n) as st:
+            try:
+                from .glucose_forecast import predict_trajectory
+                fc = ctx.forecast_config
+                forecast = predict_trajectory(
+                    patient=patient,
+                    metabolic=metabolic,
+                    hours=hours,
+                    glucose=cleaned.glucose,
+                    patient_id=fc.get('patient_id', patient.patient_id),
+                    window=fc.get('window', 'w48'),
+                    models_dir=fc.get('models_dir'),
+                    device=fc.get('device', 'cpu'),
+                    isf=fc.get('isf'),
+                )
+                if forecast is None:
+                    st.skip()
+                    ctx.warnings.append("Forecast models not found — skipped")
+            except ImportError:
+                st.skip()
+                ctx.warnings.append("PyTorch not available — forecast skipped")
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Glucose forecast failed: {e}")
+    else:
+        ctx.rec.skip('forecast', ctx.n)
+    return {'forecast': forecast}
+
 
-    # ── Stage 5: Meal Detection ───────────────────────────────────
+# ── Stage 5: Meal Detection ───────────────────────────────────────────
+# Archetype clustering annotates the detected meals in place; consumers
+# of the annotated list read the 'meals' artifact published here.
+def _stage_meal_history(ctx, cleaned, metabolic, hours, meals_detected):
+    patient = ctx.patient
     meal_history = None
     meal_prediction = None
     meal_responses = None
-    meals: list = meals_for_basal
+    meals: list = meals_detected
     if metabolic is not None and meals:
-        try:
-            # Meal archetype clustering (EXP-1591–1598)
-            classify_meal_archetypes(cleaned.glucose, meals)
-
-            meal_history = build_meal_history(meals, patient.days_of_data)
-
-            # Meal response phenotyping (EXP-514)
-            meal_responses = classify_all_meal_responses(
-                cleaned.glucose, meals, metabolic)
-
-            # Meal timing prediction (needs ≥7 days of meal history)
-            if patient.days_of_data >= 7.0 and meal_history.total_detected >= 10:
-                timing_models = build_timing_models(meal_history, patient.days_of_data)
-
-                # Train ML model if enough data (EXP-1129: dual-mode AUC=0.846/0.942)
-                ml_model = None
-                if patient.days_of_data >= 14.0 and meal_history.total_detected >= 20:
-                    ml_model = MealMLModel()
-                    net_flux = metabolic.net_flux if hasattr(metabolic, 'net_flux') else None
-                    supply = metabolic.supply if hasattr(metabolic, 'supply') else None
-                    if not ml_model.train(meal_history, cleaned.glucose,
-                                          net_flux=net_flux,
-                                          supply=supply,
-                                          days_of_data=patient.days_of_data):
-                        ml_model = None
-
-                if timing_models:
-                    c_hour = current_hour if current_hour is not None else float(hours[-1])
-
-                    # Gather ML context for prediction
-                    ml_kwargs = {}
-                    if ml_model is not None:
-                        N = len(cleaned.glucose)
-                        last_meal_idx = max(m.index for m in meal_history.meals)
-
-                        # 60-min glucose window (13 steps) for pre-meal features
-                        win_start = max(0, N - 13)
-                        glucose_window = cleaned.glucose[win_start:N]
-
-                        # Supply window for IOB proxy
-                        supply_arr = supply if supply is not None else np.zeros(N)
-                        supply_window = supply_arr[win_start:N]
-
-                        # Fasting duration estimate
-                        mean_g = float(np.nanmean(cleaned.glucose[max(0, N - 288):N]))
-                        fasting_steps = 0
-                        for j in range(N - 1, max(0, N - 288), -1):
-                            if not np.isnan(cleaned.glucose[j]) and cleaned.glucose[j] > mean_g + 15:
-                                break
-                            fasting_steps += 1
-
-                        ml_kwargs = dict(
-                            ml_model=ml_model,
-                            glucose_current=float(cleaned.glucose[-1]),
-                            glucose_15min_ago=float(cleaned.glucose[-4]) if N > 3 else float(cleaned.glucose[-1]),
-                            glucose_30min_ago=float(cleaned.glucose[-7]) if N > 6 else float(cleaned.glucose[-1]),
-                            minutes_since_last_meal=float((N - 1 - last_meal_idx) * 5),
-                            meals_today_count=int(sum(1 for m in meal_history.meals
-                                                      if m.index >= N - 288)),
-                            net_flux_current=float(net_flux[-1]) if net_flux is not None and len(net_flux) > 0 else 0.0,
-                            day_index=N // 288,
-                            glucose_window=glucose_window,
-                            supply_window=supply_window,
-                            fasting_hours=fasting_steps * 5.0 / 60.0,
-                            current_step=N - 1,
-                        )
-
-                    meal_prediction = predict_next_meal(
-                        timing_models, c_hour, meal_history, **ml_kwargs)
-        except Exception as e:
-            warnings.append(f"Meal detection failed: {e}")
+        with ctx.rec.stage('meal_history', ctx.n) as st:
+            try:
+                # Meal archetype clustering (EXP-1591–1598)
+                classify_meal_archetypes(cleaned.glucose, meals)
+
+                meal_history = build_meal_history(meals, patient.days_of_data)
+
+                # Meal response phenotyping (EXP-514)
+                meal_responses = classify_all_meal_responses(
+                    cleaned.glucose, meals, metabolic)
+
+                # Meal timing prediction (needs ≥7 days of meal history)
+                if patient.days_of_data >= 7.0 and meal_history.total_detected >= 10:
+                    timing_models = build_timing_models(meal_history, patient.days_of_data)
+
+                    # Train ML model if enough data (EXP-1129: dual-mode AUC=0.846/0.942)
+                    ml_model = None
+                    if patient.days_of_data >= 14.0 and meal_history.total_detected >= 20:
+                        ml_model = MealMLModel()
+                        net_flux = metabolic.net_flux if hasattr(metabolic, 'net_flux') else None
+                        supply = metabolic.supply if hasattr(metabolic, 'supply') else None
+                        if not ml_model.train(meal_history, cleaned.glucose,
+                                              net_flux=net_flux,
+                                              supply=supply,
+                                              days_of_data=patient.days_of_data,
+                                              time_index=patient.time_index(ctx.effective_tz)):
+                            ml_model = None
+
+                    if timing_models:
+                        c_hour = ctx.current_hour if ctx.current_hour is not None else float(hours[-1])
+
+                        # Gather ML context for prediction
+                        ml_kwargs = {}
+                        if ml_model is not None:
+                            N = len(cleaned.glucose)
+                            last_meal_idx = max(m.index for m in meal_history.meals)
+
+                            # 60-min glucose window (13 steps) for pre-meal features
+                            win_start = max(0, N - 13)
+                            glucose_window = cleaned.glucose[win_start:N]
+
+                            # Supply window for IOB proxy
+                            supply_arr = supply if supply is not None else np.zeros(N)
+                            supply_window = supply_arr[win_start:N]
+
+                            # Fasting duration estimate
+                            mean_g = float(np.nanmean(cleaned.glucose[max(0, N - 288):N]))
+                            fasting_steps = 0
+                            for j in range(N - 1, max(0, N - 288), -1):
+                                if not np.isnan(cleaned.glucose[j]) and cleaned.glucose[j] > mean_g + 15:
+                                    break
+                                fasting_steps += 1
+
+                            ml_kwargs = dict(
+                                ml_model=ml_model,
+                                glucose_current=float(cleaned.glucose[-1]),
+                                glucose_15min_ago=float(cleaned.glucose[-4]) if N > 3 else float(cleaned.glucose[-1]),
+                                glucose_30min_ago=float(cleaned.glucose[-7]) if N > 6 else float(cleaned.glucose[-1]),
+                                minutes_since_last_meal=float((N - 1 - last_meal_idx) * 5),
+                                meals_today_count=int(sum(1 for m in meal_history.meals
+                                                          if m.index >= N - 288)),
+                                net_flux_current=float(net_flux[-1]) if net_flux is not None and len(net_flux) > 0 else 0.0,
+                                day_index=N // 288,
+                                glucose_window=glucose_window,
+                                supply_window=supply_window,
+                                fasting_hours=fasting_steps * 5.0 / 60.0,
+                                current_step=N - 1,
+                            )
+
+                        meal_prediction = predict_next_meal(
+                            timing_models, c_hour, meal_history, **ml_kwargs)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Meal detection failed: {e}")
+    else:
+        ctx.rec.skip('meal_history', ctx.n)
+    return {'meals': meals, 'meal_history': meal_history,
+            'meal_responses': meal_responses, 'meal_prediction': meal_prediction}
+
 
-    # ── Stage 5a: Meal-logging quality reconciliation ─────────────
-    # Compares logged carb events vs glucose-rise inferred meals;
-    # surfaces under-loggers (Loop users who skip logging) and
-    # phantom-loggers (UAM-style controller annotations).
+# ── Stage 5a: Meal-logging quality reconciliation ─────────────────────
+# Compares logged carb events vs glucose-rise inferred meals;
+# surfaces under-loggers (Loop users who skip logging) and
+# phantom-loggers (UAM-style controller annotations).
+def _stage_meal_logging_qc(ctx, meals):
+    patient = ctx.patient
     meal_logging_qc = None
     if patient.carbs is not None and patient.days_of_data > 0:
-        try:
-            from .meal_reconciliation import reconcile_meal_logging
-            logged_events = [
-                (int(t), float(c))
-                for t, c in zip(patient.timestamps, patient.carbs)
-                if c is not None and float(c) > 0
-            ]
-            meal_logging_qc = reconcile_meal_logging(
-                logged_events=logged_events,
-                inferred_meals=meals,
-                days_of_data=patient.days_of_data,
-                tz=effective_tz,
-            )
-        except Exception as e:
-            warnings.append(f"Meal logging QC failed: {e}")
+        with ctx.rec.stage('meal_logging_qc', ctx.n) as st:
+            try:
+                from .meal_reconciliation import reconcile_meal_logging
+                logged_events = [
+                    (int(t), float(c))
+                    for t, c in zip(patient.timestamps, patient.carbs)
+                    if c is not None and float(c) > 0
+                ]
+                meal_logging_qc = reconcile_meal_logging(
+                    logged_events=logged_events,
+                    inferred_meals=meals,
+                    days_of_data=patient.days_of_data,
+                    tz=ctx.effective_tz,
+                )
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Meal logging QC failed: {e}")
+    else:
+        ctx.rec.skip('meal_logging_qc', ctx.n)
+    return {'meal_logging_qc': meal_logging_qc}
 
-    # ── Stage 5b: Advanced Analytics ──────────────────────────────
+
+# ── Stage 5b: Advanced Analytics ──────────────────────────────────────
+def _stage_period_analysis(ctx, cleaned, metabolic, hours, clinical_report):
+    patient = ctx.patient
     period_metrics = None
+    if metabolic is not None and patient.days_of_data >= 3.0:
+        with ctx.rec.stage('period_analysis', ctx.n) as st:
+            try:
+                period_metrics = analyze_periods(
+                    cleaned.glucose, metabolic, hours,
+                    clinical_report, patient.profile, patient.days_of_data)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Period analysis failed: {e}")
+    else:
+        ctx.rec.skip('period_analysis', ctx.n)
+    return {'period_metrics': period_metrics}
+
+
+# Correction energy scoring (EXP-559)
+def _stage_correction_energy(ctx, cleaned, metabolic, hours):
     correction_energy = None
-    bolus_safety = None
-    aid_compensation = None
+    if metabolic is not None:
+        with ctx.rec.stage('correction_energy', ctx.n) as st:
+            try:
+                correction_energy = compute_correction_energy(
+                    metabolic, hours, cleaned.glucose, ctx.patient.days_of_data)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Correction energy failed: {e}")
+    else:
+        ctx.rec.skip('correction_energy', ctx.n)
+    return {'correction_energy': correction_energy}
 
-    # Period-by-period analysis
-    if metabolic is not None and patient.days_of_data >= 3.0:
+
+# Correction timing safety
+def _stage_bolus_safety(ctx, cleaned):
+    bolus_safety = None
+    with ctx.rec.stage('bolus_safety', ctx.n) as st:
         try:
-            period_metrics = analyze_periods(
-                cleaned.glucose, metabolic, hours,
-                clinical_report, patient.profile, patient.days_of_data)
+            bolus_safety = assess_correction_timing(
+                ctx.patient.bolus, cleaned.glucose, ctx.patient.timestamps)
         except Exception as e:
-            warnings.append(f"Period analysis failed: {e}")
+            st.fail(e)
+            ctx.warnings.append(f"Bolus safety failed: {e}")
+    return {'bolus_safety': bolus_safety}
 
-    # Correction energy scoring (EXP-559)
-    if metabolic is not None:
+
+# AID compensation detection (EXP-747)
+def _stage_aid_compensation(ctx, metabolic, clinical_report):
+    aid_compensation = None
+    with ctx.rec.stage('aid_compensation', ctx.n) as st:
         try:
-            correction_energy = compute_correction_energy(
-                metabolic, hours, cleaned.glucose, patient.days_of_data)
+            aid_compensation = assess_aid_compensation(clinical_report, metabolic)
         except Exception as e:
-            warnings.append(f"Correction energy failed: {e}")
+            st.fail(e)
+            ctx.warnings.append(f"AID compensation failed: {e}")
+    return {'aid_compensation': aid_compensation}
 
-    # Correction timing safety
-    try:
-        bolus_safety = assess_correction_timing(
-            patient.bolus, cleaned.glucose, patient.timestamps)
-    except Exception as e:
-        warnings.append(f"Bolus safety failed: {e}")
-
-    # AID compensation detection (EXP-747)
-    try:
-        aid_compensation = assess_aid_compensation(clinical_report, metabolic)
-    except Exception as e:
-        warnings.append(f"AID compensation failed: {e}")
 
-    # ── Stage 5c: Natural Experiment Detection (EXP-1551) ─────────
+# ── Stage 5c: Natural Experiment Detection (EXP-1551) ─────────────────
+def _stage_natural_experiments(ctx, metabolic):
     natural_experiments = None
-    if patient.days_of_data >= 1.0:
-        try:
-            natural_experiments = detect_natural_experiments(
-                patient=patient,
-                metabolic=metabolic,
-            )
-        except Exception as e:
-            warnings.append(f"Natural experiment detection failed: {e}")
+    if ctx.patient.days_of_data >= 1.0:
+        with ctx.rec.stage('natural_experiments', ctx.n) as st:
+            try:
+                natural_experiments = detect_natural_experiments(
+                    patient=ctx.patient,
+                    metabolic=metabolic,
+                )
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Natural experiment detection failed: {e}")
+    else:
+        ctx.rec.skip('natural_experiments', ctx.n)
+    return {'natural_experiments': natural_experiments}
+
 
-    # ── Stage 6a: Settings Optimization from NE (EXP-1701) ──────
+# ── Stage 6a: Settings Optimization from NE (EXP-1701) ────────────────
+def _stage_settings_optimizer(ctx, natural_experiments):
     optimal_settings = None
-    if natural_experiments is not None and patient.days_of_data >= 3.0:
-        try:
-            optimal_settings = optimize_settings(
-                census=natural_experiments,
-                profile=patient.profile,
-            )
-        except Exception as e:
-            warnings.append(f"Settings optimization failed: {e}")
+    if natural_experiments is not None and ctx.patient.days_of_data >= 3.0:
+        with ctx.rec.stage('settings_optimizer', ctx.n) as st:
+            try:
+                optimal_settings = optimize_settings(
+                    census=natural_experiments,
+                    profile=ctx.patient.profile,
+                )
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Settings optimization failed: {e}")
+    else:
+        ctx.rec.skip('settings_optimizer', ctx.n)
+    return {'optimal_settings': optimal_settings}
+
+
+# ── Stage 6: Settings Advisor ─────────────────────────────────────────
+def _stage_controller_detection(ctx):
+    with ctx.rec.stage('controller_detection', ctx.n):
+        controller_type = detect_controller_type(ctx.patient)
+        controller_behavior = get_controller_behavior(controller_type)
+    return {'controller_type': controller_type,
+            'controller_behavior': controller_behavior}
 
-    # ── Stage 6: Settings Advisor ─────────────────────────────────
-    settings_recs = None
-    dual_phase_isf = None
-    controller_type = detect_controller_type(patient)
-    controller_behavior = get_controller_behavior(controller_type)
-    overnight_assessment = None
-    loop_workload = None
 
-    # Extract correction and meal events for settings advisories
+# Extract correction and meal events for settings advisories
+def _stage_event_extraction(ctx, cleaned, hours, meals):
+    patient = ctx.patient
     correction_events = None
     meal_events = None
-    try:
-        correction_events = _extract_correction_events(
-            cleaned.glucose, patient.bolus, patient.carbs,
-            hours, patient.profile,
-            inferred_meals=meals_for_basal or None) or None
-    except Exception as e:
-        warnings.append(f"Correction event extraction failed: {e}")
-    try:
-        meal_events = _extract_meal_events(
-            cleaned.glucose, patient.bolus, patient.carbs, hours) or None
-    except Exception as e:
-        warnings.append(f"Meal event extraction failed: {e}")
-
-    if patient.days_of_data >= 3.0:
-        # Compute demand-phase ISF (EXP-2651) — stored in PipelineResult
+    with ctx.rec.stage('event_extraction', ctx.n) as st:
         try:
-            from .clinical_rules import compute_demand_isf
-            dual_phase_isf = compute_demand_isf(
-                cleaned.glucose, patient.bolus, patient.profile,
-                carbs=patient.carbs)
+            correction_events = _extract_correction_events(
+                cleaned.glucose, patient.bolus, patient.carbs,
+                hours, patient.profile,
+                inferred_meals=meals or None) or None
         except Exception as e:
-            warnings.append(f"Demand-phase ISF computation failed: {e}")
-
+            st.fail(e)
+            ctx.warnings.append(f"Correction event extraction failed: {e}")
         try:
-            settings_recs = generate_settings_advice(
-                cleaned.glucose, metabolic, hours,
-                clinical_report, patient.profile, patient.days_of_data,
-                carbs=patient.carbs, iob=patient.iob,
-                cob=patient.cob, actual_basal=patient.basal_rate,
-                bolus=patient.bolus,
-                correction_events=correction_events,
-                meal_events=meal_events,
-                dual_phase_isf=dual_phase_isf,
-                patterns=patterns,
-                inferred_meal_indices=meal_indices_for_basal)
-
-            # Adjust confidence based on controller behavior (EXP-2081)
-            if settings_recs:
-                settings_recs = adjust_confidence_for_controller(
-                    settings_recs, controller_type)
+            meal_events = _extract_meal_events(
+                cleaned.glucose, patient.bolus, patient.carbs, hours) or None
         except Exception as e:
-            warnings.append(f"Settings advisor failed: {e}")
+            st.fail(e)
+            ctx.warnings.append(f"Meal event extraction failed: {e}")
+    return {'correction_events': correction_events, 'meal_events': meal_events}
 
-        # Overnight drift assessment (EXP-2371–2378)
-        try:
-            overnight_assessment = assess_overnight_drift(
-                cleaned.glucose, hours, patient.profile, patient.days_of_data,
-                iob=patient.iob, cob=patient.cob,
-                actual_basal=patient.basal_rate, carbs=patient.carbs,
-                inferred_meal_indices=meal_indices_for_basal)
-        except Exception as e:
-            warnings.append(f"Overnight drift assessment failed: {e}")
 
-        # Loop workload report (EXP-2391–2396)
-        if patient.basal_rate is not None:
+# Compute demand-phase ISF (EXP-2651) — stored in PipelineResult
+def _stage_demand_isf(ctx, cleaned):
+    patient = ctx.patient
+    dual_phase_isf = None
+    if patient.days_of_data >= 3.0:
+        with ctx.rec.stage('demand_isf', ctx.n) as st:
+            try:
+                from .clinical_rules import compute_demand_isf
+                dual_phase_isf = compute_demand_isf(
+                    cleaned.glucose, patient.bolus, patient.profile,
+                    carbs=patient.carbs)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Demand-phase ISF computation failed: {e}")
+    else:
+        ctx.rec.skip('demand_isf', ctx.n)
+    return {'dual_phase_isf': dual_phase_isf}
+
+
+def _stage_settings_advisor(ctx, cleaned, metabolic, hours, clinical_report,
+                            meal_indices, patterns, controller_type,
+                            correction_events, meal_events, dual_phase_isf):
+    patient = ctx.patient
+    settings_recs = None
+    if patient.days_of_data >= 3.0:
+        with ctx.rec.stage('settings_advisor', ctx.n) as st:
+            try:
+                settings_recs = generate_settings_advice(
+                    cleaned.glucose, metabolic, hours,
+                    clinical_report, patient.profile, patient.days_of_data,
+                    carbs=patient.carbs, iob=patient.iob,
+                    cob=patient.cob, actual_basal=patient.basal_rate,
+                    bolus=patient.bolus,
+                    correction_events=correction_events,
+                    meal_events=meal_events,
+                    dual_phase_isf=dual_phase_isf,
+                    patterns=patterns,
+                    inferred_meal_indices=meal_indices)
+
+                # Adjust confidence based on controller behavior (EXP-2081)
+                if settings_recs:
+                    settings_recs = adjust_confidence_for_controller(
+                        settings_recs, controller_type)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Settings advisor failed: {e}")
+    else:
+        ctx.rec.skip('settings_advisor', ctx.n)
+    return {'settings_recs': settings_recs}
+
+
+# Overnight drift assessment (EXP-2371–2378)
+def _stage_overnight_drift(ctx, cleaned, hours, meal_indices):
+    patient = ctx.patient
+    overnight_assessment = None
+    if patient.days_of_data >= 3.0:
+        with ctx.rec.stage('overnight_drift', ctx.n) as st:
+            try:
+                overnight_assessment = assess_overnight_drift(
+                    cleaned.glucose, hours, patient.profile, patient.days_of_data,
+                    iob=patient.iob, cob=patient.cob,
+                    actual_basal=patient.basal_rate, carbs=patient.carbs,
+                    inferred_meal_indices=meal_indices)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Overnight drift assessment failed: {e}")
+    else:
+        ctx.rec.skip('overnight_drift', ctx.n)
+    return {'overnight_assessment': overnight_assessment}
+
+
+# Loop workload report (EXP-2391–2396)
+def _stage_loop_workload(ctx, hours):
+    patient = ctx.patient
+    loop_workload = None
+    if patient.days_of_data >= 3.0 and patient.basal_rate is not None:
+        with ctx.rec.stage('loop_workload', ctx.n) as st:
             try:
                 loop_workload = compute_loop_workload(
                     hours, patient.basal_rate, patient.profile)
             except Exception as e:
-                warnings.append(f"Loop workload analysis failed: {e}")
+                st.fail(e)
+                ctx.warnings.append(f"Loop workload analysis failed: {e}")
+    else:
+        ctx.rec.skip('loop_workload', ctx.n)
+    return {'loop_workload': loop_workload}
+
 
+# ── Stage 7: Action Recommendations ───────────────────────────────────
+def _stage_recommendations(ctx, hours, clinical_report, hypo_alert,
+                           meal_prediction, settings_recs, meal_history,
+                           overnight_assessment, controller_type,
+                           controller_behavior):
+    patient = ctx.patient
     if controller_type != ControllerType.UNKNOWN:
-        warnings.append(
+        ctx.warnings.append(
             f"Controller detected: {controller_type.value} "
             f"({controller_behavior.compensation_style}). "
             f"Settings visibility: {controller_behavior.settings_visibility:.0%}."
         )
 
-    # ── Stage 7: Action Recommendations ───────────────────────────
-    recommendations = generate_recommendations(
-        clinical=clinical_report,
-        hypo_alert=hypo_alert,
-        meal_prediction=meal_prediction,
-        settings_recs=settings_recs,
-        meal_history=meal_history,
-        overnight_assessment=overnight_assessment,
-    )
-
-    # Pattern-driven override schedule recommender (informational, prio 3)
-    try:
-        override_recs = recommend_meal_override_schedule(
-            patient.glucose, hours, patient.profile,
-            days_of_data=patient.days_of_data,
-        )
-        recommendations.extend(override_recs)
-    except Exception as e:
-        warnings.append(f"Override schedule advisor failed: {e}")
-
-    # Cross-design migration hypothetical (informational, prio 3)
-    try:
-        migration_recs = recommend_design_migration(
-            clinical_report, controller_type,
-            days_of_data=patient.days_of_data,
-            target_design='oref1',
+    with ctx.rec.stage('recommendations', ctx.n) as st:
+        recommendations = generate_recommendations(
+            clinical=clinical_report,
+            hypo_alert=hypo_alert,
+            meal_prediction=meal_prediction,
+            settings_recs=settings_recs,
+            meal_history=meal_history,
+            overnight_assessment=overnight_assessment,
         )
-        recommendations.extend(migration_recs)
-    except Exception as e:
-        warnings.append(f"Design-migration advisor failed: {e}")
 
-    # ── Stage 8: DIA Discrepancy Analysis (EXP-2351–2358) ─────────
-    dia_discrepancy = None
-    two_component_dia = None
-    if metabolic is not None and patient.has_insulin_data:
+        # Pattern-driven override schedule recommender (informational, prio 3)
         try:
-            dia_discrepancy = estimate_dia_discrepancy(patient, metabolic)
-            if dia_discrepancy.discrepancy_ratio and dia_discrepancy.discrepancy_ratio > 2.0:
-                warnings.append(
-                    f"DIA discrepancy: glucose response DIA "
-                    f"({dia_discrepancy.glucose_dia_hours:.1f}h) is "
-                    f"{dia_discrepancy.discrepancy_ratio:.1f}× longer than "
-                    f"IOB decay DIA ({dia_discrepancy.iob_dia_hours:.1f}h)."
-                )
+            override_recs = recommend_meal_override_schedule(
+                patient.glucose, hours, patient.profile,
+                days_of_data=patient.days_of_data,
+            )
+            recommendations.extend(override_recs)
         except Exception as e:
-            warnings.append(f"DIA discrepancy analysis failed: {e}")
+            st.fail(e)
+            ctx.warnings.append(f"Override schedule advisor failed: {e}")
 
-        # Two-component DIA decomposition (EXP-2525)
+        # Cross-design migration hypothetical (informational, prio 3)
         try:
-            two_component_dia = decompose_two_component_dia(patient, metabolic)
+            migration_recs = recommend_design_migration(
+                clinical_report, controller_type,
+                days_of_data=patient.days_of_data,
+                target_design='oref1',
+            )
+            recommendations.extend(migration_recs)
         except Exception as e:
-            warnings.append(f"Two-component DIA decomposition failed: {e}")
+            st.fail(e)
+            ctx.warnings.append(f"Design-migration advisor failed: {e}")
+    return {'recommendations': recommendations}
+
+
+# ── Stage 8: DIA Discrepancy Analysis (EXP-2351–2358) ─────────────────
+def _stage_dia_discrepancy(ctx, metabolic):
+    patient = ctx.patient
+    dia_discrepancy = None
+    if metabolic is not None and patient.has_insulin_data:
+        with ctx.rec.stage('dia_discrepancy', ctx.n) as st:
+            try:
+                dia_discrepancy = estimate_dia_discrepancy(patient, metabolic)
+                if dia_discrepancy.discrepancy_ratio and dia_discrepancy.discrepancy_ratio > 2.0:
+                    ctx.warnings.append(
+                        f"DIA discrepancy: glucose response DIA "
+                        f"({dia_discrepancy.glucose_dia_hours:.1f}h) is "
+                        f"{dia_discrepancy.discrepancy_ratio:.1f}× longer than "
+                        f"IOB decay DIA ({dia_discrepancy.iob_dia_hours:.1f}h)."
+                    )
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"DIA discrepancy analysis failed: {e}")
+    else:
+        ctx.rec.skip('dia_discrepancy', ctx.n)
+    return {'dia_discrepancy': dia_discrepancy}
+
+
+# Two-component DIA decomposition (EXP-2525)
+def _stage_two_component_dia(ctx, metabolic):
+    patient = ctx.patient
+    two_component_dia = None
+    if metabolic is not None and patient.has_insulin_data:
+        with ctx.rec.stage('two_component_dia', ctx.n) as st:
+            try:
+                two_component_dia = decompose_two_component_dia(patient, metabolic)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Two-component DIA decomposition failed: {e}")
+    else:
+        ctx.rec.skip('two_component_dia', ctx.n)
+    return {'two_component_dia': two_component_dia}
 
-    # ── Stage 9: Hypo Early Warning (EXP-2539) ────────────────────
+
+# ── Stage 9: Hypo Early Warning (EXP-2539) ────────────────────────────
+def _stage_hypo_risk(ctx, cleaned):
     hypo_risk_result = None
     if len(cleaned.glucose) >= 3:
-        try:
-            recent = cleaned.glucose[-12:].tolist()
-            recent_clean = [v for v in recent if not np.isnan(v)]
-            if len(recent_clean) >= 3:
-                hypo_risk_result = compute_hypo_risk(recent_clean)
-        except Exception as e:
-            warnings.append(f"Hypo risk assessment failed: {e}")
+        with ctx.rec.stage('hypo_risk', ctx.n) as st:
+            try:
+                recent = cleaned.glucose[-12:].tolist()
+                recent_clean = [v for v in recent if not np.isnan(v)]
+                if len(recent_clean) >= 3:
+                    hypo_risk_result = compute_hypo_risk(recent_clean)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Hypo risk assessment failed: {e}")
+    else:
+        ctx.rec.skip('hypo_risk', ctx.n)
+    return {'hypo_risk': hypo_risk_result}
+
 
-    # ── Stage 10: Patient Phenotyping (EXP-2541) ───────────────────
+# ── Stage 10: Patient Phenotyping (EXP-2541) ──────────────────────────
+def _stage_phenotyping(ctx, cleaned, hours):
     phenotype_result = None
-    if patient.days_of_data >= 3.0:
-        try:
-            phenotype_result = classify_patient_phenotype(
-                cleaned.glucose, hours, patient.days_of_data)
-        except Exception as e:
-            warnings.append(f"Patient phenotyping failed: {e}")
+    if ctx.patient.days_of_data >= 3.0:
+        with ctx.rec.stage('phenotyping', ctx.n) as st:
+            try:
+                phenotype_result = classify_patient_phenotype(
+                    cleaned.glucose, hours, ctx.patient.days_of_data)
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Patient phenotyping failed: {e}")
+    else:
+        ctx.rec.skip('phenotyping', ctx.n)
+    return {'phenotype': phenotype_result}
 
-    # ── Stage 11: Loop Quality Assessment (EXP-2538/2540) ─────────
+
+# ── Stage 11: Loop Quality Assessment (EXP-2538/2540) ─────────────────
+def _stage_loop_quality(ctx, cleaned, hours):
+    patient = ctx.patient
     loop_quality_result = None
     if patient.days_of_data >= 3.0 and patient.basal_rate is not None:
-        try:
-            # Get scheduled basal from profile
-            basal_vals = [e.get('value', e.get('rate', 0.8))
-                          for e in patient.profile.basal_schedule]
-            sched_basal = float(np.median([float(v) for v in basal_vals])) if basal_vals else 0.8
-
-            loop_quality_result = assess_loop_quality(
-                glucose=cleaned.glucose,
-                hours=hours,
-                basal_rate=patient.basal_rate,
-                bolus=patient.bolus,
-                iob=patient.iob,
-                scheduled_basal=sched_basal,
-                days_of_data=patient.days_of_data,
-            )
-        except Exception as e:
-            warnings.append(f"Loop quality assessment failed: {e}")
+        with ctx.rec.stage('loop_quality', ctx.n) as st:
+            try:
+                # Get scheduled basal from profile
+                basal_vals = [e.get('value', e.get('rate', 0.8))
+                              for e in patient.profile.basal_schedule]
+                sched_basal = float(np.median([float(v) for v in basal_vals])) if basal_vals else 0.8
+
+                loop_quality_result = assess_loop_quality(
+                    glucose=cleaned.glucose,
+                    hours=hours,
+                    basal_rate=patient.basal_rate,
+                    bolus=patient.bolus,
+                    iob=patient.iob,
+                    scheduled_basal=sched_basal,
+                    days_of_data=patient.days_of_data,
+                )
+            except Exception as e:
+                st.fail(e)
+                ctx.warnings.append(f"Loop quality assessment failed: {e}")
+    else:
+        ctx.rec.skip('loop_quality', ctx.n)
+    return {'loop_quality': loop_quality_result}
+
+
+def _node(fn, inputs: str = '', outputs: str = '') -> StageNode:
+    return StageNode(fn.__name__[len('_stage_'):], fn,
+                     tuple(inputs.split()), tuple(outputs.split()))
+
+
+PIPELINE_GRAPH = StageGraph([
+    _node(_stage_cleaning, '', 'cleaned'),
+    _node(_stage_onboarding, '', 'onboarding'),
+    _node(_stage_metabolic_engine, '', 'metabolic'),
+    _node(_stage_risk, 'cleaned metabolic', 'risk'),
+    _node(_stage_hypo_prediction, 'cleaned metabolic', 'hypo_alert'),
+    _node(_stage_extract_hours, '', 'hours'),
+    _node(_stage_meal_detection, 'cleaned metabolic hours',
+          'meals_detected meal_indices'),
+    _node(_stage_clinical_report, 'cleaned metabolic hours meal_indices',
+          'clinical_report_base'),
+    _node(_stage_fidelity, 'cleaned metabolic hours clinical_report_base',
+          'clinical_report'),
+    _node(_stage_patterns, 'cleaned metabolic hours', 'patterns'),
+    _node(_stage_forecast, 'cleaned metabolic hours', 'forecast'),
+    _node(_stage_meal_history, 'cleaned metabolic hours meals_detected',
+          'meals meal_history meal_responses meal_prediction'),
+    _node(_stage_meal_logging_qc, 'meals', 'meal_logging_qc'),
+    _node(_stage_period_analysis, 'cleaned metabolic hours clinical_report',
+          'period_metrics'),
+    _node(_stage_correction_energy, 'cleaned metabolic hours', 'correction_energy'),
+    _node(_stage_bolus_safety, 'cleaned', 'bolus_safety'),
+    _node(_stage_aid_compensation, 'metabolic clinical_report', 'aid_compensation'),
+    _node(_stage_natural_experiments, 'metabolic', 'natural_experiments'),
+    _node(_stage_settings_optimizer, 'natural_experiments', 'optimal_settings'),
+    _node(_stage_controller_detection, '', 'controller_type controller_behavior'),
+    _node(_stage_event_extraction, 'cleaned hours meals',
+          'correction_events meal_events'),
+    _node(_stage_demand_isf, 'cleaned', 'dual_phase_isf'),
+    _node(_stage_settings_advisor,
+          'cleaned metabolic hours clinical_report meal_indices patterns '
+          'controller_type correction_events meal_events dual_phase_isf',
+          'settings_recs'),
+    _node(_stage_overnight_drift, 'cleaned hours meal_indices', 'overnight_assessment'),
+    _node(_stage_loop_workload, 'hours', 'loop_workload'),
+    _node(_stage_recommendations,
+          'hours clinical_report hypo_alert meal_prediction settings_recs '
+          'meal_history overnight_assessment controller_type controller_behavior',
+          'recommendations'),
+    _node(_stage_dia_discrepancy, 'metabolic', 'dia_discrepancy'),
+    _node(_stage_two_component_dia, 'metabolic', 'two_component_dia'),
+    _node(_stage_hypo_risk, 'cleaned', 'hypo_risk'),
+    _node(_stage_phenotyping, 'cleaned hours', 'phenotype'),
+    _node(_stage_loop_quality, 'cleaned hours', 'loop_quality'),
+])
+
+# Artifacts that land on PipelineResult (valid ``run_pipeline(outputs=...)``)
+PIPELINE_OUTPUTS = frozenset(
+    a for a in PIPELINE_GRAPH.artifacts
+    if a in PipelineResult.__dataclass_fields__)
+
+
+def _run_pipeline_stages(patient: PatientData,
+                         rec: StageRecorder,
+                         personal_params: Optional[dict] = None,
+                         skip_patterns: bool = False,
+                         current_hour: Optional[float] = None,
+                         forecast_config: Optional[dict] = None,
+                         tz_offset_hours: Optional[float] = None,
+                         outputs: Optional[Iterable[str]] = None,
+                         stage_threads: int = 1,
+                         physics_cache: Optional[PhysicsCache] = None,
+                         ) -> PipelineResult:
+    """Body of ``run_pipeline``: execute PIPELINE_GRAPH and assemble the result."""
+    start = time.perf_counter()
+
+    # ── Resolve effective timezone ─────────────────────────────────
+    # Profile-derived IANA name is the canonical source of truth.
+    # tz_offset_hours kwarg is deprecated; if provided, it is converted
+    # to a Etc/GMT-style fixed-offset string for backward compatibility.
+    profile_tz = getattr(patient.profile, "timezone", "UTC") or "UTC"
+    if tz_offset_hours is not None and float(tz_offset_hours) != 0.0:
+        import warnings as _w
+        _w.warn(
+            "run_pipeline(tz_offset_hours=...) is deprecated. "
+            "Set PatientProfile.timezone to an IANA name "
+            "(e.g. 'America/Los_Angeles') instead.",
+            DeprecationWarning, stacklevel=3,
+        )
+        # Etc/GMT signs are inverted: Etc/GMT+7 means UTC-7.
+        sign = "-" if tz_offset_hours > 0 else "+"
+        effective_tz = f"Etc/GMT{sign}{abs(int(tz_offset_hours))}"
+    else:
+        # tz_offset_hours is None or 0.0 — use profile timezone.
+        effective_tz = profile_tz
+
+    if outputs is not None:
+        outputs = set(outputs)
+        unknown = sorted(outputs - PIPELINE_OUTPUTS)
+        if unknown:
+            raise ValueError(f"Unknown pipeline outputs {unknown}; "
+                             f"available: {sorted(PIPELINE_OUTPUTS)}")
+
+    options = dict(personal_params=personal_params, skip_patterns=skip_patterns,
+                   current_hour=current_hour, forecast_config=forecast_config,
+                   effective_tz=effective_tz, physics_cache=physics_cache)
+    contexts = {}
+
+    def invoke(node, inputs):
+        ctx = _StageContext(patient, options)
+        contexts[node.name] = ctx
+        return node.fn(ctx, **inputs)
+
+    try:
+        artifacts = PIPELINE_GRAPH.run(invoke, outputs=outputs,
+                                       max_workers=stage_threads)
+    finally:
+        # Keep metrics of stages that finished before a fatal error
+        for node in PIPELINE_GRAPH.nodes:
+            if node.name in contexts:
+                rec.metrics.extend(contexts[node.name].rec.metrics)
+
+    warnings: List[str] = []
+    for node in PIPELINE_GRAPH.nodes:
+        if node.name in contexts:
+            warnings.extend(contexts[node.name].warnings)
 
     # ── Assemble result ───────────────────────────────────────────
     elapsed = (time.perf_counter() - start) * 1000.0
+    fields = {a: v for a, v in artifacts.items() if a in PIPELINE_OUTPUTS}
+    for name in ('cleaned', 'metabolic', 'risk', 'hypo_alert',
+                 'clinical_report', 'patterns', 'onboarding'):
+        fields.setdefault(name, None)
 
     return PipelineResult(
         patient_id=patient.patient_id,
-        cleaned=cleaned,
-        metabolic=metabolic,
-        risk=risk,
-        hypo_alert=hypo_alert,
-        clinical_report=clinical_report,
-        patterns=patterns,
-        onboarding=onboarding,
-        meal_history=meal_history,
-        meal_prediction=meal_prediction,
-        settings_recs=settings_recs,
-        recommendations=recommendations,
-        period_metrics=period_metrics,
-        correction_energy=correction_energy,
-        meal_responses=meal_responses,
-        bolus_safety=bolus_safety,
-        aid_compensation=aid_compensation,
-        forecast=forecast,
-        natural_experiments=natural_experiments,
-        optimal_settings=optimal_settings,
-        dia_discrepancy=dia_discrepancy,
-        two_component_dia=two_component_dia,
-        overnight_assessment=overnight_assessment,
-        loop_workload=loop_workload,
-        hypo_risk=hypo_risk_result,
-        phenotype=phenotype_result,
-        loop_quality=loop_quality_result,
-        meal_logging_qc=meal_logging_qc,
         pipeline_latency_ms=elapsed,
         warnings=warnings,
-        dual_phase_isf=dual_phase_isf,
+        stage_metrics=rec.metrics,
+        **fields,
     )
 
 
 def run_pipeline_batch(patients: list[PatientData],
                        **kwargs) -> list[PipelineResult]:
-    """Run pipeline on multiple patients sequentially."""
+    """Run pipeline on multiple patients sequentially.
+
+    For multi-core cohort runs with per-patient timeouts and structured
+    errors, see ``batch_runner.run_pipeline_parallel``.
+    """
     return [run_pipeline(p, **kwargs) for p in patients]
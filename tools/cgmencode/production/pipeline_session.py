@@ -0,0 +1,684 @@
+"""
+pipeline_session.py — Incremental pipeline state for live 5-minute CGM updates.
+
+``run_pipeline`` recomputes every stage from the full history. A live
+deployment receives one reading per patient every 5 minutes, so
+``PipelineSession`` keeps the rolling state instead:
+
+  - a bounded ring buffer of raw and cleaned glucose, IOB/COB and the
+    metabolic flux columns (default 14 days, the horizon the heavy
+    stages need),
+  - running jump statistics for spike cleaning and running residual
+    statistics (batch-merged mean/variance, O(new readings)),
+  - the future IOB/COB contribution of every bolus and carb entry,
+    convolved forward once when the treatment arrives (kept as the
+    ``treatment_iob`` / ``treatment_cob`` columns; the metabolic flux
+    reads the device IOB/COB, as compute_metabolic_state does),
+  - the most recent residual-burst meal cluster.
+
+``append(readings, treatments)`` costs time proportional to the new
+readings and returns risk, hypo alert and the metabolic tail as a
+``SessionUpdate``. The heavy weekly stages (patterns, natural
+experiments, settings optimization, ...) come from a full
+``run_pipeline`` over the buffer, scheduled every ``refresh_hours`` of
+new data or on demand via ``refresh()``.
+
+Relation to run_pipeline on the same history:
+  - the metabolic tail equals ``compute_metabolic_state`` on the
+    appended readings (same per-step formulas with the previous step
+    carried over; missing device IOB/COB count as 0 there as here).
+  - risk and hypo alert only look at the last hour, and the threshold
+    calibration statistics are kept as running sums, so they match
+    given the same cleaned glucose.
+  - spike cleaning thresholds against running jump statistics rather
+    than whole-record ones, and a spike at the newest reading holds the
+    previous value until its right-hand anchor arrives.
+  - meal clusters use a trailing 30-min burst window and the running
+    residual mean as baseline (meal_detector uses a centred window and
+    the median), so a cluster opens up to 15 min later.
+
+Usage:
+    session = PipelineSession(profile, patient_id='p1', history=patient)
+    update = session.append(
+        {'timestamps': [t_ms], 'glucose': [132.0], 'iob': [1.4]},
+        {'timestamps': [t_ms], 'bolus': [2.0], 'carbs': [30.0]},
+    )
+    if update.hypo_alert and update.hypo_alert.should_alert:
+        ...
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Mapping, Optional, Union
+
+import numpy as np
+
+from .types import (
+    DetectedMeal, HypoAlert, MetabolicState, PatientData, PatientProfile,
+    PipelineResult, RiskAssessment, SessionUpdate,
+)
+from .data_quality import DEFAULT_SIGMA, interpolate_spikes
+from .metabolic_engine import (
+    _DECAY_RATE, _DECAY_TARGET, _compute_hepatic_production,
+    _demand_calibration_factor, _extract_hours, _median_schedule_value,
+)
+from .event_detector import classify_risk_simple
+from .hypo_predictor import (
+    DEFAULT_THRESHOLD, HYPO_LEVEL_1, _threshold_from_distribution, predict_hypo,
+)
+from .meal_detector import (
+    DEFAULT_SIGMA_MULT, MIN_CARB_SUPPLY, MULTIPART_GAP_STEPS, ROLLING_WINDOW,
+    _classify_meal_window, _median_value,
+)
+from .forward_simulator import (
+    _DEFAULT_CARB_ABSORPTION_HOURS, _STEP_MINUTES,
+    _carb_absorption_rate, _insulin_kernels,
+)
+from .pipeline import run_pipeline
+
+STEP_MS = 300_000                 # 5-min CGM cadence
+DECISION_WINDOW = 24              # 2 h; risk/hypo read ≤ 13 readings
+_MIN_SPIKE_JUMPS = 100            # detect_spikes needs ≥100 valid jumps
+_MIN_MEAL_RESIDUALS = 100         # detect_meal_events needs N ≥ 100
+_CALIBRATION_MIN_SAMPLES = 864    # run_pipeline calibrates at ≥3 days
+_CALIBRATION_MIN_VALID = 288      # calibrate_threshold needs ≥1 day valid
+_MEAL_ANNOUNCE_LOOKBACK = 6       # meal_detector: carb supply 30 min before
+_MEAL_ANNOUNCE_LOOKAHEAD = 12     # ... and 60 min after the burst
+_MEAL_INTEGRATION_STEPS = 36      # 3 h residual integral after the burst
+
+_COLUMNS = (
+    'timestamps', 'glucose_raw', 'glucose', 'iob', 'cob',
+    'bolus', 'carbs', 'basal_rate', 'treatment_iob', 'treatment_cob',
+    'supply', 'demand', 'hepatic', 'carb_supply', 'net_flux', 'residual',
+)
+_FLUX_COLUMNS = ('supply', 'demand', 'hepatic', 'carb_supply', 'net_flux', 'residual')
+
+
+# ── Rolling state helpers ─────────────────────────────────────────────
+
+class _RunningStats:
+    """Count/mean/M2 accumulator; ``update`` merges a whole batch at once."""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        x = np.asarray(values, dtype=np.float64)
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            return
+        nb = len(x)
+        mb = float(x.mean())
+        m2b = float(np.sum((x - mb) ** 2))
+        n = self.n + nb
+        delta = mb - self.mean
+        self.mean += delta * nb / n
+        self.m2 += m2b + delta * delta * self.n * nb / n
+        self.n = n
+
+    @property
+    def std(self) -> float:
+        """Population std (ddof=0, as np.std)."""
+        return float(np.sqrt(self.m2 / self.n)) if self.n else 0.0
+
+
+class _RingBuffer:
+    """Fixed-capacity float64 column store; the oldest rows are overwritten."""
+
+    def __init__(self, capacity: int, columns=_COLUMNS):
+        self.capacity = int(capacity)
+        self._data = {c: np.full(self.capacity, np.nan) for c in columns}
+        self._head = 0  # next write position
+        self.size = 0
+
+    def extend(self, rows: Mapping[str, np.ndarray]) -> None:
+        m = len(rows['timestamps'])
+        start = max(0, m - self.capacity)
+        idx = (self._head + np.arange(m - start)) % self.capacity
+        for col, arr in self._data.items():
+            arr[idx] = rows[col][start:]
+        self._head = (self._head + m - start) % self.capacity
+        self.size = min(self.capacity, self.size + m)
+
+    def _tail_index(self, k: int) -> np.ndarray:
+        k = min(int(k), self.size)
+        return (self._head - k + np.arange(k)) % self.capacity
+
+    def tail(self, column: str, k: int) -> np.ndarray:
+        """Last ``k`` values of ``column``, oldest first (a copy)."""
+        return self._data[column][self._tail_index(k)]
+
+    def set_tail(self, column: str, values: np.ndarray) -> None:
+        self._data[column][self._tail_index(len(values))] = values
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {c: self.tail(c, self.size) for c in self._data}
+
+
+def _cob_kernel(absorption_hours: float = _DEFAULT_CARB_ABSORPTION_HOURS) -> np.ndarray:
+    """Fraction of 1 g still unabsorbed k steps after the carb entry."""
+    n = int(absorption_hours * 60.0 / _STEP_MINUTES) + 1
+    absorbed = np.array([_carb_absorption_rate(k * _STEP_MINUTES, 1.0, absorption_hours)
+                         for k in range(n)])
+    return np.clip(1.0 - np.cumsum(absorbed), 0.0, 1.0)
+
+
+# ── Session ───────────────────────────────────────────────────────────
+
+ReadingsLike = Union[PatientData, Mapping[str, object]]
+
+
+class PipelineSession:
+    """Rolling per-patient pipeline state fed by ``append``.
+
+    Args:
+        profile: therapy settings (ISF/CR/basal/DIA and timezone).
+        patient_id: carried onto every update and refresh.
+        history: optional PatientData (or readings mapping) to seed the
+            session; it is appended like any other batch.
+        buffer_days: ring buffer length. Bounds memory and the history
+            that scheduled refreshes see.
+        refresh_hours: hours of new data between heavy refreshes (a full
+            ``run_pipeline`` over the buffer). None disables the
+            schedule; call ``refresh()`` directly instead.
+        min_refresh_days: no scheduled refresh until the buffer holds
+            this much data.
+        personal_params, forecast_config: passed to ``run_pipeline``.
+        sigma_mult: spike threshold multiplier (data_quality default).
+    """
+
+    def __init__(self,
+                 profile: PatientProfile,
+                 patient_id: str = "unknown",
+                 history: Optional[ReadingsLike] = None,
+                 buffer_days: float = 14.0,
+                 refresh_hours: Optional[float] = 24.0,
+                 min_refresh_days: float = 1.0,
+                 personal_params: Optional[dict] = None,
+                 forecast_config: Optional[dict] = None,
+                 sigma_mult: float = DEFAULT_SIGMA,
+                 ):
+        self.profile = profile
+        self.patient_id = patient_id
+        self.refresh_hours = refresh_hours
+        self.min_refresh_days = min_refresh_days
+        self.personal_params = personal_params
+        self.forecast_config = forecast_config
+        self.sigma_mult = sigma_mult
+        self._tz = getattr(profile, 'timezone', 'UTC') or 'UTC'
+        self._ring = _RingBuffer(max(int(buffer_days * 288), DECISION_WINDOW))
+
+        # Profile scalars, resolved once (same sources as the batch stages)
+        self._isf = _median_schedule_value(profile.isf_mgdl(), default=50.0)
+        self._cr = _median_schedule_value(profile.cr_schedule, default=10.0)
+        basal = _median_schedule_value(profile.basal_schedule, default=0.8)
+        self._demand_factor = _demand_calibration_factor(basal, self._isf)
+        self._meal_isf = _median_value(profile.isf_mgdl(), 'value', 'sensitivity',
+                                       default=50.0)
+        self._meal_cr = _median_value(profile.cr_schedule, 'value', 'carbratio',
+                                      default=10.0)
+
+        # Treatment convolution: kernels and contributions to future steps
+        self._iob_kernel = _insulin_kernels(profile.dia_hours, 1 << 30)[0]
+        self._cob_kernel = _cob_kernel()
+        self._future_iob = np.zeros(0)
+        self._future_cob = np.zeros(0)
+        self._pending_treatments = np.zeros((0, 3))  # (ts, bolus, carbs)
+
+        # Carried state
+        self.n_seen = 0
+        self._last_ts: Optional[float] = None
+        self._last_raw: Optional[float] = None
+        self._pending_spikes = 0       # trailing spikes awaiting a right anchor
+        self._prev_flux: Optional[tuple] = None  # (glucose, iob, cob, net_flux)
+        self._has_insulin = False
+        self._has_cob = False
+        self._has_basal = False
+        self._jump_stats = _RunningStats()
+        self._glucose_stats = _RunningStats()
+        self._n_low = 0
+        self._residual_stats = _RunningStats()
+        self._cluster: Optional[dict] = None
+        self._last_meal: Optional[DetectedMeal] = None
+        self._risk: Optional[RiskAssessment] = None
+        self._hypo_alert: Optional[HypoAlert] = None
+        self._last_refresh_ts: Optional[float] = None
+        self.last_full_result: Optional[PipelineResult] = None
+
+        if history is not None:
+            self.append(history)
+
+    # ── Public API ────────────────────────────────────────────────────
+
+    @property
+    def n_buffered(self) -> int:
+        return self._ring.size
+
+    @property
+    def days_buffered(self) -> float:
+        return self._ring.size * 5.0 / 60.0 / 24.0
+
+    @property
+    def last_meal(self) -> Optional[DetectedMeal]:
+        """Open meal cluster if one is accumulating, else the last closed one."""
+        if self._cluster is not None:
+            return self._cluster_to_meal(self._cluster, is_open=True)
+        return self._last_meal
+
+    def append(self,
+               readings: ReadingsLike,
+               treatments: Optional[Mapping[str, object]] = None,
+               ) -> SessionUpdate:
+        """Ingest new readings (and treatments); O(len(readings)).
+
+        Args:
+            readings: PatientData, or a mapping with 'timestamps' (ms) and
+                'glucose' plus optional 'iob', 'cob', 'basal_rate' and
+                per-interval 'bolus' / 'carbs' arrays, at 5-min cadence.
+                Readings at or before the last buffered timestamp are
+                dropped.
+            treatments: optional mapping with 'timestamps' (ms) and
+                'bolus' and/or 'carbs' event amounts. Each entry is
+                binned to the nearest reading; entries ahead of the
+                newest reading wait for it, late entries land on the
+                first new reading.
+
+        Returns:
+            SessionUpdate for the new readings.
+        """
+        start = time.perf_counter()
+        warnings: List[str] = []
+        batch = self._coerce_readings(readings, warnings)
+        self._bin_treatments(batch, treatments)
+        m = len(batch['timestamps'])
+        if m == 0:
+            return self._update(0, np.zeros(0), None, 0, False, start, warnings)
+
+        cleaned, n_spikes = self._clean(batch['glucose_raw'])
+        batch['glucose'] = cleaned
+        batch['treatment_iob'], batch['treatment_cob'] = self._convolve_treatments(batch)
+        batch.update(self._metabolic_step(batch))
+
+        self._ring.extend(batch)
+        self.n_seen += m
+        self._last_ts = float(batch['timestamps'][-1])
+        finite_raw = batch['glucose_raw'][np.isfinite(batch['glucose_raw'])]
+        self._glucose_stats.update(finite_raw)
+        self._n_low += int(np.sum(finite_raw < HYPO_LEVEL_1))
+        self._residual_stats.update(batch['residual'])
+
+        self._score_tail(warnings)
+        self._track_meals(m)
+
+        metabolic_tail = None
+        if self._has_insulin:
+            metabolic_tail = MetabolicState(**{c: batch[c] for c in _FLUX_COLUMNS})
+
+        refreshed = False
+        if self._refresh_due():
+            self.refresh()
+            refreshed = True
+        return self._update(m, cleaned, metabolic_tail, n_spikes, refreshed,
+                            start, warnings)
+
+    def refresh(self) -> PipelineResult:
+        """Run the full pipeline (heavy weekly stages) over the buffer."""
+        result = run_pipeline(
+            self.to_patient_data(),
+            personal_params=self.personal_params,
+            forecast_config=self.forecast_config,
+        )
+        self.last_full_result = result
+        self._last_refresh_ts = self._last_ts
+        return result
+
+    def to_patient_data(self) -> PatientData:
+        """Buffered history as PatientData (raw glucose, device IOB/COB)."""
+        cols = self._ring.to_arrays()
+        return PatientData(
+            glucose=cols['glucose_raw'],
+            timestamps=cols['timestamps'].astype(np.int64),
+            profile=self.profile,
+            iob=cols['iob'] if self._has_insulin else None,
+            cob=cols['cob'] if self._has_cob else None,
+            bolus=cols['bolus'],
+            carbs=cols['carbs'],
+            basal_rate=cols['basal_rate'] if self._has_basal else None,
+            patient_id=self.patient_id,
+        )
+
+    def treatment_state(self) -> Dict[str, np.ndarray]:
+        """IOB/COB convolved from the binned boluses and carbs, per buffered row.
+
+        Independent of the device-reported IOB/COB (which the metabolic
+        flux uses); available for patients whose uploader reports neither.
+        """
+        return {'iob': self._ring.tail('treatment_iob', self._ring.size),
+                'cob': self._ring.tail('treatment_cob', self._ring.size)}
+
+    def buffered_metabolic_state(self) -> Optional[MetabolicState]:
+        """Metabolic flux for the whole buffer (None without insulin data)."""
+        if not self._has_insulin:
+            return None
+        return MetabolicState(**{c: self._ring.tail(c, self._ring.size)
+                                 for c in _FLUX_COLUMNS})
+
+    # ── Ingest ────────────────────────────────────────────────────────
+
+    def _coerce_readings(self, readings: ReadingsLike,
+                         warnings: List[str]) -> Dict[str, np.ndarray]:
+        if isinstance(readings, PatientData):
+            readings = {k: getattr(readings, k) for k in
+                        ('timestamps', 'glucose', 'iob', 'cob',
+                         'basal_rate', 'bolus', 'carbs')}
+        ts = np.asarray(readings['timestamps'], dtype=np.float64).ravel()
+        m = len(ts)
+
+        def column(key: str, fill: float) -> np.ndarray:
+            values = readings.get(key)
+            if values is None:
+                return np.full(m, fill)
+            arr = np.asarray(values, dtype=np.float64).ravel()
+            if len(arr) != m:
+                raise ValueError(f"readings['{key}'] has {len(arr)} values, "
+                                 f"expected {m}")
+            return arr
+
+        batch = {
+            'timestamps': ts,
+            'glucose_raw': column('glucose', np.nan),
+            'iob': column('iob', np.nan),
+            'cob': column('cob', np.nan),
+            'basal_rate': column('basal_rate', np.nan),
+            'bolus': np.nan_to_num(column('bolus', 0.0), nan=0.0),
+            'carbs': np.nan_to_num(column('carbs', 0.0), nan=0.0),
+        }
+        order = np.argsort(ts, kind='stable')
+        if np.any(order != np.arange(m)):
+            batch = {k: v[order] for k, v in batch.items()}
+        keep = np.ones(m, dtype=bool)
+        keep[1:] = np.diff(batch['timestamps']) > 0
+        if self._last_ts is not None:
+            keep &= batch['timestamps'] > self._last_ts
+        if not keep.all():
+            warnings.append(f"Dropped {int((~keep).sum())} readings at or before "
+                            "an already buffered timestamp")
+            batch = {k: v[keep] for k, v in batch.items()}
+        return batch
+
+    def _bin_treatments(self, batch: Dict[str, np.ndarray],
+                        treatments: Optional[Mapping[str, object]]) -> None:
+        """Add treatment amounts to the per-interval bolus/carbs columns."""
+        events = self._pending_treatments
+        if treatments is not None:
+            tts = np.asarray(treatments['timestamps'], dtype=np.float64).ravel()
+            zeros = np.zeros(len(tts))
+            tb = treatments.get('bolus')
+            tc = treatments.get('carbs')
+            tb = np.asarray(tb, dtype=np.float64).ravel() if tb is not None else zeros
+            tc = np.asarray(tc, dtype=np.float64).ravel() if tc is not None else zeros
+            if not (len(tb) == len(tc) == len(tts)):
+                raise ValueError("treatments arrays must match 'timestamps' length")
+            events = np.vstack([events, np.column_stack([tts, tb, tc])])
+        if len(events) == 0:
+            return
+        ts = batch['timestamps']
+        if len(ts) == 0:
+            self._pending_treatments = events
+            return
+        idx = np.searchsorted(ts, events[:, 0] - STEP_MS / 2, side='left')
+        ready = idx < len(ts)
+        np.add.at(batch['bolus'], idx[ready], np.nan_to_num(events[ready, 1]))
+        np.add.at(batch['carbs'], idx[ready], np.nan_to_num(events[ready, 2]))
+        self._pending_treatments = events[~ready]
+
+    # ── Per-batch stages ─────────────────────────────────────────────
+
+    def _clean(self, raw: np.ndarray):
+        """Running-threshold spike detection + local interpolation."""
+        m = len(raw)
+        if self._last_raw is not None:
+            jumps = np.abs(np.diff(np.concatenate([[self._last_raw], raw])))
+            offset = 0
+        else:
+            jumps = np.abs(np.diff(raw))
+            offset = 1
+        self._last_raw = float(raw[-1])
+        self._jump_stats.update(jumps)
+
+        is_spike = np.zeros(m, dtype=bool)
+        stats = self._jump_stats
+        if self.n_seen + m >= _MIN_SPIKE_JUMPS and stats.n >= _MIN_SPIKE_JUMPS:
+            threshold = stats.mean + self.sigma_mult * stats.std
+            with np.errstate(invalid='ignore'):
+                flagged = np.isfinite(jumps) & (jumps > threshold)
+            is_spike[offset:] = flagged
+        n_spikes = int(is_spike.sum())
+        if n_spikes == 0 and self._pending_spikes == 0:
+            return raw.copy(), 0
+
+        # Interpolate over [anchor, pending spikes..., new readings]; the
+        # anchor and pending spikes come from the buffer.
+        k = min(self._pending_spikes + 1, self._ring.size)
+        window = np.concatenate([self._ring.tail('glucose_raw', k), raw])
+        n_pending = min(self._pending_spikes, k)
+        spike_idx = np.concatenate([
+            np.arange(k - n_pending, k), k + np.flatnonzero(is_spike)])
+        cleaned = interpolate_spikes(window, spike_idx.astype(int))
+        if n_pending:
+            self._ring.set_tail('glucose', cleaned[k - n_pending:k])
+
+        # Trailing spikes keep waiting for their right-hand anchor
+        non_spike = np.flatnonzero(~is_spike)
+        if len(non_spike):
+            self._pending_spikes = m - 1 - int(non_spike[-1])
+        else:
+            self._pending_spikes += m
+        return cleaned[k:], n_spikes
+
+    def _convolve_treatments(self, batch: Dict[str, np.ndarray]):
+        """Treatment IOB/COB for the batch; tracks which device columns exist.
+
+        Device IOB/COB stay as reported (NaN included) so the flux matches
+        compute_metabolic_state, whose has_insulin_data needs a finite IOB.
+        """
+        conv_iob = self._convolve(batch['bolus'], self._iob_kernel, '_future_iob')
+        conv_cob = self._convolve(batch['carbs'], self._cob_kernel, '_future_cob')
+        if np.any(np.isfinite(batch['iob'])):
+            self._has_insulin = True
+        if np.any(np.isfinite(batch['cob'])):
+            self._has_cob = True
+        if np.any(np.isfinite(batch['basal_rate'])):
+            self._has_basal = True
+        return conv_iob, conv_cob
+
+    def _convolve(self, amounts: np.ndarray, kernel: np.ndarray,
+                  attr: str) -> np.ndarray:
+        """Spread each amount over ``kernel``; return this batch's share."""
+        m = len(amounts)
+        future = getattr(self, attr)
+        need = m + len(kernel)
+        if len(future) < need:
+            future = np.concatenate([future, np.zeros(need - len(future))])
+        for j in np.flatnonzero(amounts > 0):
+            future[j:j + len(kernel)] += amounts[j] * kernel
+        current = future[:m].copy()
+        setattr(self, attr, future[m:])
+        return current
+
+    def _metabolic_step(self, batch: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """compute_metabolic_state for the new rows, carrying the previous step."""
+        m = len(batch['timestamps'])
+        glucose = np.nan_to_num(batch['glucose_raw'], nan=120.0)
+        iob = np.nan_to_num(batch['iob'], nan=0.0)
+        cob = np.nan_to_num(batch['cob'], nan=0.0)
+        hours = _extract_hours(batch['timestamps'])
+        hepatic = _compute_hepatic_production(iob, hours)
+
+        prev = self._prev_flux
+        delta_iob = np.zeros(m)
+        delta_cob = np.zeros(m)
+        if prev is not None:
+            delta_iob = np.concatenate([[prev[1]], iob[:-1]]) - iob
+            delta_cob = np.concatenate([[prev[2]], cob[:-1]]) - cob
+        else:
+            delta_iob[1:] = iob[:-1] - iob[1:]
+            delta_cob[1:] = cob[:-1] - cob[1:]
+
+        carb_supply = np.abs(delta_cob * (self._isf / max(self._cr, 1.0)))
+        supply = hepatic + carb_supply
+        demand = np.abs(delta_iob * self._isf)
+        if self._demand_factor is not None:
+            demand = demand * self._demand_factor
+        supply = np.maximum(supply, 0.0)
+        demand = np.maximum(demand, 0.0)
+        net_flux = np.asarray(supply - demand, dtype=np.float64)
+
+        residual = np.zeros(m)
+        if prev is not None:
+            g = np.concatenate([[prev[0]], glucose])
+            nf = np.concatenate([[prev[3]], net_flux])
+            bg_decay = (_DECAY_TARGET - g) * _DECAY_RATE
+            residual = np.diff(g) - (nf[:-1] + bg_decay[:-1])
+        else:
+            bg_decay = (_DECAY_TARGET - glucose) * _DECAY_RATE
+            residual[1:] = np.diff(glucose) - (net_flux[:-1] + bg_decay[:-1])
+
+        self._prev_flux = (glucose[-1], iob[-1], cob[-1], net_flux[-1])
+        return {'supply': supply, 'demand': demand, 'hepatic': hepatic,
+                'carb_supply': carb_supply, 'net_flux': net_flux,
+                'residual': residual}
+
+    def _score_tail(self, warnings: List[str]) -> None:
+        """Risk + hypo alert from the last DECISION_WINDOW readings."""
+        glucose = self._ring.tail('glucose', DECISION_WINDOW)
+        metabolic = None
+        if self._has_insulin:
+            metabolic = MetabolicState(**{c: self._ring.tail(c, DECISION_WINDOW)
+                                          for c in _FLUX_COLUMNS})
+        try:
+            self._risk = classify_risk_simple(glucose, metabolic)
+        except Exception as e:
+            warnings.append(f"Event detection failed: {e}")
+        try:
+            threshold = None
+            if self.n_seen >= _CALIBRATION_MIN_SAMPLES:
+                threshold = self._calibrated_threshold()
+            self._hypo_alert = predict_hypo(glucose, metabolic=metabolic,
+                                            personal_threshold=threshold)
+        except Exception as e:
+            warnings.append(f"Hypo prediction failed: {e}")
+
+    def _calibrated_threshold(self) -> float:
+        """calibrate_threshold over the session's running glucose stats."""
+        stats = self._glucose_stats
+        if stats.n < _CALIBRATION_MIN_VALID or stats.mean == 0.0:
+            return DEFAULT_THRESHOLD
+        return _threshold_from_distribution(stats.std / stats.mean,
+                                            self._n_low / stats.n)
+
+    # ── Meal cluster ─────────────────────────────────────────────────
+
+    def _track_meals(self, m: int) -> None:
+        """Advance the residual-burst cluster over the last ``m`` readings."""
+        stats = self._residual_stats
+        resid_std = stats.std
+        if self.n_seen < _MIN_MEAL_RESIDUALS or resid_std < 1e-6:
+            return
+        burst_threshold = DEFAULT_SIGMA_MULT * resid_std * ROLLING_WINDOW * 0.5
+        baseline = stats.mean
+
+        lead = max(ROLLING_WINDOW - 1, _MEAL_ANNOUNCE_LOOKBACK)
+        n_ctx = min(self._ring.size, m + lead)
+        n_lead = n_ctx - m
+        resid = self._ring.tail('residual', n_ctx)
+        demand = self._ring.tail('demand', n_ctx)
+        carb_supply = self._ring.tail('carb_supply', n_ctx)
+        ts = self._ring.tail('timestamps', n_ctx)
+        resid_pos = np.maximum(np.nan_to_num(resid, nan=0.0), 0.0)
+        csum = np.concatenate([[0.0], np.cumsum(resid_pos)])
+        lo = np.maximum(np.arange(n_ctx) + 1 - ROLLING_WINDOW, 0)
+        rolling = csum[1:] - csum[lo]
+
+        first_abs = self.n_seen - n_ctx
+        for i in range(n_lead, n_ctx):
+            a = first_abs + i
+            c = self._cluster
+            if c is not None:
+                if a <= c['end'] + _MEAL_INTEGRATION_STEPS:
+                    c['pos_int'] += max(float(np.nan_to_num(resid[i])) - baseline, 0.0)
+                    c['demand'] += float(np.nan_to_num(demand[i]))
+                if a <= c['end'] + _MEAL_ANNOUNCE_LOOKAHEAD:
+                    c['carb_supply'] += float(carb_supply[i])
+            if rolling[i] > burst_threshold:
+                if c is not None and a - c['end'] <= MULTIPART_GAP_STEPS:
+                    c['end'], c['end_ts'] = a, float(ts[i])
+                    c['peak'] = max(c['peak'], float(rolling[i]))
+                else:
+                    if c is not None:
+                        self._last_meal = self._cluster_to_meal(c, is_open=False)
+                    lb = max(0, i - _MEAL_ANNOUNCE_LOOKBACK)
+                    self._cluster = {
+                        'start': a, 'end': a,
+                        'start_ts': float(ts[i]), 'end_ts': float(ts[i]),
+                        'peak': float(rolling[i]),
+                        'threshold': burst_threshold,
+                        'pos_int': max(float(np.nan_to_num(resid[i])) - baseline, 0.0),
+                        'demand': float(np.nan_to_num(demand[i])),
+                        'carb_supply': float(np.sum(carb_supply[lb:i + 1])),
+                    }
+            elif c is not None and a > c['end'] + _MEAL_INTEGRATION_STEPS:
+                self._last_meal = self._cluster_to_meal(c, is_open=False)
+                self._cluster = None
+
+    def _cluster_to_meal(self, c: dict, is_open: bool) -> DetectedMeal:
+        center_ts = (c['start_ts'] + c['end_ts']) / 2.0
+        hour = float(_extract_hours(np.array([center_ts]), tz=self._tz)[0])
+        estimated = (c['pos_int'] + c['demand']) * self._meal_cr / max(self._meal_isf, 1.0)
+        return DetectedMeal(
+            index=(c['start'] + c['end']) // 2,
+            timestamp_ms=center_ts,
+            window=_classify_meal_window(hour),
+            estimated_carbs_g=max(0.0, estimated),
+            announced=c['carb_supply'] > MIN_CARB_SUPPLY,
+            residual_integral=c['pos_int'],
+            confidence=min(1.0, c['peak'] / (c['threshold'] * 3.0)),
+            hour_of_day=hour,
+            metadata={'source': 'pipeline_session', 'open': is_open},
+        )
+
+    # ── Refresh schedule ─────────────────────────────────────────────
+
+    def _refresh_due(self) -> bool:
+        if self.refresh_hours is None or self.days_buffered < self.min_refresh_days:
+            return False
+        if self._last_refresh_ts is None:
+            return True
+        return self._last_ts - self._last_refresh_ts >= self.refresh_hours * 3_600_000
+
+    def _update(self, m, cleaned, metabolic_tail, n_spikes, refreshed,
+                start, warnings) -> SessionUpdate:
+        stats = self._residual_stats
+        return SessionUpdate(
+            patient_id=self.patient_id,
+            n_new=m,
+            n_buffered=self._ring.size,
+            timestamp_ms=self._last_ts if self._last_ts is not None else 0.0,
+            cleaned_tail=cleaned,
+            metabolic_tail=metabolic_tail,
+            risk=self._risk,
+            hypo_alert=self._hypo_alert,
+            n_spikes=n_spikes,
+            residual_mean=stats.mean if stats.n else None,
+            residual_std=stats.std if stats.n else None,
+            last_meal=self.last_meal,
+            refreshed=refreshed,
+            full_result=self.last_full_result if refreshed else None,
+            latency_ms=(time.perf_counter() - start) * 1000.0,
+            warnings=warnings,
+        )
@@ -29,7 +29,7 @@ from .types import (
     MetabolicState, PatientData, PatientProfile,
     OptimalSettings, SettingsOptimizationResult,
 )
-from .metabolic_engine import compute_metabolic_state, _extract_hours
+from .physics_cache import cached_hours, cached_metabolic_state
 from .settings_advisor import simulate_tir_with_settings
 from .natural_experiment_detector import detect_natural_experiments
 from .settings_optimizer import optimize_settings
@@ -133,10 +133,10 @@ def validate_patient(patient: PatientData,
     )
 
     # Compute metabolic state
-    meta_train = compute_metabolic_state(train)
-    meta_test = compute_metabolic_state(test)
-    hours_train = _extract_hours(train.timestamps)
-    hours_test = _extract_hours(test.timestamps)
+    meta_train = cached_metabolic_state(train)
+    meta_test = cached_metabolic_state(test)
+    hours_train = cached_hours(train.timestamps)
+    hours_test = cached_hours(test.timestamps)
 
     # Actual TIR
     def _tir(g):
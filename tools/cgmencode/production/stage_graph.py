@@ -0,0 +1,197 @@
+"""
+stage_graph.py — Declarative stage DAG and executor behind run_pipeline.
+
+Each pipeline stage is a ``StageNode`` naming the artifacts it reads
+and the artifacts it produces. ``StageGraph`` validates the wiring,
+selects the transitive dependencies of a requested output set, and
+runs the selected nodes either sequentially (declaration order) or on
+a thread pool as soon as their inputs exist.
+
+Declaration order is both a valid topological order and the canonical
+order: callers merge per-node side records (stage metrics, warnings)
+in that order, so a threaded run yields the same result as the
+sequential one.
+
+The graph is introspectable for instrumentation and benchmarks:
+
+    from tools.cgmencode.production.pipeline import PIPELINE_GRAPH
+    PIPELINE_GRAPH.required_nodes({'hypo_alert'})   # nodes that would run
+    path, ms = PIPELINE_GRAPH.critical_path(
+        {m.name: m.wall_ms for m in result.stage_metrics})
+    print(PIPELINE_GRAPH.to_dot())
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import (
+    Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple,
+)
+
+
+@dataclass(frozen=True)
+class StageNode:
+    """One stage: ``fn(ctx, **inputs) -> {output: value}``."""
+    name: str
+    fn: Callable[..., Dict[str, Any]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+
+
+class StageGraph:
+    """Validated DAG of StageNodes in canonical (declaration) order.
+
+    Raises:
+        ValueError: duplicate node names, an artifact produced twice, or
+            an input that no earlier node produces.
+    """
+
+    def __init__(self, nodes: Sequence[StageNode]):
+        self.nodes: List[StageNode] = list(nodes)
+        self._by_name: Dict[str, StageNode] = {}
+        self.producers: Dict[str, str] = {}
+        for node in self.nodes:
+            if node.name in self._by_name:
+                raise ValueError(f"Duplicate stage {node.name!r}")
+            for a in node.inputs:
+                if a not in self.producers:
+                    raise ValueError(f"Stage {node.name!r} reads {a!r}, which no "
+                                     f"earlier stage produces")
+            for a in node.outputs:
+                if a in self.producers:
+                    raise ValueError(f"Artifact {a!r} produced by both "
+                                     f"{self.producers[a]!r} and {node.name!r}")
+                self.producers[a] = node.name
+            self._by_name[node.name] = node
+
+    # ── Introspection ────────────────────────────────────────────────
+
+    def node(self, name: str) -> StageNode:
+        return self._by_name[name]
+
+    @property
+    def artifacts(self) -> List[str]:
+        return list(self.producers)
+
+    def dependencies(self, name: str) -> List[str]:
+        """Direct upstream stages of ``name`` (canonical order)."""
+        ups = {self.producers[a] for a in self._by_name[name].inputs}
+        return [n.name for n in self.nodes if n.name in ups]
+
+    def required_nodes(self, outputs: Optional[Iterable[str]] = None) -> List[StageNode]:
+        """Nodes needed for ``outputs`` (all nodes when None), canonical order."""
+        if outputs is None:
+            return list(self.nodes)
+        unknown = sorted(set(outputs) - set(self.producers))
+        if unknown:
+            raise ValueError(f"Unknown pipeline outputs {unknown}; "
+                             f"available: {sorted(self.producers)}")
+        needed = set()
+        stack = [self.producers[a] for a in outputs]
+        while stack:
+            name = stack.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            stack.extend(self.producers[a] for a in self._by_name[name].inputs)
+        return [n for n in self.nodes if n.name in needed]
+
+    def critical_path(self, durations: Mapping[str, float],
+                      outputs: Optional[Iterable[str]] = None,
+                      ) -> Tuple[List[str], float]:
+        """Longest duration-weighted dependency chain.
+
+        Args:
+            durations: per-stage cost (e.g. ``wall_ms`` from
+                ``PipelineResult.stage_metrics``); missing stages cost 0.
+            outputs: restrict to the nodes needed for these outputs.
+
+        Returns:
+            (stage names along the path, total cost) — the lower bound on
+            wall time for any parallel schedule of the graph.
+        """
+        best: Dict[str, Tuple[float, Optional[str]]] = {}
+        for node in self.required_nodes(outputs):
+            prev = max(((best[d][0], d) for d in self.dependencies(node.name)
+                        if d in best), default=(0.0, None))
+            best[node.name] = (prev[0] + float(durations.get(node.name, 0.0)), prev[1])
+        if not best:
+            return [], 0.0
+        # Ties resolve to the most downstream node so the path ends at a sink
+        tail = max(reversed(list(best)), key=lambda k: best[k][0])
+        total = best[tail][0]
+        path = []
+        while tail is not None:
+            path.append(tail)
+            tail = best[tail][1]
+        return path[::-1], total
+
+    def to_dot(self) -> str:
+        """Graphviz rendering (stages as nodes, artifacts as edge labels)."""
+        lines = ['digraph pipeline {', '  rankdir=LR;']
+        for node in self.nodes:
+            lines.append(f'  "{node.name}";')
+            for a in node.inputs:
+                lines.append(f'  "{self.producers[a]}" -> "{node.name}" [label="{a}"];')
+        lines.append('}')
+        return '\n'.join(lines)
+
+    # ── Execution ────────────────────────────────────────────────────
+
+    def run(self,
+            invoke: Callable[[StageNode, Dict[str, Any]], Dict[str, Any]],
+            outputs: Optional[Iterable[str]] = None,
+            max_workers: int = 1,
+            ) -> Dict[str, Any]:
+        """Execute the nodes needed for ``outputs``; return all artifacts.
+
+        Args:
+            invoke: ``invoke(node, inputs)`` runs one node and returns its
+                outputs dict (the caller supplies per-node context).
+            outputs: artifact names to produce (None = every node).
+            max_workers: >1 runs ready nodes on a thread pool. Nodes must
+                not mutate their inputs.
+
+        The first exception raised by a node propagates after running
+        nodes finish; nodes not yet started are abandoned.
+        """
+        nodes = self.required_nodes(outputs)
+        artifacts: Dict[str, Any] = {}
+
+        def call(node: StageNode, inputs: Dict[str, Any]) -> Dict[str, Any]:
+            produced = invoke(node, inputs)
+            if set(produced) != set(node.outputs):
+                raise RuntimeError(f"Stage {node.name!r} returned {sorted(produced)}, "
+                                   f"declared {sorted(node.outputs)}")
+            return produced
+
+        if max_workers <= 1:
+            for node in nodes:
+                artifacts.update(call(node, {a: artifacts[a] for a in node.inputs}))
+            return artifacts
+
+        pending = list(nodes)
+        running: Dict[Any, StageNode] = {}
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix='pipeline-stage') as pool:
+            try:
+                while pending or running:
+                    ready = [n for n in pending
+                             if all(a in artifacts for a in n.inputs)]
+                    for node in ready:
+                        pending.remove(node)
+                        inputs = {a: artifacts[a] for a in node.inputs}
+                        running[pool.submit(call, node, inputs)] = node
+                    if not running:
+                        raise RuntimeError("Stage graph stalled: "
+                                           f"{[n.name for n in pending]}")
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        running.pop(fut)
+                        artifacts.update(fut.result())
+            except BaseException:
+                for fut in running:
+                    fut.cancel()
+                raise
+        return artifacts
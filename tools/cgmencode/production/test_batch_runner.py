@@ -0,0 +1,86 @@
+"""Tests for parallel cohort execution (batch_runner)."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from tools.cgmencode.production.batch_runner import (
+    BatchThroughput,
+    PipelineError,
+    iter_pipeline_parallel,
+    run_pipeline_parallel,
+)
+from tools.cgmencode.production.pipeline import run_pipeline_batch
+from tools.cgmencode.production.test_production import make_patient
+from tools.cgmencode.production.types import PipelineResult
+
+pytestmark = pytest.mark.unit
+
+
+def _cohort(n=3, samples=600):
+    return [make_patient(n=samples, patient_id=f"bp_{i}") for i in range(n)]
+
+
+def test_parallel_matches_sequential():
+    patients = _cohort()
+    seq = run_pipeline_batch(patients, skip_patterns=True)
+    batch = run_pipeline_parallel(patients, workers=2, skip_patterns=True)
+    assert [r.patient_id for r in batch.results] == [p.patient_id for p in patients]
+    for a, b in zip(seq, batch.results):
+        assert isinstance(b, PipelineResult)
+        np.testing.assert_array_equal(a.cleaned.glucose, b.cleaned.glucose)
+        assert a.clinical_report.tir == b.clinical_report.tir
+
+
+def test_failure_is_structured_not_fatal():
+    patients = _cohort(2)
+    bad = make_patient(n=600, patient_id="bp_bad")
+    bad.profile = None
+    patients.insert(1, bad)
+    batch = run_pipeline_parallel(patients, workers=2, skip_patterns=True)
+    assert isinstance(batch.results[0], PipelineResult)
+    assert isinstance(batch.results[2], PipelineResult)
+    err = batch.results[1]
+    assert isinstance(err, PipelineError)
+    assert err.patient_id == "bp_bad"
+    assert err.index == 1
+    assert err.error_type == "AttributeError"
+    assert not err.timed_out
+    assert batch.throughput.n_failed == 1
+    assert batch.throughput.n_ok == 2
+
+
+def test_timeout_returns_error_and_batch_completes():
+    patients = _cohort(2, samples=4320)
+    batch = run_pipeline_parallel(patients, workers=1, timeout_s=0.01)
+    assert all(isinstance(r, PipelineError) and r.timed_out for r in batch.results)
+    assert batch.throughput.n_timed_out == 2
+
+
+def test_terminated_workers_do_not_lose_other_results():
+    # Repeated kills across two workers: each reports on its own pipe, so
+    # every patient still comes back exactly once
+    patients = _cohort(6, samples=4320)
+    seen = sorted(i for i, _ in iter_pipeline_parallel(
+        patients, workers=2, timeout_s=0.05, ordered=False))
+    assert seen == list(range(6))
+
+
+def test_as_completed_streaming_yields_every_index():
+    patients = _cohort(4)
+    seen = sorted(i for i, _ in iter_pipeline_parallel(
+        patients, workers=2, ordered=False, skip_patterns=True))
+    assert seen == [0, 1, 2, 3]
+
+
+def test_throughput_report():
+    tp = BatchThroughput(
+        n_patients=4, n_ok=4, n_failed=0, n_timed_out=0, workers=2,
+        wall_seconds=2.0, latencies_ms=np.array([100.0, 200.0, 400.0, 800.0]),
+    )
+    assert tp.patients_per_second == 2.0
+    assert tp.p50_ms == 300.0
+    assert tp.fraction_within_target == 0.75
+    summary = tp.summary()
+    assert summary['target_ms'] == 500.0
+    assert summary['p95_ms'] > summary['p50_ms']
@@ -0,0 +1,260 @@
+"""Vectorized correction/meal event extraction matches the loop version.
+
+The loop implementations below are the pre-vectorization reference
+copies of ``pipeline._extract_correction_events`` /
+``pipeline._extract_meal_events``; the vectorized extractors must
+reproduce them exactly on randomized histories.
+"""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pytest
+
+from tools.cgmencode.production.meal_filter import is_real_carb_event, is_real_meal
+from tools.cgmencode.production.pipeline import (
+    _extract_correction_events, _extract_meal_events, _prior_glucose_min,
+    _prior_glucose_min_array,
+)
+from tools.cgmencode.production.test_production import make_profile
+from tools.cgmencode.production.types import TIR_HIGH, TIR_LOW
+
+pytestmark = pytest.mark.unit
+
+
+# ── Reference (loop) implementations ─────────────────────────────────
+
+def _loop_correction_events(
+    glucose: np.ndarray,
+    bolus: Optional[np.ndarray],
+    carbs: Optional[np.ndarray],
+    hours: np.ndarray,
+    profile,
+    inferred_meals: Optional[Iterable] = None,
+    inferred_meal_min_carbs_g: float = 5.0,
+) -> List[dict]:
+    """Pre-vectorization loop implementation (reference)."""
+    if bolus is None or len(glucose) < 49:
+        return []
+
+    N = len(glucose)
+    target_high = getattr(profile, 'target_high', 180.0)
+    events: List[dict] = []
+
+    inferred_meal_idx_carbs: List[tuple] = []
+    if inferred_meals:
+        for m in inferred_meals:
+            try:
+                idx = int(getattr(m, 'index'))
+                cg = float(getattr(m, 'estimated_carbs_g', 0.0))
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if cg >= inferred_meal_min_carbs_g and 0 <= idx < N:
+                inferred_meal_idx_carbs.append((idx, cg))
+
+    for i in range(N):
+        if np.isnan(bolus[i]) or bolus[i] <= 0.1:
+            continue
+
+        # Skip if glucose at bolus time is missing or below target
+        if np.isnan(glucose[i]) or glucose[i] <= target_high:
+            continue
+
+        # Skip if significant carbs within ±12 steps (1 hour)
+        carb_window_lo = max(0, i - 12)
+        carb_window_hi = min(N, i + 13)
+        # Skip if significant carbs within ±12 steps (1 hour). Treats-of-low
+        # (small carbs taken at low BG) are excluded from this guard so they
+        # don't suppress legitimate correction events.
+        real_carbs = 0.0
+        if carbs is not None:
+            carb_lo, carb_hi = carb_window_lo, carb_window_hi
+            for j in range(carb_lo, carb_hi):
+                cj = carbs[j]
+                if np.isnan(cj) or cj <= 0:
+                    continue
+                prior_min_j = _prior_glucose_min(glucose, j, n_steps=6)
+                if is_real_carb_event(float(cj),
+                                      prior_glucose_30min_min=prior_min_j):
+                    real_carbs += float(cj)
+
+        # Inferred meals (under-logger correction): treat as additional
+        # ±1 h carb window. EXP-2739: under-loggers had post-meal boluses
+        # mis-classified as fasting corrections, deflating ISF.
+        if inferred_meal_idx_carbs:
+            for (im_idx, im_cg) in inferred_meal_idx_carbs:
+                if carb_window_lo <= im_idx < carb_window_hi:
+                    real_carbs += im_cg
+
+        if real_carbs > 5.0:
+            continue
+
+        # Need 48 steps (4h) of future glucose
+        end_idx = i + 48
+        if end_idx >= N:
+            continue
+
+        start_bg = float(glucose[i])
+        end_bg = float(glucose[end_idx])
+        if np.isnan(end_bg):
+            continue
+
+        window = glucose[i:end_idx + 1]
+        valid_mask = ~np.isnan(window)
+        if valid_mask.sum() < 6:
+            continue
+
+        drop = start_bg - end_bg
+
+        # Check if glucose went below 70 in the window
+        went_below_70 = bool(np.nanmin(window) < TIR_LOW)
+
+        # Rebound detection: find nadir, check if BG rose >30 above nadir after it
+        nadir_val = float(np.nanmin(window))
+        nadir_pos = int(np.nanargmin(np.where(valid_mask, window, np.inf)))
+        rebound = False
+        rebound_magnitude = 0.0
+        if nadir_pos < len(window) - 1:
+            post_nadir = window[nadir_pos + 1:]
+            post_valid = post_nadir[~np.isnan(post_nadir)]
+            if len(post_valid) > 0:
+                peak_after_nadir = float(np.max(post_valid))
+                rebound_magnitude = peak_after_nadir - nadir_val
+                rebound = rebound_magnitude > 30.0
+
+        # TIR change: fraction of readings 70-180 in 48 steps pre vs post
+        pre_start = max(0, i - 48)
+        pre_window = glucose[pre_start:i]
+        post_window = glucose[i:end_idx + 1]
+
+        def _tir_frac(arr: np.ndarray) -> float:
+            v = arr[~np.isnan(arr)]
+            if len(v) == 0:
+                return 0.0
+            return float(np.mean((v >= TIR_LOW) & (v <= TIR_HIGH)))
+
+        tir_change = _tir_frac(post_window) - _tir_frac(pre_window)
+
+        hour = float(hours[i]) if i < len(hours) else 0.0
+
+        events.append({
+            'start_bg': start_bg,
+            'drop_4h': drop,
+            'dose': float(bolus[i]),
+            'hour': hour,
+            'tir_change': tir_change,
+            'rebound': rebound,
+            'rebound_magnitude': rebound_magnitude,
+            'went_below_70': went_below_70,
+        })
+
+    return events
+
+
+def _loop_meal_events(
+    glucose: np.ndarray,
+    bolus: Optional[np.ndarray],
+    carbs: Optional[np.ndarray],
+    hours: np.ndarray,
+) -> List[dict]:
+    """Pre-vectorization loop implementation (reference)."""
+    if carbs is None or len(glucose) < 49:
+        return []
+
+    N = len(glucose)
+    events: List[dict] = []
+
+    for i in range(N):
+        if np.isnan(carbs[i]):
+            continue
+        prior_min = _prior_glucose_min(glucose, i, n_steps=6)
+        if not is_real_meal(float(carbs[i]),
+                            prior_glucose_30min_min=prior_min):
+            continue
+
+        # Sum bolus within ±2 steps
+        b_lo = max(0, i - 2)
+        b_hi = min(N, i + 3)
+        if bolus is not None:
+            bolus_sum = float(np.nansum(bolus[b_lo:b_hi]))
+        else:
+            bolus_sum = 0.0
+
+        pre_meal_bg = float(glucose[i]) if not np.isnan(glucose[i]) else np.nan
+        if np.isnan(pre_meal_bg):
+            continue
+
+        # 4-hour post-meal glucose
+        post_idx = i + 48
+        if post_idx >= N:
+            continue
+        post_meal_bg = float(glucose[post_idx])
+        if np.isnan(post_meal_bg):
+            continue
+
+        hour = float(hours[i]) if i < len(hours) else 0.0
+
+        events.append({
+            'carbs': float(carbs[i]),
+            'bolus': bolus_sum,
+            'pre_meal_bg': pre_meal_bg,
+            'post_meal_bg_4h': post_meal_bg,
+            'hour': hour,
+        })
+
+    return events
+
+
+# ── Equivalence ──────────────────────────────────────────────────────
+
+def _history(seed: int, n: int = 3000):
+    rng = np.random.default_rng(seed)
+    glucose = 150 + 70 * np.sin(np.arange(n) / 40.0) + rng.normal(0, 25, n)
+    glucose[rng.random(n) < 0.05] = np.nan
+    glucose[200:230] = 62.0                      # a low → treats-of-low follow
+    bolus = np.where(rng.random(n) < 0.15, rng.choice([0.05, 0.2, 0.5, 2.0], n), 0.0)
+    bolus[rng.random(n) < 0.01] = np.nan
+    carbs = np.where(rng.random(n) < 0.02, rng.choice([3.0, 5.0, 8.0, 15.0, 45.0], n), 0.0)
+    carbs[232] = 12.0
+    carbs[rng.random(n) < 0.005] = np.nan
+    hours = (np.arange(n) * 5.0 / 60.0) % 24.0
+    return glucose, bolus, carbs, hours
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_correction_events_identical(seed):
+    glucose, bolus, carbs, hours = _history(seed)
+    profile = make_profile()
+    assert (_extract_correction_events(glucose, bolus, carbs, hours, profile)
+            == _loop_correction_events(glucose, bolus, carbs, hours, profile))
+    assert (_extract_correction_events(glucose, bolus, None, hours[:-100], profile)
+            == _loop_correction_events(glucose, bolus, None, hours[:-100], profile))
+    rng = np.random.default_rng(seed + 100)
+    meals = [SimpleNamespace(index=int(i), estimated_carbs_g=float(g))
+             for i, g in zip(rng.integers(-10, len(glucose) + 10, 60),
+                             rng.choice([2.0, 5.0, 20.0, 60.0], 60))]
+    meals.append(SimpleNamespace(index='bad'))
+    assert (_extract_correction_events(glucose, bolus, carbs, hours, profile,
+                                       inferred_meals=meals)
+            == _loop_correction_events(glucose, bolus, carbs, hours, profile,
+                                       inferred_meals=meals))
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_meal_events_identical(seed):
+    glucose, bolus, carbs, hours = _history(seed)
+    got = _extract_meal_events(glucose, bolus, carbs, hours)
+    assert got == _loop_meal_events(glucose, bolus, carbs, hours)
+    assert got
+    assert (_extract_meal_events(glucose, None, carbs, hours[:-100])
+            == _loop_meal_events(glucose, None, carbs, hours[:-100]))
+
+
+def test_prior_min_array_matches_scalar():
+    glucose, _, _, _ = _history(0, n=400)
+    arr = _prior_glucose_min_array(glucose)
+    for i in range(len(glucose)):
+        ref = _prior_glucose_min(glucose, i)
+        assert arr[i] == (np.inf if ref is None else ref)
@@ -0,0 +1,164 @@
+"""Tests for projected experiment grid loading and the process grid cache."""
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.cgmencode.production import grid_cache as gc
+from tools.cgmencode.production.experiment_base import ObservationalExperiment
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def terrarium(tmp_path):
+    rng = np.random.default_rng(0)
+    frames = []
+    for k, pid in enumerate(["a", "b", "c", "d"]):
+        n = 300
+        frames.append(pd.DataFrame({
+            "patient_id": pid,
+            "time": pd.Timestamp("2025-01-01", tz="UTC")
+            + pd.to_timedelta(np.arange(n) * 5, unit="min"),
+            "glucose": rng.normal(150, 30, n).astype(np.float32),
+            "bolus": np.where(rng.random(n) < 0.05, 2.0, 0.0).astype(np.float32),
+            "iob": rng.uniform(0, 4, n).astype(np.float32),
+            "carbs": np.zeros(n, dtype=np.float32),
+            "scheduled_isf": np.float32(40 + k),
+            "cob": rng.uniform(0, 30, n).astype(np.float32),
+        }))
+    grid = pd.concat(frames).sample(frac=1.0, random_state=1)
+    grid_path = tmp_path / "grid.parquet"
+    grid.to_parquet(grid_path, index=False, row_group_size=250)
+    ds = pd.DataFrame({"patient_id": ["a", "b", "b", "c", "d"],
+                       "controller": ["loop", "trio", "loop", "openaps", "aaps"],
+                       "payload": ["x"] * 5})
+    ds_path = tmp_path / "devicestatus.parquet"
+    ds.to_parquet(ds_path, index=False)
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"qualified_patients": ["b", "a", "d"]}))
+    return grid_path, ds_path, manifest
+
+
+def _legacy_load(grid_path, ds_path, qualified):
+    """The pre-projection ObservationalExperiment.load_data body."""
+    grid = pd.read_parquet(grid_path)
+    ds = pd.read_parquet(ds_path)
+    ctrl_map = ds.groupby("patient_id")["controller"].first().to_dict()
+    grid["controller"] = grid["patient_id"].map(ctrl_map)
+    grid = grid[grid["patient_id"].isin(qualified)].copy()
+    return grid.sort_values(["patient_id", "time"]).reset_index(drop=True), ctrl_map
+
+
+def test_projected_load_matches_full_read(terrarium):
+    grid_path, ds_path, _ = terrarium
+    expected, ctrl = _legacy_load(grid_path, ds_path, ["a", "b", "d"])
+    grid, ctrl_map = gc.load_grid(grid_path, ds_path, ["a", "b", "d"],
+                                  columns=["glucose", "bolus", "no_such_column"])
+    assert list(grid.columns) == ["patient_id", "time", "glucose", "bolus", "controller"]
+    pd.testing.assert_frame_equal(grid, expected[list(grid.columns)])
+    assert ctrl_map == {k: v for k, v in ctrl.items() if k in {"a", "b", "d"}}
+
+    full, _ = gc.load_grid(grid_path, ds_path, ["a", "b", "d"])
+    pd.testing.assert_frame_equal(full, expected)
+
+
+def test_cache_shares_one_decoded_grid(terrarium):
+    grid_path, ds_path, _ = terrarium
+    cache = gc.GridCache()
+    first, _ = cache.load(grid_path, ds_path, ["a", "b"], ["glucose", "iob"])
+    subset, _ = cache.load(grid_path, ds_path, ["b", "a"], ["glucose"])
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.shares_memory(first["glucose"].values, subset["glucose"].values)
+    subset["extra"] = 1.0                       # private to this caller
+    with pytest.raises(ValueError, match="read-only"):
+        subset.loc[0, "glucose"] = -1.0         # shared: element writes refused
+    subset["iob"] = 0.0                         # whole-column replacement is private
+    again = cache.load(grid_path, ds_path, ["a", "b"], ["iob", "glucose"])[0]
+    assert "extra" not in again
+    pd.testing.assert_frame_equal(again, first)
+
+    cache.load(grid_path, ds_path, ["a", "b"], ["glucose", "cob"])   # not covered
+    cache.load(grid_path, ds_path, ["a"], ["glucose"])               # other patients
+    assert cache.misses == 3 and cache.stats()["entries"] == 3
+
+
+def test_copy_gives_private_writable_grid(terrarium):
+    grid_path, ds_path, _ = terrarium
+    cache = gc.GridCache()
+    shared, _ = cache.load(grid_path, ds_path, ["a", "b"], ["glucose"])
+    private, _ = cache.load(grid_path, ds_path, ["a", "b"], ["glucose"], copy=True)
+    assert not np.shares_memory(shared["glucose"].values, private["glucose"].values)
+    private.loc[0, "glucose"] = -1.0
+    private.loc[0, "time"] = pd.Timestamp(0, tz="UTC")
+    again, _ = cache.load(grid_path, ds_path, ["a", "b"], ["glucose"])
+    pd.testing.assert_frame_equal(again, shared)
+
+
+def test_cache_evicts_least_recently_used(terrarium):
+    grid_path, ds_path, _ = terrarium
+    cache = gc.GridCache(max_entries=2)
+    cache.load(grid_path, ds_path, ["a"], ["glucose"])
+    cache.load(grid_path, ds_path, ["b"], ["glucose"])
+    cache.load(grid_path, ds_path, ["a"], ["glucose"])               # refresh "a"
+    cache.load(grid_path, ds_path, ["c"], ["glucose"])               # evicts "b"
+    assert cache.stats()["entries"] == 2
+    cache.load(grid_path, ds_path, ["a"], ["glucose"])
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.load(grid_path, ds_path, ["b"], ["glucose"])
+    assert (cache.hits, cache.misses) == (2, 4)
+    with pytest.raises(ValueError):
+        gc.GridCache(max_entries=0)
+
+
+def test_dataset_source_id_tracks_fragments(terrarium, tmp_path):
+    grid_path, _, _ = terrarium
+    ds_dir = tmp_path / "grid_ds"
+    pd.read_parquet(grid_path).to_parquet(ds_dir, partition_cols=["patient_id"])
+    before = gc._source_id(ds_dir)
+    assert gc._source_id(ds_dir) == before
+    # Appending a fragment leaves the directory's own stat unchanged
+    frag = next((ds_dir / "patient_id=a").glob("*.parquet"))
+    pd.read_parquet(frag).to_parquet(frag.with_name("part-extra.parquet"))
+    assert gc._source_id(ds_dir) != before
+
+
+def test_ipc_backed_cache_round_trip(terrarium, tmp_path):
+    grid_path, ds_path, _ = terrarium
+    expected, _ = gc.load_grid(grid_path, ds_path, ["a", "c"], ["glucose"])
+    gc.GridCache(tmp_path / "ipc").load(grid_path, ds_path, ["a", "c"], ["glucose"])
+    assert len(list((tmp_path / "ipc").glob("grid-*.arrow"))) == 1
+
+    fresh = gc.GridCache(tmp_path / "ipc")          # e.g. another process
+    grid, ctrl = fresh.load(grid_path, ds_path, ["a", "c"], ["glucose"])
+    pd.testing.assert_frame_equal(grid, expected)
+    assert ctrl == {"a": "loop", "c": "openaps"}
+
+
+def test_experiment_load_data_declares_columns(terrarium):
+    grid_path, ds_path, manifest = terrarium
+
+    class Projected(ObservationalExperiment):
+        EXP_ID = "EXP-TEST-GRID"
+        GRID_COLUMNS = ["cob"]
+
+    cache = gc.GridCache()
+    exp = Projected(grid_path=grid_path, ds_path=ds_path, manifest_path=manifest,
+                    output_dir=terrarium[0].parent / "vis", grid_cache=cache)
+    exp.load_data()
+    assert exp.qualified == ["b", "a", "d"]
+    assert set(exp.grid.columns) == {"patient_id", "time", "cob", "glucose", "bolus",
+                                     "iob", "carbs", "scheduled_isf", "controller"}
+    assert exp.grid["patient_id"].unique().tolist() == ["a", "b", "d"]
+    assert exp.ctrl_map == {"a": "loop", "b": "trio", "d": "aaps"}
+
+    events = exp.extract_events()
+    assert len(events) > 0 and set(events["controller"]) <= {"loop", "trio", "aaps"}
+
+    again = Projected(grid_path=grid_path, ds_path=ds_path, manifest_path=manifest,
+                      output_dir=terrarium[0].parent / "vis", grid_cache=cache)
+    again.load_data()
+    assert cache.hits == 1
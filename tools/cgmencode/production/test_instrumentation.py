@@ -0,0 +1,94 @@
+"""Tests for per-stage pipeline instrumentation."""
+from __future__ import annotations
+
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from tools.cgmencode.production.instrumentation import (
+    JsonLinesExporter,
+    PrometheusTextExporter,
+    StageRecorder,
+    register_stage_hook,
+    summarize_stage_metrics,
+    unregister_stage_hook,
+)
+from tools.cgmencode.production.pipeline import run_pipeline
+from tools.cgmencode.production.test_production import make_patient
+
+pytestmark = pytest.mark.unit
+
+_CORE_STAGES = {
+    'cleaning', 'metabolic_engine', 'meal_detection', 'clinical_report',
+    'patterns', 'forecast', 'natural_experiments', 'settings_optimizer',
+    'settings_advisor', 'dia_discrepancy', 'phenotyping', 'loop_quality',
+}
+
+
+def test_every_stage_is_recorded():
+    result = run_pipeline(make_patient(n=2016, patient_id="inst_a"))
+    names = [m.name for m in result.stage_metrics]
+    assert _CORE_STAGES <= set(names)
+    assert len(names) == len(set(names))
+    for m in result.stage_metrics:
+        assert m.status in ('ok', 'skipped', 'failed')
+        assert m.n_samples == 2016
+        assert m.wall_ms >= 0.0
+    by_name = {m.name: m for m in result.stage_metrics}
+    # No forecast_config → forecast is skipped, not silently absent
+    assert by_name['forecast'].status == 'skipped'
+    assert by_name['cleaning'].status == 'ok'
+    total = sum(m.wall_ms for m in result.stage_metrics)
+    assert total <= result.pipeline_latency_ms + 1.0
+
+
+def test_failed_stage_records_exception_type(monkeypatch):
+    from tools.cgmencode.production import pipeline
+
+    def _boom(*args, **kwargs):
+        raise RuntimeError("phenotyper down")
+
+    monkeypatch.setattr(pipeline, 'classify_patient_phenotype', _boom)
+    result = run_pipeline(make_patient(n=1200, patient_id="inst_b"),
+                          skip_patterns=True)
+    by_name = {m.name: m for m in result.stage_metrics}
+    assert by_name['phenotyping'].status == 'failed'
+    assert by_name['phenotyping'].error_type == 'RuntimeError'
+    assert any('phenotyper down' in w for w in result.warnings)
+
+
+def test_recorder_memory_and_reraise():
+    rec = StageRecorder(trace_memory=True)
+    try:
+        with rec.stage('alloc', 10):
+            _buf = bytearray(2_000_000)
+        with pytest.raises(ValueError):
+            with rec.stage('boom'):
+                raise ValueError("x")
+    finally:
+        rec.close()
+    assert not tracemalloc.is_tracing()
+    alloc, boom = rec.metrics
+    assert alloc.peak_mem_bytes >= 2_000_000
+    assert boom.status == 'failed' and boom.error_type == 'ValueError'
+    assert 'alloc' in summarize_stage_metrics(rec.metrics)
+
+
+def test_hooks_export_jsonl_and_prometheus():
+    stream = io.StringIO()
+    jsonl = register_stage_hook(JsonLinesExporter(stream))
+    prom = register_stage_hook(PrometheusTextExporter())
+    try:
+        result = run_pipeline(make_patient(n=600, patient_id="inst_c"),
+                              skip_patterns=True)
+    finally:
+        unregister_stage_hook(jsonl)
+        unregister_stage_hook(prom)
+    rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(rows) == len(result.stage_metrics)
+    assert rows[0]['patient_id'] == 'inst_c'
+    text = prom.render()
+    assert 'cgm_pipeline_runs_total 1' in text
+    assert 'cgm_pipeline_stage_total{stage="cleaning",status="ok"} 1' in text
@@ -0,0 +1,110 @@
+"""Tests for the content-addressed physics cache."""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pytest
+
+from tools.cgmencode.production import physics_cache as pc
+from tools.cgmencode.production.data_quality import clean_glucose
+from tools.cgmencode.production.metabolic_engine import (
+    _extract_hours, compute_metabolic_state,
+)
+from tools.cgmencode.production.pipeline import run_pipeline
+from tools.cgmencode.production.test_production import make_patient, make_profile
+
+pytestmark = pytest.mark.unit
+
+_FIELDS = ('supply', 'demand', 'hepatic', 'carb_supply', 'net_flux', 'residual')
+
+
+def test_metabolic_state_round_trip(tmp_path):
+    patient = make_patient(n=600, patient_id="pc_a")
+    cache = pc.PhysicsCache(tmp_path)
+    first = cache.metabolic_state(patient)
+    second = cache.metabolic_state(patient)
+    assert (cache.hits, cache.misses) == (1, 1)
+    expected = compute_metabolic_state(patient)
+    for f in _FIELDS:
+        np.testing.assert_array_equal(getattr(first, f), getattr(expected, f))
+        np.testing.assert_array_equal(getattr(second, f), getattr(expected, f))
+    # Copy-on-write: mutating a hit never reaches the blob on disk
+    second.supply[:] = -1.0
+    again = cache.metabolic_state(patient)
+    np.testing.assert_array_equal(again.supply, expected.supply)
+
+
+def test_key_tracks_arrays_profile_and_version(tmp_path, monkeypatch):
+    patient = make_patient(n=300, patient_id="pc_b")
+    cache = pc.PhysicsCache(tmp_path)
+    cache.metabolic_state(patient)
+
+    patient.bolus = patient.bolus.copy()
+    patient.bolus[10] += 1.0
+    cache.metabolic_state(patient)
+    profile = make_profile()
+    profile.isf_schedule = [{'time': '00:00', 'value': 35.0}]
+    patient.profile = profile
+    cache.metabolic_state(patient)
+    monkeypatch.setattr(pc, 'PHYSICS_VERSION', 'test-bump')
+    cache.metabolic_state(patient)
+    assert cache.misses == 4 and cache.hits == 0
+
+
+def test_hours_and_cleaned(tmp_path):
+    patient = make_patient(n=400, patient_id="pc_c")
+    glucose = patient.glucose.copy()
+    glucose[200] += 150.0
+    cache = pc.PhysicsCache(tmp_path, mmap=False)
+    for _ in range(2):
+        hours = cache.hours(patient.timestamps, tz='America/Los_Angeles')
+        cleaned = cache.cleaned(glucose, bolus=patient.bolus, carbs=patient.carbs)
+    assert cache.hits == 2
+    np.testing.assert_array_equal(
+        hours, _extract_hours(patient.timestamps, tz='America/Los_Angeles'))
+    expected = clean_glucose(glucose, bolus=patient.bolus, carbs=patient.carbs)
+    np.testing.assert_array_equal(cleaned.glucose, expected.glucose)
+    np.testing.assert_array_equal(cleaned.spike_indices, expected.spike_indices)
+    assert cleaned.n_spikes == expected.n_spikes
+    assert cleaned.cleaning_r2_gain == expected.cleaning_r2_gain
+    assert cleaned.n_compression_lows == expected.n_compression_lows
+
+
+def test_lru_eviction_respects_size_cap(tmp_path):
+    ts = [np.arange(1000, dtype=np.int64) * 300_000 + k for k in range(3)]
+    paths = [tmp_path / 'hours' / f"{pc.physics_key('hours', t, tz='UTC')}.npy"
+             for t in ts]
+    cache = pc.PhysicsCache(tmp_path)
+    cache.hours(ts[0])
+    cache.max_bytes = int(paths[0].stat().st_size * 2.5)
+    cache.hours(ts[1])
+    os.utime(paths[0], (1, 1))
+    os.utime(paths[1], (2, 2))
+    cache.hours(ts[0])              # hit refreshes ts[0]; ts[1] is now stalest
+    cache.hours(ts[2])              # third blob exceeds the cap
+    assert [p.exists() for p in paths] == [True, False, True]
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+
+def test_pipeline_uses_cache(tmp_path):
+    patient = make_patient(n=900, patient_id="pc_d")
+    cache = pc.PhysicsCache(tmp_path)
+    cold = run_pipeline(patient, skip_patterns=True, physics_cache=cache)
+    warm = run_pipeline(patient, skip_patterns=True, physics_cache=cache)
+    assert cache.hits == 3 and cache.misses == 3
+    np.testing.assert_array_equal(cold.metabolic.residual, warm.metabolic.residual)
+    np.testing.assert_array_equal(cold.cleaned.glucose, warm.cleaned.glucose)
+    assert cold.clinical_report.grade == warm.clinical_report.grade
+
+
+def test_default_cache_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(pc, '_DEFAULT', None)
+    monkeypatch.delenv(pc.ENV_CACHE_DIR, raising=False)
+    assert pc.default_physics_cache() is None
+    monkeypatch.setenv(pc.ENV_CACHE_DIR, str(tmp_path))
+    monkeypatch.setenv(pc.ENV_CACHE_MAX_MB, '8')
+    cache = pc.default_physics_cache()
+    assert cache.cache_dir == tmp_path and cache.max_bytes == 8 << 20
+    pc.cached_metabolic_state(make_patient(n=200, patient_id="pc_e"))
+    assert cache.misses == 1
@@ -0,0 +1,130 @@
+"""Tests for the incremental PipelineSession."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from tools.cgmencode.production.data_quality import clean_glucose
+from tools.cgmencode.production.event_detector import classify_risk_simple
+from tools.cgmencode.production.hypo_predictor import calibrate_threshold, predict_hypo
+from tools.cgmencode.production.metabolic_engine import compute_metabolic_state
+from tools.cgmencode.production.pipeline_session import PipelineSession
+from tools.cgmencode.production.test_production import make_patient
+from tools.cgmencode.production.types import PipelineResult
+
+pytestmark = pytest.mark.unit
+
+_COLS = ('timestamps', 'glucose', 'iob', 'cob', 'bolus', 'carbs', 'basal_rate')
+
+
+def _readings(patient, a, b, cols=_COLS):
+    return {k: getattr(patient, k)[a:b] for k in cols
+            if getattr(patient, k) is not None}
+
+
+def test_metabolic_tail_matches_batch_engine():
+    patient = make_patient(n=1200, patient_id="sess_a")
+    # Device gaps: the batch engine reads missing IOB/COB as 0, the session
+    # must not fill them from its treatment convolution
+    iob = patient.iob.copy()
+    iob[100:160] = np.nan
+    cob = 20.0 + 10.0 * np.sin(np.arange(1200) / 40.0)
+    cob[400:700] = np.nan
+    patient.iob, patient.cob = iob, cob
+    assert patient.bolus.sum() > 0 and patient.carbs[400:700].sum() > 0
+    session = PipelineSession(patient.profile, patient_id="sess_a", refresh_hours=None)
+    tails, i = [], 0
+    for step in (1, 7, 50, 300, 1, 1, 200, 640):
+        update = session.append(_readings(patient, i, i + step))
+        assert update.n_new == step
+        tails.append(update.metabolic_tail)
+        i += step
+    assert i == 1200
+
+    full = compute_metabolic_state(patient)
+    for col in ('supply', 'demand', 'hepatic', 'carb_supply', 'net_flux', 'residual'):
+        np.testing.assert_array_equal(
+            np.concatenate([getattr(t, col) for t in tails]), getattr(full, col))
+    assert update.residual_std == pytest.approx(float(np.std(full.residual)))
+
+    # Risk / hypo alert agree with the batch stages on the same cleaned glucose
+    cleaned = session._ring.tail('glucose', 1200)
+    assert update.risk == classify_risk_simple(cleaned, full)
+    threshold = calibrate_threshold(patient.glucose)
+    assert update.hypo_alert == predict_hypo(cleaned, full, personal_threshold=threshold)
+
+
+def test_spike_is_interpolated_once_right_anchor_arrives():
+    patient = make_patient(n=400, patient_id="sess_b")
+    glucose = patient.glucose.copy()
+    glucose[300] += 150.0
+    patient.glucose = glucose
+    session = PipelineSession(patient.profile, refresh_hours=None)
+    session.append(_readings(patient, 0, 300))
+    update = session.append(_readings(patient, 300, 301))
+    assert update.n_spikes == 1
+    assert update.cleaned_tail[0] == pytest.approx(glucose[299])
+    # The drop back at 301 is a spike too; 302 anchors the pair
+    session.append(_readings(patient, 301, 303))
+    batch = clean_glucose(glucose[:303])
+    assert {300, 301} <= set(batch.spike_indices.tolist())
+    np.testing.assert_allclose(session._ring.tail('glucose', 4), batch.glucose[299:303])
+
+
+def test_treatments_are_binned_and_convolved():
+    patient = make_patient(n=200, with_insulin=False, patient_id="sess_c")
+    session = PipelineSession(patient.profile, refresh_hours=None)
+    session.append(_readings(patient, 0, 100, ('timestamps', 'glucose')))
+    t_bolus = float(patient.timestamps[100]) + 60_000  # 1 min after a reading
+    update = session.append(
+        _readings(patient, 100, 104, ('timestamps', 'glucose')),
+        {'timestamps': [t_bolus, float(patient.timestamps[150])],
+         'bolus': [3.0, 1.0]},
+    )
+    # No device IOB: like compute_metabolic_state, no insulin flux
+    assert update.metabolic_tail is None
+    assert session.to_patient_data().iob is None
+    bolus = session.to_patient_data().bolus
+    assert bolus[100] == 3.0 and bolus[:100].sum() == 0.0
+    iob = session.treatment_state()['iob']
+    assert iob[100] == pytest.approx(3.0)
+    assert 0.0 < iob[103] < iob[100]
+    # The future treatment waits until its reading arrives
+    session.append(_readings(patient, 104, 200, ('timestamps', 'glucose')))
+    assert session.to_patient_data().bolus[150] == 1.0
+
+
+def test_duplicate_readings_are_dropped():
+    patient = make_patient(n=50, patient_id="sess_d")
+    session = PipelineSession(patient.profile, refresh_hours=None)
+    session.append(_readings(patient, 0, 40))
+    update = session.append(_readings(patient, 35, 45))
+    assert update.n_new == 5
+    assert session.n_buffered == 45
+    assert any('Dropped 5' in w for w in update.warnings)
+
+
+def test_ring_buffer_bounds_history():
+    patient = make_patient(n=700, patient_id="sess_e")
+    session = PipelineSession(patient.profile, buffer_days=1.0, refresh_hours=None)
+    for i in range(0, 700, 100):
+        session.append(_readings(patient, i, i + 100))
+    data = session.to_patient_data()
+    assert data.n_samples == 288
+    np.testing.assert_array_equal(data.timestamps, patient.timestamps[-288:])
+
+
+def test_heavy_stages_run_on_schedule():
+    patient = make_patient(n=2 * 288 + 12, patient_id="sess_f")
+    session = PipelineSession(patient.profile, patient_id="sess_f",
+                              history=_readings(patient, 0, 288),
+                              refresh_hours=6.0)
+    assert isinstance(session.last_full_result, PipelineResult)
+    first = session.last_full_result
+    update = session.append(_readings(patient, 288, 288 + 12))
+    assert not update.refreshed and update.full_result is None
+    assert session.last_full_result is first
+    update = session.append(_readings(patient, 300, 2 * 288 + 12))
+    assert update.refreshed
+    assert update.full_result.patient_id == "sess_f"
+    assert update.full_result.cleaned.glucose.shape == (2 * 288 + 12,)
@@ -480,6 +480,91 @@ class TestGlucoseForecastModule(unittest.TestCase):
         )
         self.assertIsNone(result)
 
+    def test_seed_ensemble_matches_per_seed_models(self):
+        """Stacked grouped forward equals running each seed model."""
+        try:
+            import torch
+            from cgmencode.production.glucose_forecast import (
+                _build_model, SeedEnsemble)
+        except ImportError:
+            self.skipTest("PyTorch not available")
+
+        torch.manual_seed(0)
+        members = [(_build_model().eval(), s) for s in (1, 2, 3)]
+        x = torch.randn(4, 48, 8)
+        with torch.no_grad():
+            ref = torch.stack([m(x, causal=True) for m, _ in members])
+        ens = SeedEnsemble(members)
+        self.assertEqual(ens.seeds, [1, 2, 3])
+        torch.testing.assert_close(ens(x), ref, atol=1e-5, rtol=1e-5)
+        # Member modules share the stacked weights
+        self.assertEqual(members[1][0].state_proj.weight.data_ptr(),
+                         ens.params['state_proj.weight'][1].data_ptr())
+        # Cohort stack: one batch per member
+        cohort = SeedEnsemble.concat([ens, SeedEnsemble(members[:1])])
+        per_member = torch.cat([x[:2].expand(3, 2, 48, 8), x[2:].unsqueeze(0)])
+        out = cohort(per_member)
+        torch.testing.assert_close(out[:3], ref[:, :2], atol=1e-5, rtol=1e-5)
+        torch.testing.assert_close(out[3], ref[0, 2:], atol=1e-5, rtol=1e-5)
+
+    def test_predict_trajectories_cohort(self):
+        """Cohort forecast equals per-patient forecasts; cache is bounded."""
+        import tempfile
+        try:
+            import torch
+            from cgmencode.production import glucose_forecast as gf
+        except ImportError:
+            self.skipTest("PyTorch not available")
+
+        models_dir = tempfile.mkdtemp()
+        for i, pid in enumerate('ab'):
+            for seed in gf.PRODUCTION_SEEDS[:2 + i]:
+                torch.manual_seed(seed + i)
+                torch.save({'model_state': gf._build_model().state_dict()},
+                           f"{models_dir}/exp619_w48_ft_{pid}_s{seed}.pth")
+        requests = []
+        for pid, n in [('a', 400), ('b', 500), ('z', 400), ('a', 450)]:
+            patient = make_patient(n=n)
+            requests.append(dict(patient=patient, metabolic=_make_metabolic(n),
+                                 hours=_make_hours(n), glucose=patient.glucose,
+                                 patient_id=pid, isf=50.0 if pid == 'b' else None))
+        gf.clear_model_cache()
+        cohort = gf.predict_trajectories(requests, models_dir=models_dir)
+        self.assertIsNone(cohort[2])
+        self.assertEqual([r.ensemble_size for r in cohort if r], [2, 3, 2])
+        for req, got in zip(requests, cohort):
+            if got is None:
+                continue
+            single = gf.predict_trajectory(window='w48', models_dir=models_dir, **req)
+            np.testing.assert_allclose(got.predicted_glucose,
+                                       single.predicted_glucose, atol=1e-3)
+            np.testing.assert_allclose(got.ensemble_std, single.ensemble_std,
+                                       atol=1e-3)
+
+        # Cached cohort stacks are served without loading per-patient models
+        self.assertEqual(len(gf._cohort_cache), 1)
+        gf._model_cache.clear()
+        from unittest import mock
+        with mock.patch.object(gf, 'load_ensemble', side_effect=AssertionError):
+            again = gf.predict_trajectories(requests, models_dir=models_dir)
+        np.testing.assert_allclose(again[1].predicted_glucose,
+                                   cohort[1].predicted_glucose)
+
+        old_size, old_bytes = gf.MODEL_CACHE_SIZE, gf.COHORT_CACHE_BYTES
+        gf.MODEL_CACHE_SIZE = 1
+        gf.clear_model_cache()
+        try:
+            gf.load_ensemble('a', 'w48', models_dir)
+            gf.load_ensemble('b', 'w48', models_dir)
+            self.assertEqual(list(gf._model_cache), ['b_w48_cpu'])
+            # Cohort stacks over the byte budget are not kept
+            gf.COHORT_CACHE_BYTES = 0
+            gf.predict_trajectories(requests, models_dir=models_dir)
+            self.assertEqual(len(gf._cohort_cache), 0)
+        finally:
+            gf.MODEL_CACHE_SIZE, gf.COHORT_CACHE_BYTES = old_size, old_bytes
+            gf.clear_model_cache()
+
     def test_pipeline_no_forecast_by_default(self):
         """Pipeline runs without forecast when no config provided."""
         from cgmencode.production.pipeline import run_pipeline
@@ -4896,6 +4981,129 @@ class TestForwardSimulator(unittest.TestCase):
         self.assertGreater(r_stacked.glucose.min(), 70)
 
 
+class TestForwardSimulatorBatch(unittest.TestCase):
+    pytestmark = pytest.mark.unit
+    """forward_simulate_batch must reproduce the scalar engine per scenario."""
+
+    def setUp(self):
+        from cgmencode.production.forward_simulator import (
+            forward_simulate, forward_simulate_batch,
+            TherapySettings, InsulinEvent, CarbEvent,
+        )
+        self.forward_simulate = forward_simulate
+        self.forward_simulate_batch = forward_simulate_batch
+        self.TherapySettings = TherapySettings
+        self.InsulinEvent = InsulinEvent
+        self.CarbEvent = CarbEvent
+
+    def _random_scenarios(self, n, seed=0):
+        rng = np.random.RandomState(seed)
+        scen = []
+        for i in range(n):
+            s = self.TherapySettings(
+                isf=rng.uniform(20, 90), cr=rng.uniform(5, 20),
+                basal_rate=rng.uniform(0.3, 1.5),
+                dia_hours=float(rng.choice([3.0, 5.0, 6.5])),
+                carb_sensitivity=None if i % 2 else 2.0,
+                isf_schedule=[(0, 40.0), (6, 55.0), (18, 45.0)] if i % 3 == 0 else [],
+                basal_schedule=[(2, 0.7), (8, 1.1)] if i % 4 == 0 else [],
+            )
+            scen.append(dict(
+                initial_glucose=rng.uniform(60, 300), settings=s,
+                start_hour=rng.uniform(0, 24),
+                initial_iob=float(rng.choice([0.0, rng.uniform(0, 4)])),
+                counter_reg_k=float(rng.choice([0.0, 1.5, 3.0])),
+                metabolic_basal_rate=rng.uniform(0.3, 1.5),
+                bolus_events=[self.InsulinEvent(rng.uniform(0, 400), rng.uniform(0, 5))
+                              for _ in range(rng.randint(0, 3))],
+                carb_events=[self.CarbEvent(rng.uniform(0, 400), rng.uniform(0, 80),
+                                            delay_minutes=float(rng.choice([0, 20, 45])))
+                             for _ in range(rng.randint(0, 3))],
+            ))
+        return scen
+
+    def _assert_matches(self, scen, **shared):
+        batch = self.forward_simulate_batch(
+            initial_glucose=[c['initial_glucose'] for c in scen],
+            settings=[c['settings'] for c in scen],
+            start_hour=[c['start_hour'] for c in scen],
+            initial_iob=[c['initial_iob'] for c in scen],
+            counter_reg_k=[c['counter_reg_k'] for c in scen],
+            metabolic_basal_rate=[c['metabolic_basal_rate'] for c in scen],
+            bolus_events=[c['bolus_events'] for c in scen],
+            carb_events=[c['carb_events'] for c in scen],
+            seed=list(range(len(scen))),
+            **shared,
+        )
+        self.assertEqual(batch.glucose.shape[0], len(scen))
+        for i, c in enumerate(scen):
+            r = self.forward_simulate(seed=i, **c, **shared)
+            for name in ('glucose', 'iob', 'cob', 'supply', 'demand', 'hours_of_day'):
+                np.testing.assert_allclose(
+                    getattr(batch, name)[i], getattr(r, name), rtol=0, atol=1e-9,
+                    err_msg=f"scenario {i} field {name}")
+
+    def test_matches_scalar_engine(self):
+        self._assert_matches(self._random_scenarios(40), duration_hours=10.0)
+
+    def test_matches_scalar_engine_with_egp_and_noise(self):
+        self._assert_matches(self._random_scenarios(20, seed=1),
+                             duration_hours=6.0, egp_enabled=True, noise_std=3.0)
+
+    def test_shared_settings_broadcast(self):
+        s = self.TherapySettings(isf=50, cr=10, basal_rate=0.8)
+        batch = self.forward_simulate_batch(
+            [120.0, 200.0, 250.0], s, duration_hours=4.0,
+            bolus_events=[self.InsulinEvent(0, 2.0)])
+        self.assertEqual(batch.glucose.shape, (3, 48))
+        self.assertEqual(batch.tir.shape, (3,))
+        single = self.forward_simulate(200.0, s, duration_hours=4.0,
+                                       bolus_events=[self.InsulinEvent(0, 2.0)])
+        np.testing.assert_allclose(batch.scenario(1).glucose, single.glucose, atol=1e-9)
+
+    def test_mismatched_lengths_raise(self):
+        s = self.TherapySettings()
+        with self.assertRaises(ValueError):
+            self.forward_simulate_batch([120.0, 130.0], [s, s, s], duration_hours=1.0)
+
+    def test_correction_drops_isolate_failing_window(self):
+        from unittest import mock
+        from cgmencode.production.advisor import _isf_advisors as adv
+
+        def sim(initial_glucose, **kw):
+            if min(initial_glucose) < 0:
+                raise ValueError('bad window')
+            return self.forward_simulate_batch(initial_glucose, **kw)
+
+        windows = [dict(g=g, b=2.0, iob=0.5, h=8.0, isf=50.0, cr=10.0, basal=0.8)
+                   for g in (220.0, 250.0, -1.0, 280.0)]
+        good = adv._simulate_correction_drops(
+            [w for w in windows if w['g'] > 0], 1.0, 2.0)
+        with mock.patch.object(adv, '_fwd_simulate_batch', side_effect=sim):
+            drops = adv._simulate_correction_drops(windows, 1.0, 2.0)
+        self.assertTrue(np.isnan(drops[2]))
+        np.testing.assert_allclose(np.delete(drops, 2), good, atol=1e-9)
+
+    def test_joint_settings_skip_failing_window(self):
+        from unittest import mock
+        from cgmencode.production.advisor import _isf_advisors as adv
+
+        def sim(initial_glucose, **kw):
+            if min(initial_glucose) < 0:
+                raise ValueError('bad window')
+            return self.forward_simulate_batch(initial_glucose, **kw)
+
+        windows = [dict(g=g, b=b, c=c, iob=0.5, h=12.0, isf=50.0, cr=10.0, basal=0.8)
+                   for g, b, c in ((120.0, 4.0, 40.0), (160.0, 6.0, 60.0),
+                                   (-1.0, 5.0, 50.0), (200.0, 3.0, 30.0))]
+        per_window = [adv._evaluate_joint_settings([w], 1.2, 0.9)
+                      for w in windows if w['g'] > 0]
+        with mock.patch.object(adv, '_fwd_simulate_batch', side_effect=sim):
+            tir = adv._evaluate_joint_settings(windows, 1.2, 0.9)
+            self.assertIsNone(adv._evaluate_joint_settings([windows[2]], 1.2, 0.9))
+        self.assertAlmostEqual(tir, float(np.mean(per_window)), places=12)
+
+
 # ── Override ISF Advisory Tests (EXP-2621) ────────────────────────────
 
 class TestOverrideISFAdvisory(unittest.TestCase):
@@ -0,0 +1,118 @@
+"""Tests for the pipeline stage DAG (selective outputs, threaded execution)."""
+from __future__ import annotations
+
+import dataclasses
+import threading
+
+import numpy as np
+import pytest
+
+from tools.cgmencode.production.pipeline import (
+    PIPELINE_GRAPH, PIPELINE_OUTPUTS, run_pipeline,
+)
+from tools.cgmencode.production.stage_graph import StageGraph, StageNode
+from tools.cgmencode.production.test_production import make_patient
+
+pytestmark = pytest.mark.unit
+
+_TIMING_FIELDS = {'pipeline_latency_ms', 'wall_ms', 'cpu_ms', 'peak_mem_bytes'}
+
+
+def _assert_same(a, b, path='result'):
+    """Deep equality that tolerates numpy arrays, NaN and timing fields."""
+    if dataclasses.is_dataclass(a) and not isinstance(a, type):
+        assert type(a) is type(b), path
+        for f in dataclasses.fields(a):
+            if f.name not in _TIMING_FIELDS:
+                _assert_same(getattr(a, f.name), getattr(b, f.name), f'{path}.{f.name}')
+    elif isinstance(a, np.ndarray):
+        np.testing.assert_array_equal(a, b, err_msg=path)
+    elif isinstance(a, dict):
+        assert a.keys() == b.keys(), path
+        for k in a:
+            _assert_same(a[k], b[k], f'{path}[{k!r}]')
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b), path
+        for i, (x, y) in enumerate(zip(a, b)):
+            _assert_same(x, y, f'{path}[{i}]')
+    elif isinstance(a, float) and np.isnan(a):
+        assert isinstance(b, float) and np.isnan(b), path
+    else:
+        assert a == b, path
+
+
+def _node(name, inputs='', outputs='', fn=None):
+    return StageNode(name, fn or (lambda ctx, **kw: {}),
+                     tuple(inputs.split()), tuple(outputs.split()))
+
+
+def test_threaded_run_matches_sequential():
+    patient = make_patient(n=2100, patient_id="dag_a")
+    seq = run_pipeline(patient)
+    par = run_pipeline(patient, stage_threads=4)
+    _assert_same(seq, par)
+    assert [m.name for m in seq.stage_metrics] == [m.name for m in par.stage_metrics]
+    assert seq.warnings == par.warnings
+
+
+def test_outputs_run_only_transitive_dependencies():
+    patient = make_patient(n=1200, patient_id="dag_b")
+    full = run_pipeline(patient, skip_patterns=True)
+    part = run_pipeline(patient, skip_patterns=True, outputs={'hypo_alert', 'risk'})
+    assert [m.name for m in part.stage_metrics] == [
+        'cleaning', 'metabolic_engine', 'risk', 'hypo_prediction']
+    assert part.hypo_alert == full.hypo_alert
+    assert part.risk == full.risk
+    assert part.clinical_report is None and part.recommendations is None
+
+    with pytest.raises(ValueError, match='hours'):
+        run_pipeline(patient, outputs={'hours'})
+
+
+def test_pipeline_graph_introspection():
+    assert PIPELINE_GRAPH.producers['clinical_report'] == 'fidelity'
+    assert PIPELINE_GRAPH.dependencies('fidelity') == [
+        'cleaning', 'metabolic_engine', 'extract_hours', 'clinical_report']
+    needed = [n.name for n in PIPELINE_GRAPH.required_nodes({'phenotype'})]
+    assert needed == ['cleaning', 'extract_hours', 'phenotyping']
+    assert {'recommendations', 'loop_quality', 'meal_logging_qc'} <= PIPELINE_OUTPUTS
+    assert 'meals_detected' not in PIPELINE_OUTPUTS
+    assert '"fidelity" -> "period_analysis"' in PIPELINE_GRAPH.to_dot()
+
+
+def test_critical_path_and_validation():
+    g = StageGraph([_node('a', '', 'x'), _node('b', 'x', 'y'),
+                    _node('c', 'x', 'z'), _node('d', 'y z', 'w')])
+    path, total = g.critical_path({'a': 1.0, 'b': 5.0, 'c': 2.0, 'd': 1.0})
+    assert path == ['a', 'b', 'd'] and total == 7.0
+    assert g.critical_path({}, outputs={'z'})[0][-1] == 'c'
+
+    with pytest.raises(ValueError, match='no earlier stage'):
+        StageGraph([_node('b', 'x', 'y'), _node('a', '', 'x')])
+    with pytest.raises(ValueError, match='produced by both'):
+        StageGraph([_node('a', '', 'x'), _node('b', '', 'x')])
+
+
+def test_thread_pool_runs_independent_nodes_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_sibling(ctx, x):
+        barrier.wait()     # deadlocks (BrokenBarrierError) if run serially
+        return {}
+
+    g = StageGraph([
+        _node('src', '', 'x', lambda ctx: {'x': 1}),
+        StageNode('left', lambda ctx, x: {**wait_for_sibling(ctx, x), 'l': x},
+                  ('x',), ('l',)),
+        StageNode('right', lambda ctx, x: {**wait_for_sibling(ctx, x), 'r': x + 1},
+                  ('x',), ('r',)),
+    ])
+    out = g.run(lambda node, inputs: node.fn(None, **inputs), max_workers=2)
+    assert out == {'x': 1, 'l': 1, 'r': 2}
+
+    def boom(ctx):
+        raise KeyError('stage failed')
+
+    g = StageGraph([_node('src', '', 'x', boom), _node('next', 'x', 'y')])
+    with pytest.raises(KeyError):
+        g.run(lambda node, inputs: node.fn(None, **inputs), max_workers=2)
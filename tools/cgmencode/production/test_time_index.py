@@ -0,0 +1,81 @@
+"""Tests for the shared per-patient TimeIndex."""
+from __future__ import annotations
+
+import warnings
+
+import numpy as np
+import pytest
+
+from tools.cgmencode.production.metabolic_engine import _extract_hours
+from tools.cgmencode.production.time_index import build_time_index
+from tools.cgmencode.production.test_production import make_patient
+
+pytestmark = pytest.mark.unit
+
+
+def _ms(iso: str) -> int:
+    return int(np.datetime64(iso, 'ms').astype(np.int64))
+
+
+@pytest.mark.parametrize('tz', ['UTC', 'America/Los_Angeles', 'Etc/GMT+7', 'Not/AZone'])
+def test_hours_match_extract_hours(tz):
+    patient = make_patient(n=2000, patient_id="ti_a")
+    index = patient.time_index(tz)
+    np.testing.assert_array_equal(index.hours, _extract_hours(patient.timestamps, tz))
+    assert index.step_of_day.dtype == np.int32 and index.day.dtype == np.int32
+    np.testing.assert_array_equal(index.step_of_day, (index.hours * 12).astype(int))
+    assert index.resolved_tz == ('UTC' if tz == 'Not/AZone' else tz)
+
+
+def test_cached_per_timezone_and_rebuilt_on_new_timestamps():
+    patient = make_patient(n=600, patient_id="ti_b")
+    first = patient.time_index()
+    assert patient.time_index('UTC') is first          # profile default is UTC
+    assert patient.time_index('America/New_York') is not first
+    patient.timestamps = patient.timestamps + 3_600_000
+    shifted = patient.time_index()
+    assert shifted is not first
+    np.testing.assert_allclose(shifted.hours[:5], (first.hours[:5] + 1) % 24)
+
+
+def test_local_day_and_dst_transition():
+    # 2024-03-10 US spring-forward: 02:00 PST → 03:00 PDT (10:00 UTC)
+    ts = _ms('2024-03-10T07:00') + np.arange(48) * 300_000    # 23:00 PST on 3/9
+    index = build_time_index(ts, 'America/Los_Angeles')
+    jump = int(np.flatnonzero(index.dst_transition)[0])
+    assert index.dst_transition.sum() == 1
+    assert index.hours[jump - 1] == pytest.approx(1 + 55 / 60)
+    assert index.hours[jump] == 3.0
+    assert index.day_starts.tolist() == [12]                  # local midnight
+    assert str(np.datetime64(int(index.day[12]), 'D')) == '2024-03-10'
+    assert index.day_of_week[12] == 6                         # Sunday
+
+
+@pytest.mark.parametrize('fallback', [False, True])
+def test_missing_timestamps_are_masked(monkeypatch, fallback):
+    from tools.cgmencode.production import time_index
+    if fallback:                      # numeric path used without pandas
+        def no_pandas(*args, **kwargs):
+            raise ImportError('pandas')
+        monkeypatch.setattr(time_index, 'local_datetimes', no_pandas)
+    ts = (_ms('2024-01-01T00:00') + np.arange(4) * 300_000).astype(np.float64)
+    ts[2] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        index = build_time_index(ts)
+    assert np.isnan(index.hours[2])
+    assert (index.day[2], index.day_of_week[2], index.step_of_day[2]) == (-1, -1, -1)
+    assert index.step_of_day[[0, 1, 3]].tolist() == [0, 1, 3]
+    assert index.day_of_week[0] == 0                          # Monday
+
+
+def test_nights_grouped_when_rows_are_out_of_order():
+    from tools.report.therapy_analyzer import _analyze_nights
+    ts = _ms('2024-01-01T00:00') + np.arange(2 * 288) * 300_000
+    glucose = 100.0 + np.arange(len(ts)) % 288                # rising each night
+    order = np.random.default_rng(0).permutation(len(ts))
+    nights = _analyze_nights(build_time_index(ts[order]), glucose[order])
+    assert [n.date for n in nights] == ['2024-01-01', '2024-01-02']
+    for n in nights:
+        assert (n.start_bg, n.end_bg, n.n_points) == (100.0, 171.0, 72)
+        assert n.slope_per_hour == pytest.approx(12.0)
@@ -85,6 +85,7 @@ from cgmencode.production.test_production import (  # noqa: F401
     TestPredictionValidatorExecution,
     # Forward simulator
     TestForwardSimulator,
+    TestForwardSimulatorBatch,
     # Advisory functions (EXP-2621+)
     TestOverrideISFAdvisory,
     TestAdvisoryConfidenceTier,
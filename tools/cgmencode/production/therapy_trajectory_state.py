@@ -80,10 +80,15 @@ from ..production_therapy import (
     compute_time_in_ranges,
 )
 from .clinical_rules import detect_insulin_saturation
-from .metabolic_engine import compute_metabolic_state
+from .physics_cache import cached_metabolic_state
 from .types import MetabolicState, PatientData, PatientProfile, SaturationLevel
 from .wear_facts_loader import WearFactsLoader
 
+try:
+    from ...ns2parquet.catalog import Terrarium
+except ImportError:  # cgmencode imported as a top-level package
+    from ns2parquet.catalog import Terrarium
+
 # Turn geometry. 72h chosen to approximate human metabolic/behavioral
 # re-entrainment cycles while giving ~3 repetitions of each daily basal
 # segment per turn (see module docstring).
@@ -213,14 +218,17 @@ class TurnLabel:
 
 
 def load_patient_grid(parquet_dir: Path | str, patient_id: str) -> pd.DataFrame:
-    """Load and sort one patient's rows from a grid.parquet cohort file."""
-    grid_path = Path(parquet_dir) / "grid.parquet"
-    df_all = pd.read_parquet(grid_path)
-    df = df_all[df_all["patient_id"] == patient_id].copy()
+    """Load and sort one patient's rows from a terrarium grid.
+
+    Reads only that patient's row groups / fragments when the grid has a
+    current ns2parquet catalog, else filters the grid on read.
+    """
+    terrarium = Terrarium(parquet_dir)
+    df = terrarium.read("grid", patient_id)
     if df.empty:
         raise ValueError(
-            f"No rows for patient_id='{patient_id}' in {grid_path}. "
-            f"Available: {sorted(df_all['patient_id'].unique())[:20]}"
+            f"No rows for patient_id='{patient_id}' in {Path(parquet_dir) / 'grid.parquet'}. "
+            f"Available: {terrarium.patients('grid')[:20]}"
         )
     return df.sort_values("time").reset_index(drop=True)
 
@@ -510,7 +518,7 @@ def _build_patient_metabolic_state(df: pd.DataFrame, patient_id: str) -> Metabol
         patient_id=patient_id,
     )
     try:
-        return compute_metabolic_state(patient)
+        return cached_metabolic_state(patient)
     except Exception:
         # Physiology features are additive context, not required for the
         # core turn/label harness — degrade gracefully rather than fail
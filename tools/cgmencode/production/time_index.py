@@ -0,0 +1,99 @@
+"""
+time_index.py — Local clock arrays derived once per (timestamps, timezone).
+
+Every circadian analysis needs hour-of-day, and several need day
+boundaries. Deriving them used to happen independently in the metabolic
+engine, the pipeline, the natural-experiment detector (UTC modulo), the
+meal predictor (sample index modulo 288) and the report layer (per-
+sample ``datetime.fromtimestamp``), each with slightly different
+semantics. ``build_time_index`` does the pandas conversion once and
+returns a ``TimeIndex``; ``PatientData.time_index(tz)`` caches it on the
+patient, so each timezone is converted at most once per patient.
+
+Hours keep ``_extract_hours`` semantics exactly (local ``hour +
+minute/60``, float64, unknown timezone → UTC, numeric fallback without
+pandas), so switching a consumer over does not shift its outputs.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+from .types import TimeIndex
+
+_MS_PER_DAY = 86_400_000
+_STEP_MINUTES = 5
+
+
+def local_datetimes(timestamps: np.ndarray, tz: str = 'UTC'):
+    """Timezone-aware DatetimeIndex for Unix-ms ``timestamps``.
+
+    Unknown timezone names fall back to UTC silently (callers may not
+    have plumbed ``normalize_timezone`` yet). Raises if pandas is not
+    importable or the timestamps cannot be converted.
+    """
+    import pandas as pd
+    dt = pd.to_datetime(timestamps, unit='ms', utc=True)
+    if tz and tz != 'UTC':
+        try:
+            dt = dt.tz_convert(tz)
+        except Exception:
+            pass
+    return dt
+
+
+def _fallback_seconds(timestamps: np.ndarray) -> np.ndarray:
+    ts = np.asarray(timestamps, dtype=np.float64)
+    finite = ts[np.isfinite(ts)]
+    return ts / 1000.0 if finite.size and finite.max() > 1e12 else ts
+
+
+def _int32(values, valid: np.ndarray) -> np.ndarray:
+    """int32 copy of ``values`` with -1 where the timestamp is missing."""
+    out = np.full(len(valid), -1, dtype=np.int32)
+    out[valid] = np.asarray(values)[valid].astype(np.int32)
+    return out
+
+
+def build_time_index(timestamps: np.ndarray, tz: Optional[str] = 'UTC') -> TimeIndex:
+    """Compute all local clock arrays for ``timestamps`` in one pass.
+
+    Missing timestamps (NaN / NaT) get NaN hours and -1 day, day of week
+    and step of day.
+    """
+    tz = tz or 'UTC'
+    try:
+        dt = local_datetimes(timestamps, tz)
+        valid = ~np.asarray(dt.isna())
+        hour = dt.hour.to_numpy()
+        minute = dt.minute.to_numpy()
+        hours = np.asarray(dt.hour + dt.minute / 60.0, dtype=np.float64)
+        wall = dt.tz_localize(None).asi8                      # local wall-clock ns
+        day = _int32(wall // (_MS_PER_DAY * 1_000_000), valid)
+        dow = _int32(dt.dayofweek.to_numpy(), valid)
+        offset = wall - dt.asi8                                # UTC offset, ns
+        dst = np.zeros(len(offset), dtype=bool)
+        dst[1:] = offset[1:] != offset[:-1]
+        step = _int32((hour * 60 + minute) // _STEP_MINUTES, valid)
+        resolved = str(dt.tz) if dt.tz is not None else 'UTC'
+    except Exception:
+        seconds = _fallback_seconds(timestamps)
+        valid = np.isfinite(seconds)
+        sod = seconds % 86400
+        hours = sod / 3600.0
+        day = _int32(np.floor_divide(seconds, 86400), valid)
+        dow = _int32((day + 3) % 7, valid)                     # 1970-01-01 was a Thursday
+        step = _int32(sod // (_STEP_MINUTES * 60), valid)
+        dst = np.zeros(len(seconds), dtype=bool)
+        resolved = 'UTC'
+    return TimeIndex(
+        tz=tz,
+        resolved_tz=resolved,
+        hours=np.ascontiguousarray(hours, dtype=np.float64),
+        day=np.ascontiguousarray(day),
+        day_of_week=np.ascontiguousarray(dow),
+        step_of_day=np.ascontiguousarray(step),
+        dst_transition=dst,
+    )
@@ -365,11 +365,29 @@ class PatientData:
     basal_rate: Optional[np.ndarray] = None   # (N,) U/hr actual basal rate
     patient_id: str = "unknown"
     metadata: Dict = field(default_factory=dict)
+    # tz → (timestamps array it was built from, TimeIndex); see time_index()
+    _time_index_cache: Dict = field(default_factory=dict, init=False,
+                                    repr=False, compare=False)
 
     @property
     def n_samples(self) -> int:
         return len(self.glucose)
 
+    def time_index(self, tz: Optional[str] = None) -> 'TimeIndex':
+        """Local clock arrays for ``timestamps`` (default: profile timezone).
+
+        Computed on first use per timezone and cached; rebuilt if
+        ``timestamps`` is replaced. Arrays are shared — do not modify.
+        """
+        tz = tz or getattr(self.profile, 'timezone', None) or 'UTC'
+        hit = self._time_index_cache.get(tz)
+        if hit is not None and hit[0] is self.timestamps:
+            return hit[1]
+        from .time_index import build_time_index
+        index = build_time_index(self.timestamps, tz)
+        self._time_index_cache[tz] = (self.timestamps, index)
+        return index
+
     @property
     def has_insulin_data(self) -> bool:
         return self.iob is not None and not np.all(np.isnan(self.iob))
@@ -383,6 +401,31 @@ class PatientData:
         return self.hours_of_data / 24.0
 
 
+@dataclass
+class TimeIndex:
+    """Local clock view of a timestamp grid (see time_index.py).
+
+    Built once per timezone by ``PatientData.time_index``; consumers
+    read it instead of re-deriving hours or day boundaries.
+    """
+    tz: str                     # requested timezone name
+    resolved_tz: str            # zone actually applied ('UTC' on fallback)
+    hours: np.ndarray           # (N,) float64 local hour + minute/60
+    day: np.ndarray             # (N,) int32 local calendar day (days since 1970-01-01)
+    day_of_week: np.ndarray     # (N,) int32, Monday = 0
+    step_of_day: np.ndarray     # (N,) int32 local 5-min slot, 0..287
+                                # (int fields are -1, hours NaN, at missing timestamps)
+    dst_transition: np.ndarray  # (N,) bool, UTC offset changed since previous sample
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    @property
+    def day_starts(self) -> np.ndarray:
+        """Indices where a new local calendar day begins (excluding 0)."""
+        return np.flatnonzero(np.diff(self.day)) + 1
+
+
 # ── Intermediate Results ──────────────────────────────────────────────
 
 @dataclass
@@ -1125,6 +1168,29 @@ class SaturationAssessment:
     iob_cap_suggestion: float = 0.0      # suggested IOB cap (Units)
 
 
+@dataclass
+class StageMetrics:
+    """Timing/memory record for one pipeline stage (see instrumentation.py)."""
+    name: str
+    status: str = "ok"                    # 'ok' | 'skipped' | 'failed'
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    peak_mem_bytes: Optional[int] = None  # None unless tracemalloc is tracing
+    n_samples: int = 0                    # input length seen by the stage
+    error_type: Optional[str] = None      # exception class name when failed
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'status': self.status,
+            'wall_ms': round(self.wall_ms, 3),
+            'cpu_ms': round(self.cpu_ms, 3),
+            'peak_mem_bytes': self.peak_mem_bytes,
+            'n_samples': self.n_samples,
+            'error_type': self.error_type,
+        }
+
+
 @dataclass
 class PipelineResult:
     """Complete output from a single pipeline run."""
@@ -1172,6 +1238,8 @@ class PipelineResult:
     meal_logging_qc: Optional[object] = None  # MealLoggingQC; avoid circular import
     pipeline_latency_ms: float = 0.0
     warnings: List[str] = field(default_factory=list)
+    # Per-stage wall/CPU/memory records (instrumentation.py)
+    stage_metrics: List[StageMetrics] = field(default_factory=list)
 
     @property
     def is_complete(self) -> bool:
@@ -1179,3 +1247,29 @@ class PipelineResult:
         return (self.metabolic is not None and
                 self.risk is not None and
                 self.patterns is not None)
+
+
+@dataclass
+class SessionUpdate:
+    """Output of one ``PipelineSession.append`` (see pipeline_session.py).
+
+    Arrays cover only the newly appended readings; the heavy weekly
+    stages are carried in ``full_result`` only on appends that
+    triggered a scheduled refresh.
+    """
+    patient_id: str
+    n_new: int                              # readings accepted by this append
+    n_buffered: int                         # readings held in the ring buffer
+    timestamp_ms: float                     # most recent reading
+    cleaned_tail: np.ndarray                # (n_new,) cleaned glucose
+    metabolic_tail: Optional[MetabolicState]  # None until insulin data is seen
+    risk: Optional[RiskAssessment]
+    hypo_alert: Optional[HypoAlert]
+    n_spikes: int = 0                       # spikes flagged in the new readings
+    residual_mean: Optional[float] = None   # running over the whole session
+    residual_std: Optional[float] = None
+    last_meal: Optional[DetectedMeal] = None  # most recent residual burst cluster
+    refreshed: bool = False                 # heavy stages recomputed this call
+    full_result: Optional[PipelineResult] = None
+    latency_ms: float = 0.0
+    warnings: List[str] = field(default_factory=list)
@@ -31,11 +31,25 @@ import sys
 import os
 import numpy as np
 import pandas as pd
-import torch
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Optional, Tuple, Dict, List
+from typing import Optional, Tuple, Dict, Iterator, List
 
-from .encoder import CGMDataset, ConditionedDataset
+from .encoder import (
+    ConditionedDataset, WindowedDataset, fill_gaps, valid_window_starts,
+)
+try:
+    from ..ns2parquet.grid_kernels import (
+        interval_mask, minutes_since_nonzero, schedule_at,
+        seconds_since_last, steps_since,
+    )
+    from ..ns2parquet.catalog import Terrarium
+except ImportError:  # cgmencode imported as a top-level package
+    from ns2parquet.grid_kernels import (
+        interval_mask, minutes_since_nonzero, schedule_at,
+        seconds_since_last, steps_since,
+    )
+    from ns2parquet.catalog import Terrarium
 from .schema import (
     NORMALIZATION_SCALES, GLUCOSE_CLIP_MIN, GLUCOSE_CLIP_MAX,
     NUM_FEATURES_EXTENDED, OVERRIDE_TYPES, TIME_SINCE_CAP_MIN,
@@ -196,6 +210,10 @@ def split_into_windows(features: np.ndarray, window_size: int = 24,
     """
     Split feature array into overlapping windows, skipping windows with too many NaN glucose values.
 
+    Gaps are filled once over the whole array (encoder.fill_gaps, on a
+    copy) and the windows are views into that array; ``features`` is not
+    modified. WindowedDataset does the same without building the list.
+
     Parameters:
         features: (N, 8) array
         window_size: Window length in time steps
@@ -204,27 +222,10 @@ def split_into_windows(features: np.ndarray, window_size: int = 24,
     Returns:
         List of (window_size, 8) arrays
     """
-    windows = []
-    stride = window_size // 2  # 50% overlap
-
-    for start in range(0, len(features) - window_size + 1, stride):
-        window = features[start:start + window_size]
-        # Check glucose channel (0) for NaN
-        glucose_valid = np.sum(~np.isnan(window[:, 0]))
-        if glucose_valid / window_size >= min_valid_fraction:
-            # Fill any remaining NaN with interpolation
-            for col in range(window.shape[1]):
-                mask = np.isnan(window[:, col])
-                if mask.any():
-                    valid = ~mask
-                    if valid.sum() >= 2:
-                        window[mask, col] = np.interp(
-                            np.where(mask)[0], np.where(valid)[0], window[valid, col])
-                    else:
-                        window[mask, col] = 0.0
-            windows.append(window)
-
-    return windows
+    stride = max(window_size // 2, 1)  # 50% overlap
+    starts = valid_window_starts(features[:, 0], window_size, stride, min_valid_fraction)
+    filled = fill_gaps(features) if len(starts) else features
+    return [filled[start:start + window_size] for start in starts]
 
 
 def load_nightscout_grid_timestamps(data_path: str) -> np.ndarray:
@@ -464,33 +465,14 @@ def build_nightscout_grid(data_path: str,
     sensor_start_times.sort()
 
     # Compute hours since last Site Change (cannula age) for each grid point
-    df['cage_hours'] = np.nan
-    if site_change_times:
-        sc_idx = 0
-        for i, ts in enumerate(df.index):
-            while sc_idx < len(site_change_times) - 1 and site_change_times[sc_idx + 1] <= ts:
-                sc_idx += 1
-            if site_change_times[sc_idx] <= ts:
-                delta_h = (ts - site_change_times[sc_idx]).total_seconds() / 3600.0
-                df.iloc[i, df.columns.get_loc('cage_hours')] = delta_h
+    df['cage_hours'] = seconds_since_last(df.index, site_change_times) / 3600.0
 
     # Compute hours since last Sensor Start (sensor age) for each grid point
-    df['sage_hours'] = np.nan
-    if sensor_start_times:
-        ss_idx = 0
-        for i, ts in enumerate(df.index):
-            while ss_idx < len(sensor_start_times) - 1 and sensor_start_times[ss_idx + 1] <= ts:
-                ss_idx += 1
-            if sensor_start_times[ss_idx] <= ts:
-                delta_h = (ts - sensor_start_times[ss_idx]).total_seconds() / 3600.0
-                df.iloc[i, df.columns.get_loc('sage_hours')] = delta_h
+    df['sage_hours'] = seconds_since_last(df.index, sensor_start_times) / 3600.0
 
     # Detect sensor warmup: first 2 hours after Sensor Start
-    df['sensor_warmup'] = 0.0
-    for ss_ts in sensor_start_times:
-        warmup_end = ss_ts + pd.Timedelta(hours=2)
-        mask = (df.index >= ss_ts) & (df.index < warmup_end)
-        df.loc[mask, 'sensor_warmup'] = 1.0
+    df['sensor_warmup'] = interval_mask(
+        df.index, sensor_start_times, pd.Timedelta(hours=2)).astype(np.float64)
 
     if verbose:
         print(f"  CAGE: {len(site_change_times)} site changes, "
@@ -568,14 +550,7 @@ def build_nightscout_grid(data_path: str,
         print(f"  Patient timezone: {patient_tz}{tz_offset}")
 
     # Use LOCAL time for basal schedule lookup (timeAsSeconds is local midnight-relative)
-    scheduled = np.zeros(len(df))
-    for i, ts in enumerate(local_index):
-        sec_of_day = ts.hour * 3600 + ts.minute * 60 + ts.second
-        rate = basal_schedule[0]['value'] if basal_schedule else 0
-        for entry in basal_schedule:
-            if entry.get('timeAsSeconds', 0) <= sec_of_day:
-                rate = entry['value']
-        scheduled[i] = rate
+    scheduled = schedule_at(local_index, basal_schedule)
 
     df['temp_rate'] = df['temp_rate'].ffill()
     df['temp_rate'] = df['temp_rate'].fillna(pd.Series(scheduled, index=df.index))
@@ -620,6 +595,8 @@ def build_nightscout_grid(data_path: str,
 # ── Parquet bridge ─────────────────────────────────────────────────────
 # Fast-path loader that reads pre-built grid.parquet from the data terrarium
 # instead of re-parsing JSON.  Drop-in replacement for the JSON code path.
+# Patients are read one at a time (patient filter + columns pushed into the
+# scan), so a cohort never has to be decoded in full.
 # Usage:
 #   patients = load_parquet_patients('externals/ns-parquet/training')
 
@@ -687,14 +664,133 @@ _PARQUET_COL_MAP = {
 }
 
 
+# Grid columns the 8-feature array is built from (always read)
+_PARQUET_FEATURE_COLS = ['time', 'glucose', 'iob', 'cob', 'net_basal', 'bolus',
+                         'carbs', 'time_sin', 'time_cos']
+
+# Patients shorter than this are skipped by load_parquet_patients
+_MIN_PARQUET_STEPS = 100
+
+
+def _parquet_patient_grid(terrarium: Terrarium, patient_id: str,
+                          columns: Optional[List[str]] = None,
+                          ) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Read and shape one patient's grid → (df, features_8col).
+
+    Only this patient's row groups / partitions are opened (see
+    ns2parquet.catalog.Terrarium.read), restricted to ``columns`` plus
+    the feature columns when given.
+    """
+    if columns is not None:
+        columns = list(dict.fromkeys([*_PARQUET_FEATURE_COLS, *columns]))
+    pdf = terrarium.read('grid', patient_id, columns=columns)
+    pdf = pdf.sort_values('time').copy()
+    pdf.index = pd.DatetimeIndex(pdf['time'])
+
+    # Rename columns to match real_data_adapter conventions
+    pdf = pdf.rename(columns={k: v for k, v in _PARQUET_COL_MAP.items()
+                              if k in pdf.columns})
+
+    # Reconstruct df.attrs from this patient's profiles
+    profiles = terrarium.read('profiles', patient_id)
+    if not profiles.empty:
+        pdf.attrs.update(_reconstruct_attrs(profiles, patient_id))
+
+    # Build the 8-feature normalized array matching build_nightscout_grid output
+    features = np.column_stack([
+        pdf['glucose'].values / SCALE['glucose'],
+        pdf['iob'].values / SCALE['iob'],
+        pdf['cob'].values / SCALE['cob'],
+        pdf['net_basal'].values / SCALE['net_basal'],
+        pdf['bolus'].values / SCALE['bolus'],
+        pdf['carbs'].values / SCALE['carbs'],
+        pdf['time_sin'].values,
+        pdf['time_cos'].values,
+    ]).astype(np.float32)
+    return pdf, features
+
+
+def _parquet_patient_ids(terrarium: Terrarium,
+                         patient_filter: Optional[str] = None,
+                         min_steps: int = 0) -> List[str]:
+    """Sorted grid patient ids, without decoding any grid rows.
+
+    With a catalog, patients whose cataloged row count is below
+    ``min_steps`` are dropped up front (cataloged rows never undercount).
+    """
+    path = terrarium.path
+    if not (path / 'grid.parquet').exists() and not (path / 'grid').is_dir():
+        raise FileNotFoundError(
+            f"No grid.parquet in {path}. Run 'make terrarium' first.")
+    pids = [str(p) for p in terrarium.patients('grid')]
+    if patient_filter is not None:
+        pids = [p for p in pids if p == str(patient_filter)]
+    if min_steps:
+        summary = terrarium.summary('grid')
+        if summary is not None:
+            rows = summary['rows']
+            pids = [p for p in pids if rows.get(p, 0) >= min_steps]
+    return pids
+
+
+class ParquetCohort(Mapping):
+    """Lazy {patient_id: (df, features_8col)} over a terrarium grid.
+
+    Keys come from the catalog (or the patient_id column) so nothing is
+    decoded up front; a patient's grid is read on first access and
+    cached. ``release(pid)`` drops a cached patient again.
+    """
+
+    def __init__(self, parquet_dir, patient_ids: List[str],
+                 columns: Optional[List[str]] = None, verbose: bool = True):
+        self.terrarium = parquet_dir if isinstance(parquet_dir, Terrarium) \
+            else Terrarium(parquet_dir)
+        self.columns = columns
+        self.verbose = verbose
+        self._ids = list(patient_ids)
+        self._known = set(self._ids)
+        self._cache: Dict[str, Tuple[pd.DataFrame, np.ndarray]] = {}
+
+    def __getitem__(self, patient_id):
+        if patient_id not in self._known:
+            raise KeyError(patient_id)
+        if patient_id not in self._cache:
+            pdf, features = _parquet_patient_grid(self.terrarium, patient_id,
+                                                  self.columns)
+            if self.verbose:
+                print(f"  Loaded {patient_id}: {len(pdf)} steps (parquet)")
+            self._cache[patient_id] = (pdf, features)
+        return self._cache[patient_id]
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._known
+
+    def loaded(self) -> List[str]:
+        """Patient ids materialized so far."""
+        return [p for p in self._ids if p in self._cache]
+
+    def release(self, patient_id: str):
+        self._cache.pop(patient_id, None)
+
+
 def load_parquet_grid(parquet_dir: str,
                       patient_filter: str = None,
                       verbose: bool = True,
-                      ) -> Dict[str, Tuple[pd.DataFrame, np.ndarray]]:
+                      max_patients: int = None,
+                      columns: Optional[List[str]] = None,
+                      ) -> ParquetCohort:
     """Load pre-built 5-min grids from a ns-parquet terrarium directory.
 
-    Returns dict mapping patient_id → (df, features) in the same format
-    as build_nightscout_grid(), so callers can swap seamlessly.
+    Returns a lazy mapping patient_id → (df, features) in the same format
+    as build_nightscout_grid(), so callers can swap seamlessly. Patients
+    are read one at a time on first access, with the patient filter and
+    column projection pushed into the parquet scan.
 
     Reconstructs df.attrs from profiles.parquet so that
     build_continuous_pk_features() gets correct therapy schedules.
@@ -703,101 +799,106 @@ def load_parquet_grid(parquet_dir: str,
         parquet_dir: Directory containing grid.parquet (e.g. externals/ns-parquet/training)
         patient_filter: Optional single patient ID to load
         verbose: Print progress
+        max_patients: Keep only the first N patients (sorted by id)
+        columns: Optional grid columns to read (ns2parquet names); the
+            feature columns are always included
 
     Returns:
-        Dict of {patient_id: (df, features_8col)} where df has DatetimeIndex
+        Mapping of {patient_id: (df, features_8col)} where df has DatetimeIndex
         and features is (N, 8) float32 normalized array.
     """
-    parquet_dir = Path(parquet_dir)
-    grid_path = parquet_dir / 'grid.parquet'
-    if not grid_path.exists():
-        raise FileNotFoundError(
-            f"No grid.parquet in {parquet_dir}. Run 'make terrarium' first.")
-
-    grid = pd.read_parquet(grid_path)
-    if patient_filter:
-        grid = grid[grid['patient_id'] == patient_filter]
-
-    # Load profiles for attrs reconstruction
-    profiles_path = parquet_dir / 'profiles.parquet'
-    profiles = pd.read_parquet(profiles_path) if profiles_path.exists() else pd.DataFrame()
-
-    results = {}
-    for pid, pdf in grid.groupby('patient_id'):
-        pdf = pdf.sort_values('time').copy()
-        pdf.index = pd.DatetimeIndex(pdf['time'])
-
-        # Rename columns to match real_data_adapter conventions
-        pdf = pdf.rename(columns={k: v for k, v in _PARQUET_COL_MAP.items()
-                                  if k in pdf.columns})
-
-        # Reconstruct df.attrs from profiles
-        attrs = _reconstruct_attrs(profiles, pid)
-        pdf.attrs.update(attrs)
-
-        # Build the 8-feature normalized array matching build_nightscout_grid output
-        features = np.column_stack([
-            pdf['glucose'].values / SCALE['glucose'],
-            pdf['iob'].values / SCALE['iob'],
-            pdf['cob'].values / SCALE['cob'],
-            pdf['net_basal'].values / SCALE['net_basal'],
-            pdf['bolus'].values / SCALE['bolus'],
-            pdf['carbs'].values / SCALE['carbs'],
-            pdf['time_sin'].values,
-            pdf['time_cos'].values,
-        ]).astype(np.float32)
-
-        results[pid] = (pdf, features)
-        if verbose:
-            print(f"  Loaded {pid}: {len(pdf)} steps (parquet)")
-
-    return results
+    terrarium = Terrarium(parquet_dir)
+    pids = _parquet_patient_ids(terrarium, patient_filter)
+    if max_patients:
+        pids = pids[:max_patients]
+    return ParquetCohort(terrarium, pids, columns=columns, verbose=verbose)
 
 
-def load_parquet_patients(parquet_dir: str,
+def iter_parquet_patients(parquet_dir: str,
                           max_patients: int = None,
                           patient_filter: str = None,
-                          verbose: bool = True) -> list:
-    """Drop-in replacement for exp_metabolic_flux.load_patients() using parquet.
-
-    Returns the same [{name, df, grid, pk}] list format that all cgmencode
-    experiments expect, but reads from pre-built parquet (~16ms) instead of
-    re-parsing JSON (~3s per patient).
-
-    Args:
-        parquet_dir: Path to terrarium subset (e.g. 'externals/ns-parquet/training')
-        max_patients: Limit number of patients loaded
-        patient_filter: Load only this patient ID
-        verbose: Print progress
+                          verbose: bool = True,
+                          columns: Optional[List[str]] = None,
+                          feature_store=None,
+                          ) -> Iterator[dict]:
+    """Yield {name, df, grid, pk} patients one at a time from parquet.
+
+    Same records as load_parquet_patients, but only one patient's grid
+    is held at a time. Reading stops once ``max_patients`` have been
+    yielded; patients the catalog shows as too short are never read.
+
+    ``feature_store`` (a feature_store.FeatureStore, or True for the
+    terrarium's own store) serves PK arrays from disk, building and
+    storing the ones that are missing; with ``columns`` they are built
+    from the full grid, never from the projected frame.
     """
     from .continuous_pk import build_continuous_pk_features
 
-    grids = load_parquet_grid(parquet_dir, patient_filter=patient_filter,
-                              verbose=verbose)
-
-    patients = []
-    for pid in sorted(grids.keys()):
-        if max_patients and len(patients) >= max_patients:
+    terrarium = Terrarium(parquet_dir)
+    if feature_store is True:
+        from .feature_store import FeatureStore
+        feature_store = FeatureStore(terrarium.path)
+    pids = _parquet_patient_ids(terrarium, patient_filter,
+                                min_steps=_MIN_PARQUET_STEPS)
+    yielded = 0
+    for pid in pids:
+        if max_patients and yielded >= max_patients:
             break
-        df, features = grids[pid]
-        if len(df) < 100:
-            continue
         try:
-            pk = build_continuous_pk_features(df)
+            df, features = _parquet_patient_grid(terrarium, pid, columns)
+            if verbose:
+                print(f"  Loaded {pid}: {len(df)} steps (parquet)")
+            if len(df) < _MIN_PARQUET_STEPS:
+                continue
+            if feature_store and columns is not None:
+                # A projected frame may lack builder inputs (temp_rate):
+                # let the store key and build from the full grid
+                pk = feature_store.get(pid, 'pk')
+            elif feature_store:
+                pk = feature_store.get(pid, 'pk', df=df, grid=features)
+            else:
+                pk = build_continuous_pk_features(df)
             if pk is None:
                 continue
             n = min(len(features), len(pk))
-            patients.append({
+            patient = {
                 'name': pid,
                 'df':   df.iloc[:n],
                 'grid': features[:n],
                 'pk':   pk[:n],
-            })
+            }
         except Exception as exc:
             if verbose:
                 print(f"  Skip {pid}: {exc}")
+            continue
+        yielded += 1
+        yield patient
+
+
+def load_parquet_patients(parquet_dir: str,
+                          max_patients: int = None,
+                          patient_filter: str = None,
+                          verbose: bool = True,
+                          feature_store=None) -> list:
+    """Drop-in replacement for exp_metabolic_flux.load_patients() using parquet.
 
-    return patients
+    Returns the same [{name, df, grid, pk}] list format that all cgmencode
+    experiments expect, but reads from pre-built parquet (~16ms) instead of
+    re-parsing JSON (~3s per patient). Use iter_parquet_patients() to
+    stream patients instead of holding the whole cohort.
+
+    Args:
+        parquet_dir: Path to terrarium subset (e.g. 'externals/ns-parquet/training')
+        max_patients: Limit number of patients loaded
+        patient_filter: Load only this patient ID
+        verbose: Print progress
+        feature_store: Serve PK arrays from a FeatureStore (True: the
+            terrarium's default store) instead of rebuilding them
+    """
+    return list(iter_parquet_patients(parquet_dir, max_patients=max_patients,
+                                      patient_filter=patient_filter,
+                                      verbose=verbose,
+                                      feature_store=feature_store))
 
 
 def build_extended_features(df: pd.DataFrame, features: np.ndarray,
@@ -900,15 +1001,6 @@ def build_extended_features(df: pd.DataFrame, features: np.ndarray,
     return extended
 
 
-def _lookup_schedule_value(sec_of_day: int, schedule: list, default: float = 0.0) -> float:
-    """Look up value from a time-of-day schedule (ISF, CR, target)."""
-    value = default
-    for entry in schedule:
-        if entry.get('timeAsSeconds', 0) <= sec_of_day:
-            value = float(entry.get('value', default))
-    return value
-
-
 # Trend arrow direction encoding (Dexcom standard)
 _DIRECTION_MAP = {
     'DoubleDown': -2.0, 'SingleDown': -1.0, 'FortyFiveDown': -0.5,
@@ -976,16 +1068,9 @@ def build_enriched_features(df: pd.DataFrame, features_21: np.ndarray,
     enriched[:, IDX_ROLLING_NOISE] = rolling_std.astype(np.float32) / SCALE['rolling_noise']
 
     # --- Channel 24: Hours since last valid CGM reading (gap proxy) ---
-    cgm_valid = ~np.isnan(df['glucose'].values)
-    hours_since = np.zeros(N, dtype=np.float32)
-    last_valid_idx = -1
-    for i in range(N):
-        if cgm_valid[i]:
-            last_valid_idx = i
-        if last_valid_idx >= 0:
-            hours_since[i] = (i - last_valid_idx) * 5.0 / 60.0
-        else:
-            hours_since[i] = 24.0  # cap
+    cgm_steps = steps_since(~np.isnan(df['glucose'].values))
+    hours_since = np.where(cgm_steps >= 0, cgm_steps * 5.0 / 60.0,
+                           24.0).astype(np.float32)  # cap before first reading
     enriched[:, IDX_HOURS_SINCE_CGM] = np.clip(hours_since, 0, 24) / SCALE['hours_since_cgm']
 
     # --- Channels 25-28: Loop predicted glucose summary ---
@@ -1025,22 +1110,20 @@ def build_enriched_features(df: pd.DataFrame, features_21: np.ndarray,
     target_low_schedule = df.attrs.get('target_low_schedule', [{'timeAsSeconds': 0, 'value': 100}])
     target_high_schedule = df.attrs.get('target_high_schedule', [{'timeAsSeconds': 0, 'value': 120}])
 
-    for i, ts in enumerate(local_index):
-        sec_of_day = ts.hour * 3600 + ts.minute * 60 + ts.second
-        enriched[i, IDX_SCHEDULED_ISF] = (
-            _lookup_schedule_value(sec_of_day, isf_schedule, 100.0) / SCALE['scheduled_isf']
-        )
-        enriched[i, IDX_SCHEDULED_CR] = (
-            _lookup_schedule_value(sec_of_day, cr_schedule, 10.0) / SCALE['scheduled_cr']
-        )
-        # Channel 34: Glucose vs target midpoint
-        t_low = _lookup_schedule_value(sec_of_day, target_low_schedule, 100.0)
-        t_high = _lookup_schedule_value(sec_of_day, target_high_schedule, 120.0)
-        t_mid = (t_low + t_high) / 2.0
-        if not np.isnan(glucose_raw[i]):
-            enriched[i, IDX_GLUCOSE_VS_TARGET] = (
-                (glucose_raw[i] - t_mid) / SCALE['glucose_vs_target']
-            )
+    enriched[:, IDX_SCHEDULED_ISF] = (
+        schedule_at(local_index, isf_schedule, 100.0) / SCALE['scheduled_isf']
+    )
+    enriched[:, IDX_SCHEDULED_CR] = (
+        schedule_at(local_index, cr_schedule, 10.0) / SCALE['scheduled_cr']
+    )
+    # Channel 34: Glucose vs target midpoint
+    t_low = schedule_at(local_index, target_low_schedule, 100.0)
+    t_high = schedule_at(local_index, target_high_schedule, 120.0)
+    t_mid = (t_low + t_high) / 2.0
+    has_glucose = ~np.isnan(glucose_raw)
+    enriched[has_glucose, IDX_GLUCOSE_VS_TARGET] = (
+        (glucose_raw[has_glucose] - t_mid[has_glucose]) / SCALE['glucose_vs_target']
+    )
 
     # --- Channels 35-36: Pump hardware state ---
     if 'pump_battery' in df.columns:
@@ -1077,14 +1160,10 @@ def build_enriched_features(df: pd.DataFrame, features_21: np.ndarray,
     # --- Channel 38: Time since last insulin suspension ---
     suspension_times = df.attrs.get('suspension_times', [])
     if suspension_times:
-        susp_minutes = np.full(N, SCALE['suspension_time'], dtype=np.float32)
-        s_idx = 0
-        for i, ts in enumerate(df.index):
-            while s_idx < len(suspension_times) - 1 and suspension_times[s_idx + 1] <= ts:
-                s_idx += 1
-            if suspension_times[s_idx] <= ts:
-                delta_min = (ts - suspension_times[s_idx]).total_seconds() / 60.0
-                susp_minutes[i] = min(delta_min, SCALE['suspension_time'])
+        delta_min = seconds_since_last(df.index, suspension_times) / 60.0
+        susp_minutes = np.where(np.isnan(delta_min), SCALE['suspension_time'],
+                                np.minimum(delta_min, SCALE['suspension_time'])
+                                ).astype(np.float32)
         enriched[:, IDX_SUSPENSION_TIME] = susp_minutes / SCALE['suspension_time']
     else:
         enriched[:, IDX_SUSPENSION_TIME] = 1.0  # capped (no suspensions known)
@@ -1145,18 +1224,7 @@ def _fill_override_channels(df: pd.DataFrame, extended: np.ndarray,
 def _time_since_last_nonzero(values: np.ndarray, cap_min: float,
                               interval_min: float = 5.0) -> np.ndarray:
     """Compute minutes since last non-zero value, capped at cap_min."""
-    N = len(values)
-    result = np.full(N, cap_min, dtype=np.float32)
-    last_nonzero_idx = -1
-
-    for i in range(N):
-        if not np.isnan(values[i]) and values[i] > 0:
-            last_nonzero_idx = i
-        if last_nonzero_idx >= 0:
-            minutes = (i - last_nonzero_idx) * interval_min
-            result[i] = min(minutes, cap_min)
-
-    return result
+    return minutes_since_nonzero(values, cap_min, interval_min).astype(np.float32)
 
 
 def load_nightscout_to_dataset(data_path: str,
@@ -1187,28 +1255,20 @@ def load_nightscout_to_dataset(data_path: str,
     # --- Window and split ---
     # For conditioned model: windows must be 2x window_size (history + future)
     actual_window = window_size * 2 if conditioned else window_size
-    windows = split_into_windows(features, window_size=actual_window)
-    if not windows:
+    windows = WindowedDataset(features, actual_window, task=task, window_size=window_size)
+    if not len(windows):
         print("  WARNING: No valid windows extracted.")
         return None, None
 
     # Train/val split (chronological)
-    split_idx = int(len(windows) * (1 - val_fraction))
-    train_windows = windows[:split_idx]
-    val_windows = windows[split_idx:]
-
-    train_tensor = torch.tensor(np.array(train_windows), dtype=torch.float32)
-    val_tensor = torch.tensor(np.array(val_windows), dtype=torch.float32)
+    train_ds, val_ds = windows.split(val_fraction)
 
     if conditioned:
         # ConditionedDataset splits at window_size: [:window_size] = history, [window_size:] = future
-        train_ds = ConditionedDataset(train_tensor, window_size=window_size)
-        val_ds = ConditionedDataset(val_tensor, window_size=window_size)
-    else:
-        train_ds = CGMDataset(train_tensor, task=task, window_size=window_size)
-        val_ds = CGMDataset(val_tensor, task=task, window_size=window_size)
+        train_ds = ConditionedDataset(train_ds.windows(), window_size=window_size)
+        val_ds = ConditionedDataset(val_ds.windows(), window_size=window_size)
 
-    print(f"  Windows: {len(windows)} total → {len(train_windows)} train, {len(val_windows)} val")
+    print(f"  Windows: {len(windows)} total → {len(train_ds)} train, {len(val_ds)} val")
 
     return train_ds, val_ds
 
@@ -1247,7 +1307,7 @@ def load_multipatient_nightscout(data_paths: List[str],
     if enriched_features:
         extended_features = True  # enriched builds on top of extended
 
-    per_patient_windows = []
+    per_patient_features = []
 
     if extended_features:
         # Extended path: 21+ features, doubled window for history+future
@@ -1272,54 +1332,46 @@ def load_multipatient_nightscout(data_paths: List[str],
         if enriched_features:
             features = build_enriched_features(df, features, verbose=False)
 
-        windows = split_into_windows(features, window_size=actual_window)
-        if not windows:
+        n_windows = len(valid_window_starts(features[:, 0], actual_window,
+                                            max(actual_window // 2, 1), 0.8))
+        if not n_windows:
             print(f"    SKIP: no valid windows")
             continue
 
         n_feat = features.shape[1] if hasattr(features, 'shape') else '?'
-        print(f"    {len(df)} rows → {len(windows)} windows "
+        print(f"    {len(df)} rows → {n_windows} windows "
               f"({n_feat}f, {df['glucose'].min():.0f}-{df['glucose'].max():.0f} mg/dL)")
-        per_patient_windows.append(windows)
+        per_patient_features.append(features)
 
-    if not per_patient_windows:
+    if not per_patient_features:
         print("  ERROR: no valid windows from any patient")
         return None, None
 
+    # Windows are (patient, offset) views into the per-patient arrays, so
+    # the overlapping windows are never copied into one big array.
+    # extended: (x, x) pairs for train_forecast() which handles its own masking
+    windows = WindowedDataset(per_patient_features, actual_window,
+                              task='reconstruct' if extended_features else task,
+                              window_size=window_size)
+
     # Per-patient chronological split: within each patient, first (1-val_fraction)
     # windows become training, last val_fraction become validation. This ensures
     # val windows are always temporally AFTER train windows for each patient,
     # preventing temporal proximity leakage from random shuffling.
-    train_windows = []
-    val_windows = []
-    for patient_windows in per_patient_windows:
-        split_idx = int(len(patient_windows) * (1 - val_fraction))
-        train_windows.extend(patient_windows[:split_idx])
-        val_windows.extend(patient_windows[split_idx:])
+    train_ds, val_ds = windows.split(val_fraction)
 
     # Shuffle training set to mix patients (prevents batch-level patient bias).
     # Validation set is NOT shuffled to preserve temporal ordering for analysis.
     rng = np.random.RandomState(42)
-    rng.shuffle(train_windows)
+    rng.shuffle(train_ds.index)
 
-    train_tensor = torch.tensor(np.array(train_windows), dtype=torch.float32)
-    val_tensor = torch.tensor(np.array(val_windows), dtype=torch.float32)
+    if conditioned and not extended_features:
+        train_ds = ConditionedDataset(train_ds.windows(), window_size=window_size)
+        val_ds = ConditionedDataset(val_ds.windows(), window_size=window_size)
 
-    if extended_features:
-        # TensorDataset (x, x) pairs for train_forecast() which handles its own masking
-        train_ds = torch.utils.data.TensorDataset(train_tensor, train_tensor)
-        val_ds = torch.utils.data.TensorDataset(val_tensor, val_tensor)
-    elif conditioned:
-        train_ds = ConditionedDataset(train_tensor, window_size=window_size)
-        val_ds = ConditionedDataset(val_tensor, window_size=window_size)
-    else:
-        train_ds = CGMDataset(train_tensor, task=task, window_size=window_size)
-        val_ds = CGMDataset(val_tensor, task=task, window_size=window_size)
-
-    total_windows = len(train_windows) + len(val_windows)
-    print(f"  Multi-patient total: {total_windows} windows from "
-          f"{len(data_paths)} patients → {len(train_windows)} train, "
-          f"{len(val_windows)} val (chronological split per patient)")
+    print(f"  Multi-patient total: {len(windows)} windows from "
+          f"{len(data_paths)} patients → {len(train_ds)} train, "
+          f"{len(val_ds)} val (chronological split per patient)")
 
     return train_ds, val_ds
 
@@ -1417,28 +1469,20 @@ def _dataframe_to_datasets(df: pd.DataFrame, task: str, window_size: int,
         basal_col=basal_col, carbs_col=carbs_col,
     )
 
-    windows = split_into_windows(features, window_size=window_size)
+    windows = WindowedDataset(features, window_size, task=task)
 
-    if not windows:
+    if not len(windows):
         print("  WARNING: No valid windows extracted.")
         return None, None
 
     print(f"  Extracted {len(windows)} windows of {window_size} steps ({window_size*5} min)")
 
     # Train/val split (chronological — last N% is validation)
-    split_idx = int(len(windows) * (1 - val_fraction))
-    train_windows = windows[:split_idx]
-    val_windows = windows[split_idx:]
-
-    train_tensor = torch.tensor(np.array(train_windows), dtype=torch.float32)
-    val_tensor = torch.tensor(np.array(val_windows), dtype=torch.float32)
+    train_ds, val_ds = windows.split(val_fraction)
 
     if conditioned:
-        train_ds = ConditionedDataset(train_tensor, window_size=window_size)
-        val_ds = ConditionedDataset(val_tensor, window_size=window_size)
-    else:
-        train_ds = CGMDataset(train_tensor, task=task, window_size=window_size)
-        val_ds = CGMDataset(val_tensor, task=task, window_size=window_size)
+        train_ds = ConditionedDataset(train_ds.windows(), window_size=window_size)
+        val_ds = ConditionedDataset(val_ds.windows(), window_size=window_size)
 
     return train_ds, val_ds
 
@@ -303,6 +303,54 @@ class TestCGMDataset(unittest.TestCase):
             self.assertEqual(y.shape, (18, 8), f"Task {task}: y shape wrong")
 
 
+class TestWindowedDataset(unittest.TestCase):
+    """Strided (patient, offset) windows over per-patient feature arrays."""
+
+    def _features(self, n=400, seed=0):
+        rng = np.random.default_rng(seed)
+        features = rng.random((n, 8)).astype(np.float32)
+        features[rng.random(n) < 0.1, 0] = np.nan
+        features[100:140, 0] = np.nan
+        return features
+
+    def test_valid_starts_match_loop(self):
+        from tools.cgmencode.encoder import valid_window_starts
+        features = self._features()
+        expected = [s for s in range(0, len(features) - 24 + 1, 12)
+                    if np.sum(~np.isnan(features[s:s + 24, 0])) / 24 >= 0.8]
+        np.testing.assert_array_equal(
+            valid_window_starts(features[:, 0], 24, 12, 0.8), expected)
+
+    def test_windows_are_views_of_filled_array(self):
+        from tools.cgmencode.encoder import WindowedDataset
+        from tools.cgmencode.real_data_adapter import split_into_windows
+        features = self._features()
+        original = features.copy()
+        ds = WindowedDataset(features, 24)
+        windows = split_into_windows(features, window_size=24)
+        np.testing.assert_array_equal(features, original)  # input untouched
+        self.assertEqual(len(ds), len(windows))
+        np.testing.assert_array_equal(ds.windows(), np.array(windows))
+        self.assertFalse(np.isnan(ds.windows()).any())
+        clean = np.nan_to_num(features)
+        self.assertTrue(np.shares_memory(WindowedDataset(clean, 24)._views[0], clean))
+
+    def test_task_masking_and_split(self):
+        from tools.cgmencode.encoder import WindowedDataset
+        ds = WindowedDataset([self._features(seed=1), self._features(200, seed=2)],
+                             24, task='forecast', window_size=12)
+        x, y = ds[0]
+        self.assertEqual(x.shape, (24, 8))
+        self.assertTrue((x[12:, :6] == 0).all())
+        self.assertFalse((y[12:, :6] == 0).all())
+        train, val = ds.split(0.25)
+        self.assertEqual(len(train) + len(val), len(ds))
+        for p in (0, 1):
+            last_train = train.index[train.index[:, 0] == p, 1].max()
+            self.assertLess(last_train, val.index[val.index[:, 0] == p, 1].min())
+        self.assertEqual(tuple(train.vectors.shape), (len(train), 24, 8))
+
+
 class TestConditionedDataset(unittest.TestCase):
     """Verify conditioned dataset splits history/actions/target correctly."""
 
@@ -1086,6 +1134,273 @@ class TestExtendedFeatures(unittest.TestCase):
         self.assertEqual(ext[36, 10], 0.0)
         self.assertAlmostEqual(ext[30, 11], OVERRIDE_TYPES['eating_soon'])
 
+    def test_time_since_last_nonzero_matches_loop(self):
+        """Vectorized time-since kernel matches the original per-step loop."""
+        from tools.cgmencode.real_data_adapter import _time_since_last_nonzero
+        values = np.random.default_rng(3).choice([0.0, 0.0, 2.0, np.nan], size=400)
+        expected = np.full(len(values), 120.0, dtype=np.float32)
+        last = -1
+        for i, v in enumerate(values):
+            if not np.isnan(v) and v > 0:
+                last = i
+            if last >= 0:
+                expected[i] = min((i - last) * 5.0, 120.0)
+        got = _time_since_last_nonzero(values, 120.0)
+        self.assertEqual(got.dtype, np.float32)
+        np.testing.assert_array_equal(got, expected)
+
+    def test_expand_schedule_matches_loop(self):
+        """expand_schedule (searchsorted kernel) matches the nested scan."""
+        from tools.cgmencode.continuous_pk import expand_schedule
+        idx = pd.date_range('2026-03-01', periods=600, freq='5min', tz='UTC')
+        local = idx.tz_convert('Europe/Berlin')
+        sched = [{'timeAsSeconds': 64800, 'value': 55},
+                 {'timeAsSeconds': 3600, 'value': 50},
+                 {'timeAsSeconds': 21600, 'value': 45}]
+        ordered = sorted(sched, key=lambda e: e['timeAsSeconds'])
+        expected = []
+        for ts in local:
+            sec = ts.hour * 3600 + ts.minute * 60 + ts.second
+            val = ordered[0]['value']
+            for entry in ordered:
+                if entry['timeAsSeconds'] <= sec:
+                    val = entry['value']
+            expected.append(float(val))
+        np.testing.assert_array_equal(
+            expand_schedule(idx, sched, default=40.0, local_index=local), expected)
+        np.testing.assert_array_equal(expand_schedule(idx, [], default=40.0),
+                                      np.full(len(idx), 40.0))
+
+
+class TestPKConvolution(unittest.TestCase):
+    """Shared dose × kernel convolution (pk_convolution.convolve_doses)."""
+
+    @staticmethod
+    def _loop(doses, kernel):
+        out = np.zeros(len(doses))
+        for i in np.nonzero(doses)[0]:
+            end = min(i + len(kernel), len(doses))
+            out[i:end] += doses[i] * kernel[:end - i]
+        return out
+
+    def test_methods_match_scatter_loop(self):
+        """sparse / direct / fft all match the per-dose loop, zeros stay exact."""
+        from tools.cgmencode.pk_convolution import convolve_doses
+        rng = np.random.RandomState(0)
+        for K in (36, 60, 200):
+            kernel = rng.rand(K)
+            bolus = np.where(rng.rand(3000) < 0.02, rng.gamma(2.0, 2.0, 3000), 0.0)
+            basal = rng.uniform(-0.05, 0.1, 3000)
+            basal[1000:1400] = 0.0                      # suspend
+            for doses in (bolus, basal):
+                expected = self._loop(doses, kernel)
+                for method in ('auto', 'sparse', 'direct', 'fft'):
+                    got = convolve_doses(doses, kernel, method=method)
+                    np.testing.assert_allclose(got, expected, rtol=1e-10, atol=1e-12)
+                    np.testing.assert_array_equal(got == 0, expected == 0)
+
+    def test_batch_matches_rows(self):
+        """A (P, N) batch equals convolving each row; 1-D shape is kept."""
+        from tools.cgmencode.pk_convolution import convolve_doses
+        rng = np.random.RandomState(1)
+        kernel = rng.rand(150)
+        batch = np.stack([np.zeros(500),
+                          np.where(rng.rand(500) < 0.002, 1.0, 0.0),
+                          rng.rand(500)])
+        got = convolve_doses(batch, kernel)
+        self.assertEqual(got.shape, batch.shape)
+        for row, out in zip(batch, got):
+            np.testing.assert_allclose(out, self._loop(row, kernel), atol=1e-12)
+        self.assertEqual(convolve_doses(batch[2], kernel).shape, (500,))
+        with self.assertRaises(ValueError):
+            convolve_doses(batch[np.newaxis], kernel)
+
+    def test_kernels_cached_read_only(self):
+        """Kernel builders share one read-only array per parameter set."""
+        from tools.cgmencode.continuous_pk import (
+            _build_activity_kernel, _build_carb_kernel, _build_iob_kernel)
+        k = _build_activity_kernel(5.0, 55.0, 5)
+        self.assertIs(k, _build_activity_kernel())
+        self.assertIs(k, _build_activity_kernel(dia_hours=5.0, interval_min=5))
+        self.assertIsNot(k, _build_activity_kernel(6.0))
+        self.assertFalse(k.flags.writeable)
+        self.assertIs(_build_carb_kernel(3.0), _build_carb_kernel())
+        iob = _build_iob_kernel()
+        np.testing.assert_allclose(iob, np.clip(1 - np.cumsum(k) * 5, 0, 1))
+
+    def test_rolling_insulin_total(self):
+        """metabolic_engine's 12h insulin total matches the rolling sum."""
+        from tools.cgmencode.production.metabolic_engine import (
+            _compute_total_insulin_delivered)
+        rng = np.random.RandomState(2)
+        bolus = np.where(rng.rand(1000) < 0.03, 3.0, 0.0)
+        basal = rng.uniform(0.0, 2.0, 1000)
+        per_step = bolus + basal * (5.0 / 60.0)
+        expected = np.array([per_step[max(0, i - 143):i + 1].sum()
+                             for i in range(1000)])
+        np.testing.assert_allclose(
+            _compute_total_insulin_delivered(bolus, basal, 144), expected, rtol=1e-10)
+
+
+NS_FIXTURES = PROJECT_ROOT / 'tools' / 'ns2parquet' / 'fixtures'
+
+
+def _write_fixture_terrarium(out_dir, patients=(('patient_d', 'd'), ('patient_a', 'a'))):
+    """Grid + profiles for ns2parquet JSON fixtures, written to out_dir."""
+    import shutil
+    from tools.ns2parquet.grid import build_grid
+    from tools.ns2parquet.normalize import normalize_profiles
+    from tools.ns2parquet.writer import write_parquet
+    for prefix, pid in patients:
+        src = tempfile.mkdtemp()
+        for col in ['entries', 'treatments', 'devicestatus', 'profile']:
+            shutil.copy(NS_FIXTURES / f'{prefix}_{col}.json',
+                        os.path.join(src, f'{col}.json'))
+        write_parquet(build_grid(src, pid, verbose=False), out_dir, 'grid')
+        with open(os.path.join(src, 'profile.json')) as f:
+            write_parquet(normalize_profiles(json.load(f), pid), out_dir, 'profiles')
+        shutil.rmtree(src)
+
+
+@unittest.skipUnless((NS_FIXTURES / 'patient_d_entries.json').exists(),
+                     'ns2parquet JSON fixtures not available')
+class TestParquetCohort(unittest.TestCase):
+    """Lazy per-patient loading of a terrarium grid (load_parquet_grid)."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        _write_fixture_terrarium(cls.tmpdir)
+
+    @classmethod
+    def tearDownClass(cls):
+        import shutil
+        shutil.rmtree(cls.tmpdir)
+
+    def test_patients_materialize_on_access(self):
+        from tools.cgmencode.real_data_adapter import load_parquet_grid
+        cohort = load_parquet_grid(self.tmpdir, verbose=False)
+        self.assertEqual(list(cohort), ['a', 'd'])
+        self.assertEqual(cohort.loaded(), [])
+        df, features = cohort['d']
+        self.assertEqual(cohort.loaded(), ['d'])
+        self.assertIsInstance(df.index, pd.DatetimeIndex)
+        self.assertEqual(features.shape, (len(df), 8))
+        self.assertEqual(features.dtype, np.float32)
+        self.assertIn('isf_schedule', df.attrs)
+        self.assertIs(cohort['d'][0], df)
+        with self.assertRaises(KeyError):
+            cohort['missing']
+
+    def test_filter_limit_and_columns(self):
+        from tools.cgmencode.real_data_adapter import load_parquet_grid
+        self.assertEqual(list(load_parquet_grid(self.tmpdir, max_patients=1,
+                                                verbose=False)), ['a'])
+        self.assertEqual(list(load_parquet_grid(self.tmpdir, patient_filter='d',
+                                                verbose=False)), ['d'])
+        full = load_parquet_grid(self.tmpdir, verbose=False)['a']
+        slim = load_parquet_grid(self.tmpdir, columns=['scheduled_isf'],
+                                 verbose=False)['a']
+        self.assertIn('scheduled_isf', slim[0].columns)
+        self.assertNotIn('loop_predicted_30', slim[0].columns)
+        np.testing.assert_array_equal(slim[1], full[1])
+        with self.assertRaises(FileNotFoundError):
+            load_parquet_grid(os.path.join(self.tmpdir, 'nowhere'))
+
+    def test_iter_matches_load_patients(self):
+        from tools.cgmencode.real_data_adapter import (
+            iter_parquet_patients, load_parquet_patients)
+        patients = load_parquet_patients(self.tmpdir, verbose=False)
+        self.assertEqual([p['name'] for p in patients], ['a', 'd'])
+        gen = iter_parquet_patients(self.tmpdir, max_patients=1, verbose=False)
+        first = next(gen)
+        self.assertEqual(first['name'], 'a')
+        np.testing.assert_array_equal(first['pk'], patients[0]['pk'])
+        self.assertEqual(list(gen), [])
+
+
+@unittest.skipUnless((NS_FIXTURES / 'patient_d_entries.json').exists(),
+                     'ns2parquet JSON fixtures not available')
+class TestFeatureStore(unittest.TestCase):
+    """Persistent PK / extended feature arrays (feature_store.FeatureStore)."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        _write_fixture_terrarium(self.tmpdir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir)
+
+    def test_stored_pk_matches_builder(self):
+        from tools.cgmencode.continuous_pk import build_continuous_pk_features
+        from tools.cgmencode.feature_store import FeatureStore
+        from tools.cgmencode.real_data_adapter import load_parquet_grid
+        store = FeatureStore(self.tmpdir)
+        self.assertIsNone(store.load('a'))
+        built = store.get('a')
+        stored = store.load('a')
+        self.assertIsInstance(stored, np.memmap)
+        df, _ = load_parquet_grid(self.tmpdir, verbose=False)['a']
+        np.testing.assert_array_equal(stored, build_continuous_pk_features(df))
+        np.testing.assert_array_equal(built, stored)
+        # Parameters get their own entry; defaults spelled out share one
+        self.assertIsNone(store.load('a', dia_hours=6.0))
+        self.assertEqual(store.key('a', dia_hours=5.0), store.key('a'))
+        self.assertEqual(store.get('a', 'extended').shape[1], 21)
+
+    def test_data_change_invalidates(self):
+        from tools.cgmencode.feature_store import FeatureStore
+        store = FeatureStore(self.tmpdir)
+        store.get('d')
+        key = store.key('d')
+        # Rewriting a patient's grid changes its catalog content hash
+        _write_fixture_terrarium(self.tmpdir, [('patient_b', 'd')])
+        store = FeatureStore(self.tmpdir)
+        self.assertNotEqual(store.key('d'), key)
+        self.assertIsNone(store.load('d'))
+        store.get('d')
+        self.assertEqual(len(store.entries()), 1)
+        self.assertEqual(store.invalidate('d'), 1)
+        self.assertIsNone(store.load('d'))
+
+    def test_warm_cli_and_loader(self):
+        from tools.cgmencode.feature_store import FeatureStore, main
+        from tools.cgmencode.real_data_adapter import load_parquet_patients
+        self.assertEqual(main(['warm', '-p', self.tmpdir, '--sets', 'pk', 'extended']), 0)
+        entries = FeatureStore(self.tmpdir).entries()
+        self.assertEqual(sorted(entries['feature_set']), ['extended'] * 2 + ['pk'] * 2)
+        plain = load_parquet_patients(self.tmpdir, verbose=False)
+        stored = load_parquet_patients(self.tmpdir, verbose=False, feature_store=True)
+        for a, b in zip(plain, stored):
+            np.testing.assert_array_equal(a['pk'], b['pk'])
+
+    def test_projected_loader_uses_full_grid(self):
+        from tools.cgmencode.feature_store import FeatureStore
+        from tools.cgmencode.real_data_adapter import (
+            iter_parquet_patients, load_parquet_patients)
+        full = {p['name']: p['pk'] for p in
+                load_parquet_patients(self.tmpdir, verbose=False)}
+        # Projected frames lack temp_rate; the store must not cache their PK
+        for p in iter_parquet_patients(self.tmpdir, verbose=False,
+                                       columns=['glucose'], feature_store=True):
+            np.testing.assert_array_equal(p['pk'], full[p['name']])
+        store = FeatureStore(self.tmpdir)
+        for pid, pk in full.items():
+            np.testing.assert_array_equal(store.load(pid), pk)
+
+    def test_catalog_reloaded_on_change(self):
+        from tools.cgmencode import schema
+        from tools.cgmencode.feature_store import FEATURE_SETS, FeatureStore
+        store = FeatureStore(self.tmpdir)
+        key = store.key('d')
+        _write_fixture_terrarium(self.tmpdir, [('patient_b', 'd')])
+        # Same store instance: the rewritten catalog is picked up
+        self.assertNotEqual(store.key('d'), key)
+        # Extended / enriched normalize with schema.NORMALIZATION_SCALES
+        for name in ('extended', 'enriched'):
+            self.assertIn(schema, FEATURE_SETS[name][2])
+
 
 # =============================================================================
 # 8. State Tracker Tests (ISF/CR drift detection)
@@ -5,6 +5,10 @@ Mock Nightscout Server - lightweight HTTP server for offline testing.
 Simulates Nightscout API v1/v3 with in-memory storage.
 Supports: entries, treatments, devicestatus, profile
 
+Speaks HTTP/1.1 keep-alive on a threading server and understands the
+``find[field][$gte|$gt|$lte|$lt|$ne]=`` query syntax and ``.json`` paths
+used by ns2parquet's windowed fetcher.
+
 Usage:
     python tools/mock_nightscout.py                          # Start on port 5555
     python tools/mock_nightscout.py --port 8080              # Custom port
@@ -20,7 +24,7 @@ import json
 import sys
 import uuid
 from datetime import datetime, timezone
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 from typing import Any
 from urllib.parse import urlparse, parse_qs
@@ -43,6 +47,9 @@ _storage: dict[str, list[dict]] = {
 # API secret for authentication (optional)
 API_SECRET = "mock-api-secret"
 
+# Set by --quiet
+QUIET = False
+
 
 def generate_id() -> str:
     """Generate a MongoDB-style ObjectId (simplified)."""
@@ -90,25 +97,71 @@ def load_fixtures(fixtures_dir: Path) -> None:
                     print(f"Error loading {filepath}: {e}", file=sys.stderr)
 
 
+def _matches(doc_value: Any, op: str, value: str) -> bool:
+    """Compare a document field against a query-string operand.
+
+    Numeric fields (e.g. ``date``) compare numerically, everything else
+    (e.g. ISO ``created_at``) as strings, like MongoDB on mixed types.
+    """
+    if doc_value is None:
+        return op == "$ne"
+    if isinstance(doc_value, (int, float)) and not isinstance(doc_value, bool):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return op == "$ne"
+    else:
+        doc_value = str(doc_value)
+    if op == "$gte":
+        return doc_value >= value
+    if op == "$gt":
+        return doc_value > value
+    if op == "$lte":
+        return doc_value <= value
+    if op == "$lt":
+        return doc_value < value
+    if op == "$ne":
+        return doc_value != value
+    return doc_value == value
+
+
+def _parse_filter(key: str) -> tuple[str, str]:
+    """``find[date][$gte]`` / ``date[$gte]`` / ``type`` → (field, op)."""
+    if key.startswith("find[") and key.endswith("]"):
+        key = key[len("find["):]
+        field, _, rest = key.partition("]")
+        op = rest[1:-1] if rest.startswith("[") else "$eq"
+        return field, op
+    for op in ("$ne", "$gte", "$gt", "$lte", "$lt"):
+        if key.endswith(f"[{op}]"):
+            return key[:-len(op) - 2], op
+    return key, "$eq"
+
+
 class NightscoutHandler(BaseHTTPRequestHandler):
     """HTTP request handler simulating Nightscout API."""
+
+    protocol_version = "HTTP/1.1"   # keep-alive; every response sets Content-Length
     
     def log_message(self, format: str, *args: Any) -> None:
         """Override to use simpler logging."""
-        print(f"[{self.command}] {args[0]}")
+        if not QUIET:
+            print(f"[{self.command}] {args[0]}")
     
     def send_json(self, data: Any, status: int = 200) -> None:
         """Send JSON response."""
         self.send_response(status)
+        body = json.dumps(data).encode()
         self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
     
     def parse_path(self) -> tuple[str, str, dict]:
         """Parse request path into (version, collection, query_params)."""
         parsed = urlparse(self.path)
-        path_parts = [p for p in parsed.path.split("/") if p]
+        path_parts = [p.removesuffix(".json") for p in parsed.path.split("/") if p]
         query = parse_qs(parsed.query)
         
         # Flatten single-value query params
@@ -140,20 +193,10 @@ class NightscoutHandler(BaseHTTPRequestHandler):
         
         # Field filters (simplified)
         for key, value in query.items():
-            if key in ("count", "find", "fields"):
+            if key in ("count", "find", "fields", "token"):
                 continue
-            # Handle $ne operator
-            if key.endswith("[$ne]"):
-                field = key.replace("[$ne]", "")
-                result = [d for d in result if d.get(field) != value]
-            elif key.endswith("[$gte]"):
-                field = key.replace("[$gte]", "")
-                result = [d for d in result if d.get(field, 0) >= float(value)]
-            elif key.endswith("[$lte]"):
-                field = key.replace("[$lte]", "")
-                result = [d for d in result if d.get(field, 0) <= float(value)]
-            else:
-                result = [d for d in result if str(d.get(key)) == str(value)]
+            field, op = _parse_filter(key)
+            result = [d for d in result if _matches(d.get(field), op, value)]
         
         # Sort by date descending (most recent first)
         result.sort(key=lambda x: x.get("date", x.get("created_at", "")), reverse=True)
@@ -166,6 +209,7 @@ class NightscoutHandler(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE")
         self.send_header("Access-Control-Allow-Headers", "Content-Type, api-secret")
+        self.send_header("Content-Length", "0")
         self.end_headers()
     
     def do_GET(self) -> None:
@@ -320,12 +364,15 @@ def main():
     parser.add_argument("--fixtures", "-f", type=Path, help="Directory with fixture files to preload")
     parser.add_argument("--quiet", "-q", action="store_true", help="Suppress request logging")
     args = parser.parse_args()
+
+    global QUIET
+    QUIET = args.quiet
     
     if args.fixtures:
         load_fixtures(args.fixtures)
     
     server_address = ("", args.port)
-    httpd = HTTPServer(server_address, NightscoutHandler)
+    httpd = ThreadingHTTPServer(server_address, NightscoutHandler)
     
     print(f"Mock Nightscout server running on http://localhost:{args.port}")
     print("Collections: entries, treatments, devicestatus, profile")
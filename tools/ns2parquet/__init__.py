@@ -15,9 +15,9 @@ Usage:
         --patients-dir externals/ns-data/patients \\
         --output output/
 
-    # Convert OpenAPS Data Commons patients
+    # Convert OpenAPS Data Commons patients (8 in parallel)
     python -m tools.ns2parquet convert-odc \\
-        --odc-dir path/to/odc-dataset --output output/
+        --odc-dir path/to/odc-dataset --output output/ --workers 8
 
     # Fetch from live Nightscout site and convert
     python -m tools.ns2parquet ingest \\
@@ -32,6 +32,9 @@ Usage:
 
     # Show info about existing parquet files
     python -m tools.ns2parquet info --input output/
+
+    # Backfill per-patient catalogs for an output written before catalogs
+    python -m tools.ns2parquet catalog --input output/
 """
 
 __version__ = '0.3.0'
@@ -40,10 +43,17 @@ __version__ = '0.3.0'
 from .normalize import (                                    # noqa: F401
     normalize_entries, normalize_treatments,
     normalize_devicestatus, normalize_profiles,
-    normalize_settings,
+    normalize_settings, concat_normalized, normalize_json_dir,
+)
+from .grid import (                                         # noqa: F401
+    build_grid, build_grid_incremental, GridSource, GridTailState,
+)
+from .json_stream import iter_json_batches                  # noqa: F401
+from .odc_reader import (                                   # noqa: F401
+    convert_odc_patient, convert_odc_patients, read_devicestatus_csv,
 )
-from .grid import build_grid                                # noqa: F401
 from .writer import write_parquet, read_parquet, parquet_info  # noqa: F401
+from .catalog import Terrarium, build_catalog, read_catalog  # noqa: F401
 from .schemas import (                                      # noqa: F401
     ENTRIES_SCHEMA, TREATMENTS_SCHEMA, DEVICESTATUS_SCHEMA,
     PROFILES_SCHEMA, SETTINGS_SCHEMA, GRID_SCHEMA,
@@ -52,5 +62,6 @@ from .constants import MMOLL_TO_MGDL, DIRECTION_MAP, normalize_timezone  # noqa:
 from .ns_fetch import (                                     # noqa: F401
     fetch_json, fetch_entries, fetch_treatments,
     fetch_devicestatus, load_ns_url, parse_ns_url,
+    NightscoutClient, FetchStats, iter_records, iter_normalized,
 )
 from .cli import build_manifest                             # noqa: F401
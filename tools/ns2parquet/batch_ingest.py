@@ -2,8 +2,12 @@
 """Batch-ingest Nightscout sites from a CSV list into opaque-ID parquet.
 
 Reads a two-column CSV (formula_type, nightscout_url) like the DynISF
-Analysis spreadsheet, preprocesses each URL (strips tokens), and calls
-the ns2parquet ingest pipeline per site.
+Analysis spreadsheet, preprocesses each URL (strips tokens), and runs
+the ns2parquet fetch + convert pipeline for several sites at once
+(``--workers``). Each site stages its JSON and parquet under
+``<output>/.staging/<patient_id>/`` with a per-collection checkpoint, so
+an interrupted run resumes where it stopped; staged sites are merged
+into the output once at the end.
 
 Usage:
     python3 -m tools.ns2parquet.batch_ingest \
@@ -22,24 +26,33 @@ After ingestion, a ``manifest.json`` is written with per-patient metadata
 import argparse
 import csv
 import json
-import signal
+import os
+import shutil
 import sys
+import threading
 import time
 import urllib.error
-from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Tuple, Optional
 
-# Per-site timeout (seconds).  Prevents infinite hangs on unresponsive servers.
+# Per-site deadline (seconds).  Prevents infinite hangs on unresponsive servers.
 _SITE_TIMEOUT = 300  # 5 minutes
 
+# Sites ingested concurrently (each site is also rate-limited on its own)
+_WORKERS = 4
 
-class _SiteTimeout(Exception):
-    """Raised when a single site takes too long."""
+# Per-site staging area under the output directory, merged at the end
+_STAGING_DIR = '.staging'
+_CHECKPOINT = 'checkpoint.json'
 
-
-def _alarm_handler(signum, frame):
-    raise _SiteTimeout('site ingest timed out')
+# Windowed collections fetched per site: name → (endpoint, time field, mode)
+_SITE_COLLECTIONS = {
+    'entries': ('/api/v1/entries.json', 'date', 'epoch'),
+    'treatments': ('/api/v1/treatments.json', 'created_at', 'iso'),
+    'devicestatus': ('/api/v1/devicestatus.json', 'created_at', 'iso'),
+}
 
 
 def parse_csv(csv_path: str) -> List[Tuple[str, str]]:
@@ -62,16 +75,26 @@ def parse_csv(csv_path: str) -> List[Tuple[str, str]]:
 
 
 def _existing_patients(output: str) -> set:
-    """Return set of patient_ids already present in the output grid."""
-    grid_path = Path(output) / 'grid.parquet'
-    if not grid_path.exists():
-        return set()
-    try:
-        import pyarrow.parquet as pq
-        t = pq.read_table(grid_path, columns=['patient_id'])
-        return set(t.column('patient_id').to_pylist())
-    except Exception:
-        return set()
+    """Return set of patient_ids already present in the output.
+
+    Uses the grid, or entries when the output was built with --skip-grid.
+    """
+    for collection in ('grid', 'entries'):
+        ds_dir = Path(output) / collection
+        if ds_dir.is_dir():
+            from urllib.parse import unquote
+            return {unquote(p.name.split('=', 1)[1])
+                    for p in ds_dir.glob('patient_id=*')}
+        path = Path(output) / f'{collection}.parquet'
+        if not path.exists():
+            continue
+        try:
+            import pyarrow.parquet as pq
+            t = pq.read_table(path, columns=['patient_id'])
+            return set(t.column('patient_id').to_pylist())
+        except Exception:
+            return set()
+    return set()
 
 
 def _auth_failed_patients(output: str) -> set:
@@ -97,14 +120,173 @@ def _auth_failed_patients(output: str) -> set:
         return set()
 
 
+def _classify_error(exc: BaseException, site_timeout: int) -> Tuple[str, str]:
+    """(manifest status, error_kind) for a failed site."""
+    from .ns_fetch import FetchDeadline
+    if isinstance(exc, FetchDeadline):
+        return f'timeout after {site_timeout}s', 'network'
+    if isinstance(exc, urllib.error.HTTPError):
+        return (f'http-{exc.code}: {exc.reason}',
+                'auth' if exc.code in (401, 403) else 'network')
+    if isinstance(exc, (urllib.error.URLError, OSError, TimeoutError)):
+        return f'network: {exc}', 'network'
+    # Classify: if the string contains 403/401/Forbidden, it's auth
+    err_str = str(exc).lower()
+    if '403' in err_str or '401' in err_str or 'forbidden' in err_str:
+        return f'error: {exc}', 'auth'
+    return f'error: {exc}', 'network'
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    tmp = path.with_name(f'.{path.name}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _load_checkpoint(site_dir: Path) -> dict:
+    try:
+        with open(site_dir / _CHECKPOINT) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _latest_ms(records: list, time_field: str) -> Optional[int]:
+    """Newest record time in epoch ms (for JSON fetched before checkpoints)."""
+    import pandas as pd
+    values = [r.get(time_field) for r in records if r.get(time_field) is not None]
+    if not values:
+        return None
+    if time_field == 'date':
+        return int(max(values))
+    ts = pd.to_datetime(pd.Series(values), utc=True, errors='coerce').max()
+    return None if pd.isna(ts) else int(ts.value // 1_000_000)
+
+
+def _fetch_site_json(client, json_dir: Path, site_dir: Path, days: int) -> dict:
+    """Fetch one site into ``json_dir``, resuming from its checkpoint.
+
+    Each collection is written (atomically) as soon as it is complete and
+    its fetched-until timestamp is recorded in ``site_dir/checkpoint.json``.
+    A re-run only fetches the tail after that timestamp and appends it, so
+    an interrupted batch never re-downloads finished collections.
+    """
+    from .ns_fetch import _fetch_windowed
+
+    json_dir.mkdir(parents=True, exist_ok=True)
+    ckpt = _load_checkpoint(site_dir)
+    done = ckpt.setdefault('collections', {})
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    start_ms = now_ms - days * 86400 * 1000
+
+    for name, (endpoint, time_field, mode) in _SITE_COLLECTIONS.items():
+        path = json_dir / f'{name}.json'
+        old, since = [], start_ms
+        if path.exists():
+            with open(path) as f:
+                old = json.load(f)
+            last = done.get(name, {}).get('until_ms') or _latest_ms(old, time_field)
+            if last is not None:
+                since = max(start_ms, last)
+        new = _fetch_windowed(client.base_url, endpoint, '_id', time_field,
+                              since, now_ms, date_mode=mode, client=client)
+        seen = {r.get('_id') for r in new}
+        records = new + [r for r in old if r.get('_id') not in seen]
+        records.sort(key=lambda r: r.get(time_field, 0), reverse=True)
+        _write_json_atomic(path, records)
+        done[name] = {'until_ms': now_ms, 'records': len(records)}
+        _write_json_atomic(site_dir / _CHECKPOINT, ckpt)
+
+    try:
+        status = client.get_json('/api/v1/status.json')
+        _write_json_atomic(json_dir / 'settings.json', status)
+    except urllib.error.HTTPError:
+        raise
+    except Exception:
+        pass                       # status is optional (as in cmd_ingest)
+    _write_json_atomic(json_dir / 'profile.json',
+                       client.get_json('/api/v1/profile.json'))
+    ckpt['fetched_at'] = now_ms
+    _write_json_atomic(site_dir / _CHECKPOINT, ckpt)
+    return ckpt
+
+
+def _ingest_site(base_url: str, token: Optional[str], opaque_id: str,
+                 days: int, staging: Path, keep_json: Optional[str],
+                 skip_grid: bool, site_timeout: int) -> dict:
+    """Fetch and convert one site into its own staging partition.
+
+    Runs in a worker thread: the per-site deadline is enforced by the
+    fetch client (no ``SIGALRM``), and output goes to
+    ``staging/<opaque_id>/parquet`` so workers never share a file.
+    """
+    from .cli import cmd_convert
+    from .ns_fetch import NightscoutClient
+
+    site_dir = staging / opaque_id
+    site_dir.mkdir(parents=True, exist_ok=True)
+    json_dir = (Path(keep_json) / opaque_id) if keep_json else site_dir / 'json'
+    deadline = time.monotonic() + site_timeout
+
+    with NightscoutClient(base_url, token=token, deadline=deadline) as client:
+        _fetch_site_json(client, json_dir, site_dir, days)
+        stats = client.stats
+
+    parquet_dir = site_dir / 'parquet'
+    if parquet_dir.exists():
+        shutil.rmtree(parquet_dir)
+    rc = cmd_convert(argparse.Namespace(
+        input=str(json_dir), patient_id=opaque_id, output=str(parquet_dir),
+        append=False, quiet=True, skip_grid=skip_grid, opaque_ids=False,
+        layout='file'))
+    if rc and rc != 0:
+        raise RuntimeError(f'convert returned {rc}')
+    return {'records': stats.records, 'bytes': stats.bytes,
+            'fetch_seconds': round(stats.seconds, 2),
+            'records_per_s': round(stats.records_per_s, 1)}
+
+
+def _merge_staging(output: str, site_ids: List[str], staging: Path,
+                   quiet: bool = False) -> None:
+    """Append every converted site partition into ``output`` in one pass."""
+    import pandas as pd
+    from .writer import write_parquet, read_parquet, list_collections
+
+    dirs = [staging / pid / 'parquet' for pid in site_ids]
+    dirs = [d for d in dirs if d.is_dir()]
+    collections = sorted({c for d in dirs for c in list_collections(d)})
+    for collection in collections:
+        frames = [read_parquet(str(d), collection) for d in dirs
+                  if collection in list_collections(d)]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            continue
+        df = pd.concat(frames, ignore_index=True)
+        write_parquet(df, output, collection, append=True, verbose=False)
+        if not quiet:
+            print(f'  merged {collection}: {len(df):,} rows from '
+                  f'{len(frames)} sites')
+    for pid in site_ids:
+        shutil.rmtree(staging / pid, ignore_errors=True)
+
+
 def batch_ingest(csv_path: str, days: int, output: str,
                  quiet: bool = False, skip_grid: bool = False,
                  dry_run: bool = False, resume: bool = True,
                  retry_network: bool = False,
                  site_timeout: int = _SITE_TIMEOUT,
-                 keep_json: str = None) -> dict:
+                 keep_json: str = None,
+                 workers: int = _WORKERS) -> dict:
     """Ingest every site in *csv_path* into *output* directory.
 
+    Up to *workers* sites are fetched concurrently. Each site has a
+    *site_timeout* deadline, writes its own staging partition under
+    ``output/.staging/<patient_id>/`` and keeps a checkpoint of the last
+    fetched timestamp per collection there; all successful sites are
+    merged into *output* once at the end. An interrupted run leaves its
+    staging directories behind and the next run resumes from them.
+
     When *resume* is True (default), patients already in the output
     parquet are skipped automatically.
 
@@ -115,7 +297,7 @@ def batch_ingest(csv_path: str, days: int, output: str,
     Returns a manifest dict with per-patient metadata.
     """
     from .ns_fetch import parse_ns_url
-    from .cli import _generate_opaque_id, cmd_ingest
+    from .cli import _generate_opaque_id
 
     rows = parse_csv(csv_path)
     if not rows:
@@ -124,11 +306,18 @@ def batch_ingest(csv_path: str, days: int, output: str,
 
     already_done = _existing_patients(output) if resume else set()
     auth_failed = _auth_failed_patients(output) if retry_network else set()
+    staging = Path(output) / _STAGING_DIR
+    resumable = ({d.name for d in staging.iterdir() if d.is_dir()}
+                 if staging.is_dir() else set())
 
     if not quiet:
-        print(f'Batch ingest: {len(rows)} sites, {days} days each')
+        print(f'Batch ingest: {len(rows)} sites, {days} days each, '
+              f'{workers} workers')
         if already_done:
             print(f'Resuming: {len(already_done)} patients already ingested')
+        if resumable - already_done:
+            print(f'Resuming: {len(resumable - already_done)} sites from '
+                  f'checkpoints')
         if auth_failed:
             print(f'Skipping: {len(auth_failed)} patients with auth errors '
                   f'(need fresh tokens)')
@@ -137,8 +326,9 @@ def batch_ingest(csv_path: str, days: int, output: str,
 
     Path(output).mkdir(parents=True, exist_ok=True)
 
-    manifest_patients = []
+    entries = {}                 # CSV index → manifest entry
     results = {'ok': 0, 'fail': 0, 'skip': 0}
+    todo = []
 
     for idx, (annotation, raw_url) in enumerate(rows, 1):
         base_url, token = parse_ns_url(raw_url)
@@ -147,11 +337,11 @@ def batch_ingest(csv_path: str, days: int, output: str,
         if opaque_id in already_done:
             if not quiet:
                 print(f'[{idx}/{len(rows)}] {opaque_id}  SKIP (already ingested)')
-            manifest_patients.append({
+            entries[idx] = {
                 'patient_id': opaque_id,
                 'annotation': annotation,
                 'status': 'already-ingested',
-            })
+            }
             results['skip'] += 1
             continue
 
@@ -159,97 +349,80 @@ def batch_ingest(csv_path: str, days: int, output: str,
             if not quiet:
                 print(f'[{idx}/{len(rows)}] {opaque_id}  SKIP (auth error — '
                       f'needs fresh token)')
-            manifest_patients.append({
+            entries[idx] = {
                 'patient_id': opaque_id,
                 'annotation': annotation,
                 'status': 'auth-skip',
                 'error_kind': 'auth',
-            })
+            }
             results['skip'] += 1
             continue
 
-        if not quiet:
-            print(f'[{idx}/{len(rows)}] {opaque_id}  '
-                  f'(annotation={annotation!r})')
-
         if dry_run:
-            manifest_patients.append({
+            if not quiet:
+                print(f'[{idx}/{len(rows)}] {opaque_id}  '
+                      f'(annotation={annotation!r})')
+            entries[idx] = {
                 'patient_id': opaque_id,
                 'annotation': annotation,
                 'base_url_host': '(redacted)',
                 'has_token': token is not None,
-            })
+            }
             results['skip'] += 1
             continue
 
-        # Build an argparse.Namespace that cmd_ingest expects
-        ingest_args = argparse.Namespace(
-            url=base_url,
-            env=None,
-            token=token,
-            days=days,
-            patient_id=opaque_id,
-            output=output,
-            skip_grid=skip_grid,
-            quiet=quiet,
-            keep_json=keep_json,
-        )
+        todo.append((idx, annotation, base_url, token, opaque_id))
 
-        try:
-            old_handler = signal.signal(signal.SIGALRM, _alarm_handler)
-            signal.alarm(site_timeout)
+    succeeded = []
+    interrupted = False
+    print_lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=max(1, workers),
+                              thread_name_prefix='ingest')
+    try:
+        futures = {}
+        for site in todo:
+            _, _, base_url, token, opaque_id = site
+            futures[pool.submit(_ingest_site, base_url, token, opaque_id,
+                                days, staging, keep_json, skip_grid,
+                                site_timeout)] = site
+        for fut in as_completed(futures):
+            idx, annotation, _, _, opaque_id = futures[fut]
+            entry = {'patient_id': opaque_id, 'annotation': annotation}
             try:
-                rc = cmd_ingest(ingest_args)
-                if rc and rc != 0:
-                    raise RuntimeError(f'ingest returned {rc}')
+                fetch = fut.result()
+            except Exception as e:
+                status, error_kind = _classify_error(e, site_timeout)
+                results['fail'] += 1
+                entry.update(status=status, error_kind=error_kind)
+                line = f'FAILED {status}'
+            else:
                 results['ok'] += 1
-                status = 'ok'
-                error_kind = None
-            finally:
-                signal.alarm(0)
-                signal.signal(signal.SIGALRM, old_handler)
-        except _SiteTimeout:
+                succeeded.append(opaque_id)
+                entry.update(status='ok', fetch=fetch)
+                line = (f'ok  {fetch["records"]:,} records, '
+                        f'{fetch["records_per_s"]:,.0f} rec/s')
+            entries[idx] = entry
             if not quiet:
-                print(f'  TIMEOUT: skipping after {site_timeout}s')
-            results['fail'] += 1
-            status = f'timeout after {site_timeout}s'
-            error_kind = 'network'
-        except urllib.error.HTTPError as e:
-            if not quiet:
-                print(f'  HTTP {e.code}: {e.reason}')
-            results['fail'] += 1
-            status = f'http-{e.code}: {e.reason}'
-            error_kind = 'auth' if e.code in (401, 403) else 'network'
-        except (urllib.error.URLError, OSError, TimeoutError) as e:
-            if not quiet:
-                print(f'  NETWORK ERROR: {e}')
-            results['fail'] += 1
-            status = f'network: {e}'
-            error_kind = 'network'
-        except Exception as e:
-            if not quiet:
-                print(f'  ERROR: {e}')
-            results['fail'] += 1
-            status = f'error: {e}'
-            # Classify: if the string contains 403/401/Forbidden, it's auth
-            err_str = str(e).lower()
-            if '403' in err_str or '401' in err_str or 'forbidden' in err_str:
-                error_kind = 'auth'
-            else:
-                error_kind = 'network'
-
-        manifest_patients.append({
-            'patient_id': opaque_id,
-            'annotation': annotation,
-            'status': status,
-            **(dict(error_kind=error_kind) if error_kind else {}),
-        })
-
-        # Be polite to remote servers — longer pause after failures
-        if status == 'ok':
-            time.sleep(1.0)
-        else:
-            time.sleep(2.0)
+                with print_lock:
+                    print(f'[{idx}/{len(rows)}] {opaque_id}  '
+                          f'(annotation={annotation!r})  {line}')
+    except KeyboardInterrupt:
+        # Running sites finish (bounded by their deadline); queued ones are
+        # dropped. Completed sites are still merged; the rest resume from
+        # their checkpoints next run.
+        interrupted = True
+        pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        pool.shutdown(wait=True)
+
+    if succeeded:
+        if not quiet:
+            print(f'\nMerging {len(succeeded)} staged sites → {output}/')
+        _merge_staging(output, sorted(succeeded), staging, quiet=quiet)
+    if staging.is_dir() and not any(staging.iterdir()):
+        staging.rmdir()
+
+    manifest_patients = [entries[i] for i in sorted(entries)]
 
     # Write manifest — merge with existing to preserve error classifications
     manifest_path = Path(output) / 'manifest.json'
@@ -299,6 +472,8 @@ def batch_ingest(csv_path: str, days: int, output: str,
               f'{results["skip"]} skipped')
         print(f'Manifest: {manifest_path}')
 
+    if interrupted:
+        raise KeyboardInterrupt
     return manifest
 
 
@@ -331,7 +506,7 @@ def split_chronological(input_dir: str, output_dir: str,
     Returns per-patient summary dict.
     """
     import pandas as pd
-    from .writer import write_parquet
+    from .writer import write_parquet, read_parquet, list_collections
 
     input_path = Path(input_dir)
     train_out = str(Path(output_dir) / 'training')
@@ -341,10 +516,9 @@ def split_chronological(input_dir: str, output_dir: str,
 
     patient_summary = {}
 
-    for pf in sorted(input_path.glob('*.parquet')):
-        collection = pf.stem
+    for collection in list_collections(input_path):
         time_col = _TIME_COL.get(collection)
-        df = pd.read_parquet(pf)
+        df = read_parquet(str(input_path), collection)
 
         if 'patient_id' not in df.columns or time_col is None:
             # Atemporal / no patient_id — training only
@@ -408,9 +582,16 @@ def merge_into_terrarium(staging_dir: str,
     Reads ``staging_dir/training/`` and ``staging_dir/verification/``,
     appends into ``terrarium_dir/training/`` and
     ``terrarium_dir/verification/`` respectively, with deduplication.
+
+    Collections stored in the partitioned dataset layout are appended as
+    new fragments (only the staged patients' partitions are written);
+    single-file collections are rewritten as before.
     """
     import pandas as pd
-    from .writer import write_parquet, _dedup_key
+    from .writer import (
+        write_parquet, read_parquet, list_collections, collection_layout,
+        _dedup_key,
+    )
 
     for subset in ('training', 'verification'):
         src = Path(staging_dir) / subset
@@ -419,13 +600,18 @@ def merge_into_terrarium(staging_dir: str,
             continue
         dst.mkdir(parents=True, exist_ok=True)
 
-        for pf in sorted(src.glob('*.parquet')):
-            collection = pf.stem
-            new_df = pd.read_parquet(pf)
-            dst_pf = dst / f'{collection}.parquet'
+        for collection in list_collections(src):
+            new_df = read_parquet(str(src), collection)
+            layout = collection_layout(dst, collection)
 
-            if dst_pf.exists():
-                existing = pd.read_parquet(dst_pf)
+            if layout == 'dataset':
+                if not quiet:
+                    print(f'  {subset}/{collection}: +{len(new_df):,} rows '
+                          f'(dataset append)')
+                write_parquet(new_df, str(dst), collection,
+                              append=True, verbose=False)
+            elif layout == 'file':
+                existing = read_parquet(str(dst), collection)
                 merged = pd.concat([existing, new_df], ignore_index=True)
                 # Dedup
                 dedup_cols = _dedup_key(collection)
@@ -447,18 +633,26 @@ def merge_into_terrarium(staging_dir: str,
                 if not quiet:
                     print(f'  {subset}/{collection}: {len(new_df):,} rows (new)')
                 write_parquet(new_df, str(dst), collection,
-                              append=False, verbose=False)
+                              append=False, verbose=False,
+                              layout=collection_layout(src, collection))
 
 
 def reconvert_from_json(json_dir: str, output: str,
                         skip_grid: bool = False,
-                        quiet: bool = False) -> None:
+                        quiet: bool = False,
+                        layout: str = 'file') -> None:
     """Rebuild parquet from previously staged JSON directories.
 
     Expects ``json_dir`` to contain subdirectories named by patient ID,
     each with entries.json, treatments.json, devicestatus.json, etc.
     This allows offline re-conversion after schema/normalization changes
     without hitting the Nightscout servers again.
+
+    Only outputs in the rebuilt ``layout`` are cleared first; a
+    collection stored in the other layout is left alone and the rebuild
+    stops instead of mixing layouts. ``layout='dataset'`` makes the
+    rebuild linear in cohort size: each patient only writes fragments
+    into its own partitions.
     """
     import shutil
     from .cli import cmd_convert
@@ -473,10 +667,21 @@ def reconvert_from_json(json_dir: str, output: str,
               file=sys.stderr)
         return
 
-    # Clear old parquet output so we get a clean rebuild
+    # Clear old output in this layout so we get a clean rebuild
     out_path = Path(output)
-    for pq_file in out_path.glob('*.parquet'):
-        pq_file.unlink()
+    from .writer import collection_layout, list_collections
+    collections = list_collections(out_path)
+    other = [c for c in collections
+             if collection_layout(out_path, c) not in (None, layout)]
+    if other:
+        print(f'{output} holds {", ".join(other)} in a layout other than '
+              f'{layout!r}; remove them or pass that --layout', file=sys.stderr)
+        return
+    for collection in collections:
+        if layout == 'dataset':
+            shutil.rmtree(out_path / collection)
+        else:
+            (out_path / f'{collection}.parquet').unlink()
 
     if not quiet:
         print(f'Reconverting {len(patient_dirs)} patients from {json_dir}/')
@@ -497,6 +702,7 @@ def reconvert_from_json(json_dir: str, output: str,
                 quiet=quiet,
                 skip_grid=skip_grid,
                 opaque_ids=False,
+                layout=layout,
             )
             cmd_convert(conv_args)
             ok += 1
@@ -532,6 +738,8 @@ def main():
         help=f'Per-site timeout in seconds (default: {_SITE_TIMEOUT})')
     p_ing.add_argument('--keep-json',
         help='Persist raw JSON to this directory (enables offline reconvert)')
+    p_ing.add_argument('--workers', type=int, default=_WORKERS,
+        help=f'Sites ingested concurrently (default: {_WORKERS})')
 
     # ── reconvert ──
     p_reconv = sub.add_parser('reconvert',
@@ -541,6 +749,8 @@ def main():
     p_reconv.add_argument('--output', '-o', default='externals/ns-parquet-dynisf',
         help='Output directory for Parquet files')
     p_reconv.add_argument('--skip-grid', action='store_true')
+    p_reconv.add_argument('--layout', choices=['file', 'dataset'], default='file',
+        help='Output layout (default: file; dataset — partitioned, linear rebuild)')
     p_reconv.add_argument('--quiet', '-q', action='store_true')
 
     # ── split ──
@@ -580,6 +790,8 @@ def main():
     p_pipe.add_argument('--train-frac', type=float, default=0.8,
         help='Fraction of data for training (default: 0.8)')
     p_pipe.add_argument('--skip-grid', action='store_true')
+    p_pipe.add_argument('--workers', type=int, default=_WORKERS,
+        help=f'Sites ingested concurrently (default: {_WORKERS})')
     p_pipe.add_argument('--quiet', '-q', action='store_true')
     p_pipe.add_argument('--dry-run', action='store_true')
 
@@ -602,7 +814,8 @@ def main():
                      dry_run=args.dry_run,
                      retry_network=getattr(args, 'retry_network', False),
                      site_timeout=getattr(args, 'site_timeout', _SITE_TIMEOUT),
-                     keep_json=getattr(args, 'keep_json', None))
+                     keep_json=getattr(args, 'keep_json', None),
+                     workers=getattr(args, 'workers', _WORKERS))
 
     elif args.command == 'split':
         print(f'Splitting {args.input} → {args.output}/')
@@ -619,7 +832,8 @@ def main():
 
     elif args.command == 'reconvert':
         reconvert_from_json(args.json_dir, args.output,
-                            skip_grid=args.skip_grid, quiet=args.quiet)
+                            skip_grid=args.skip_grid, quiet=args.quiet,
+                            layout=args.layout)
 
     elif args.command == 'pipeline':
         staging = args.staging
@@ -628,7 +842,8 @@ def main():
         # Step 1: Ingest
         if not args.dry_run:
             batch_ingest(args.csv, args.days, staging,
-                         quiet=args.quiet, skip_grid=args.skip_grid)
+                         quiet=args.quiet, skip_grid=args.skip_grid,
+                         workers=args.workers)
         else:
             batch_ingest(args.csv, args.days, staging,
                          quiet=args.quiet, dry_run=True)
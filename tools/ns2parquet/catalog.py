@@ -0,0 +1,400 @@
+"""
+catalog.py — Per-collection patient catalog and the Terrarium reader.
+
+Every write through ``writer.write_parquet`` (and ``compact_dataset``)
+keeps a small sidecar ``_catalog/<collection>.parquet`` next to the
+collection. It has one row per (patient, location):
+
+- ``location``: the file (``grid.parquet``) or dataset fragment
+  (``grid/patient_id=a/year_month=2024-01/part-*.parquet``), relative
+  to the terrarium directory, and its size and mtime when cataloged;
+- ``row_groups``: row groups of a file that hold the patient's rows
+  (file layout writes one run of row groups per patient);
+- ``rows``, ``time_min``, ``time_max`` of the patient's rows there;
+- ``column_stats``: JSON ``{column: [non_null, min, max]}`` for numeric
+  columns;
+- ``content_hash``: SHA-256 over the patient's rows;
+- ``source``: where the rows came from (input directory), if known.
+
+The sidecar is replaced atomically, so readers see either the old or
+the new catalog. Updates are read-modify-write: one writer per output
+directory at a time, which is how convert/ingest already work.
+
+``Terrarium`` answers patient lists, row counts and time bounds from
+the catalog alone, and reads one patient or time range by opening only
+the cataloged row groups / fragments. A catalog whose files changed
+size or mtime since it was written (or a terrarium written before
+catalogs, or before catalogs recorded mtimes) is ignored and the reader
+falls back to ``read_parquet``;
+``build_catalog`` (CLI: ``catalog``) backfills catalogs for existing
+terrariums.
+
+Usage:
+    from tools.ns2parquet.catalog import Terrarium
+    t = Terrarium('externals/ns-parquet/training')
+    t.patients('grid')
+    t.summary('grid')                       # rows + time bounds per patient
+    df = t.read('grid', 'a', start='2024-01-01', end='2024-02-01')
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+from .writer import (
+    PARTITION_TIME_COLUMNS, _dedup_key, _fragments, _read_dataset,
+    list_collections, read_parquet,
+)
+
+CATALOG_DIR = '_catalog'
+
+CATALOG_SCHEMA = pa.schema([
+    ('patient_id', pa.string()),
+    ('location', pa.string()),
+    ('location_bytes', pa.int64()),
+    ('location_mtime_ns', pa.int64()),
+    ('row_groups', pa.list_(pa.int32())),
+    ('rows', pa.int64()),
+    ('time_min', pa.timestamp('ns', tz='UTC')),
+    ('time_max', pa.timestamp('ns', tz='UTC')),
+    ('column_stats', pa.string()),
+    ('content_hash', pa.string()),
+    ('source', pa.string()),
+    ('updated_at', pa.timestamp('ns', tz='UTC')),
+])
+
+
+# ── Catalog entries ──────────────────────────────────────────────────
+
+def catalog_path(input_path, collection: str) -> Path:
+    return Path(input_path) / CATALOG_DIR / f'{collection}.parquet'
+
+
+def _content_hash(df: pd.DataFrame) -> str:
+    """SHA-256 of the rows in order; column order and patient_id
+    (a partition key in the dataset layout) do not contribute."""
+    h = hashlib.sha256()
+    for col in sorted((c for c in df.columns if c != "patient_id"), key=str):
+        try:
+            values = pd.util.hash_pandas_object(df[col], index=False)
+        except TypeError:  # unhashable cells (lists, dicts)
+            values = pd.util.hash_pandas_object(df[col].astype(str), index=False)
+        h.update(str(col).encode())
+        h.update(values.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _json_scalar(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def _column_stats(df: pd.DataFrame) -> str:
+    num = df.select_dtypes(include='number').drop(columns=['patient_id'],
+                                                  errors='ignore')
+    stats = {c: [int(num[c].count()),
+                 _json_scalar(num[c].min()), _json_scalar(num[c].max())]
+             for c in num.columns}
+    return json.dumps(stats, separators=(',', ':'))
+
+
+def catalog_entries(df: pd.DataFrame, collection: str, location: str,
+                    location_bytes: int,
+                    row_groups: Optional[Dict[str, List[int]]] = None,
+                    source: Optional[str] = None,
+                    location_mtime_ns: Optional[int] = None) -> List[dict]:
+    """Catalog rows for each patient of ``df`` stored at ``location``."""
+    if df is None or df.empty or 'patient_id' not in df.columns:
+        return []
+    time_col = PARTITION_TIME_COLUMNS.get(collection)
+    ts = None
+    if time_col in df.columns:
+        ts = pd.to_datetime(df[time_col], utc=True, errors='coerce')
+    now = pd.Timestamp(time.time_ns(), unit='ns', tz='UTC')
+    out = []
+    for pid, idx in df.groupby(df['patient_id'].astype(str), sort=False).indices.items():
+        sub = df.iloc[idx]
+        out.append({
+            'patient_id': pid,
+            'location': location,
+            'location_bytes': int(location_bytes),
+            'location_mtime_ns': location_mtime_ns,
+            'row_groups': (row_groups or {}).get(pid),
+            'rows': len(sub),
+            'time_min': ts.iloc[idx].min() if ts is not None else pd.NaT,
+            'time_max': ts.iloc[idx].max() if ts is not None else pd.NaT,
+            'column_stats': _column_stats(sub),
+            'content_hash': _content_hash(sub),
+            'source': source,
+            'updated_at': now,
+        })
+    return out
+
+
+def file_row_groups(meta: pq.FileMetaData, patient_ids) -> Dict[str, List[int]]:
+    """Row groups holding each patient's rows, from per-row patient ids."""
+    bounds = np.cumsum([0] + [meta.row_group(i).num_rows
+                              for i in range(meta.num_row_groups)])
+    rg = np.searchsorted(bounds, np.arange(len(patient_ids)), side='right') - 1
+    pids = pd.Series(patient_ids).astype(str).to_numpy()
+    return {pid: sorted(set(rg[idx].tolist()))
+            for pid, idx in pd.Series(pids).groupby(pids, sort=False).indices.items()}
+
+
+# ── Catalog files ────────────────────────────────────────────────────
+
+def read_catalog(input_path, collection: str) -> Optional[pd.DataFrame]:
+    """The collection's catalog as a DataFrame, or None if it has none."""
+    path = catalog_path(input_path, collection)
+    if not path.exists():
+        return None
+    # Nullable int64 (mtime) must not round-trip through float64
+    return pq.read_table(path).to_pandas(integer_object_nulls=True)
+
+
+def write_catalog(input_path, collection: str, entries) -> Path:
+    """Atomically replace the collection's catalog with ``entries``."""
+    path = catalog_path(input_path, collection)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(entries, pd.DataFrame):
+        entries = entries.to_dict('records')
+    cols = {f.name: [e.get(f.name) for e in entries] for f in CATALOG_SCHEMA}
+    for c in ('time_min', 'time_max', 'updated_at'):
+        cols[c] = pd.to_datetime(pd.Series(cols[c], dtype=object), utc=True)
+    cols['row_groups'] = [None if v is None or (np.isscalar(v) and pd.isna(v))
+                          else [int(x) for x in v] for v in cols['row_groups']]
+    table = pa.Table.from_pydict(cols, schema=CATALOG_SCHEMA)
+    table = table.sort_by([('patient_id', 'ascending'), ('location', 'ascending')])
+    tmp = path.parent / f'.{path.name}.tmp'
+    pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, path)
+    return path
+
+
+def update_catalog(input_path, collection: str, entries: List[dict],
+                   drop_locations=(), drop_prefix: Optional[str] = None) -> Path:
+    """Replace catalog rows for ``drop_locations`` (or a location prefix)
+    and the locations of ``entries`` with ``entries``.
+
+    A collection with data but no catalog yet (written before catalogs)
+    has its other locations scanned once, so the catalog covers it all.
+    """
+    replaced = set(drop_locations) | {e['location'] for e in entries}
+    current = read_catalog(input_path, collection)
+    if current is None:
+        current = pd.DataFrame(_scan_collection(input_path, collection,
+                                                skip=replaced))
+    keep = []
+    if not current.empty:
+        drop = current['location'].isin(replaced)
+        if drop_prefix:
+            drop |= current['location'].str.startswith(drop_prefix)
+        keep = current[~drop].to_dict('records')
+    return write_catalog(input_path, collection, keep + list(entries))
+
+
+def _scan_collection(input_path, collection: str, skip=()) -> List[dict]:
+    """Catalog rows computed by reading a collection's data."""
+    in_dir = Path(input_path)
+    entries = []
+    in_file = in_dir / f'{collection}.parquet'
+    if in_file.exists() and in_file.name not in skip:
+        df = pd.read_parquet(in_file)
+        if 'patient_id' in df.columns:
+            rgs = file_row_groups(pq.read_metadata(in_file), df['patient_id'])
+            st = in_file.stat()
+            entries += catalog_entries(df, collection, in_file.name,
+                                       st.st_size, rgs,
+                                       location_mtime_ns=st.st_mtime_ns)
+    ds_dir = in_dir / collection
+    if ds_dir.is_dir():
+        for frag in _fragments(ds_dir):
+            location = frag.relative_to(in_dir).as_posix()
+            if location in skip:
+                continue
+            df = pq.read_table(frag).to_pandas()
+            pid = unquote(frag.relative_to(ds_dir).parts[0].split('=', 1)[1])
+            df.insert(0, 'patient_id', pid)
+            st = frag.stat()
+            entries += catalog_entries(df, collection, location, st.st_size,
+                                       location_mtime_ns=st.st_mtime_ns)
+    return entries
+
+
+def build_catalog(input_path, collections: Optional[List[str]] = None,
+                  verbose: bool = False) -> Dict[str, int]:
+    """(Re)build catalogs by reading the data; returns catalog rows per collection."""
+    counts = {}
+    for collection in collections or list_collections(input_path):
+        entries = _scan_collection(input_path, collection)
+        write_catalog(input_path, collection, entries)
+        counts[collection] = len(entries)
+        if verbose:
+            n_pat = len({e['patient_id'] for e in entries})
+            print(f'  CATALOG {collection}: {n_pat} patient(s), '
+                  f'{len(entries)} location(s)')
+    return counts
+
+
+# ── Reader ───────────────────────────────────────────────────────────
+
+def _utc(ts) -> Optional[pd.Timestamp]:
+    """Timestamp bound in UTC; naive values are taken as UTC."""
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+class Terrarium:
+    """Catalog-backed reader for an ns2parquet output directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def collections(self) -> List[str]:
+        return list_collections(self.path)
+
+    def catalog(self, collection: str) -> Optional[pd.DataFrame]:
+        """The collection's catalog, or None when missing or stale.
+
+        Stale means a cataloged location is gone or changed size or
+        mtime (data rewritten outside ``write_parquet``), has no recorded
+        mtime (cataloged by an older version), or a file-layout
+        collection exists without catalog rows.
+        """
+        cat = read_catalog(self.path, collection)
+        if cat is None or 'location_mtime_ns' not in cat.columns:
+            return None
+        stamps = cat.drop_duplicates('location')
+        for loc, size, mtime in zip(stamps['location'], stamps['location_bytes'],
+                                    stamps['location_mtime_ns']):
+            p = self.path / loc
+            if pd.isna(mtime) or not p.exists():
+                return None
+            st = p.stat()
+            if st.st_size != size or st.st_mtime_ns != int(mtime):
+                return None
+        in_file = self.path / f'{collection}.parquet'
+        if in_file.exists() and not (cat['location'] == in_file.name).any():
+            return None
+        return cat
+
+    def patients(self, collection: str = 'grid') -> List[str]:
+        cat = self.catalog(collection)
+        if cat is None:
+            df = read_parquet(self.path, collection, columns=['patient_id'])
+            return sorted(df['patient_id'].astype(str).unique()) if len(df) else []
+        return sorted(cat['patient_id'].unique())
+
+    def summary(self, collection: str) -> Optional[pd.DataFrame]:
+        """Rows, time bounds and location count per patient (catalog only).
+
+        Dataset rows are fragment totals, counted before readers drop
+        duplicates across uncompacted fragments. None without a catalog.
+        """
+        cat = self.catalog(collection)
+        if cat is None:
+            return None
+        g = cat.groupby('patient_id', sort=True)
+        return pd.DataFrame({
+            'rows': g['rows'].sum(),
+            'time_min': g['time_min'].min(),
+            'time_max': g['time_max'].max(),
+            'locations': g['location'].nunique(),
+        })
+
+    def read(self, collection: str, patient_id=None,
+             start=None, end=None,
+             columns: Optional[list] = None) -> pd.DataFrame:
+        """Rows of one patient (or a list of patients) and/or time range
+        [start, end).
+
+        Same rows and order as ``read_parquet`` followed by the filters,
+        but only cataloged row groups / fragments that can contain them
+        are opened.
+        """
+        pids = None
+        if patient_id is not None and not isinstance(patient_id, str):
+            pids, patient_id = {str(p) for p in patient_id}, None
+        time_col = PARTITION_TIME_COLUMNS.get(collection)
+        start, end = _utc(start), _utc(end)
+        needed = list(columns) if columns is not None else None
+        if needed is not None:
+            extra = ['patient_id', *([time_col] if time_col else []),
+                     *_dedup_key(collection)]
+            needed = list(dict.fromkeys([*needed, *extra]))
+
+        cat = self.catalog(collection)
+        if cat is None:
+            df = read_parquet(self.path, collection, patient_id, needed)
+        else:
+            df = self._read_cataloged(cat, collection, pids or patient_id,
+                                      start, end, needed)
+
+        if df.empty:
+            return df
+        mask = np.ones(len(df), dtype=bool)
+        if patient_id is not None:
+            mask &= (df['patient_id'].astype(str) == str(patient_id)).to_numpy()
+        if pids is not None:
+            mask &= df['patient_id'].astype(str).isin(pids).to_numpy()
+        if time_col in df.columns and (start is not None or end is not None):
+            ts = pd.to_datetime(df[time_col], utc=True, errors='coerce')
+            if start is not None:
+                mask &= (ts >= start).to_numpy()
+            if end is not None:
+                mask &= (ts < end).to_numpy()
+        if not mask.all():
+            df = df[mask].reset_index(drop=True)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df
+
+    def _read_cataloged(self, cat: pd.DataFrame, collection: str,
+                        patient_id, start, end, columns) -> pd.DataFrame:
+        sel = cat
+        if isinstance(patient_id, set):
+            sel = sel[sel['patient_id'].isin(patient_id)]
+        elif patient_id is not None:
+            sel = sel[sel['patient_id'] == str(patient_id)]
+        if start is not None:
+            sel = sel[~(sel['time_max'] < start)]
+        if end is not None:
+            sel = sel[~(sel['time_min'] >= end)]
+
+        in_file = f'{collection}.parquet'
+        frames = []
+        file_rows = sel[sel['location'] == in_file]
+        if len(file_rows):
+            pf = pq.ParquetFile(self.path / in_file)
+            rgs = sorted({int(i) for v in file_rows['row_groups'] for i in v})
+            cols = [c for c in columns if c in pf.schema_arrow.names] if columns else None
+            frames.append(pf.read_row_groups(rgs, columns=cols).to_pandas())
+        frags = sorted(self.path / loc for loc in sel['location'].unique()
+                       if loc != in_file)
+        if frags:
+            df = _read_dataset(self.path / collection, columns=columns, files=frags)
+            if df is not None:
+                frames.append(df)
+
+        if not frames:
+            return pd.DataFrame()
+        dirty = len(frames) > 1 or len({f.parent for f in frags}) < len(frags)
+        if not dirty:
+            return frames[0]
+        df = pd.concat(frames, ignore_index=True)
+        valid_cols = [c for c in _dedup_key(collection) if c in df.columns]
+        if valid_cols:
+            df = df.drop_duplicates(subset=valid_cols, keep='last').reset_index(drop=True)
+        return df
@@ -7,6 +7,8 @@ Commands:
     convert-odc Convert OpenAPS Data Commons patients to Parquet
     ingest      Fetch from live Nightscout API and convert to Parquet
     merge       Merge + deduplicate parquet from multiple directories
+    compact     Compact partitioned (dataset-layout) collections
+    catalog     Rebuild per-patient collection catalogs
     manifest    Generate patient manifest JSON
     info        Show summary of existing Parquet files
 """
@@ -34,17 +36,8 @@ def _generate_opaque_id(source: str) -> str:
 
 def cmd_convert(args):
     """Convert a single patient's Nightscout JSON directory to Parquet."""
-    from .normalize import (
-        normalize_entries, normalize_treatments,
-        normalize_devicestatus, normalize_profiles,
-        normalize_settings,
-    )
-    from .grid import build_grid
-    from .writer import write_parquet
-    from .schemas import (
-        ENTRIES_SCHEMA, TREATMENTS_SCHEMA,
-        DEVICESTATUS_SCHEMA, PROFILES_SCHEMA, SETTINGS_SCHEMA, GRID_SCHEMA,
-    )
+    from .normalize import normalize_json_dir
+    from .grid import GridSource, GridTailState, grid_state_path
 
     data_dir = Path(args.input)
     if not data_dir.exists():
@@ -57,21 +50,36 @@ def cmd_convert(args):
         patient_id = _generate_opaque_id(raw_name) if args.opaque_ids else raw_name
     verbose = not args.quiet
     output = args.output
+    layout = getattr(args, 'layout', None)
+
+    # Incremental refresh: resume the grid from the persisted tail state
+    # and append everything to the existing output
+    verify = getattr(args, 'verify_incremental', False)
+    incremental = getattr(args, 'incremental', False) or verify
+    state_path = grid_state_path(output, patient_id)
+    tail_state = None
+    if incremental and state_path.exists():
+        tail_state = GridTailState.load(state_path)
+    append = args.append or tail_state is not None
 
     if verbose:
         print(f'Converting {data_dir} (patient: {patient_id}) → {output}/')
+        if tail_state is not None:
+            print(f'  Incremental: grid resumes at {tail_state.resume_time}, '
+                  f'rewrites from {tail_state.emit_from}')
 
     t0 = time.time()
 
-    # Load raw JSON
-    collections = {}
-    for name in ['entries', 'treatments', 'devicestatus', 'profile']:
-        fpath = data_dir / f'{name}.json'
-        if fpath.exists():
-            with open(fpath) as f:
-                collections[name] = json.load(f)
-        else:
-            collections[name] = [] if name != 'profile' else {}
+    # Stream each record collection once: every batch goes to its
+    # normalizer and to the grid source, then is dropped
+    grid_source = None if args.skip_grid else GridSource()
+    streamed = normalize_json_dir(data_dir, patient_id, grid_source)
+
+    profile_path = data_dir / 'profile.json'
+    profile_data = {}
+    if profile_path.exists():
+        with open(profile_path) as f:
+            profile_data = json.load(f)
 
     # Load site settings if available (from /api/v1/status.json)
     site_settings = None
@@ -87,10 +95,37 @@ def cmd_convert(args):
             mode = 'AID/pump' if has_pump else 'MDI/CGM-only'
             print(f'  Site settings: units={site_units}, mode={mode}')
 
+    return _write_patient(
+        streamed, grid_source, profile_data, site_settings,
+        data_path=str(data_dir), patient_id=patient_id, output=output,
+        append=append, layout=layout, skip_grid=args.skip_grid,
+        incremental=incremental, tail_state=tail_state,
+        state_path=state_path, verify=verify, verbose=verbose,
+        source=str(data_dir), t0=t0)
+
+
+def _write_patient(streamed, grid_source, profile_data, site_settings, *,
+                   data_path, patient_id, output, append, layout, skip_grid,
+                   incremental, tail_state, state_path, verify, verbose,
+                   source, t0):
+    """Write one patient's normalized collections, profiles, settings and grid.
+
+    ``streamed`` holds the normalized entries/treatments/devicestatus
+    frames; ``grid_source`` (a GridSource, None with ``skip_grid``) has
+    already seen the same records. Shared by ``convert`` (JSON directory)
+    and ``ingest`` (live fetch).
+    """
+    from .normalize import normalize_profiles, normalize_settings
+    from .grid import build_grid, build_grid_incremental
+    from .writer import write_parquet
+    from .schemas import (
+        ENTRIES_SCHEMA, TREATMENTS_SCHEMA,
+        DEVICESTATUS_SCHEMA, PROFILES_SCHEMA, SETTINGS_SCHEMA, GRID_SCHEMA,
+    )
+
     # Cross-check: if site_settings has units, verify profile units agree
     if site_settings:
         site_units = (site_settings.get('units') or '').lower().replace('/', '')
-        profile_data = collections['profile']
         if isinstance(profile_data, list) and profile_data:
             store = profile_data[0].get('store', {})
             for pname, pval in store.items():
@@ -103,29 +138,33 @@ def cmd_convert(args):
     if verbose:
         print(f'\n── Normalizing collections ──')
 
-    entries_df = normalize_entries(collections['entries'], patient_id)
+    entries_df = streamed['entries']
     if verbose:
         print(f'  entries: {len(entries_df)} rows')
     write_parquet(entries_df, output, 'entries', ENTRIES_SCHEMA,
-                  append=args.append, verbose=verbose)
+                  append=append, verbose=verbose, layout=layout,
+                  source=source)
 
-    treatments_df = normalize_treatments(collections['treatments'], patient_id)
+    treatments_df = streamed['treatments']
     if verbose:
         print(f'  treatments: {len(treatments_df)} rows')
     write_parquet(treatments_df, output, 'treatments', TREATMENTS_SCHEMA,
-                  append=args.append, verbose=verbose)
+                  append=append, verbose=verbose, layout=layout,
+                  source=source)
 
-    ds_df = normalize_devicestatus(collections['devicestatus'], patient_id)
+    ds_df = streamed['devicestatus']
     if verbose:
         print(f'  devicestatus: {len(ds_df)} rows')
     write_parquet(ds_df, output, 'devicestatus', DEVICESTATUS_SCHEMA,
-                  append=args.append, verbose=verbose)
+                  append=append, verbose=verbose, layout=layout,
+                  source=source)
 
-    profiles_df = normalize_profiles(collections['profile'], patient_id)
+    profiles_df = normalize_profiles(profile_data, patient_id)
     if verbose:
         print(f'  profiles: {len(profiles_df)} rows')
     write_parquet(profiles_df, output, 'profiles', PROFILES_SCHEMA,
-                  append=args.append, verbose=verbose)
+                  append=append, verbose=verbose, layout=layout,
+                  source=source)
 
     # Normalize site settings if available
     if site_settings:
@@ -136,16 +175,30 @@ def cmd_convert(args):
                   f'(units={site_settings.get("units", "?")}, '
                   f'mode={settings_df["data_mode"].iloc[0] if len(settings_df) else "?"})')
         write_parquet(settings_df, output, 'settings', SETTINGS_SCHEMA,
-                      append=args.append, verbose=verbose)
+                      append=append, verbose=verbose, layout=layout,
+                      source=source)
 
     # Build research grid
-    if not args.skip_grid:
+    if not skip_grid:
         if verbose:
             print(f'\n── Building research grid ──')
-        grid_df = build_grid(str(data_dir), patient_id, verbose=verbose)
+        if incremental:
+            try:
+                grid_df, next_state = build_grid_incremental(
+                    data_path, patient_id, tail_state, verbose=verbose,
+                    source=grid_source, verify=verify)
+            except AssertionError as e:
+                print(f'ERROR: {e}', file=sys.stderr)
+                return 1
+        else:
+            grid_df = build_grid(data_path, patient_id, verbose=verbose,
+                                 source=grid_source)
         if grid_df is not None:
             write_parquet(grid_df, output, 'grid', GRID_SCHEMA,
-                          append=args.append, verbose=verbose)
+                          append=append, verbose=verbose, layout=layout,
+                          source=source)
+        if incremental and next_state is not None:
+            next_state.save(state_path)
 
     elapsed = time.time() - t0
     if verbose:
@@ -256,6 +309,7 @@ def cmd_convert_all(args):
                 quiet=args.quiet,
                 skip_grid=args.skip_grid,
                 opaque_ids=False,  # already resolved above
+                layout=getattr(args, 'layout', None),
             )
 
             try:
@@ -326,113 +380,172 @@ def cmd_ingest(args):
         print(f'Patient ID: {patient_id}'
               f'{" (auto-generated)" if not args.patient_id else ""}')
 
+    from .grid import GridSource, GridTailState, grid_state_path
+
     now = datetime.now(timezone.utc)
     start = now - timedelta(days=args.days)
+    incremental = getattr(args, 'incremental', False)
+    state_path = grid_state_path(output, patient_id)
+    tail_state = None
+    if incremental and state_path.exists():
+        # Only the records the resumed grid looks back over
+        tail_state = GridTailState.load(state_path)
+        start = tail_state.resume_time.to_pydatetime() - timedelta(minutes=5)
+        if verbose:
+            print(f'  Incremental: fetching from {start:%Y-%m-%d %H:%M} UTC')
 
     from .ns_fetch import (
-        fetch_entries, fetch_treatments, fetch_devicestatus, fetch_json,
+        NightscoutClient, fetch_entries, fetch_treatments, fetch_devicestatus,
     )
 
     now_ms = int(now.timestamp() * 1000)
     start_ms = int(start.timestamp() * 1000)
 
-    if verbose:
-        print(f'Fetching site status/settings...')
-    try:
-        status = fetch_json(f'{base_url}/api/v1/status.json', token=token)
-    except Exception as e:
+    # --keep-json saves (and reuses) the raw JSON, so it fetches whole
+    # collections and converts from disk; otherwise every fetched window
+    # goes straight to the normalizers and the grid source.
+    keep_json = getattr(args, 'keep_json', None)
+    streamed = grid_source = None
+    t0 = time.time()
+
+    rate = getattr(args, 'rate', None)
+    client = NightscoutClient(
+        base_url, token=token,
+        concurrency=getattr(args, 'concurrency', None) or 4,
+        rate=2.0 if rate is None else rate)
+    with client:
         if verbose:
-            print(f'  WARNING: Could not fetch status: {e}')
-        status = None
+            print(f'Fetching site status/settings...')
+        try:
+            status = client.get_json('/api/v1/status.json')
+        except Exception as e:
+            if verbose:
+                print(f'  WARNING: Could not fetch status: {e}')
+            status = None
 
-    if verbose:
-        print(f'Fetching entries...')
-    entries = fetch_entries(base_url, start_ms, now_ms, verbose=verbose,
-                            token=token)
+        if not keep_json:
+            grid_source = None if args.skip_grid else GridSource()
+            streamed = _stream_collections(client, start_ms, now_ms,
+                                           patient_id, grid_source, verbose)
+        else:
+            if verbose:
+                print(f'Fetching entries...')
+            entries = fetch_entries(base_url, start_ms, now_ms, verbose=verbose,
+                                    client=client)
 
-    if verbose:
-        print(f'Fetching treatments...')
-    treatments = fetch_treatments(base_url, start, now, verbose=verbose,
-                                   token=token)
+            if verbose:
+                print(f'Fetching treatments...')
+            treatments = fetch_treatments(base_url, start, now, verbose=verbose,
+                                          client=client)
 
-    if verbose:
-        print(f'Fetching devicestatus...')
-    devicestatus = fetch_devicestatus(base_url, start, now, verbose=verbose,
-                                       token=token)
+            if verbose:
+                print(f'Fetching devicestatus...')
+            devicestatus = fetch_devicestatus(base_url, start, now,
+                                              verbose=verbose, client=client)
 
+        if verbose:
+            print(f'Fetching profile...')
+        profile = client.get_json('/api/v1/profile.json')
     if verbose:
-        print(f'Fetching profile...')
-    profile = fetch_json(f'{base_url}/api/v1/profile.json', token=token)
-
-    # Write JSON -- to persistent dir if --keep-json, else temp
-    import tempfile
-
-    keep_json = getattr(args, 'keep_json', None)
-    if keep_json:
-        json_dir = str(Path(keep_json) / patient_id)
-        os.makedirs(json_dir, exist_ok=True)
-        _ctx = None
+        print(f'  Fetched {client.stats.summary()}')
+
+    if streamed is not None:
+        site_settings = status.get('settings', status) if status else None
+        if grid_source is not None:
+            grid_source.profile = profile
+            grid_source.settings = status
+        if verbose and site_settings:
+            _print_site_mode(site_settings)
+        return _write_patient(
+            streamed, grid_source, profile, site_settings,
+            data_path=base_url, patient_id=patient_id, output=output,
+            append=True, layout=getattr(args, 'layout', None),
+            skip_grid=args.skip_grid, incremental=incremental,
+            tail_state=tail_state, state_path=state_path, verify=False,
+            verbose=verbose, source=None, t0=t0)
+
+    json_dir = str(Path(keep_json) / patient_id)
+    os.makedirs(json_dir, exist_ok=True)
+
+    # Check if cached JSON exists (skip API fetch entirely)
+    cached = (not incremental
+              and all((Path(json_dir) / f'{n}.json').exists()
+                      for n in ('entries', 'treatments', 'devicestatus')))
+    if cached:
+        if verbose:
+            print(f'  Using cached JSON from {json_dir}')
+        settings_path = Path(json_dir) / 'settings.json'
+        if settings_path.exists():
+            with open(settings_path) as f:
+                status = json.load(f)
+            if verbose:
+                _print_site_mode(status.get('settings', {}))
     else:
-        _ctx = tempfile.TemporaryDirectory()
-        json_dir = _ctx.__enter__()
-
-    try:
-        # Check if cached JSON exists (skip API fetch entirely)
-        cached = (keep_json
-                  and all((Path(json_dir) / f'{n}.json').exists()
-                          for n in ('entries', 'treatments', 'devicestatus')))
-        if cached:
+        for name, data in [('entries', entries), ('treatments', treatments),
+                            ('devicestatus', devicestatus), ('profile', profile)]:
+            with open(Path(json_dir) / f'{name}.json', 'w') as f:
+                json.dump(data, f)
+        if status:
+            with open(Path(json_dir) / 'settings.json', 'w') as f:
+                json.dump(status, f)
             if verbose:
-                print(f'  Using cached JSON from {json_dir}')
-            settings_path = Path(json_dir) / 'settings.json'
-            if settings_path.exists():
-                with open(settings_path) as f:
-                    status = json.load(f)
-                if verbose:
-                    site_settings = status.get('settings', {})
-                    site_units = site_settings.get('units', '?')
-                    enabled = site_settings.get('enable', [])
-                    has_pump = any(p in enabled for p in ['pump', 'iob', 'loop', 'openaps'])
-                    mode = 'AID/pump' if has_pump else 'MDI/CGM-only'
-                    print(f'  Site: units={site_units}, mode={mode}, '
-                          f'plugins={len(enabled)}')
-        else:
-            for name, data in [('entries', entries), ('treatments', treatments),
-                                ('devicestatus', devicestatus), ('profile', profile)]:
-                with open(Path(json_dir) / f'{name}.json', 'w') as f:
-                    json.dump(data, f)
-            if status:
-                with open(Path(json_dir) / 'settings.json', 'w') as f:
-                    json.dump(status, f)
-                if verbose:
-                    s = status.get('settings', {})
-                    site_units = s.get('units', '?')
-                    enabled = s.get('enable', [])
-                    has_pump = any(p in enabled for p in ['pump', 'iob', 'loop', 'openaps'])
-                    mode = 'AID/pump' if has_pump else 'MDI/CGM-only'
-                    print(f'  Site: units={site_units}, mode={mode}, '
-                          f'plugins={len(enabled)}')
-
-        conv_args = argparse.Namespace(
-            input=json_dir,
-            patient_id=patient_id,
-            output=output,
-            append=True,
-            quiet=args.quiet,
-            skip_grid=args.skip_grid,
-            opaque_ids=False,
-        )
-
-        return cmd_convert(conv_args)
-    finally:
-        if _ctx is not None:
-            _ctx.__exit__(None, None, None)
+                _print_site_mode(status.get('settings', {}))
+
+    conv_args = argparse.Namespace(
+        input=json_dir,
+        patient_id=patient_id,
+        output=output,
+        append=True,
+        quiet=args.quiet,
+        skip_grid=args.skip_grid,
+        opaque_ids=False,
+        layout=getattr(args, 'layout', None),
+        incremental=incremental,
+    )
+
+    return cmd_convert(conv_args)
+
+
+def _stream_collections(client, start_ms: int, end_ms: int, patient_id: str,
+                        grid_source, verbose: bool) -> dict:
+    """Normalized entries/treatments/devicestatus straight from the API.
+
+    Each fetched window goes to its normalizer (and ``grid_source``) and
+    is then dropped; nothing is written as JSON.
+    """
+    from .normalize import (
+        concat_normalized, normalize_entries, normalize_treatments,
+        normalize_devicestatus,
+    )
+    from .ns_fetch import iter_normalized
+
+    out = {}
+    for name, normalize, time_col in (
+            ('entries', normalize_entries, 'date'),
+            ('treatments', normalize_treatments, 'created_at'),
+            ('devicestatus', normalize_devicestatus, 'created_at')):
+        if verbose:
+            print(f'Fetching {name}...')
+        frames = list(iter_normalized(client, name, start_ms, end_ms,
+                                      patient_id, grid_source))
+        out[name] = (concat_normalized(frames, time_col) if frames
+                     else normalize([], patient_id))
+    return out
+
+
+def _print_site_mode(site_settings: dict) -> None:
+    site_units = site_settings.get('units', '?')
+    enabled = site_settings.get('enable', [])
+    has_pump = any(p in enabled for p in ['pump', 'iob', 'loop', 'openaps'])
+    mode = 'AID/pump' if has_pump else 'MDI/CGM-only'
+    print(f'  Site: units={site_units}, mode={mode}, '
+          f'plugins={len(enabled)}')
 
 
 def cmd_merge(args):
     """Merge parquet files from multiple directories into one."""
     import pandas as pd
-    from .writer import write_parquet, _dedup_key
+    from .writer import write_parquet, read_parquet, list_collections, _dedup_key
 
     verbose = not args.quiet
     output = args.output
@@ -450,8 +563,7 @@ def cmd_merge(args):
         if not src_path.exists():
             print(f'  WARNING: {src} does not exist, skipping', file=sys.stderr)
             continue
-        for pf in src_path.glob('*.parquet'):
-            collections.add(pf.stem)
+        collections.update(list_collections(src_path))
 
     if not collections:
         print('ERROR: No parquet files found in any source directory', file=sys.stderr)
@@ -460,9 +572,8 @@ def cmd_merge(args):
     for collection in sorted(collections):
         frames = []
         for src in sources:
-            pf = Path(src) / f'{collection}.parquet'
-            if pf.exists():
-                df = pd.read_parquet(pf)
+            df = read_parquet(src, collection)
+            if len(df):
                 frames.append(df)
                 if verbose:
                     print(f'  {collection}: {len(df):,} rows from {src}')
@@ -484,7 +595,8 @@ def cmd_merge(args):
             dedup_str = f' ({deduped:,} duplicates removed)' if deduped else ''
             print(f'  → {collection}: {len(merged):,} rows merged{dedup_str}')
 
-        write_parquet(merged, output, collection, append=False, verbose=False)
+        write_parquet(merged, output, collection, append=False, verbose=False,
+                      layout=getattr(args, 'layout', None))
 
     elapsed = time.time() - t0
     if verbose:
@@ -497,11 +609,30 @@ def cmd_merge(args):
     return 0
 
 
+def _scan_summary(input_path: str, collection: str):
+    """Per-patient rows and time bounds by reading the collection."""
+    import pandas as pd
+    from .writer import read_parquet
+
+    df = read_parquet(input_path, collection)
+    ts_col = next((c for c in ['time', 'date', 'created_at'] if c in df.columns), None)
+    ts = (pd.to_datetime(df[ts_col], utc=True, errors='coerce') if ts_col
+          else pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns, UTC]'))
+    g = ts.groupby(df['patient_id'].astype(str))
+    return pd.DataFrame({'rows': g.size(), 'time_min': g.min(), 'time_max': g.max()})
+
+
 def cmd_info(args):
-    """Show summary of existing Parquet files."""
+    """Show summary of existing Parquet files.
+
+    Patient lists and ``--detail`` rows / date ranges come from the
+    collection catalogs, so no data is read when they are current.
+    """
     import pandas as pd
+    from .catalog import Terrarium
     from .writer import parquet_info
 
+    terrarium = Terrarium(args.input)
     info = parquet_info(args.input)
     if not info:
         print(f'No parquet files found in {args.input}')
@@ -525,27 +656,18 @@ def cmd_info(args):
         if patients_str:
             print(f'  {"":20s}  patients: {patients_str}')
 
-        # Per-patient detail
+        # Per-patient detail: from the catalog when current, else a scan
         if detail and stats['num_patients'] > 0:
-            pf = Path(args.input) / f'{collection}.parquet'
             try:
-                # Pick timestamp column for date range
-                ts_col = None
-                for candidate in ['time', 'date', 'created_at']:
-                    if candidate in pd.read_parquet(pf, columns=None).columns:
-                        ts_col = candidate
-                        break
-
-                df = pd.read_parquet(pf)
-                for pid in sorted(stats['patients']):
-                    pdf = df[df['patient_id'] == pid]
-                    row_info = f'{len(pdf):>8,} rows'
-                    if ts_col and ts_col in pdf.columns:
-                        ts_min = pdf[ts_col].min()
-                        ts_max = pdf[ts_col].max()
-                        if pd.notna(ts_min) and pd.notna(ts_max):
-                            days = (ts_max - ts_min).total_seconds() / 86400
-                            row_info += f'  {str(ts_min.date())} → {str(ts_max.date())} ({days:.0f}d)'
+                summary = terrarium.summary(collection)
+                if summary is None:
+                    summary = _scan_summary(args.input, collection)
+                for pid, row in summary.iterrows():
+                    row_info = f'{int(row["rows"]):>8,} rows'
+                    ts_min, ts_max = row['time_min'], row['time_max']
+                    if pd.notna(ts_min) and pd.notna(ts_max):
+                        days = (ts_max - ts_min).total_seconds() / 86400
+                        row_info += f'  {str(ts_min.date())} → {str(ts_max.date())} ({days:.0f}d)'
                     print(f'  {"":20s}    {pid:>12s}: {row_info}')
             except Exception:
                 pass  # graceful fallback if detail fails
@@ -561,17 +683,14 @@ def cmd_info(args):
 def cmd_convert_odc(args):
     """Convert OpenAPS Data Commons patients to Parquet.
 
-    Discovers ODC patient directories (numeric IDs), converts AAPS-native
-    JSON to Nightscout-shaped dicts, then builds grids+Parquet using the
-    standard pipeline.
+    Discovers ODC patient directories (numeric IDs) and converts each
+    one directly (odc_reader: AAPS records, Nightscout-export JSON and
+    flattened devicestatus CSVs go straight to the normalizers and the
+    grid), ``--workers`` patients at a time. Tables are written here as
+    each patient finishes.
     """
-    import tempfile
-    from .odc_loader import discover_odc_patients, write_odc_as_nightscout
-    from .grid import build_grid
-    from .normalize import (
-        normalize_entries, normalize_treatments,
-        normalize_devicestatus, normalize_profiles,
-    )
+    from .odc_loader import discover_odc_patients
+    from .odc_reader import convert_odc_patients
     from .writer import write_parquet
     from .schemas import (
         ENTRIES_SCHEMA, TREATMENTS_SCHEMA,
@@ -585,6 +704,8 @@ def cmd_convert_odc(args):
 
     verbose = not args.quiet
     output = args.output
+    workers = max(1, getattr(args, 'workers', 1) or 1)
+    layout = getattr(args, 'layout', None)
 
     # Discover patients
     all_patients = discover_odc_patients(str(odc_dir))
@@ -600,70 +721,62 @@ def cmd_convert_odc(args):
 
     if verbose:
         print(f'Found {len(all_patients)} ODC patient(s) in {odc_dir}')
-        print(f'Output: {output}/')
+        print(f'Output: {output}/' + (f'  ({workers} workers)' if workers > 1 else ''))
         print()
 
+    ids = {odc_pid: (_generate_opaque_id(f'odc-{odc_pid}')
+                     if args.opaque_ids else f'odc-{odc_pid}')
+           for odc_pid, _ in all_patients}
+    jobs = [(odc_pid, path, ids[odc_pid]) for odc_pid, path in all_patients]
+    sources = {odc_pid: str(path) for odc_pid, path in all_patients}
+
     t0 = time.time()
     success = 0
     failed = 0
 
-    for odc_pid, patient_path in all_patients:
-        patient_id = (_generate_opaque_id(f'odc-{odc_pid}')
-                      if args.opaque_ids else f'odc-{odc_pid}')
-        if verbose:
+    # Serial conversion prints each patient's header and progress as it
+    # goes; worker processes are quiet, so announce them on completion
+    for odc_pid, frames, error in convert_odc_patients(
+            jobs, workers=workers, skip_grid=args.skip_grid, verbose=verbose):
+        patient_id = ids[odc_pid]
+        if verbose and workers > 1:
             print(f'── ODC Patient {odc_pid} → {patient_id} ──')
 
         try:
-            with tempfile.TemporaryDirectory() as tmpdir:
-                ns_dir = str(Path(tmpdir) / 'data')
-                ok = write_odc_as_nightscout(patient_path, ns_dir,
-                                             verbose=verbose)
-                if not ok:
-                    if verbose:
-                        print(f'  SKIP: insufficient data')
-                    failed += 1
-                    continue
+            if error is not None:
+                raise error
+            if frames is None:
+                if verbose:
+                    print(f'  SKIP: insufficient data')
+                failed += 1
+                continue
 
-                # Load converted JSON for raw Parquet tables
-                import json as _json
-                with open(Path(ns_dir) / 'entries.json') as _f:
-                    entries_list = _json.load(_f)
-                with open(Path(ns_dir) / 'treatments.json') as _f:
-                    treatments_list = _json.load(_f)
-                with open(Path(ns_dir) / 'devicestatus.json') as _f:
-                    ds_list = _json.load(_f)
-                with open(Path(ns_dir) / 'profile.json') as _f:
-                    profile_list = _json.load(_f)
-
-                # Normalize raw tables
-                entries_df = normalize_entries(entries_list, patient_id)
-                treatments_df = normalize_treatments(treatments_list, patient_id)
-                devicestatus_df = normalize_devicestatus(ds_list, patient_id)
-                profiles_df = normalize_profiles(profile_list, patient_id)
-
-                # Write raw Parquet tables
-                for name, df, schema in [
-                    ('entries', entries_df, ENTRIES_SCHEMA),
-                    ('treatments', treatments_df, TREATMENTS_SCHEMA),
-                    ('devicestatus', devicestatus_df, DEVICESTATUS_SCHEMA),
-                    ('profiles', profiles_df, PROFILES_SCHEMA),
-                ]:
-                    if df is not None and len(df) > 0:
-                        df['patient_id'] = patient_id
-                        write_parquet(df, output, name,
-                                      schema=schema, append=True)
-
-                # Build research grid
-                if not args.skip_grid:
-                    grid = build_grid(ns_dir, patient_id)
-                    if grid is not None:
-                        write_parquet(grid.reset_index(drop=True),
-                                     output, 'grid',
-                                     schema=GRID_SCHEMA, append=True)
-                        if verbose:
-                            print(f'  Grid: {len(grid)} rows × {grid.shape[1]} cols')
-                    elif verbose:
-                        print(f'  SKIP grid: build_grid returned None')
+            # Write raw Parquet tables
+            for name, schema in [
+                ('entries', ENTRIES_SCHEMA),
+                ('treatments', TREATMENTS_SCHEMA),
+                ('devicestatus', DEVICESTATUS_SCHEMA),
+                ('profiles', PROFILES_SCHEMA),
+            ]:
+                df = frames[name]
+                if df is not None and len(df) > 0:
+                    df['patient_id'] = patient_id
+                    write_parquet(df, output, name,
+                                  schema=schema, append=True, layout=layout,
+                                  source=sources[odc_pid])
+
+            # Research grid
+            if not args.skip_grid:
+                grid = frames['grid']
+                if grid is not None:
+                    write_parquet(grid.reset_index(drop=True),
+                                  output, 'grid',
+                                  schema=GRID_SCHEMA, append=True, layout=layout,
+                                  source=sources[odc_pid])
+                    if verbose:
+                        print(f'  Grid: {len(grid)} rows × {grid.shape[1]} cols')
+                elif verbose:
+                    print(f'  SKIP grid: build_grid returned None')
 
             success += 1
         except Exception as e:
@@ -684,6 +797,53 @@ def cmd_convert_odc(args):
     return 0 if failed == 0 else 1
 
 
+def cmd_catalog(args):
+    """Rebuild collection catalogs by reading the data (backfill)."""
+    from .catalog import build_catalog
+    from .writer import list_collections
+
+    verbose = not args.quiet
+    collections = list_collections(args.input)
+    if args.collections:
+        wanted = [c.strip() for c in args.collections.split(',') if c.strip()]
+        collections = [c for c in wanted if c in collections]
+    if not collections:
+        print(f'No collections in {args.input}', file=sys.stderr)
+        return 1
+
+    t0 = time.time()
+    build_catalog(args.input, collections, verbose=verbose)
+    if verbose:
+        print(f'  Cataloged {len(collections)} collection(s) in '
+              f'{time.time() - t0:.1f}s')
+    return 0
+
+
+def cmd_compact(args):
+    """Compact dataset-layout collections (one fragment per partition)."""
+    from .writer import compact_dataset, collection_layout, list_collections
+
+    verbose = not args.quiet
+    if args.collections:
+        collections = [c.strip() for c in args.collections.split(',') if c.strip()]
+    else:
+        collections = list_collections(args.input)
+    collections = [c for c in collections
+                   if collection_layout(args.input, c) == 'dataset']
+    if not collections:
+        print(f'No dataset-layout collections in {args.input}', file=sys.stderr)
+        return 1
+
+    t0 = time.time()
+    for collection in collections:
+        compact_dataset(args.input, collection, patient_id=args.patient_id,
+                        verbose=verbose)
+    if verbose:
+        print(f'  Compacted {len(collections)} collection(s) in '
+              f'{time.time() - t0:.1f}s')
+    return 0
+
+
 def build_manifest(input_path: str, verbose: bool = False) -> dict:
     """Build a patient manifest from Parquet files.
 
@@ -692,6 +852,7 @@ def build_manifest(input_path: str, verbose: bool = False) -> dict:
     """
     import pandas as pd
     from . import __version__
+    from .writer import read_parquet, list_collections, parquet_info
     from datetime import datetime, timezone
 
     in_dir = Path(input_path)
@@ -703,29 +864,28 @@ def build_manifest(input_path: str, verbose: bool = False) -> dict:
         'patients': {},
     }
 
-    # Scan all parquet files for collection-level stats
-    for pf in sorted(in_dir.glob('*.parquet')):
-        collection = pf.stem
+    # Scan all collections (either layout) for collection-level stats
+    sizes = {c: s['size_bytes'] for c, s in parquet_info(input_path).items()}
+    for collection in list_collections(in_dir):
         try:
-            df = pd.read_parquet(pf)
+            df = read_parquet(input_path, collection)
         except Exception as e:
             if verbose:
-                print(f'  WARNING: Could not read {pf}: {e}')
+                print(f'  WARNING: Could not read {collection}: {e}')
             continue
 
         col_info = {
             'rows': len(df),
             'columns': len(df.columns),
-            'size_bytes': pf.stat().st_size,
+            'size_bytes': sizes.get(collection, 0),
         }
         if 'patient_id' in df.columns:
             col_info['num_patients'] = df['patient_id'].nunique()
         manifest['collections'][collection] = col_info
 
     # Build per-patient metadata from grid
-    grid_path = in_dir / 'grid.parquet'
-    if grid_path.exists():
-        grid = pd.read_parquet(grid_path)
+    if 'grid' in list_collections(in_dir):
+        grid = read_parquet(input_path, 'grid')
         for pid in sorted(grid['patient_id'].unique()):
             pdf = grid[grid['patient_id'] == pid]
             ts = pd.to_datetime(pdf['time'], utc=True)
@@ -825,8 +985,17 @@ def main():
         help='Output directory for Parquet files (default: output/)')
     p_conv.add_argument('--append', action='store_true', default=False,
         help='Append to existing Parquet files (default: overwrite)')
+    p_conv.add_argument('--layout', choices=['file', 'dataset'],
+        help='Output layout: single <collection>.parquet files, or hive-partitioned '
+             'append-only datasets (default: keep the existing layout, else file)')
     p_conv.add_argument('--skip-grid', action='store_true',
         help='Skip building the research grid')
+    p_conv.add_argument('--incremental', action='store_true', default=False,
+        help='Resume the grid from <output>/grid_state/<patient>.json and append '
+             '(first run: full build that writes the state)')
+    p_conv.add_argument('--verify-incremental', action='store_true', default=False,
+        help='With --incremental, also do a full rebuild from --input and fail '
+             'if the appended rows differ from it')
     p_conv.add_argument('--quiet', '-q', action='store_true')
 
     # convert-all
@@ -842,6 +1011,9 @@ def main():
         help='Output directory for Parquet files')
     p_all.add_argument('--opaque-ids', action='store_true', default=False,
         help='Hash directory names into opaque IDs (e.g., ns-a1b2c3d4e5f6)')
+    p_all.add_argument('--layout', choices=['file', 'dataset'],
+        help='Output layout: single <collection>.parquet files, or hive-partitioned '
+             'append-only datasets (default: keep the existing layout, else file)')
     p_all.add_argument('--skip-grid', action='store_true',
         help='Skip building the research grid')
     p_all.add_argument('--quiet', '-q', action='store_true')
@@ -860,10 +1032,20 @@ def main():
         help='Patient identifier (default: auto-generated opaque hash of URL)')
     p_ing.add_argument('--output', '-o', default='output',
         help='Output directory for Parquet files')
+    p_ing.add_argument('--layout', choices=['file', 'dataset'],
+        help='Output layout: single <collection>.parquet files, or hive-partitioned '
+             'append-only datasets (default: keep the existing layout, else file)')
     p_ing.add_argument('--skip-grid', action='store_true',
         help='Skip building the research grid')
     p_ing.add_argument('--keep-json',
         help='Directory to persist raw JSON (enables offline re-conversion)')
+    p_ing.add_argument('--incremental', action='store_true', default=False,
+        help='Daily refresh: fetch only from the patient\'s grid state '
+             '(overrides --days once a state exists) and append')
+    p_ing.add_argument('--concurrency', type=int, default=4,
+        help='Fetch windows in flight per site (default: 4)')
+    p_ing.add_argument('--rate', type=float, default=2.0,
+        help='Request rate limit per site, requests/s; 0 = unlimited (default: 2)')
     p_ing.add_argument('--quiet', '-q', action='store_true')
 
     # info
@@ -881,8 +1063,30 @@ def main():
         help='Source directories containing Parquet files')
     p_merge.add_argument('--output', '-o', required=True,
         help='Output directory for merged Parquet files')
+    p_merge.add_argument('--layout', choices=['file', 'dataset'],
+        help='Output layout for the merged collections (default: file)')
     p_merge.add_argument('--quiet', '-q', action='store_true')
 
+    # compact
+    p_compact = subparsers.add_parser('compact',
+        help='Compact dataset-layout collections into one fragment per partition')
+    p_compact.add_argument('--input', '-i', default='output',
+        help='Directory containing dataset-layout collections')
+    p_compact.add_argument('--collections',
+        help='Comma-separated collections to compact (default: all datasets)')
+    p_compact.add_argument('--patient-id', '-p',
+        help='Only compact this patient\'s partitions')
+    p_compact.add_argument('--quiet', '-q', action='store_true')
+
+    # catalog
+    p_catalog = subparsers.add_parser('catalog',
+        help='Rebuild per-patient collection catalogs from the data')
+    p_catalog.add_argument('--input', '-i', default='output',
+        help='Directory containing Parquet files')
+    p_catalog.add_argument('--collections',
+        help='Comma-separated collections to catalog (default: all)')
+    p_catalog.add_argument('--quiet', '-q', action='store_true')
+
     # convert-odc
     p_odc = subparsers.add_parser('convert-odc',
         help='Convert OpenAPS Data Commons patients to Parquet')
@@ -894,8 +1098,13 @@ def main():
         help='Output directory for Parquet files')
     p_odc.add_argument('--opaque-ids', action='store_true', default=False,
         help='Hash patient IDs into opaque IDs')
+    p_odc.add_argument('--layout', choices=['file', 'dataset'],
+        help='Output layout: single <collection>.parquet files, or hive-partitioned '
+             'append-only datasets (default: keep the existing layout, else file)')
     p_odc.add_argument('--skip-grid', action='store_true',
         help='Skip building the research grid')
+    p_odc.add_argument('--workers', '-j', type=int, default=os.cpu_count() or 1,
+        help='Patients converted in parallel processes (default: CPU count)')
     p_odc.add_argument('--quiet', '-q', action='store_true')
 
     # manifest
@@ -917,6 +1126,10 @@ def main():
         return cmd_info(args)
     elif args.command == 'merge':
         return cmd_merge(args)
+    elif args.command == 'compact':
+        return cmd_compact(args)
+    elif args.command == 'catalog':
+        return cmd_catalog(args)
     elif args.command == 'convert-odc':
         return cmd_convert_odc(args)
     elif args.command == 'manifest':
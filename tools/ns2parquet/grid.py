@@ -9,16 +9,23 @@ The grid stores RAW values (mg/dL, units, grams) not normalized — normalizatio
 is done at consumption time using the scales from cgmencode.schema.
 """
 
+import copy
 import json
 import logging
 import warnings
 
 import numpy as np
 import pandas as pd
+from dataclasses import asdict, dataclass, field, replace
 from pathlib import Path
 from typing import Optional, Tuple
 
 from .constants import DIRECTION_MAP, MMOLL_TO_MGDL, normalize_timezone
+from .grid_kernels import (
+    first_step_at_or_after, interval_mask, lookup_schedule,
+    minutes_since_nonzero, schedule_at, seconds_since_last, steps_since,
+)
+from .json_stream import DEFAULT_BATCH_SIZE, iter_json_batches
 
 logger = logging.getLogger(__name__)
 
@@ -40,27 +47,482 @@ def _to_local_index(index: pd.DatetimeIndex, patient_tz: str) -> pd.DatetimeInde
 
 def _lookup_schedule(sec_of_day: int, schedule: list, default: float = 0.0) -> float:
     """Look up current value from a time-varying schedule."""
-    if not schedule:
-        return default
-    def _tas(entry):
-        t = entry.get('timeAsSeconds', 0)
-        if isinstance(t, str):
+    return float(lookup_schedule([sec_of_day], schedule, default,
+                                 carry_missing=True)[0])
+
+
+# ── Streaming sources ────────────────────────────────────────────────
+#
+# build_grid() only needs a handful of fields per record. GridSource
+# extracts them batch by batch into typed arrays, so callers that stream
+# the JSON (cmd_convert, via json_stream.iter_json_batches) can feed the
+# same batches to the normalizers and to the grid without holding or
+# re-parsing the raw documents.
+
+_FIVE_MIN_NS = 300 * 10**9
+_NAT = np.iinfo(np.int64).min
+_MAX_MS = np.iinfo(np.int64).max // 10**6
+
+_DS_FIELDS = (
+    'iob', 'cob', 'predicted_30', 'predicted_60', 'predicted_min',
+    'hypo_risk', 'recommended_bolus', 'enacted_rate', 'enacted_bolus',
+    'pump_battery', 'pump_reservoir',
+    'eventual_bg', 'sensitivity_ratio', 'insulin_req',
+    'algorithm_isf', 'algorithm_cr', 'algorithm_tdd',
+    'bolus_iob', 'insulin_activity',
+)
+
+# Treatment fields read by the grid (everything else is dropped on ingest)
+_TX_FIELDS = ('eventType', 'insulin', 'automatic', 'carbs', 'duration',
+              'rate', 'percent', 'temp', 'absolute', 'reason')
+
+
+def _utc_ns(values: list) -> np.ndarray:
+    """Timestamps (ISO strings, usually) → int64 UTC nanoseconds; NaT if unparseable.
+
+    Naive timestamps are taken as UTC. The vectorized parser is only
+    used for the all-'Z' case: mixed offsets/naive strings go through
+    pd.Timestamp one at a time.
+    """
+    if values and all(isinstance(v, str) and v.endswith('Z') for v in values):
+        try:
+            return pd.to_datetime(values, utc=True, format='ISO8601',
+                                  errors='coerce').asi8
+        except (ValueError, TypeError):
+            pass
+    out = np.full(len(values), _NAT, dtype=np.int64)
+    for i, v in enumerate(values):
+        try:
+            ts = pd.Timestamp(v)
+        except Exception:
+            continue
+        if ts is pd.NaT:
+            continue
+        ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+        out[i] = ts.value
+    return out
+
+
+def _entry_ns(e: dict) -> Optional[int]:
+    """Reading time of an sgv entry in UTC ns (``date`` ms, else ``dateString``)."""
+    if 'date' in e:
+        d = e['date']
+        if isinstance(d, int) and not isinstance(d, bool) and abs(d) < _MAX_MS:
+            return d * 10**6
+        try:
+            ts = pd.Timestamp(d, unit='ms', tz='UTC')
+        except Exception:
+            return None
+    elif 'dateString' in e:
+        try:
+            ts = pd.Timestamp(e['dateString'])
+        except Exception:
+            return None
+        if ts is not pd.NaT:
+            ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    else:
+        return None
+    return None if ts is pd.NaT else ts.value
+
+
+def _devicestatus_row(ds: dict) -> Optional[tuple]:
+    """Grid fields of one devicestatus record (in _DS_FIELDS order), or None without IOB."""
+    loop = ds.get('loop', {}) or {}
+    openaps = ds.get('openaps', {}) or {}
+
+    # Try Loop structure first, then oref0
+    iob_val = None
+    cob_val = None
+    pred_values = []
+
+    if loop and isinstance(loop, dict):
+        iob_data = loop.get('iob', {}) or {}
+        cob_data = loop.get('cob', {}) or {}
+        if 'iob' in iob_data:
+            iob_val = float(iob_data['iob'])
+            cob_val = float(cob_data.get('cob', 0))
+            predicted = loop.get('predicted', {}) or {}
+            pred_values = predicted.get('values', []) if isinstance(predicted, dict) else []
+
+    if iob_val is None and openaps and isinstance(openaps, dict):
+        iob_data = openaps.get('iob', {}) or {}
+        if isinstance(iob_data, list) and iob_data:
+            iob_data = iob_data[0]
+        suggested = openaps.get('suggested', {}) or {}
+        if 'iob' in iob_data:
+            iob_val = float(iob_data.get('iob', 0))
+        if 'IOB' in suggested and iob_val is None:
+            iob_val = float(suggested['IOB'])
+        cob_val = float(suggested.get('COB', 0))
+        # Use best available prediction curve
+        pred_bgs = suggested.get('predBGs', {}) or {}
+        for curve in ['COB', 'UAM', 'IOB', 'ZT']:
+            if curve in pred_bgs and pred_bgs[curve]:
+                pred_values = pred_bgs[curve]
+                break
+
+    if iob_val is None:
+        return None
+
+    # Loop recommendations
+    if loop:
+        recommended = float(loop.get('recommendedBolus', 0) or 0)
+        enacted = loop.get('enacted', {}) or {}
+        enacted_rate = float(enacted.get('rate', np.nan)) if isinstance(enacted, dict) else np.nan
+        enacted_bolus = float(enacted.get('bolusVolume', 0) or 0) if isinstance(enacted, dict) else 0.0
+    else:
+        enacted = openaps.get('enacted', {}) or {}
+        recommended = 0.0
+        enacted_rate = float(enacted.get('rate', np.nan)) if isinstance(enacted, dict) else np.nan
+        enacted_bolus = float(enacted.get('units', 0) or 0) if isinstance(enacted, dict) else 0.0
+
+    # Pump state
+    pump = ds.get('pump', {}) or {}
+    batt = pump.get('battery', {})
+
+    # oref0 algorithm context (Trio/AAPS/OpenAPS)
+    _suggested = (openaps.get('suggested', {}) or {}) if openaps and isinstance(openaps, dict) else {}
+    _iob_data = (openaps.get('iob', {}) or {}) if openaps and isinstance(openaps, dict) else {}
+    if isinstance(_iob_data, list) and _iob_data:
+        _iob_data = _iob_data[0]
+    # DynISF/oref0 algorithm settings (0 = algorithm couldn't compute → NaN)
+    _isf = float(_suggested['ISF']) if 'ISF' in _suggested else np.nan
+    _cr = float(_suggested['CR']) if 'CR' in _suggested else np.nan
+
+    return (
+        iob_val,
+        cob_val or 0.0,
+        float(pred_values[6]) if len(pred_values) > 6 else np.nan,
+        float(pred_values[12]) if len(pred_values) > 12 else np.nan,
+        float(min(pred_values)) if pred_values else np.nan,
+        float(sum(1 for v in pred_values if v < 70)),
+        recommended,
+        enacted_rate,
+        enacted_bolus,
+        float(batt.get('percent', np.nan)) if isinstance(batt, dict) else np.nan,
+        float(pump.get('reservoir', np.nan)),
+        float(_suggested['eventualBG']) if 'eventualBG' in _suggested else np.nan,
+        float(_suggested['sensitivityRatio']) if 'sensitivityRatio' in _suggested else np.nan,
+        float(_suggested['insulinReq']) if 'insulinReq' in _suggested else np.nan,
+        _isf if _isf else np.nan,
+        _cr if _cr else np.nan,
+        float(_suggested['TDD']) if 'TDD' in _suggested else np.nan,
+        # Extended IOB decomposition
+        float(_iob_data['bolusiob']) if 'bolusiob' in _iob_data else np.nan,
+        float(_iob_data['activity']) if 'activity' in _iob_data else np.nan,
+    )
+
+
+class GridSource:
+    """Per-collection inputs of build_grid(), accumulated batch by batch.
+
+    Each ``add_*`` call reduces a list of raw Nightscout documents to the
+    fields the grid uses (typed arrays for entries and devicestatus, slim
+    dicts for treatments); the documents themselves can be dropped
+    afterwards. Batches may arrive in any order.
+
+    Usage:
+        source = GridSource()
+        for batch in iter_json_batches(data_dir / 'entries.json'):
+            source.add_entries(batch)
+        ...
+        grid = build_grid(data_dir, patient_id, source=source)
+    """
+
+    def __init__(self):
+        self._cgm_ns, self._cgm_glucose, self._cgm_rate = [], [], []
+        self._cgm_dir: list = []
+        self._directions: dict = {}
+        self._ds_ns, self._ds_cols = [], []
+        self._tx: list = []
+        self._tx_ns = []
+        self.n_entries = 0
+        self.n_non_sgv = 0
+        self.n_no_ts = 0
+        self.n_bad_sgv = 0
+        self.n_devicestatus = 0
+        self.n_treatments = 0
+        self.n_tx_no_ts = 0
+        self.n_tx_bad_ts = 0
+        self.profile: Optional[list] = None   # profile docs; else profile.json
+        self.settings: Optional[dict] = None  # status doc; else settings.json
+
+    @classmethod
+    def from_dir(cls, data_path, batch_size: int = DEFAULT_BATCH_SIZE) -> 'GridSource':
+        """Stream entries/devicestatus/treatments.json from a Nightscout directory."""
+        data_dir = Path(data_path)
+        source = cls()
+        for name, add in (('entries', source.add_entries),
+                          ('devicestatus', source.add_devicestatus),
+                          ('treatments', source.add_treatments)):
+            path = data_dir / f'{name}.json'
+            if path.exists():
+                for batch in iter_json_batches(path, batch_size):
+                    add(batch)
+        return source
+
+    def add_entries(self, batch: list) -> None:
+        times, values, rates = [], [], []
+        intern = self._directions.setdefault
+        for e in batch:
+            if e.get('type') != 'sgv' or 'sgv' not in e:
+                self.n_non_sgv += 1
+                continue
+            ns = _entry_ns(e)
+            if ns is None:
+                self.n_no_ts += 1
+                continue
             try:
-                return int(t)
-            except ValueError:
-                return 0
-        return t
-    sorted_sched = sorted(schedule, key=_tas)
-    val = sorted_sched[0].get('value', default)
-    for entry in sorted_sched:
-        if _tas(entry) <= sec_of_day:
-            v = entry.get('value', val)
-            val = float(v) if not isinstance(v, (int, float)) else v
-    return float(val)
+                sgv_val = float(e['sgv'])
+            except (ValueError, TypeError):
+                self.n_bad_sgv += 1
+                continue
+            times.append(ns)
+            values.append(sgv_val)
+            direction = str(e.get('direction', ''))
+            self._cgm_dir.append(intern(direction, direction))
+            rates.append(e.get('trendRate', np.nan))
+        self.n_entries += len(batch)
+        if times:
+            self._cgm_ns.append(np.array(times, dtype=np.int64))
+            self._cgm_glucose.append(np.array(values, dtype=np.float64))
+            self._cgm_rate.append(np.asarray(
+                pd.to_numeric(rates, errors='coerce'), dtype=np.float64))
+
+    def add_devicestatus(self, batch: list) -> None:
+        created, rows = [], []
+        for ds in batch:
+            row = _devicestatus_row(ds)
+            if row is not None:
+                created.append(ds.get('created_at'))
+                rows.append(row)
+        self.n_devicestatus += len(batch)
+        if rows:
+            self._ds_ns.append(_utc_ns(created))
+            self._ds_cols.append(np.array(rows, dtype=np.float64).reshape(
+                len(rows), len(_DS_FIELDS)))
+
+    def add_devicestatus_columns(self, created_ns: np.ndarray, fields: dict,
+                                 n_records: Optional[int] = None) -> None:
+        """Columnar add_devicestatus for records already reduced to grid fields.
+
+        ``created_ns`` holds UTC ns timestamps (NaT allowed) of the records
+        with IOB; ``fields`` maps _DS_FIELDS names to equally long arrays
+        (missing names are NaN). ``n_records`` counts the records read,
+        including those without IOB.
+        """
+        created_ns = np.asarray(created_ns, dtype=np.int64)
+        n = len(created_ns)
+        self.n_devicestatus += n if n_records is None else n_records
+        if not n:
+            return
+        self._ds_ns.append(created_ns)
+        self._ds_cols.append(np.column_stack([
+            np.asarray(fields[k], dtype=np.float64) if k in fields
+            else np.full(n, np.nan) for k in _DS_FIELDS]))
+
+    def add_treatments(self, batch: list) -> None:
+        raw_ts, slim = [], []
+        for tx in batch:
+            ts_str = tx.get('created_at') or tx.get('timestamp')
+            if not ts_str:
+                self.n_tx_no_ts += 1
+                continue
+            raw_ts.append(ts_str)
+            slim.append({k: tx[k] for k in _TX_FIELDS if k in tx})
+        self.n_treatments += len(batch)
+        if not slim:
+            return
+        ns = _utc_ns(raw_ts)
+        ok = ns != _NAT
+        self.n_tx_bad_ts += int((~ok).sum())
+        self._tx.extend(s for s, good in zip(slim, ok) if good)
+        self._tx_ns.append(ns[ok])
+
+    # ── Assembled views for build_grid ──
+
+    def cgm_frame(self) -> pd.DataFrame:
+        ns = _concat(self._cgm_ns, np.int64)
+        return pd.DataFrame({
+            'glucose': _concat(self._cgm_glucose, np.float64),
+            'direction': self._cgm_dir,
+            'trend_rate_raw': _concat(self._cgm_rate, np.float64),
+        }, index=pd.DatetimeIndex(pd.to_datetime(ns, unit='ns', utc=True)))
+
+    def devicestatus_frame(self) -> pd.DataFrame:
+        ns = _concat(self._ds_ns, np.int64)
+        cols = (np.concatenate(self._ds_cols) if self._ds_cols
+                else np.empty((0, len(_DS_FIELDS))))
+        ok = ns != _NAT
+        return pd.DataFrame(cols[ok], columns=list(_DS_FIELDS),
+                            index=pd.DatetimeIndex(pd.to_datetime(ns[ok], unit='ns', utc=True)))
+
+    def treatments(self) -> Tuple[list, np.ndarray]:
+        """(slim treatment dicts, their UTC ns timestamps) in input order."""
+        return self._tx, _concat(self._tx_ns, np.int64)
+
+
+def _concat(parts: list, dtype) -> np.ndarray:
+    return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+
+# ── Incremental refresh ──────────────────────────────────────────────
+#
+# Every grid feature looks back a bounded distance (interpolation and
+# rolling windows ≤ 1 h, time-since caps 6 h, override windows ≤ 24 h)
+# except the forward-filled temp basal rate, cannula/sensor age and
+# hours since the last CGM reading. So a refresh only needs to rebuild
+# from TAIL_LOOKBACK before the first row it rewrites, seeded with those
+# four values as of that point. Rows in the last TAIL_OVERLAP of the
+# previous build are rewritten, and so are rows that interpolate(limit=6)
+# filled forward from a column's last value (glucose, devicestatus) when
+# that value is within TAIL_LOOKBACK of the end: once a later value
+# arrives a full rebuild interpolates towards it instead.
+
+TAIL_LOOKBACK = pd.Timedelta(hours=24)
+TAIL_OVERLAP = pd.Timedelta(hours=1)
+
+
+@dataclass
+class GridTailState:
+    """Where a patient's grid resumes, and what it needs from before then.
+
+    ``build_grid_incremental`` rebuilds rows from ``resume_time`` but only
+    emits rows from ``emit_from`` (= previous grid end - TAIL_OVERLAP),
+    which are identical to a full rebuild. Persist with ``save``/``load``
+    (see ``grid_state_path``).
+    """
+    patient_id: str
+    resume_time: pd.Timestamp
+    emit_from: pd.Timestamp
+    temp_rate: float = np.nan                 # forward-filled temp basal before resume_time
+    last_site_change: Optional[pd.Timestamp] = None
+    last_sensor_start: Optional[pd.Timestamp] = None
+    last_cgm: Optional[pd.Timestamp] = None   # grid step of the last CGM reading
+    profile: dict = field(default_factory=dict)
+    profile_units: str = 'mgdl'
+
+    _TIMES = ('resume_time', 'emit_from', 'last_site_change',
+              'last_sensor_start', 'last_cgm')
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        for k in self._TIMES:
+            d[k] = None if d[k] is None else d[k].isoformat()
+        d['temp_rate'] = None if np.isnan(self.temp_rate) else float(self.temp_rate)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'GridTailState':
+        d = dict(d)
+        for k in cls._TIMES:
+            d[k] = None if d.get(k) is None else pd.Timestamp(d[k])
+        d['temp_rate'] = np.nan if d.get('temp_rate') is None else float(d['temp_rate'])
+        return cls(**d)
+
+    def save(self, path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path) -> 'GridTailState':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def grid_state_path(output_path, patient_id: str) -> Path:
+    """Location of a patient's GridTailState under a parquet output dir."""
+    return Path(output_path) / 'grid_state' / f'{patient_id}.json'
+
+
+def _trailing_fill_start(values: pd.Series) -> Optional[pd.Timestamp]:
+    """First row after a column's last value, or None if that is the last row."""
+    last = values.last_valid_index()
+    if last is None or last == values.index[-1]:
+        return None
+    return last + pd.Timedelta(minutes=5)
+
+
+def _tail_state(patient_id: str, index: pd.DatetimeIndex, temp_ffilled: np.ndarray,
+                site_change_ns: np.ndarray, sensor_start_ns: np.ndarray,
+                has_cgm: np.ndarray, pending: list, profile: dict,
+                profile_units: str,
+                resume: Optional[GridTailState]) -> GridTailState:
+    """GridTailState for the next refresh after a build over ``index``."""
+    horizon = index[-1] - TAIL_LOOKBACK
+    emit_from = min([index[-1] - TAIL_OVERLAP]
+                    + [t for t in pending if t is not None and t >= horizon])
+    resume_time = emit_from - TAIL_LOOKBACK
+    if resume_time <= index[0]:
+        # Too little grid to look back over: resume where this build did
+        if resume is not None:
+            return replace(resume, profile=profile, profile_units=profile_units)
+        return GridTailState(patient_id, index[0], emit_from,
+                             profile=profile, profile_units=profile_units)
+
+    r = int((resume_time - index[0]) // pd.Timedelta(minutes=5))
+    resume_ns = resume_time.value
+
+    def last_before(events: np.ndarray) -> Optional[pd.Timestamp]:
+        before = events[events < resume_ns]
+        return pd.Timestamp(int(before.max()), tz='UTC') if len(before) else None
+
+    cgm_pos = np.flatnonzero(has_cgm[:r])
+    if len(cgm_pos):
+        last_cgm = index[cgm_pos[-1]]
+    else:
+        last_cgm = resume.last_cgm if resume is not None else None
+    return GridTailState(
+        patient_id, index[r], emit_from,
+        temp_rate=float(temp_ffilled[r - 1]),
+        last_site_change=last_before(site_change_ns),
+        last_sensor_start=last_before(sensor_start_ns),
+        last_cgm=last_cgm,
+        profile=profile, profile_units=profile_units,
+    )
+
+
+def _load_profile(data_dir: Path, verbose: bool = False,
+                  profiles=None, status_doc=None) -> Tuple[dict, str]:
+    """Default profile from profile.json (or ``profiles`` docs) and its glucose units ('mgdl'/'mmoll')."""
+    if profiles is None:
+        with open(data_dir / 'profile.json') as f:
+            profiles = json.load(f)
+
+    if isinstance(profiles, list) and profiles:
+        store = profiles[0].get('store', {})
+    else:
+        store = profiles.get('store', {}) if isinstance(profiles, dict) else {}
+    default_profile = store.get('Default', store.get(list(store.keys())[0], {})) if store else {}
+
+    # Convert mmol/L profiles to mg/dL for cross-patient consistency.
+    # Glucose in the grid is always mg/dL (Nightscout entries store sgv in mg/dL).
+    # Profile values (ISF, targets) may be in mmol/L if that's the user's display unit.
+    profile_units = (default_profile.get('units') or '').lower().replace('/', '')
+
+    # Fallback: if profile has no units field, check settings.json from the site
+    if not profile_units:
+        settings_path = data_dir / 'settings.json'
+        if status_doc is None and settings_path.exists():
+            with open(settings_path) as f:
+                status_doc = json.load(f)
+        if status_doc is not None:
+            site_settings = status_doc.get('settings', status_doc)
+            profile_units = (site_settings.get('units') or 'mg/dL').lower().replace('/', '')
+            if verbose:
+                print(f'  Units from settings.json: {site_settings.get("units", "?")}')
+        else:
+            profile_units = 'mgdl'
+    return default_profile, profile_units
 
 
 def build_grid(data_path: str, patient_id: str,
-               verbose: bool = False) -> Optional[pd.DataFrame]:
+               verbose: bool = False,
+               source: Optional[GridSource] = None) -> Optional[pd.DataFrame]:
     """Build a 5-minute research grid from a Nightscout JSON directory.
 
     Args:
@@ -68,77 +530,107 @@ def build_grid(data_path: str, patient_id: str,
                    devicestatus.json, profile.json
         patient_id: Identifier for this patient/site
         verbose: Print progress messages
+        source: Entries/devicestatus/treatments already streamed into a
+                GridSource (e.g. by cmd_convert); by default the JSON
+                files in ``data_path`` are streamed here. A source whose
+                ``profile`` is set needs no files in ``data_path`` at all
+                (odc_reader builds those directly from ODC parts).
 
     Returns:
         DataFrame with columns matching GRID_SCHEMA, or None on error.
     """
+    return _build_grid(Path(data_path), patient_id, verbose, source, None)[0]
+
+
+def build_grid_incremental(data_path: str, patient_id: str,
+                           state: Optional[GridTailState] = None,
+                           verbose: bool = False,
+                           source: Optional[GridSource] = None,
+                           verify: bool = False,
+                           ) -> Tuple[Optional[pd.DataFrame], Optional[GridTailState]]:
+    """Build only the grid rows a refresh changes, plus the next tail state.
+
+    With ``state=None`` this is a full build_grid() that also returns the
+    state to resume from. Otherwise the grid is rebuilt from
+    ``state.resume_time`` and rows from ``state.emit_from`` on are
+    returned; append them (writer dedup keeps the newest row per time).
+    The input only has to cover records from ``state.resume_time``;
+    profile.json may be omitted, in which case the state's profile
+    applies.
+
+    Args:
+        verify: Also run a full build over ``data_path`` (which must then
+                hold the complete history) and raise AssertionError if
+                the emitted rows differ from it.
+
+    Returns:
+        (grid rows or None, state for the next refresh). With nothing
+        new to emit the grid is None and the state is unchanged.
+    """
     data_dir = Path(data_path)
+    if verify and source is None:
+        source = GridSource.from_dir(data_dir)
+    df, new_state = _build_grid(data_dir, patient_id, verbose, source, state)
+    if verify and df is not None:
+        full = _build_grid(data_dir, patient_id, False, source, None)[0]
+        expected = full[full['time'] >= df['time'].iloc[0]].reset_index(drop=True)
+        try:
+            pd.testing.assert_frame_equal(df, expected)
+        except AssertionError as e:
+            raise AssertionError(
+                f'incremental grid for {patient_id} differs from a full '
+                f'rebuild: {e}') from None
+        if verbose:
+            print(f'  Verified {len(df)} incremental rows against full rebuild')
+    return df, new_state
+
+
+def _build_grid(data_dir: Path, patient_id: str, verbose: bool,
+                source: Optional[GridSource],
+                resume: Optional[GridTailState],
+                ) -> Tuple[Optional[pd.DataFrame], Optional[GridTailState]]:
+    data_path = str(data_dir)
     required = ['entries.json', 'treatments.json', 'devicestatus.json', 'profile.json']
+    if source is not None and source.profile is not None:
+        required = []
+    elif resume is not None:
+        required.remove('profile.json')
     for f in required:
         if not (data_dir / f).exists():
             logger.info('build_grid(%s): missing %s', patient_id, f)
             if verbose:
                 print(f'  SKIP: missing {f} in {data_path}')
-            return None
+            return None, resume
+    if source is None:
+        source = GridSource.from_dir(data_dir)
 
     # ── 1. Entries → glucose grid ────────────────────────────────────
-    with open(data_dir / 'entries.json') as f:
-        entries = json.load(f)
-
-    cgm_times, cgm_values, cgm_dirs, cgm_rates = [], [], [], []
-    n_non_sgv = 0
-    n_no_ts = 0
-    n_bad_sgv = 0
-    for e in entries:
-        if e.get('type') != 'sgv' or 'sgv' not in e:
-            n_non_sgv += 1
-            continue
-        if 'date' in e:
-            try:
-                ts = pd.Timestamp(e['date'], unit='ms', tz='UTC')
-            except Exception:
-                n_no_ts += 1
-                continue
-        elif 'dateString' in e:
-            try:
-                ts = pd.Timestamp(e['dateString'])
-            except Exception:
-                n_no_ts += 1
-                continue
-        else:
-            n_no_ts += 1
-            continue
-        try:
-            sgv_val = float(e['sgv'])
-        except (ValueError, TypeError):
-            n_bad_sgv += 1
-            continue
-        cgm_times.append(ts)
-        cgm_values.append(sgv_val)
-        cgm_dirs.append(str(e.get('direction', '')))
-        cgm_rates.append(e.get('trendRate', np.nan))
-
-    if n_no_ts > 0 or n_bad_sgv > 0:
+    if source.n_no_ts > 0 or source.n_bad_sgv > 0:
         logger.info('build_grid(%s) entries: %d total, %d non-sgv, '
                      '%d bad_ts, %d bad_sgv',
-                     patient_id, len(entries), n_non_sgv, n_no_ts, n_bad_sgv)
+                     patient_id, source.n_entries, source.n_non_sgv,
+                     source.n_no_ts, source.n_bad_sgv)
 
-    if not cgm_times:
+    cgm_df = source.cgm_frame()
+    if cgm_df.empty:
         logger.warning('build_grid(%s): no CGM data in %s', patient_id, data_path)
         if verbose:
             print(f'  SKIP: no CGM data in {data_path}')
-        return None
+        return None, resume
 
-    cgm_df = pd.DataFrame({
-        'glucose': cgm_values,
-        'direction': cgm_dirs,
-        'trend_rate_raw': pd.to_numeric(cgm_rates, errors='coerce'),
-    }, index=pd.DatetimeIndex(cgm_times))
     cgm_df = cgm_df.sort_index()
     cgm_df = cgm_df[~cgm_df.index.duplicated(keep='first')]
 
     grid_start = cgm_df.index.min().floor('5min')
     grid_end = cgm_df.index.max().ceil('5min')
+    if resume is not None:
+        if grid_end < resume.emit_from:
+            if verbose:
+                print(f'  SKIP: no CGM data after {resume.emit_from}')
+            return None, resume
+        grid_start = resume.resume_time
+        # Readings that round into the first slot and later
+        cgm_df = cgm_df[cgm_df.index >= grid_start - pd.Timedelta(minutes=5)]
     grid = pd.date_range(grid_start, grid_end, freq='5min')
     df = pd.DataFrame(index=grid)
 
@@ -146,116 +638,23 @@ def build_grid(data_path: str, patient_id: str,
     cgm_rounded.index = cgm_rounded.index.round('5min')
     cgm_grouped = cgm_rounded.groupby(level=0).first()
     df['glucose'] = cgm_grouped['glucose']
+    pending = [_trailing_fill_start(df['glucose'])]
     df['glucose'] = df['glucose'].interpolate(limit=6)
     df['direction'] = cgm_grouped['direction']
     df['trend_rate_raw'] = cgm_grouped['trend_rate_raw']
 
     if verbose:
         n_valid = df['glucose'].notna().sum()
-        print(f'  CGM: {len(entries)} raw → {n_valid}/{len(df)} grid points')
+        print(f'  CGM: {source.n_entries} raw → {n_valid}/{len(df)} grid points')
 
     # ── 2. DeviceStatus → IOB, COB, predictions, pump ───────────────
-    with open(data_dir / 'devicestatus.json') as f:
-        devicestatus = json.load(f)
-
-    ds_data = {k: [] for k in [
-        'ts', 'iob', 'cob', 'predicted_30', 'predicted_60', 'predicted_min',
-        'hypo_risk', 'recommended_bolus', 'enacted_rate', 'enacted_bolus',
-        'pump_battery', 'pump_reservoir',
-        'eventual_bg', 'sensitivity_ratio', 'insulin_req',
-        'algorithm_isf', 'algorithm_cr', 'algorithm_tdd',
-        'bolus_iob', 'insulin_activity',
-    ]}
-
-    for ds in devicestatus:
-        loop = ds.get('loop', {}) or {}
-        openaps = ds.get('openaps', {}) or {}
-
-        # Try Loop structure first, then oref0
-        iob_val = None
-        cob_val = None
-        pred_values = []
-
-        if loop and isinstance(loop, dict):
-            iob_data = loop.get('iob', {}) or {}
-            cob_data = loop.get('cob', {}) or {}
-            if 'iob' in iob_data:
-                iob_val = float(iob_data['iob'])
-                cob_val = float(cob_data.get('cob', 0))
-                predicted = loop.get('predicted', {}) or {}
-                pred_values = predicted.get('values', []) if isinstance(predicted, dict) else []
-
-        if iob_val is None and openaps and isinstance(openaps, dict):
-            iob_data = openaps.get('iob', {}) or {}
-            if isinstance(iob_data, list) and iob_data:
-                iob_data = iob_data[0]
-            suggested = openaps.get('suggested', {}) or {}
-            if 'iob' in iob_data:
-                iob_val = float(iob_data.get('iob', 0))
-            if 'IOB' in suggested and iob_val is None:
-                iob_val = float(suggested['IOB'])
-            cob_val = float(suggested.get('COB', 0))
-            # Use best available prediction curve
-            pred_bgs = suggested.get('predBGs', {}) or {}
-            for curve in ['COB', 'UAM', 'IOB', 'ZT']:
-                if curve in pred_bgs and pred_bgs[curve]:
-                    pred_values = pred_bgs[curve]
-                    break
-
-        if iob_val is None:
-            continue
-
-        ts = pd.Timestamp(ds.get('created_at'))
-        ds_data['ts'].append(ts)
-        ds_data['iob'].append(iob_val)
-        ds_data['cob'].append(cob_val or 0.0)
-        ds_data['predicted_30'].append(float(pred_values[6]) if len(pred_values) > 6 else np.nan)
-        ds_data['predicted_60'].append(float(pred_values[12]) if len(pred_values) > 12 else np.nan)
-        ds_data['predicted_min'].append(float(min(pred_values)) if pred_values else np.nan)
-        ds_data['hypo_risk'].append(float(sum(1 for v in pred_values if v < 70)))
-
-        # Loop recommendations
-        if loop:
-            ds_data['recommended_bolus'].append(float(loop.get('recommendedBolus', 0) or 0))
-            enacted = loop.get('enacted', {}) or {}
-            ds_data['enacted_rate'].append(float(enacted.get('rate', np.nan)) if isinstance(enacted, dict) else np.nan)
-            ds_data['enacted_bolus'].append(float(enacted.get('bolusVolume', 0) or 0) if isinstance(enacted, dict) else 0.0)
-        else:
-            enacted = openaps.get('enacted', {}) or {}
-            ds_data['recommended_bolus'].append(0.0)
-            ds_data['enacted_rate'].append(float(enacted.get('rate', np.nan)) if isinstance(enacted, dict) else np.nan)
-            ds_data['enacted_bolus'].append(float(enacted.get('units', 0) or 0) if isinstance(enacted, dict) else 0.0)
-
-        # Pump state
-        pump = ds.get('pump', {}) or {}
-        batt = pump.get('battery', {})
-        ds_data['pump_battery'].append(
-            float(batt.get('percent', np.nan)) if isinstance(batt, dict) else np.nan)
-        ds_data['pump_reservoir'].append(float(pump.get('reservoir', np.nan)))
-
-        # oref0 algorithm context (Trio/AAPS/OpenAPS)
-        _suggested = (openaps.get('suggested', {}) or {}) if openaps and isinstance(openaps, dict) else {}
-        _iob_data = (openaps.get('iob', {}) or {}) if openaps and isinstance(openaps, dict) else {}
-        if isinstance(_iob_data, list) and _iob_data:
-            _iob_data = _iob_data[0]
-        ds_data['eventual_bg'].append(float(_suggested['eventualBG']) if 'eventualBG' in _suggested else np.nan)
-        ds_data['sensitivity_ratio'].append(float(_suggested['sensitivityRatio']) if 'sensitivityRatio' in _suggested else np.nan)
-        ds_data['insulin_req'].append(float(_suggested['insulinReq']) if 'insulinReq' in _suggested else np.nan)
-        # DynISF/oref0 algorithm settings (0 = algorithm couldn't compute → NaN)
-        _isf = float(_suggested['ISF']) if 'ISF' in _suggested else np.nan
-        ds_data['algorithm_isf'].append(_isf if _isf else np.nan)
-        _cr = float(_suggested['CR']) if 'CR' in _suggested else np.nan
-        ds_data['algorithm_cr'].append(_cr if _cr else np.nan)
-        ds_data['algorithm_tdd'].append(float(_suggested['TDD']) if 'TDD' in _suggested else np.nan)
-        # Extended IOB decomposition
-        ds_data['bolus_iob'].append(float(_iob_data['bolusiob']) if 'bolusiob' in _iob_data else np.nan)
-        ds_data['insulin_activity'].append(float(_iob_data['activity']) if 'activity' in _iob_data else np.nan)
-
-    if ds_data['ts']:
-        ds_df = pd.DataFrame({k: v for k, v in ds_data.items() if k != 'ts'},
-                             index=pd.DatetimeIndex(ds_data['ts']))
+    ds_df = source.devicestatus_frame()
+    n_ds = len(ds_df)
+    if n_ds:
         ds_df = ds_df.sort_index()
         ds_df = ds_df[~ds_df.index.duplicated(keep='first')]
+        if resume is not None:
+            ds_df = ds_df[ds_df.index >= grid_start - pd.Timedelta(minutes=5)]
 
         # ── mmol/L → mg/dL conversion for algorithm output fields ──
         # Same heuristic as normalize._extract_oref0_ds: ISF < 15 is mmol/L
@@ -282,6 +681,7 @@ def build_grid(data_path: str, patient_id: str,
                         'algorithm_tdd'):
                 df[col] = df[col].ffill(limit=6)
             else:
+                pending.append(_trailing_fill_start(df[col]))
                 df[col] = df[col].interpolate(limit=6)
 
     # Fill IOB/COB defaults
@@ -292,138 +692,112 @@ def build_grid(data_path: str, patient_id: str,
             df[col] = df[col].fillna(0)
 
     if verbose:
-        print(f'  DeviceStatus: {len(devicestatus)} raw → {len(ds_data["ts"])} with IOB/COB')
+        print(f'  DeviceStatus: {source.n_devicestatus} raw → {n_ds} with IOB/COB')
 
     # ── 3. Treatments → bolus, carbs, temp basal, CAGE/SAGE ─────────
-    with open(data_dir / 'treatments.json') as f:
-        treatments = json.load(f)
-
-    df['bolus'] = 0.0
-    df['bolus_smb'] = 0.0
-    df['carbs'] = 0.0
-    df['temp_rate'] = np.nan
-    df['_temp_percent'] = np.nan  # percentage temps resolved after schedule computed
-    df['exercise_active'] = 0.0
-    df['override_active'] = 0.0
-    df['override_type'] = 0.0
-    site_change_times = []
-    sensor_start_times = []
-    suspension_times = []
-
-    n_tx_no_ts = 0
-    n_tx_bad_ts = 0
-    n_tx_out_of_range = 0
-    for tx in treatments:
-        et = tx.get('eventType', '')
-        ts_str = tx.get('created_at') or tx.get('timestamp')
-        if not ts_str:
-            n_tx_no_ts += 1
-            continue
-        try:
-            ts = pd.Timestamp(ts_str)
-        except Exception:
-            n_tx_bad_ts += 1
-            continue
-        if ts.tzinfo is None:
-            ts = ts.tz_localize('UTC')
-        else:
-            ts = ts.tz_convert('UTC')
-        ts = ts.round('5min')
-        if ts not in df.index:
-            n_tx_out_of_range += 1
+    n = len(df)
+    bolus = np.zeros(n)
+    bolus_smb = np.zeros(n)
+    carbs = np.zeros(n)
+    temp_rate = np.full(n, np.nan)
+    temp_percent = np.full(n, np.nan)  # percentage temps resolved after schedule computed
+    exercise_active = np.zeros(n)
+    override_active = np.zeros(n)
+    override_type = np.zeros(n)
+    site_change_ns = []
+    sensor_start_ns = []
+    suspension_ns = []
+
+    treatments, tx_ns = source.treatments()
+    slot_ns = pd.DatetimeIndex(pd.to_datetime(tx_ns, unit='ns', utc=True)).round('5min').asi8
+    start_ns = grid[0].value
+    slots = (slot_ns - start_ns) // _FIVE_MIN_NS
+    in_range = (slot_ns >= start_ns) & (slots < n)
+    n_tx_out_of_range = int((~in_range).sum())
+
+    for tx, slot_idx, ns in zip(treatments, slots.tolist(), tx_ns.tolist()):
+        if not 0 <= slot_idx < n:
             continue
+        et = tx.get('eventType', '')
 
         # Capture ALL insulin delivery (SMB, Bolus, Correction Bolus, etc.)
         insulin = float(tx.get('insulin') or 0)
         if insulin > 0:
-            df.loc[ts, 'bolus'] += insulin
+            bolus[slot_idx] += insulin
             is_smb = (et == 'SMB') or (bool(tx.get('automatic')) and insulin < 5.0)
             if is_smb:
-                df.loc[ts, 'bolus_smb'] += insulin
+                bolus_smb[slot_idx] += insulin
 
         if (tx.get('carbs') or 0) > 0:
-            df.loc[ts, 'carbs'] += float(tx['carbs'])
+            carbs[slot_idx] += float(tx['carbs'])
         if et == 'Temp Basal' and ('rate' in tx or 'percent' in tx):
             dur_min = float(tx.get('duration', 5))
             n_slots = max(1, int(dur_min / 5))
-            slot_idx = df.index.get_loc(ts)
-            if isinstance(slot_idx, int):
-                end_idx = min(slot_idx + n_slots, len(df))
-                if (tx.get('temp') == 'percent' or
-                        ('percent' in tx and tx.get('percent') is not None
-                         and 'absolute' not in tx)):
-                    # Percentage-based: store in _temp_percent, resolve after
-                    # scheduled basal is computed (percent × scheduled / 100).
-                    # Detected via: temp='percent' (AAPS-native from odc_loader)
-                    # OR percent field present without absolute (NS-export format)
-                    df.iloc[slot_idx:end_idx, df.columns.get_loc('_temp_percent')] = float(tx['percent'])
-                else:
-                    rate = float(tx['rate'])
-                    df.iloc[slot_idx:end_idx, df.columns.get_loc('temp_rate')] = rate
+            end_idx = min(slot_idx + n_slots, n)
+            if (tx.get('temp') == 'percent' or
+                    ('percent' in tx and tx.get('percent') is not None
+                     and 'absolute' not in tx)):
+                # Percentage-based: store in temp_percent, resolve after
+                # scheduled basal is computed (percent × scheduled / 100).
+                # Detected via: temp='percent' (AAPS-native from odc_loader)
+                # OR percent field present without absolute (NS-export format)
+                temp_percent[slot_idx:end_idx] = float(tx['percent'])
+            else:
+                temp_rate[slot_idx:end_idx] = float(tx['rate'])
 
         if et == 'Site Change':
-            site_change_times.append(pd.Timestamp(ts_str))
+            site_change_ns.append(ns)
         elif et == 'Sensor Start':
-            sensor_start_times.append(pd.Timestamp(ts_str))
+            sensor_start_ns.append(ns)
         if et == 'Temp Basal' and (tx.get('reason') == 'suspend' or float(tx.get('rate', 1)) == 0):
-            suspension_times.append(pd.Timestamp(ts_str))
+            suspension_ns.append(ns)
 
         # Exercise events — mark duration window (cap at 6 hours)
         if et == 'Exercise':
             dur_min = min(float(tx.get('duration', 60)), 360.0)
             n_slots = max(1, int(dur_min / 5))
-            slot_idx = df.index.get_loc(ts)
-            if isinstance(slot_idx, int):
-                end_idx = min(slot_idx + n_slots, len(df))
-                df.iloc[slot_idx:end_idx, df.columns.get_loc('exercise_active')] = 1.0
+            exercise_active[slot_idx:min(slot_idx + n_slots, n)] = 1.0
 
         # Temporary Targets and Overrides — mark duration window (cap at 24 hours)
         if et in ('Temporary Target', 'Temporary Override'):
             dur_min = min(float(tx.get('duration', 0)), 1440.0)
             if dur_min > 0:
                 n_slots = max(1, int(dur_min / 5))
-                slot_idx = df.index.get_loc(ts)
-                if isinstance(slot_idx, int):
-                    end_idx = min(slot_idx + n_slots, len(df))
-                    df.iloc[slot_idx:end_idx, df.columns.get_loc('override_active')] = 1.0
-                    # 1.0 = Temporary Target, 2.0 = Temporary Override
-                    otype = 1.0 if et == 'Temporary Target' else 2.0
-                    df.iloc[slot_idx:end_idx, df.columns.get_loc('override_type')] = otype
-
-    if n_tx_no_ts > 0 or n_tx_bad_ts > 0:
+                end_idx = min(slot_idx + n_slots, n)
+                override_active[slot_idx:end_idx] = 1.0
+                # 1.0 = Temporary Target, 2.0 = Temporary Override
+                override_type[slot_idx:end_idx] = 1.0 if et == 'Temporary Target' else 2.0
+
+    df['bolus'] = bolus
+    df['bolus_smb'] = bolus_smb
+    df['carbs'] = carbs
+    df['temp_rate'] = temp_rate
+    df['_temp_percent'] = temp_percent
+    df['exercise_active'] = exercise_active
+    df['override_active'] = override_active
+    df['override_type'] = override_type
+
+    if source.n_tx_no_ts > 0 or source.n_tx_bad_ts > 0:
         logger.info('build_grid(%s) treatments: %d total, '
                      'no_ts=%d, bad_ts=%d, out_of_range=%d',
-                     patient_id, len(treatments),
-                     n_tx_no_ts, n_tx_bad_ts, n_tx_out_of_range)
-
-    site_change_times.sort()
-    sensor_start_times.sort()
-    suspension_times.sort()
+                     patient_id, source.n_treatments,
+                     source.n_tx_no_ts, source.n_tx_bad_ts, n_tx_out_of_range)
+
+    if resume is not None:
+        # The latest events before the rebuilt window still set CAGE/SAGE
+        if resume.last_site_change is not None:
+            site_change_ns.append(resume.last_site_change.value)
+        if resume.last_sensor_start is not None:
+            sensor_start_ns.append(resume.last_sensor_start.value)
+    site_change_ns = np.array(site_change_ns, dtype=np.int64)
+    sensor_start_ns = np.array(sensor_start_ns, dtype=np.int64)
+    suspension_ns = np.array(suspension_ns, dtype=np.int64)
 
     # CAGE / SAGE
-    df['cage_hours'] = np.nan
-    if site_change_times:
-        sc_idx = 0
-        for i, ts in enumerate(df.index):
-            while sc_idx < len(site_change_times) - 1 and site_change_times[sc_idx + 1] <= ts:
-                sc_idx += 1
-            if site_change_times[sc_idx] <= ts:
-                df.iloc[i, df.columns.get_loc('cage_hours')] = (ts - site_change_times[sc_idx]).total_seconds() / 3600.0
-
-    df['sage_hours'] = np.nan
-    if sensor_start_times:
-        ss_idx = 0
-        for i, ts in enumerate(df.index):
-            while ss_idx < len(sensor_start_times) - 1 and sensor_start_times[ss_idx + 1] <= ts:
-                ss_idx += 1
-            if sensor_start_times[ss_idx] <= ts:
-                df.iloc[i, df.columns.get_loc('sage_hours')] = (ts - sensor_start_times[ss_idx]).total_seconds() / 3600.0
-
-    df['sensor_warmup'] = 0.0
-    for ss_ts in sensor_start_times:
-        warmup_end = ss_ts + pd.Timedelta(hours=2)
-        mask = (df.index >= ss_ts) & (df.index < warmup_end)
-        df.loc[mask, 'sensor_warmup'] = 1.0
+    df['cage_hours'] = seconds_since_last(df.index, site_change_ns) / 3600.0
+    df['sage_hours'] = seconds_since_last(df.index, sensor_start_ns) / 3600.0
+    df['sensor_warmup'] = interval_mask(
+        df.index, sensor_start_ns, pd.Timedelta(hours=2)).astype(np.float64)
 
     if verbose:
         n_bolus = (df['bolus'] > 0).sum()
@@ -431,14 +805,15 @@ def build_grid(data_path: str, patient_id: str,
         print(f'  Treatments: {n_bolus} bolus slots, {n_carbs} carb slots')
 
     # ── 4. Profile → basal schedule, ISF, CR, targets ────────────────
-    with open(data_dir / 'profile.json') as f:
-        profiles = json.load(f)
-
-    if isinstance(profiles, list) and profiles:
-        store = profiles[0].get('store', {})
+    if source.profile is not None:
+        default_profile, profile_units = _load_profile(
+            data_dir, verbose, copy.deepcopy(source.profile), source.settings)
+    elif resume is not None and not (data_dir / 'profile.json').exists():
+        default_profile, profile_units = copy.deepcopy(resume.profile), resume.profile_units
     else:
-        store = profiles.get('store', {}) if isinstance(profiles, dict) else {}
-    default_profile = store.get('Default', store.get(list(store.keys())[0], {})) if store else {}
+        default_profile, profile_units = _load_profile(data_dir, verbose,
+                                                       status_doc=source.settings)
+    profile_in_effect = copy.deepcopy(default_profile)
 
     basal_schedule = default_profile.get('basal', [])
     isf_schedule = default_profile.get('sens', [])
@@ -447,24 +822,6 @@ def build_grid(data_path: str, patient_id: str,
     target_high_schedule = default_profile.get('target_high', [])
     patient_tz = normalize_timezone(default_profile.get('timezone', ''))
 
-    # Convert mmol/L profiles to mg/dL for cross-patient consistency.
-    # Glucose in the grid is always mg/dL (Nightscout entries store sgv in mg/dL).
-    # Profile values (ISF, targets) may be in mmol/L if that's the user's display unit.
-    profile_units = (default_profile.get('units') or '').lower().replace('/', '')
-
-    # Fallback: if profile has no units field, check settings.json from the site
-    if not profile_units:
-        settings_path = data_dir / 'settings.json'
-        if settings_path.exists():
-            with open(settings_path) as f:
-                status_doc = json.load(f)
-            site_settings = status_doc.get('settings', status_doc)
-            profile_units = (site_settings.get('units') or 'mg/dL').lower().replace('/', '')
-            if verbose:
-                print(f'  Units from settings.json: {site_settings.get("units", "?")}')
-        else:
-            profile_units = 'mgdl'
-
     is_mmol = profile_units in ('mmoll', 'mmol')
     if is_mmol:
         for sched in [isf_schedule, target_low_schedule, target_high_schedule]:
@@ -476,10 +833,7 @@ def build_grid(data_path: str, patient_id: str,
     local_index = _to_local_index(df.index, patient_tz)
 
     # Net basal
-    scheduled = np.zeros(len(df))
-    for i, ts in enumerate(local_index):
-        sec_of_day = ts.hour * 3600 + ts.minute * 60 + ts.second
-        scheduled[i] = _lookup_schedule(sec_of_day, basal_schedule)
+    scheduled = schedule_at(local_index, basal_schedule, carry_missing=True)
 
     # Resolve percentage-based temp basals → absolute rates
     # AAPS can store temp basals as percentages of scheduled (e.g., 360 = 360%)
@@ -494,7 +848,10 @@ def build_grid(data_path: str, patient_id: str,
                   f'→ {df.loc[pct_mask, "temp_rate"].median():.2f} U/hr)')
     df = df.drop(columns=['_temp_percent'])
 
+    if resume is not None and np.isnan(df['temp_rate'].iat[0]):
+        df.iloc[0, df.columns.get_loc('temp_rate')] = resume.temp_rate
     df['temp_rate'] = df['temp_rate'].ffill()
+    temp_ffilled = df['temp_rate'].to_numpy(copy=True)
     df['temp_rate'] = df['temp_rate'].fillna(pd.Series(scheduled, index=df.index))
     df['net_basal'] = df['temp_rate'].values - scheduled
     df['scheduled_basal_rate'] = scheduled
@@ -524,17 +881,12 @@ def build_grid(data_path: str, patient_id: str,
     df['rolling_noise'] = glucose_diff.rolling(12, min_periods=3).std()
 
     # Hours since last CGM reading
-    has_cgm = cgm_grouped['glucose'].reindex(df.index).notna()
-    hours_since = np.zeros(len(df))
-    last_cgm_idx = -1
-    for i in range(len(df)):
-        if has_cgm.iloc[i]:
-            last_cgm_idx = i
-        if last_cgm_idx >= 0:
-            hours_since[i] = (i - last_cgm_idx) * 5.0 / 60.0
-        else:
-            hours_since[i] = np.nan
-    df['hours_since_cgm'] = hours_since
+    has_cgm = cgm_grouped['glucose'].reindex(df.index).notna().to_numpy()
+    cgm_steps = steps_since(has_cgm)
+    if resume is not None and resume.last_cgm is not None:
+        seeded = (df.index.asi8 - resume.last_cgm.value) // _FIVE_MIN_NS
+        cgm_steps = np.where(cgm_steps >= 0, cgm_steps, seeded)
+    df['hours_since_cgm'] = np.where(cgm_steps >= 0, cgm_steps * 5.0 / 60.0, np.nan)
 
     # Trend direction (ordinal)
     df['trend_direction'] = df['direction'].map(DIRECTION_MAP)
@@ -542,35 +894,16 @@ def build_grid(data_path: str, patient_id: str,
     df['trend_rate'] = df['trend_rate_raw']
 
     # ── 7. Time-since features ───────────────────────────────────────
-    bolus_vals = df['bolus'].values
-    carb_vals = df['carbs'].values
-    time_since_bolus = np.full(len(df), 360.0)  # cap at 6 hours
-    time_since_carb = np.full(len(df), 360.0)
-    last_bolus = -99999
-    last_carb = -99999
-    for i in range(len(df)):
-        if bolus_vals[i] > 0:
-            last_bolus = i
-        if carb_vals[i] > 0:
-            last_carb = i
-        if last_bolus >= 0:
-            time_since_bolus[i] = min((i - last_bolus) * 5.0, 360.0)
-        if last_carb >= 0:
-            time_since_carb[i] = min((i - last_carb) * 5.0, 360.0)
-    df['time_since_bolus_min'] = time_since_bolus
-    df['time_since_carb_min'] = time_since_carb
+    # Capped at 6 hours
+    df['time_since_bolus_min'] = minutes_since_nonzero(df['bolus'].values, 360.0)
+    df['time_since_carb_min'] = minutes_since_nonzero(df['carbs'].values, 360.0)
 
     # ── 8. Profile-derived context ───────────────────────────────────
-    isf_vals = np.zeros(len(df))
-    cr_vals = np.zeros(len(df))
-    target_mid = np.zeros(len(df))
-    for i, ts in enumerate(local_index):
-        sec = ts.hour * 3600 + ts.minute * 60 + ts.second
-        isf_vals[i] = _lookup_schedule(sec, isf_schedule, 100.0)
-        cr_vals[i] = _lookup_schedule(sec, cr_schedule, 10.0)
-        t_low = _lookup_schedule(sec, target_low_schedule, 100.0)
-        t_high = _lookup_schedule(sec, target_high_schedule, 120.0)
-        target_mid[i] = (t_low + t_high) / 2.0
+    isf_vals = schedule_at(local_index, isf_schedule, 100.0, carry_missing=True)
+    cr_vals = schedule_at(local_index, cr_schedule, 10.0, carry_missing=True)
+    t_low = schedule_at(local_index, target_low_schedule, 100.0, carry_missing=True)
+    t_high = schedule_at(local_index, target_high_schedule, 120.0, carry_missing=True)
+    target_mid = (t_low + t_high) / 2.0
 
     df['scheduled_isf'] = isf_vals
     df['scheduled_cr'] = cr_vals
@@ -617,19 +950,10 @@ def build_grid(data_path: str, patient_id: str,
         np.where(sage < 240, 0.75, 1.0))))
     df.loc[df['sage_hours'].isna(), 'sensor_phase'] = np.nan
 
-    # Suspension time (vectorized)
-    suspension_min = np.full(len(df), 360.0)
-    if suspension_times:
-        sus_idx = 0
-        last_sus_step = -99999
-        for i, ts in enumerate(df.index):
-            while sus_idx < len(suspension_times) and suspension_times[sus_idx] <= ts:
-                sus_step = int((ts - suspension_times[sus_idx]).total_seconds() / 300)
-                last_sus_step = i - sus_step
-                sus_idx += 1
-            if last_sus_step >= 0:
-                suspension_min[i] = min((i - last_sus_step) * 5.0, 360.0)
-    df['suspension_time_min'] = suspension_min
+    # Suspension time: counted from the first grid step at/after each
+    # suspension, capped at 6 hours
+    df['suspension_time_min'] = minutes_since_nonzero(
+        first_step_at_or_after(df.index, suspension_ns), 360.0)
 
     # ── 12. Add patient_id and prepare output ────────────────────────
     df['patient_id'] = patient_id
@@ -666,8 +990,14 @@ def build_grid(data_path: str, patient_id: str,
 
     df = df[grid_columns]
 
+    state = _tail_state(patient_id, grid, temp_ffilled, site_change_ns,
+                        sensor_start_ns, has_cgm, pending,
+                        profile_in_effect, profile_units, resume)
+    if resume is not None:
+        df = df[df['time'] >= resume.emit_from].reset_index(drop=True)
+
     if verbose:
         n_days = (df['time'].max() - df['time'].min()).total_seconds() / 86400
         print(f'  Grid: {len(df)} rows, {n_days:.1f} days')
 
-    return df
+    return df, state
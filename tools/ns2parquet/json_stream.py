@@ -0,0 +1,110 @@
+"""
+json_stream.py — Incremental reader for Nightscout JSON exports.
+
+Nightscout collections are exported as one top-level JSON array per
+file (``entries.json``, ``devicestatus.json`` …); a year of 1-minute
+Loop devicestatus is several hundred MB.  ``json.load`` materializes the
+whole text plus every record before anything can be normalized, and the
+old convert path did that twice (once for ``normalize_*``, once more in
+``build_grid``).
+
+``iter_json_batches`` parses the array element by element with the C
+scanner (``JSONDecoder.raw_decode``) over a sliding text buffer and
+yields lists of at most ``batch_size`` records, so peak memory is one
+batch of dicts plus one read chunk regardless of file size.  A file
+whose top level is an object (``profile.json`` on some exports) yields
+a single one-record batch.
+
+Usage:
+    from tools.ns2parquet.json_stream import iter_json_batches
+    for batch in iter_json_batches('entries.json'):
+        frames.append(normalize_entries(batch, 'a', seen_ids=seen))
+"""
+
+import json
+from pathlib import Path
+from typing import Iterator, List, Union
+
+DEFAULT_BATCH_SIZE = 2_000           # ~30 MB of Loop devicestatus dicts
+_CHUNK_CHARS = 1 << 20              # 1M characters per read
+_WS = ' \t\n\r'
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_batches(path: Union[str, Path],
+                      batch_size: int = DEFAULT_BATCH_SIZE,
+                      chunk_chars: int = _CHUNK_CHARS) -> Iterator[List]:
+    """Yield the elements of a top-level JSON array in lists of ``batch_size``.
+
+    Raises ``json.JSONDecodeError`` on malformed input (positions are
+    relative to the current buffer, not the file).
+    """
+    with open(path, encoding='utf-8') as f:
+        buf = f.read(chunk_chars)
+        pos = _skip_ws(buf, 0)
+        while pos == len(buf):                  # leading whitespace only
+            more = f.read(chunk_chars)
+            if not more:
+                return                          # empty file
+            buf, pos = more, _skip_ws(more, 0)
+        if buf[pos] != '[':
+            doc = _decoder.decode(buf[pos:] + f.read())
+            yield [doc]
+            return
+        pos += 1
+        eof = False
+        after_comma = False
+        batch = []
+        while True:
+            # Skip whitespace; refill when the buffer runs dry
+            pos = _skip_ws(buf, pos)
+            while pos == len(buf) and not eof:
+                more = f.read(chunk_chars)
+                eof = not more
+                buf, pos = more, _skip_ws(more, 0)
+            if pos == len(buf):
+                raise json.JSONDecodeError('Unterminated array', buf, pos)
+            if buf[pos] == ']' and not after_comma:
+                break
+            if buf[pos] in ',]':
+                raise json.JSONDecodeError('Expecting value', buf, pos)
+            try:
+                obj, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Element straddles the buffer end: drop the consumed
+                # prefix, append a chunk and retry from the element start
+                more = f.read(chunk_chars)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            # Accept the element only once its delimiter is in the buffer:
+            # a number cut at the chunk edge ('2.' | '5e3') decodes short
+            nxt = _skip_ws(buf, end)
+            if nxt == len(buf) or buf[nxt] not in ',]':
+                if not eof:
+                    more = f.read(chunk_chars)
+                    eof = not more
+                    buf, pos = buf[pos:] + more, 0
+                    continue
+                if nxt == len(buf):
+                    raise json.JSONDecodeError('Unterminated array', buf, nxt)
+                raise json.JSONDecodeError("Expecting ',' delimiter", buf, nxt)
+            batch.append(obj)
+            after_comma = buf[nxt] == ','
+            pos = nxt + 1 if after_comma else nxt
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _skip_ws(buf: str, pos: int) -> int:
+    n = len(buf)
+    while pos < n and buf[pos] in _WS:
+        pos += 1
+    return pos
+
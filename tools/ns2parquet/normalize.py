@@ -13,16 +13,25 @@ Key transformations:
 - Multi-step SMB detection (type, automatic, eventType)
 - DeviceStatus: handles both Loop (flat) and oref0 (nested) structures
 - Profiles: expands time-varying schedules to one row per segment
+
+Entries, treatments and devicestatus are normalized column-wise: each
+field is gathered across the batch and converted at once (timestamps in
+bulk, prediction curves reduced over one flat array). The per-record
+_extract_*_ds helpers remain the reference for those semantics.
 """
 
 import logging
 import warnings
+from itertools import chain, compress
 
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import List, Dict, Optional, Union
 
 from .constants import DIRECTION_MAP, MMOLL_TO_MGDL, normalize_timezone  # noqa: F401 — re-export
+from .grid import _MAX_MS, _NAT
+from .json_stream import DEFAULT_BATCH_SIZE, iter_json_batches
 
 logger = logging.getLogger(__name__)
 
@@ -157,63 +166,183 @@ def _absorption_to_minutes(record: dict, device: str = '') -> Optional[float]:
     return val
 
 
+# ── Columnar helpers ────────────────────────────────────────────────────
+#
+# The normalize_* functions gather each raw field across the whole batch
+# and convert it in one go instead of building a dict per record. Float
+# columns come out as float64 arrays (NaN where missing), or all-None when
+# the field is missing everywhere — what the per-record dicts inferred to.
+
+def _first_seen(ids: list, seen_ids: set) -> np.ndarray:
+    """Mask of records to keep: _id-less, or first sighting of their _id.
+
+    Kept ids are added to ``seen_ids``.
+    """
+    n = len(ids)
+    has_id = np.fromiter(map(bool, ids), dtype=bool, count=n)
+    if not has_id.any():
+        return np.ones(n, dtype=bool)
+    s = pd.Series(ids, dtype=object)
+    keep = ~(has_id & (s.duplicated().to_numpy() | s.isin(seen_ids).to_numpy()))
+    seen_ids.update(compress(ids, (has_id & keep).tolist()))
+    return keep
+
+
+def _field_ns(values: list, field: str) -> np.ndarray:
+    """One timestamp field across records → int64 UTC ns (_NAT if unusable).
+
+    Epoch-ms integers and 'Z' strings are converted in bulk; anything
+    else (offsets, naive or odd strings, floats) and whatever the bulk
+    parse rejects goes through _parse_ts one value at a time.
+    """
+    out = np.full(len(values), _NAT, dtype=np.int64)
+    ms_idx, z_idx, z_vals, other = [], [], [], []
+    for i, v in enumerate(values):
+        if v is None or v == '':
+            continue
+        t = type(v)
+        if t is int and 1e10 < v <= _MAX_MS:
+            ms_idx.append(i)
+        elif t is str and v.endswith('Z'):
+            z_idx.append(i)
+            z_vals.append(v)
+        else:
+            other.append(i)
+    if ms_idx:
+        out[ms_idx] = np.array([values[i] for i in ms_idx], dtype=np.int64) * 10**6
+    if z_idx:
+        try:
+            ns = pd.to_datetime(z_vals, utc=True, format='ISO8601',
+                                errors='coerce').asi8
+        except (ValueError, TypeError):
+            ns = np.full(len(z_idx), _NAT, dtype=np.int64)
+        out[z_idx] = ns
+        other.extend(i for i, x in zip(z_idx, ns.tolist()) if x == _NAT)
+    for i in other:
+        ts = _parse_ts({field: values[i]}, field)
+        if ts is not None:
+            try:
+                out[i] = ts.value
+            except OverflowError:
+                logger.debug('Out-of-range timestamp field=%s val=%r',
+                             field, values[i])
+    return out
+
+
+def _parse_ts_ns(records: List[Dict], *fields) -> np.ndarray:
+    """Columnar _parse_ts: first valid field per record as int64 UTC ns, else _NAT."""
+    out = np.full(len(records), _NAT, dtype=np.int64)
+    todo = np.arange(len(records))
+    for field in fields:
+        if not len(todo):
+            break
+        ns = _field_ns([records[i].get(field) for i in todo.tolist()], field)
+        out[todo] = ns
+        todo = todo[ns == _NAT]
+    return out
+
+
+def _none_column(n: int) -> np.ndarray:
+    return np.full(n, None, dtype=object)
+
+
+def _float_column(values: list, field_name: str = '') -> np.ndarray:
+    """One field across records → float64 column (None → NaN).
+
+    Unconvertible values are logged and dropped as in _safe_float. A
+    field with nothing present stays an all-None object column.
+    """
+    n = len(values)
+    try:
+        arr = np.array(values, dtype=np.float64)
+        if arr.shape != (n,):
+            raise ValueError('nested values')
+    except (ValueError, TypeError):
+        values = [_safe_float(v, field_name) for v in values]
+        arr = np.array(values, dtype=np.float64)
+    return arr if values.count(None) < n else _none_column(n)
+
+
+def _int_values(values: list, field_name: str = '') -> list:
+    """_safe_int over a field, ints passed through as-is."""
+    return [v if v is None or type(v) is int else _safe_int(v, field_name)
+            for v in values]
+
+
+def _curve_stats(curves: list, at=(6, 12)) -> dict:
+    """Prediction curves → columns keyed by each index in ``at``, 'min' and 'hypo'.
+
+    'hypo' counts values < 70. min and hypo exist for non-empty curves,
+    ``at[i]`` for long enough ones; all curves are reduced together over
+    one flat array.
+    """
+    n = len(curves)
+    lengths = np.fromiter(map(len, curves), dtype=np.int64, count=n)
+    flat = np.fromiter(chain.from_iterable(curves), dtype=np.float64,
+                       count=int(lengths.sum()))
+    starts = np.zeros(n, dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    has = lengths > 0
+    if not has.any():
+        out = {'min': _none_column(n), 'hypo': _none_column(n)}
+    else:
+        cmin = np.full(n, np.nan)
+        cmin[has] = np.minimum.reduceat(flat, starts[has])
+        hypo = np.zeros(n, dtype=np.int64)
+        hypo[has] = np.add.reduceat((flat < 70).astype(np.int64), starts[has])
+        out = {'min': cmin,
+               'hypo': [h if m else None for h, m in zip(hypo.tolist(), has.tolist())]}
+    for i in at:
+        ok = lengths > i
+        if ok.any():
+            vals = np.full(n, np.nan)
+            vals[ok] = flat[starts[ok] + i]
+            out[i] = vals
+        else:
+            out[i] = _none_column(n)
+    return out
+
+
 # ── Entries ─────────────────────────────────────────────────────────────
 
-def normalize_entries(records: List[Dict], patient_id: str) -> pd.DataFrame:
+def normalize_entries(records: List[Dict], patient_id: str,
+                      seen_ids: Optional[set] = None) -> pd.DataFrame:
     """Normalize raw Nightscout entries JSON → flat DataFrame.
 
     Handles SGV, MBG, and calibration records. Deduplicates by _id.
 
     Sets df.attrs['quality'] with skip counts so callers can assess
     data completeness.
-    """
-    rows = []
-    seen_ids = set()
-    n_dup = 0
-    n_no_ts = 0
-    n_bad_value = 0
-
-    for e in records:
-        eid = e.get('_id')
-        if eid and eid in seen_ids:
-            n_dup += 1
-            continue
-        if eid:
-            seen_ids.add(eid)
-
-        ts = _parse_ts(e, 'date', 'dateString', 'sysTime')
-        if ts is None:
-            n_no_ts += 1
-            continue
 
-        entry_type = e.get('type', 'sgv')
-        sgv = _safe_float(e.get('sgv'), 'sgv') if entry_type == 'sgv' else None
-        mbg = _safe_float(e.get('mbg'), 'mbg') if entry_type == 'mbg' else None
-        if entry_type == 'sgv' and sgv is None and 'sgv' in e:
-            n_bad_value += 1
-
-        rows.append({
-            'patient_id': patient_id,
-            '_id': eid,
-            'type': entry_type,
-            'date': ts,
-            'sgv': sgv,
-            'mbg': mbg,
-            'direction': str(e.get('direction', '')) if e.get('direction') is not None else None,
-            'noise': _safe_int(e.get('noise'), 'noise'),
-            'filtered': _safe_float(e.get('filtered'), 'filtered'),
-            'unfiltered': _safe_float(e.get('unfiltered'), 'unfiltered'),
-            'delta': _safe_float(e.get('delta'), 'delta'),
-            'rssi': _safe_int(e.get('rssi'), 'rssi'),
-            'trend': _safe_int(e.get('trend'), 'trend'),
-            'trend_rate': _safe_float(e.get('trendRate'), 'trendRate'),
-            'device': e.get('device'),
-            'utc_offset': _safe_int(e.get('utcOffset'), 'utcOffset'),
-        })
+    ``seen_ids`` carries the _id set across calls when a collection is
+    normalized batch by batch (see concat_normalized).
+    """
+    seen_ids = set() if seen_ids is None else seen_ids
+    keep = _first_seen([e.get('_id') for e in records], seen_ids)
+    n_dup = int((~keep).sum())
+    recs = list(compress(records, keep.tolist()))
+
+    ns = _parse_ts_ns(recs, 'date', 'dateString', 'sysTime')
+    has_ts = ns != _NAT
+    n_no_ts = int((~has_ts).sum())
+    recs = list(compress(recs, has_ts.tolist()))
+    ns = ns[has_ts]
+    n = len(recs)
+
+    types = [e.get('type', 'sgv') for e in recs]
+    sgv_raw = [e.get('sgv') if t == 'sgv' else None for e, t in zip(recs, types)]
+    sgv = _float_column(sgv_raw, 'sgv')
+    mbg = _float_column([e.get('mbg') if t == 'mbg' else None
+                         for e, t in zip(recs, types)], 'mbg')
+    # sgv records whose value is null or unconvertible
+    missing = np.ones(n, dtype=bool) if sgv.dtype == object else np.isnan(sgv)
+    n_bad_value = sum(1 for i in np.flatnonzero(missing).tolist()
+                      if types[i] == 'sgv' and 'sgv' in recs[i]
+                      and _safe_float(sgv_raw[i]) is None)
 
     quality = {
         'total_records': len(records),
-        'accepted': len(rows),
+        'accepted': n,
         'skipped_duplicate': n_dup,
         'skipped_no_timestamp': n_no_ts,
         'bad_value_conversion': n_bad_value,
@@ -221,10 +350,10 @@ def normalize_entries(records: List[Dict], patient_id: str) -> pd.DataFrame:
     if n_no_ts > 0 or n_bad_value > 0:
         logger.info('normalize_entries(%s): %d/%d accepted '
                      '(dup=%d, no_ts=%d, bad_val=%d)',
-                     patient_id, len(rows), len(records),
+                     patient_id, n, len(records),
                      n_dup, n_no_ts, n_bad_value)
 
-    if not rows:
+    if not n:
         df = pd.DataFrame(columns=[
             'patient_id', '_id', 'type', 'date', 'sgv', 'mbg', 'direction',
             'noise', 'filtered', 'unfiltered', 'delta', 'rssi', 'trend',
@@ -233,7 +362,28 @@ def normalize_entries(records: List[Dict], patient_id: str) -> pd.DataFrame:
         df.attrs['quality'] = quality
         return df
 
-    df = pd.DataFrame(rows)
+    def floats(key):
+        return _float_column([e.get(key) for e in recs], key)
+
+    directions = [e.get('direction') for e in recs]
+    df = pd.DataFrame({
+        'patient_id': patient_id,
+        '_id': [e.get('_id') for e in recs],
+        'type': types,
+        'date': pd.to_datetime(ns, unit='ns', utc=True),
+        'sgv': sgv,
+        'mbg': mbg,
+        'direction': [None if d is None else str(d) for d in directions],
+        'noise': _int_values([e.get('noise') for e in recs], 'noise'),
+        'filtered': floats('filtered'),
+        'unfiltered': floats('unfiltered'),
+        'delta': floats('delta'),
+        'rssi': _int_values([e.get('rssi') for e in recs], 'rssi'),
+        'trend': _int_values([e.get('trend') for e in recs], 'trend'),
+        'trend_rate': floats('trendRate'),
+        'device': [e.get('device') for e in recs],
+        'utc_offset': _int_values([e.get('utcOffset') for e in recs], 'utcOffset'),
+    })
     df = df.sort_values('date').reset_index(drop=True)
     df.attrs['quality'] = quality
     return df
@@ -241,7 +391,8 @@ def normalize_entries(records: List[Dict], patient_id: str) -> pd.DataFrame:
 
 # ── Treatments ──────────────────────────────────────────────────────────
 
-def normalize_treatments(records: List[Dict], patient_id: str) -> pd.DataFrame:
+def normalize_treatments(records: List[Dict], patient_id: str,
+                         seen_ids: Optional[set] = None) -> pd.DataFrame:
     """Normalize raw Nightscout treatments JSON → flat DataFrame.
 
     Performs:
@@ -250,77 +401,91 @@ def normalize_treatments(records: List[Dict], patient_id: str) -> pd.DataFrame:
     - Deduplication by _id
 
     Sets df.attrs['quality'] with skip counts.
-    """
-    rows = []
-    seen_ids = set()
-    n_dup = 0
-    n_no_ts = 0
-
-    for tx in records:
-        tid = tx.get('_id')
-        if tid and tid in seen_ids:
-            n_dup += 1
-            continue
-        if tid:
-            seen_ids.add(tid)
-
-        ts = _parse_ts(tx, 'created_at', 'timestamp', 'date')
-        if ts is None:
-            n_no_ts += 1
-            continue
 
-        device = tx.get('enteredBy', '') or tx.get('device', '') or ''
-        rows.append({
-            'patient_id': patient_id,
-            '_id': tid,
-            'event_type': tx.get('eventType', ''),
-            'created_at': ts,
-            'insulin': _safe_float(tx.get('insulin'), 'insulin'),
-            'programmed': _safe_float(tx.get('programmed'), 'programmed'),
-            'is_smb': _is_smb(tx),
-            'is_automatic': bool(tx.get('automatic', False)),
-            'bolus_type': tx.get('bolusType'),
-            'insulin_type': tx.get('insulinType') or tx.get('insulintype'),
-            'carbs': _safe_float(tx.get('carbs'), 'carbs'),
-            'absorption_time_min': _absorption_to_minutes(tx, device),
-            'food_type': tx.get('foodType'),
-            'fat': _safe_float(tx.get('fat'), 'fat'),
-            'protein': _safe_float(tx.get('protein'), 'protein'),
-            'rate': _safe_float(tx.get('rate'), 'rate') if tx.get('rate') is not None else (
-                _safe_float(tx.get('absolute'), 'absolute')),
-            'duration_min': _duration_to_minutes(tx, device),
-            'percent': _safe_float(tx.get('percent'), 'percent'),
-            'temp_type': tx.get('temp'),
-            'target_top': _safe_float(tx.get('targetTop'), 'targetTop'),
-            'target_bottom': _safe_float(tx.get('targetBottom'), 'targetBottom'),
-            'reason': tx.get('reason'),
-            'glucose': _safe_float(tx.get('glucose'), 'glucose'),
-            'glucose_type': tx.get('glucoseType'),
-            'entered_by': tx.get('enteredBy'),
-            'device': tx.get('device'),
-            'notes': tx.get('notes'),
-            'utc_offset': _safe_int(tx.get('utcOffset'), 'utcOffset'),
-            'identifier': tx.get('identifier'),
-            'sync_identifier': tx.get('syncIdentifier'),
-        })
+    ``seen_ids`` carries the _id set across calls when a collection is
+    normalized batch by batch (see concat_normalized).
+    """
+    seen_ids = set() if seen_ids is None else seen_ids
+    keep = _first_seen([tx.get('_id') for tx in records], seen_ids)
+    n_dup = int((~keep).sum())
+    recs = list(compress(records, keep.tolist()))
+
+    ns = _parse_ts_ns(recs, 'created_at', 'timestamp', 'date')
+    has_ts = ns != _NAT
+    n_no_ts = int((~has_ts).sum())
+    recs = list(compress(recs, has_ts.tolist()))
+    ns = ns[has_ts]
+    n = len(recs)
 
     quality = {
         'total_records': len(records),
-        'accepted': len(rows),
+        'accepted': n,
         'skipped_duplicate': n_dup,
         'skipped_no_timestamp': n_no_ts,
     }
     if n_no_ts > 0:
         logger.info('normalize_treatments(%s): %d/%d accepted '
                      '(dup=%d, no_ts=%d)',
-                     patient_id, len(rows), len(records), n_dup, n_no_ts)
+                     patient_id, n, len(records), n_dup, n_no_ts)
 
-    if not rows:
+    if not n:
         df = pd.DataFrame()
         df.attrs['quality'] = quality
         return df
 
-    df = pd.DataFrame(rows)
+    def get(key):
+        return [tx.get(key) for tx in recs]
+
+    def floats(key, values=None):
+        return _float_column(get(key) if values is None else values, key)
+
+    # Unit conversions (_duration_to_minutes / _absorption_to_minutes)
+    devices = [tx.get('enteredBy', '') or tx.get('device', '') or '' for tx in recs]
+    controllers = {d: _detect_controller(d) for d in set(devices)}
+    is_loop = np.fromiter((controllers[d] == 'loop' for d in devices),
+                          dtype=bool, count=n)
+    dur = _float_column(get('duration'), 'duration')
+    if dur.dtype != object:
+        dur = np.where(is_loop & (dur > 1000), dur / 60.0,   # seconds → minutes
+                       np.where(dur > 86400, dur / 60000.0, dur))  # ms → minutes
+    absorb = _float_column(get('absorptionTime'), 'absorptionTime')
+    if absorb.dtype != object:
+        # > 500 minutes is unreasonable, likely seconds
+        absorb = np.where(absorb > 500, absorb / 60.0, absorb)
+
+    df = pd.DataFrame({
+        'patient_id': patient_id,
+        '_id': get('_id'),
+        'event_type': [tx.get('eventType', '') for tx in recs],
+        'created_at': pd.to_datetime(ns, unit='ns', utc=True),
+        'insulin': floats('insulin'),
+        'programmed': floats('programmed'),
+        'is_smb': [_is_smb(tx) for tx in recs],
+        'is_automatic': [bool(tx.get('automatic', False)) for tx in recs],
+        'bolus_type': get('bolusType'),
+        'insulin_type': [tx.get('insulinType') or tx.get('insulintype') for tx in recs],
+        'carbs': floats('carbs'),
+        'absorption_time_min': absorb,
+        'food_type': get('foodType'),
+        'fat': floats('fat'),
+        'protein': floats('protein'),
+        'rate': floats('rate', [tx['rate'] if tx.get('rate') is not None
+                                else tx.get('absolute') for tx in recs]),
+        'duration_min': dur,
+        'percent': floats('percent'),
+        'temp_type': get('temp'),
+        'target_top': floats('targetTop'),
+        'target_bottom': floats('targetBottom'),
+        'reason': get('reason'),
+        'glucose': floats('glucose'),
+        'glucose_type': get('glucoseType'),
+        'entered_by': get('enteredBy'),
+        'device': get('device'),
+        'notes': get('notes'),
+        'utc_offset': _int_values(get('utcOffset'), 'utcOffset'),
+        'identifier': get('identifier'),
+        'sync_identifier': get('syncIdentifier'),
+    })
     df = df.sort_values('created_at').reset_index(drop=True)
     df.attrs['quality'] = quality
     return df
@@ -479,57 +644,179 @@ def _extract_oref0_ds(ds: dict) -> dict:
     return result
 
 
-def normalize_devicestatus(records: List[Dict], patient_id: str) -> pd.DataFrame:
-    """Normalize raw Nightscout devicestatus JSON → flat DataFrame.
+_DS_FIELD_NAMES = tuple(_extract_loop_ds({}))
 
-    Detects Loop vs oref0 structure and flattens accordingly.
 
-    Sets df.attrs['quality'] with skip counts.
-    """
-    rows = []
-    seen_ids = set()
-    n_dup = 0
-    n_no_ts = 0
-    n_minimal = 0
-
-    for ds in records:
-        did = ds.get('_id')
-        if did and did in seen_ids:
-            n_dup += 1
-            continue
-        if did:
-            seen_ids.add(did)
+def _loop_ds_columns(dss: List[Dict]) -> dict:
+    """Columnar _extract_loop_ds over Loop records; fields left out are None."""
+    loops = [ds['loop'] for ds in dss]
+    iobs = [lp.get('iob', {}) or {} for lp in loops]
+    cobs = [lp.get('cob', {}) or {} for lp in loops]
+    enacted = [lp.get('enacted', {}) or {} for lp in loops]
+    overrides = [ds.get('override', lp.get('override', {})) or {}
+                 for ds, lp in zip(dss, loops)]
+    curves = []
+    for lp in loops:
+        predicted = lp.get('predicted', {}) or {}
+        curves.append(predicted.get('values', []) if isinstance(predicted, dict) else [])
+    stats = _curve_stats(curves)
 
-        ts = _parse_ts(ds, 'created_at', 'timestamp')
-        if ts is None:
-            n_no_ts += 1
-            continue
+    # Enacted duration: Loop uses SECONDS
+    enacted_dur = _float_column([e.get('duration') for e in enacted])
+    if enacted_dur.dtype != object:
+        enacted_dur = enacted_dur / 60.0  # seconds → minutes
+    versions = [lp.get('version') for lp in loops]
+    return {
+        'iob': _float_column([d.get('iob') for d in iobs]),
+        'cob': _float_column([c.get('cob', 0) if c else None for c in cobs]),
+        'enacted_rate': _float_column([e.get('rate') for e in enacted]),
+        'enacted_duration_min': enacted_dur,
+        'enacted_smb': _float_column([e.get('bolusVolume', 0) or 0 if e else None
+                                      for e in enacted]),
+        'enacted_received': [_to_bool(e.get('received')) for e in enacted],
+        'predicted_30': stats[6],
+        'predicted_60': stats[12],
+        'predicted_min': stats['min'],
+        'hypo_risk_count': stats['hypo'],
+        'loop_failure_reason': [lp.get('failureReason') for lp in loops],
+        'loop_version': versions,
+        'recommended_bolus': _float_column([lp.get('recommendedBolus', 0) or 0
+                                            for lp in loops]),
+        'override_active': [bool(o.get('active', False)) for o in overrides],
+        'override_name': [o.get('name') for o in overrides],
+        'override_multiplier': _float_column([o.get('multiplier') for o in overrides]),
+        'algorithm_version': versions,
+    }
 
-        device = ds.get('device', '')
-        controller = _detect_controller(device)
-
-        # Choose extraction strategy based on structure
-        if 'loop' in ds and isinstance(ds.get('loop'), dict):
-            fields = _extract_loop_ds(ds)
-            if controller == 'unknown':
-                controller = 'loop'
-        elif 'openaps' in ds and isinstance(ds.get('openaps'), dict):
-            fields = _extract_oref0_ds(ds)
-            if controller == 'unknown':
-                controller = 'openaps'
-        else:
-            # Minimal record — just pump/uploader info
-            fields = {k: None for k in _extract_loop_ds({}).keys()}
-            n_minimal += 1
-
-        # Pump info (common structure)
-        pump = ds.get('pump', {}) or {}
-        batt = pump.get('battery', {})
-        if isinstance(batt, dict):
-            pump_battery = _safe_float(batt.get('percent'), 'pump_battery_pct')
-        else:
-            pump_battery = None
 
+def _oref0_ds_columns(dss: List[Dict]) -> dict:
+    """Columnar _extract_oref0_ds over oref0 records; fields left out are None."""
+    openaps = [ds['openaps'] for ds in dss]
+    iobs = []
+    for o in openaps:
+        iob_data = o.get('iob', {}) or {}
+        # oref0 may have iob as a list; take first entry
+        iobs.append(iob_data[0] if isinstance(iob_data, list) and iob_data else iob_data)
+    suggested = [o.get('suggested', {}) or {} for o in openaps]
+    enacted = [o.get('enacted', {}) or {} for o in openaps]
+    pred_bgs = [s.get('predBGs', {}) or {} for s in suggested]
+
+    # Select best available prediction curve (same priority as grid.py)
+    best = []
+    for pb in pred_bgs:
+        curve = []
+        for cn in ('COB', 'UAM', 'IOB', 'ZT'):
+            if pb.get(cn):
+                curve = pb[cn]
+                break
+        best.append(curve)
+    stats = _curve_stats(best)
+
+    def pred_at(curve_name):
+        curves = [pb.get(curve_name, []) for pb in pred_bgs]
+        return _float_column([c[6] if len(c) > 6 else None for c in curves])
+
+    def floats(dicts, key):
+        return _float_column([d.get(key) for d in dicts], key)
+
+    def ints(values):
+        return [None if v is None else int(v) for v in values]
+
+    # target_bg: Trio uses 'current_target', AAPS/oref0 uses 'targetBG'
+    target_bg = ints([s.get('targetBG') or s.get('current_target') for s in suggested])
+    bg = ints([s.get('bg') for s in suggested])
+    eventual_bg = ints([s.get('eventualBG') for s in suggested])
+    # Algorithm settings (oref0/Trio DynISF) — 0 = couldn't compute → None
+    isf = [float(s['ISF']) if s.get('ISF') else None for s in suggested]
+
+    # mmol/L → mg/dL for algorithm output fields (see _extract_oref0_ds)
+    mmol = [v is not None and v < 15 for v in isf]
+    if any(mmol):
+        isf = [round(v * MMOLL_TO_MGDL, 1) if m else v for v, m in zip(isf, mmol)]
+
+        def to_mgdl(values):
+            return [round(v * MMOLL_TO_MGDL) if m and v is not None and v < 30 else v
+                    for v, m in zip(values, mmol)]
+        target_bg, bg, eventual_bg = to_mgdl(target_bg), to_mgdl(bg), to_mgdl(eventual_bg)
+
+    versions = [o.get('version') for o in openaps]
+    return {
+        'iob': _float_column([d.get('iob', 0) if d else None for d in iobs]),
+        'basal_iob': floats(iobs, 'basaliob'),
+        'bolussnooze': floats(iobs, 'bolussnooze'),
+        'cob': floats(suggested, 'COB'),
+        'bg': bg,
+        'eventual_bg': eventual_bg,
+        'target_bg': target_bg,
+        'sensitivity_ratio': floats(suggested, 'sensitivityRatio'),
+        'insulin_req': floats(suggested, 'insulinReq'),
+        'suggested_rate': floats(suggested, 'rate'),
+        'suggested_duration_min': floats(suggested, 'duration'),
+        # suggested SMB: oref0 uses 'units', some builds use 'SMBunits'
+        'suggested_smb': _float_column([s.get('units') or s.get('SMBunits')
+                                        for s in suggested]),
+        'enacted_rate': floats(enacted, 'rate'),
+        'enacted_duration_min': floats(enacted, 'duration'),
+        'enacted_smb': _float_column([e.get('units', 0) if e else None for e in enacted]),
+        'enacted_received': [_to_bool(e.get('received')) if e else None
+                             for e in enacted],
+        'predicted_30': stats[6],
+        'predicted_60': stats[12],
+        'predicted_min': stats['min'],
+        'hypo_risk_count': stats['hypo'],
+        'pred_iob_30': pred_at('IOB'),
+        'pred_cob_30': pred_at('COB'),
+        'pred_uam_30': pred_at('UAM'),
+        'pred_zt_30': pred_at('ZT'),
+        'loop_version': versions,
+        'recommended_bolus': floats(openaps, 'recommendedBolus'),
+        'reason': [s.get('reason') for s in suggested],
+        'algorithm_isf': _float_column(isf),
+        'algorithm_cr': _float_column([s['CR'] if s.get('CR') else None
+                                       for s in suggested]),
+        'algorithm_tdd': floats(suggested, 'TDD'),
+        'algorithm_version': versions,
+        'bolus_iob': floats(iobs, 'bolusiob'),
+        'insulin_activity': floats(iobs, 'activity'),
+        'net_basal_insulin': floats(iobs, 'netbasalinsulin'),
+    }
+
+
+def _scatter_ds_fields(n: int, parts: list) -> dict:
+    """(row positions, _*_ds_columns output) parts → full-length field columns."""
+    if len(parts) == 1 and len(parts[0][0]) == n:
+        # One record structure across the batch: columns are already in place
+        cols = parts[0][1]
+        return {name: cols[name] if name in cols else _none_column(n)
+                for name in _DS_FIELD_NAMES}
+    out = {}
+    for name in _DS_FIELD_NAMES:
+        given = [(idx, cols[name]) for idx, cols in parts if name in cols]
+        if any(isinstance(v, np.ndarray) and v.dtype != object for _, v in given):
+            values = np.full(n, np.nan)
+            for idx, v in given:
+                values[idx] = np.asarray(v, dtype=np.float64)
+        else:
+            values = [None] * n
+            for idx, v in given:
+                for i, x in zip(idx.tolist(), v):
+                    values[i] = x
+        out[name] = values if given else _none_column(n)
+    return out
+
+
+def _pump_clock_column(pumps: List[Dict]):
+    """pump.clock per record: Timestamps (naive taken as UTC), None if absent."""
+    clocks = [p['clock'] for p in pumps if 'clock' in p]
+    if not clocks:
+        return _none_column(len(pumps))
+    if all(isinstance(c, str) and c.endswith('Z') for c in clocks):
+        parsed = pd.to_datetime([p.get('clock') for p in pumps], utc=True,
+                                format='ISO8601', errors='coerce')
+        if parsed.notna().sum() == len(clocks):
+            return parsed
+    out = []
+    for pump in pumps:
         pump_clock = None
         if 'clock' in pump:
             try:
@@ -538,32 +825,50 @@ def normalize_devicestatus(records: List[Dict], patient_id: str) -> pd.DataFrame
                     pump_clock = pump_clock.tz_localize('UTC')
             except Exception as exc:
                 logger.debug('Unparseable pump clock %r: %s', pump['clock'], exc)
+        out.append(pump_clock)
+    return out
 
-        # Uploader info
-        uploader = ds.get('uploader', {}) or {}
-        uploader_battery = _safe_float(
-            uploader.get('battery', ds.get('uploaderBattery')),
-            'uploader_battery_pct')
-
-        row = {
-            'patient_id': patient_id,
-            '_id': did,
-            'created_at': ts,
-            'device': device,
-            'controller': controller,
-            **fields,
-            'pump_battery_pct': pump_battery,
-            'pump_reservoir': _safe_float(pump.get('reservoir'), 'pump_reservoir'),
-            'pump_status': pump.get('status', {}).get('status') if isinstance(pump.get('status'), dict) else None,
-            'pump_clock': pump_clock,
-            'uploader_battery_pct': uploader_battery,
-            'utc_offset': _safe_int(ds.get('utcOffset'), 'utcOffset'),
-        }
-        rows.append(row)
+
+def normalize_devicestatus(records: List[Dict], patient_id: str,
+                           seen_ids: Optional[set] = None) -> pd.DataFrame:
+    """Normalize raw Nightscout devicestatus JSON → flat DataFrame.
+
+    Detects Loop vs oref0 structure and flattens accordingly.
+
+    Sets df.attrs['quality'] with skip counts.
+
+    ``seen_ids`` carries the _id set across calls when a collection is
+    normalized batch by batch (see concat_normalized).
+    """
+    seen_ids = set() if seen_ids is None else seen_ids
+    keep = _first_seen([ds.get('_id') for ds in records], seen_ids)
+    n_dup = int((~keep).sum())
+    recs = list(compress(records, keep.tolist()))
+
+    ns = _parse_ts_ns(recs, 'created_at', 'timestamp')
+    has_ts = ns != _NAT
+    n_no_ts = int((~has_ts).sum())
+    recs = list(compress(recs, has_ts.tolist()))
+    ns = ns[has_ts]
+    n = len(recs)
+
+    # Choose extraction strategy based on structure
+    kind = ['loop' if isinstance(ds.get('loop'), dict)
+            else 'openaps' if isinstance(ds.get('openaps'), dict)
+            else None for ds in recs]
+    kinds = np.array(kind, dtype=object)
+    parts = []
+    for name, extract in (('loop', _loop_ds_columns),
+                          ('openaps', _oref0_ds_columns)):
+        idx = np.flatnonzero(kinds == name)
+        if len(idx):
+            parts.append((idx, extract([recs[i] for i in idx.tolist()])))
+    # Minimal records — just pump/uploader info
+    n_minimal = n - sum(len(idx) for idx, _ in parts)
 
     quality = {
         'total_records': len(records),
-        'accepted': len(rows),
+        'accepted': n,
         'skipped_duplicate': n_dup,
         'skipped_no_timestamp': n_no_ts,
         'minimal_records': n_minimal,
@@ -571,20 +876,107 @@ def normalize_devicestatus(records: List[Dict], patient_id: str) -> pd.DataFrame
     if n_no_ts > 0 or n_minimal > 0:
         logger.info('normalize_devicestatus(%s): %d/%d accepted '
                      '(dup=%d, no_ts=%d, minimal=%d)',
-                     patient_id, len(rows), len(records),
+                     patient_id, n, len(records),
                      n_dup, n_no_ts, n_minimal)
 
-    if not rows:
+    if not n:
         df = pd.DataFrame()
         df.attrs['quality'] = quality
         return df
 
-    df = pd.DataFrame(rows)
+    devices = [ds.get('device', '') for ds in recs]
+    detected = {d: _detect_controller(d) for d in set(devices)}
+    controllers = [k if c == 'unknown' and k is not None else c
+                   for c, k in zip(map(detected.__getitem__, devices), kind)]
+
+    # Pump info (common structure)
+    pumps = [ds.get('pump', {}) or {} for ds in recs]
+    batteries = [p.get('battery', {}) for p in pumps]
+    # Uploader info
+    uploader_battery = [(ds.get('uploader', {}) or {}).get('battery', ds.get('uploaderBattery'))
+                        for ds in recs]
+
+    df = pd.DataFrame({
+        'patient_id': patient_id,
+        '_id': [ds.get('_id') for ds in recs],
+        'created_at': pd.to_datetime(ns, unit='ns', utc=True),
+        'device': devices,
+        'controller': controllers,
+        **_scatter_ds_fields(n, parts),
+        'pump_battery_pct': _float_column(
+            [b.get('percent') if isinstance(b, dict) else None for b in batteries],
+            'pump_battery_pct'),
+        'pump_reservoir': _float_column([p.get('reservoir') for p in pumps],
+                                        'pump_reservoir'),
+        'pump_status': [p['status'].get('status') if isinstance(p.get('status'), dict)
+                        else None for p in pumps],
+        'pump_clock': _pump_clock_column(pumps),
+        'uploader_battery_pct': _float_column(uploader_battery, 'uploader_battery_pct'),
+        'utc_offset': _int_values([ds.get('utcOffset') for ds in recs], 'utcOffset'),
+    })
     df = df.sort_values('created_at').reset_index(drop=True)
     df.attrs['quality'] = quality
     return df
 
 
+def concat_normalized(frames: List[pd.DataFrame], time_col: str) -> pd.DataFrame:
+    """Combine per-batch normalize_* results into one collection frame.
+
+    Quality counts are summed, column dtypes are re-inferred (a column
+    that is all-None in one batch is still float/datetime overall) and
+    rows are stably sorted by ``time_col``.
+    """
+    quality: Dict[str, int] = {}
+    for f in frames:
+        for k, v in f.attrs.get('quality', {}).items():
+            quality[k] = quality.get(k, 0) + v
+    parts = [f for f in frames if len(f)]
+    if len(parts) > 1:
+        with warnings.catch_warnings():
+            # all-NA batch columns are meant to defer to the other batches
+            warnings.simplefilter('ignore', FutureWarning)
+            df = pd.concat(parts, ignore_index=True)
+        df = df.infer_objects()
+        df = df.sort_values(time_col, kind='stable').reset_index(drop=True)
+    elif parts:
+        df = parts[0]
+    else:
+        df = frames[0] if frames else pd.DataFrame()
+    df.attrs['quality'] = quality
+    return df
+
+
+def normalize_json_dir(data_path: Union[str, Path], patient_id: str,
+                       grid_source=None,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, pd.DataFrame]:
+    """Stream entries/treatments/devicestatus.json once each → normalized frames.
+
+    Every batch is normalized (deduplicating by _id across batches) and,
+    if given, handed to ``grid_source`` (a grid.GridSource) before it is
+    dropped, so build_grid() needs no second parse. Missing files yield
+    the same empty frames as normalizing an empty list.
+    """
+    data_dir = Path(data_path)
+    out = {}
+    for name, normalize, time_col in (
+            ('entries', normalize_entries, 'date'),
+            ('treatments', normalize_treatments, 'created_at'),
+            ('devicestatus', normalize_devicestatus, 'created_at')):
+        path = data_dir / f'{name}.json'
+        add_to_grid = getattr(grid_source, f'add_{name}', None)
+        seen_ids = set()
+        frames = []
+        if path.exists():
+            for batch in iter_json_batches(path, batch_size):
+                frames.append(normalize(batch, patient_id, seen_ids=seen_ids))
+                if add_to_grid is not None:
+                    add_to_grid(batch)
+        if not frames:
+            frames.append(normalize([], patient_id))
+        out[name] = concat_normalized(frames, time_col)
+    return out
+
+
 # ── Profiles ────────────────────────────────────────────────────────────
 
 
@@ -2,7 +2,14 @@
 ns_fetch.py — Fetch Nightscout data via REST API.
 
 Provides windowed fetching with deduplication for each Nightscout collection.
-Uses 7-day windows to stay within the Nightscout 10K record limit per request.
+Each site gets a ``NightscoutClient``: a small pool of keep-alive
+connections, a token-bucket rate limit and a bounded number of 7-day
+windows in flight. A window that returns a full page (``count`` records,
+10K by default) is split in half until it is complete, and paginated by
+timestamp cursor once it is shorter than a minute — so high-frequency
+uploaders (1-minute Loop devicestatus) are no longer silently truncated.
+``iter_records``/``iter_normalized`` stream window results as they
+arrive; ``client.stats`` reports records/s and bytes/s.
 
 Usage (standalone):
     python -m tools.ns2parquet.ns_fetch \\
@@ -12,17 +19,29 @@ Usage (standalone):
 Usage (as library):
     from tools.ns2parquet.ns_fetch import fetch_entries, fetch_treatments
     entries = fetch_entries(base_url, start_ms, end_ms)
+
+    with NightscoutClient(base_url, concurrency=4, rate=2.0) as client:
+        for df in iter_normalized(client, 'devicestatus', start, end, 'a'):
+            ...
+        print(client.stats.summary())
 """
 
+import dataclasses
+import gzip
+import http.client
 import json
 import logging
+import queue
+import threading
 import time
 import urllib.error
 import urllib.request
 import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -111,113 +130,507 @@ def fetch_json(url: str, params: Optional[dict] = None,
     raise last_exc  # pragma: no cover
 
 
+# ── Concurrent, pooled fetch engine ──────────────────────────────────
+
+_PAGE_SIZE = 10000                    # Nightscout per-request record cap
+_WINDOW_MS = 7 * 86400 * 1000         # initial window span
+_MIN_SPLIT_MS = 60 * 1000             # below this, paginate instead of split
+_DEFAULT_CONCURRENCY = 4              # in-flight windows per site
+_DEFAULT_RATE = 1.0 / _INTER_REQUEST_SLEEP   # requests/s per site
+
+
+class _TokenBucket:
+    """Thread-safe token bucket: ``rate`` requests/s, bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchDeadline(TimeoutError):
+    """A client's ``deadline`` passed before its fetch finished."""
+
+
+@dataclass
+class FetchStats:
+    """Per-site transfer counters (thread-safe via ``NightscoutClient``).
+
+    ``seconds`` is wall-clock time with at least one windowed fetch in
+    progress: fetches running concurrently on one client count once.
+    """
+    requests: int = 0
+    records: int = 0
+    bytes: int = 0
+    retries: int = 0
+    splits: int = 0
+    pages: int = 0
+    seconds: float = 0.0
+
+    @property
+    def records_per_s(self) -> float:
+        return self.records / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f'{self.records:,} records, {self.bytes / 1e6:.1f} MB in '
+                f'{self.requests} requests, {self.seconds:.1f}s '
+                f'({self.records_per_s:,.0f} rec/s, '
+                f'{self.bytes_per_s / 1e3:,.0f} kB/s; '
+                f'{self.splits} splits, {self.pages} extra pages, '
+                f'{self.retries} retries)')
+
+
+class NightscoutClient:
+    """Keep-alive HTTP client for one Nightscout site.
+
+    Holds up to ``concurrency`` persistent connections, shares one token
+    bucket (``rate`` requests/s) between them and accumulates
+    :class:`FetchStats`. Safe to use from several threads.
+
+    Args:
+        base_url: Site URL (no trailing slash; a ``?token=`` is honoured).
+        token: Readable token; overrides one embedded in ``base_url``.
+        concurrency: Windows fetched in parallel.
+        rate: Request rate limit per site; 0 disables limiting.
+        page_size: ``count`` sent with every windowed query.
+        timeout: Socket timeout in seconds.
+        deadline: ``time.monotonic()`` value after which requests raise
+            :class:`FetchDeadline` (socket timeouts are shortened to fit).
+            Works from any thread, unlike ``signal.alarm``.
+    """
+
+    def __init__(self, base_url: str, token: Optional[str] = None,
+                 concurrency: int = _DEFAULT_CONCURRENCY,
+                 rate: float = _DEFAULT_RATE,
+                 page_size: int = _PAGE_SIZE,
+                 timeout: float = 30.0,
+                 deadline: Optional[float] = None):
+        base_url, url_token = parse_ns_url(base_url)
+        self.base_url = base_url
+        self.token = token or url_token
+        self.concurrency = max(1, int(concurrency))
+        self.page_size = int(page_size)
+        self.timeout = timeout
+        self.deadline = deadline
+        parsed = urllib.parse.urlparse(base_url)
+        self._https = parsed.scheme == 'https'
+        self._host = parsed.netloc
+        self._prefix = parsed.path.rstrip('/')
+        self._pool: 'queue.LifoQueue' = queue.LifoQueue()
+        self._bucket = _TokenBucket(rate, burst=self.concurrency)
+        self._lock = threading.Lock()
+        self._active = 0                 # windowed fetches in progress
+        self._active_since = 0.0
+        self.stats = FetchStats()
+
+    # -- connections --
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = (http.client.HTTPSConnection if self._https
+               else http.client.HTTPConnection)
+        return cls(self._host, timeout=self.timeout)
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        if self._pool.qsize() < self.concurrency:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self) -> 'NightscoutClient':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _budget(self) -> float:
+        """Socket timeout for the next request; raises past the deadline."""
+        if self.deadline is None:
+            return self.timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise FetchDeadline(f'{self.base_url}: deadline exceeded')
+        return min(self.timeout, remaining)
+
+    def _sleep(self, seconds: float) -> None:
+        if self.deadline is not None and \
+                time.monotonic() + seconds >= self.deadline:
+            raise FetchDeadline(f'{self.base_url}: deadline exceeded '
+                                f'while backing off')
+        time.sleep(seconds)
+
+    def _begin_fetch(self) -> None:
+        with self._lock:
+            if self._active == 0:
+                self._active_since = time.perf_counter()
+            self._active += 1
+
+    def _end_fetch(self) -> None:
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.stats.seconds += time.perf_counter() - self._active_since
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                setattr(self.stats, key, getattr(self.stats, key) + value)
+
+    # -- requests --
+
+    def get_json(self, path: str, params: Optional[dict] = None) -> Any:
+        """GET ``path`` on the site; same retry policy as :func:`fetch_json`."""
+        all_params = dict(params or {})
+        if self.token:
+            all_params['token'] = self.token
+        target = self._prefix + path
+        if all_params:
+            target += '?' + urllib.parse.urlencode(all_params)
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip',
+                   'Connection': 'keep-alive'}
+
+        for attempt in range(_MAX_RETRIES + 1):
+            self._bucket.acquire()
+            budget = self._budget()
+            conn = self._checkout()
+            conn.timeout = budget
+            if conn.sock is not None:
+                conn.sock.settimeout(budget)
+            try:
+                conn.request('GET', target, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()                     # stale keep-alive or network
+                if attempt < _MAX_RETRIES:
+                    wait = _RETRY_BACKOFF[min(attempt, len(_RETRY_BACKOFF) - 1)]
+                    logger.info('Network error on %s — retry %d/%d in %ds: %s',
+                                path, attempt + 1, _MAX_RETRIES, wait, e)
+                    self._count(retries=1)
+                    self._sleep(wait)
+                    continue
+                raise
+            self._count(requests=1, bytes=len(body))
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            if resp.status in _RETRYABLE_CODES and attempt < _MAX_RETRIES:
+                wait = _RETRY_BACKOFF[min(attempt, len(_RETRY_BACKOFF) - 1)]
+                retry_after = resp.getheader('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    wait = max(wait, int(retry_after))
+                logger.info('HTTP %d on %s — retry %d/%d in %ds',
+                            resp.status, path, attempt + 1, _MAX_RETRIES, wait)
+                self._count(retries=1)
+                self._sleep(wait)
+                continue
+            if resp.status >= 400:
+                raise urllib.error.HTTPError(
+                    self.base_url + target, resp.status, resp.reason,
+                    resp.headers, None)
+            if resp.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            return json.loads(body)
+        raise RuntimeError('unreachable')  # pragma: no cover
+
+    # -- windowed collections --
+
+    def iter_windows(self, endpoint: str, time_field: str, start_ms: int,
+                     end_ms: int, date_mode: str = 'iso',
+                     window_ms: int = _WINDOW_MS) -> Iterator[List[Dict]]:
+        """Yield record chunks for ``[start_ms, end_ms)`` as windows complete.
+
+        Windows are fetched ``concurrency`` at a time. A window that comes
+        back with exactly ``page_size`` records may have been truncated:
+        it is split in half (both halves re-queued) until it is shorter
+        than a minute, after which it is paginated with a ``$lte`` cursor
+        on the oldest timestamp seen. Chunks may overlap at cursor
+        boundaries; deduplicate by ``_id``.
+        """
+        bounds = []
+        cursor = end_ms
+        while cursor > start_ms:
+            bounds.append((max(start_ms, cursor - window_ms), cursor))
+            cursor -= window_ms
+        self._begin_fetch()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency,
+                                  thread_name_prefix='ns-fetch')
+        try:
+            pending = {pool.submit(self._window, endpoint, time_field,
+                                   lo, hi, date_mode): (lo, hi)
+                       for lo, hi in bounds}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    lo, hi = pending.pop(fut)
+                    chunk = fut.result()
+                    if len(chunk) < self.page_size:
+                        self._count(records=len(chunk))
+                        yield chunk
+                    elif hi - lo > _MIN_SPLIT_MS:
+                        mid = lo + (hi - lo) // 2
+                        self._count(splits=1)
+                        for sub in ((lo, mid), (mid, hi)):
+                            pending[pool.submit(self._window, endpoint,
+                                                time_field, *sub,
+                                                date_mode)] = sub
+                    else:
+                        for page in self._paginate(endpoint, time_field,
+                                                   lo, chunk, date_mode):
+                            self._count(records=len(page))
+                            yield page
+        finally:
+            # Don't wait for queued windows if the consumer stopped early
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._end_fetch()
+
+    def _params(self, time_field: str, lo, hi, date_mode: str,
+                upper_op: str = '$lt') -> dict:
+        if date_mode == 'iso':
+            lo, hi = (_iso_ms(v) if isinstance(v, (int, float)) else v
+                      for v in (lo, hi))
+        return {f'find[{time_field}][$gte]': lo,
+                f'find[{time_field}][{upper_op}]': hi,
+                'count': self.page_size}
+
+    def _window(self, endpoint, time_field, lo, hi, date_mode) -> List[Dict]:
+        return self.get_json(endpoint,
+                             self._params(time_field, lo, hi, date_mode))
+
+    def _paginate(self, endpoint, time_field, lo, first, date_mode):
+        """Cursor-page a sub-minute window that still fills a page."""
+        page = first
+        while True:
+            yield page
+            if len(page) < self.page_size:
+                return
+            stamps = [ms for ms in (_record_ms(r.get(time_field)) for r in page)
+                      if ms is not None]
+            if not stamps:
+                logger.warning('%s: no parseable %s in a full page — '
+                               'cannot paginate further', endpoint, time_field)
+                return
+            oldest = min(stamps)
+            nxt = self.get_json(endpoint, self._params(
+                time_field, lo, oldest, date_mode, upper_op='$lte'))
+            self._count(pages=1)
+            if {r.get('_id') for r in nxt} <= {r.get('_id') for r in page}:
+                logger.warning('%s: more than %d records at %s — '
+                               'cannot paginate further', endpoint,
+                               self.page_size, oldest)
+                return
+            page = nxt
+
+
+def _iso_ms(ms: int) -> str:
+    """Epoch ms → Nightscout ISO string (ms precision, ``Z`` suffix)."""
+    dt = datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f'{int(ms) % 1000:03d}Z'
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _record_ms(value) -> Optional[int]:
+    """A record's epoch-ms number or ISO 8601 string → epoch ms, rounded up.
+
+    ISO strings may carry any UTC offset and sub-ms precision, so they
+    only order correctly once parsed. None if missing or unparseable.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    us = (dt - _EPOCH) // timedelta(microseconds=1)
+    return -(-us // 1000)
+
+
+def _to_ms(value) -> int:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+def iter_records(base_url: str, endpoint: str, time_field: str, start, end,
+                 date_mode: str = 'iso', token: Optional[str] = None,
+                 client: Optional[NightscoutClient] = None,
+                 id_field: str = '_id') -> Iterator[List[Dict]]:
+    """Stream de-duplicated record chunks of one collection.
+
+    ``start``/``end`` are epoch ms or datetimes. Each record is yielded
+    once (by ``id_field``), in window completion order — not sorted.
+    """
+    own = client is None
+    if own:
+        client = NightscoutClient(base_url, token=token)
+    seen = set()
+    try:
+        for chunk in client.iter_windows(endpoint, time_field, _to_ms(start),
+                                         _to_ms(end), date_mode):
+            fresh = []
+            for rec in chunk:
+                rid = rec.get(id_field, id(rec))
+                if rid not in seen:
+                    seen.add(rid)
+                    fresh.append(rec)
+            if fresh:
+                yield fresh
+    finally:
+        if own:
+            client.close()
+
+
+_COLLECTIONS = {
+    # name: (endpoint, time field, date mode)
+    'entries': ('/api/v1/entries.json', 'date', 'epoch'),
+    'treatments': ('/api/v1/treatments.json', 'created_at', 'iso'),
+    'devicestatus': ('/api/v1/devicestatus.json', 'created_at', 'iso'),
+}
+
+
+def iter_normalized(client: NightscoutClient, collection: str, start, end,
+                    patient_id: str, grid_source=None) -> Iterator['pd.DataFrame']:
+    """Stream normalized DataFrames of ``collection`` as windows arrive.
+
+    Each window's records go straight to the collection's normalizer (and,
+    if given, to ``grid_source``, a grid.GridSource), so the raw JSON of
+    the whole range is never held at once.
+    """
+    from . import normalize
+    endpoint, time_field, date_mode = _COLLECTIONS[collection]
+    fn = getattr(normalize, f'normalize_{collection}')
+    add_to_grid = getattr(grid_source, f'add_{collection}', None)
+    for chunk in iter_records(client.base_url, endpoint, time_field,
+                              start, end, date_mode, client=client):
+        if add_to_grid is not None:
+            add_to_grid(chunk)
+        yield fn(chunk, patient_id)
+
+
 def _fetch_windowed(base_url: str, endpoint: str, id_field: str,
                     sort_field: str, start, end,
                     date_mode: str = 'iso',
                     verbose: bool = False,
                     label: str = '',
-                    token: Optional[str] = None) -> List[Dict]:
-    """Fetch records in 7-day windows with deduplication.
+                    token: Optional[str] = None,
+                    client: Optional[NightscoutClient] = None) -> List[Dict]:
+    """Fetch records in concurrent windows with deduplication.
 
     Args:
         base_url: Nightscout base URL (no trailing slash, no query string).
         endpoint: API path (e.g., '/api/v1/entries.json')
         id_field: Field name for deduplication (typically '_id')
-        sort_field: Field to sort results by
+        sort_field: Field to sort results by (also the window filter field)
         start: Start of range (epoch ms for 'epoch' mode, datetime for 'iso')
         end: End of range (epoch ms for 'epoch' mode, datetime for 'iso')
         date_mode: 'epoch' for epoch milliseconds, 'iso' for ISO 8601 strings
         verbose: Print progress
         label: Display label for progress messages
         token: Nightscout readable token (passed through to each request).
+        client: Shared :class:`NightscoutClient` (pool, rate limit, stats);
+            a private one is created when omitted.
 
     Returns:
-        Deduplicated, sorted list of records
+        Deduplicated list of records, newest first
     """
-    all_records = []
-
-    if date_mode == 'epoch':
-        window = 7 * 86400 * 1000  # 7 days in ms
-        cursor = end
-        while cursor > start:
-            win_start = max(start, cursor - window)
-            if verbose:
-                d1 = datetime.fromtimestamp(win_start / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
-                d2 = datetime.fromtimestamp(cursor / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
-                print(f'  {label} {d1} → {d2}...', end='', flush=True)
-
-            params = {
-                'find[date][$gte]': int(win_start),
-                'find[date][$lt]': int(cursor),
-                'count': 10000,
-            }
-            chunk = fetch_json(f'{base_url}{endpoint}', params, token=token)
-            if verbose:
-                print(f' {len(chunk)} records')
-            all_records.extend(chunk)
-            cursor -= window
-            time.sleep(_INTER_REQUEST_SLEEP)
-    else:
-        window = timedelta(days=7)
-        cursor = end
-        while cursor > start:
-            win_start = max(start, cursor - window)
-            if verbose:
-                print(f'  {label} {win_start.strftime("%Y-%m-%d")} → '
-                      f'{cursor.strftime("%Y-%m-%d")}...', end='', flush=True)
-
-            params = {
-                'find[created_at][$gte]': win_start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
-                'find[created_at][$lt]': cursor.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
-                'count': 10000,
-            }
-            chunk = fetch_json(f'{base_url}{endpoint}', params, token=token)
-            if verbose:
-                print(f' {len(chunk)} records')
-            all_records.extend(chunk)
-            cursor -= window
-            time.sleep(_INTER_REQUEST_SLEEP)
-
-    # Deduplicate by id_field
-    seen = set()
+    own = client is None
+    if own:
+        client = NightscoutClient(base_url, token=token)
+    before = dataclasses.replace(client.stats)
     unique = []
-    for rec in all_records:
-        rid = rec.get(id_field, id(rec))
-        if rid not in seen:
-            seen.add(rid)
-            unique.append(rec)
+    try:
+        for chunk in iter_records(base_url, endpoint, sort_field, start, end,
+                                  date_mode, client=client, id_field=id_field):
+            unique.extend(chunk)
+    finally:
+        if own:
+            client.close()
+    if verbose:
+        after = client.stats
+        print(f'  {label}: {len(unique):,} records, '
+              f'{after.requests - before.requests} requests '
+              f'({after.splits - before.splits} splits, '
+              f'{after.pages - before.pages} extra pages)')
     unique.sort(key=lambda x: x.get(sort_field, 0), reverse=True)
     return unique
 
 
 def fetch_entries(base_url: str, start_ms: int, end_ms: int,
                   verbose: bool = False,
-                  token: Optional[str] = None) -> List[Dict]:
-    """Fetch CGM entries in 7-day windows (NS has a 10K record limit)."""
+                  token: Optional[str] = None,
+                  client: Optional[NightscoutClient] = None) -> List[Dict]:
+    """Fetch CGM entries in concurrent 7-day windows (split when full)."""
     return _fetch_windowed(
         base_url, '/api/v1/entries.json', '_id', 'date',
         start_ms, end_ms, date_mode='epoch',
         verbose=verbose, label='entries', token=token,
+        client=client,
     )
 
 
 def fetch_treatments(base_url: str, start_dt: datetime, end_dt: datetime,
                      verbose: bool = False,
-                     token: Optional[str] = None) -> List[Dict]:
-    """Fetch treatments in 7-day windows."""
+                     token: Optional[str] = None,
+                     client: Optional[NightscoutClient] = None) -> List[Dict]:
+    """Fetch treatments in concurrent 7-day windows."""
     return _fetch_windowed(
         base_url, '/api/v1/treatments.json', '_id', 'created_at',
         start_dt, end_dt, date_mode='iso',
         verbose=verbose, label='treatments', token=token,
+        client=client,
     )
 
 
 def fetch_devicestatus(base_url: str, start_dt: datetime, end_dt: datetime,
                        verbose: bool = False,
-                       token: Optional[str] = None) -> List[Dict]:
-    """Fetch devicestatus in 7-day windows."""
+                       token: Optional[str] = None,
+                       client: Optional[NightscoutClient] = None) -> List[Dict]:
+    """Fetch devicestatus in concurrent 7-day windows."""
     return _fetch_windowed(
         base_url, '/api/v1/devicestatus.json', '_id', 'created_at',
         start_dt, end_dt, date_mode='iso',
         verbose=verbose, label='devicestatus', token=token,
+        client=client,
     )
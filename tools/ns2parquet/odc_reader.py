@@ -0,0 +1,565 @@
+"""
+odc_reader.py — Direct columnar conversion of OpenAPS Data Commons patients.
+
+odc_loader.load_odc_patient() turns every ODC part into nested Nightscout
+documents — including one dict per row of the flattened devicestatus
+CSV — and write_odc_as_nightscout() dumps those to JSON so build_grid()
+can parse them again and flatten them back into columns. Here each part
+is read once and goes straight to the normalizers and a grid.GridSource:
+
+- AAPS uploads (BgReadings.json, APSData.json …) are converted in memory
+  by odc_loader and handed over without a JSON round trip;
+- Nightscout-export JSON is streamed in batches (json_stream) and
+  deduplicated by _id across the date-ranged files;
+- flattened devicestatus CSVs are read in row chunks with pandas, only
+  the ``openaps/suggested|enacted|iob/*`` and ``predBGs/<curve>/<i>``
+  columns, which are mapped as arrays onto the devicestatus table and the
+  grid fields.
+
+The output matches normalizing and gridding the odc_loader documents.
+convert_odc_patients() runs patients in worker processes and yields their
+frames in input order, with at most ``2 × workers`` patients in flight,
+so memory stays bounded on the full corpus.
+
+Usage:
+    from tools.ns2parquet.odc_reader import convert_odc_patients
+    for odc_pid, frames, error in convert_odc_patients(patients, workers=8):
+        write_parquet(frames['grid'], 'output', 'grid', append=True)
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import MMOLL_TO_MGDL
+from .grid import GridSource, _NAT, _utc_ns, build_grid
+from .json_stream import DEFAULT_BATCH_SIZE, iter_json_batches
+from .normalize import (
+    _detect_controller, concat_normalized, normalize_devicestatus,
+    normalize_entries, normalize_profiles, normalize_treatments,
+)
+from .odc_loader import (
+    _discover_ns_export_files, _discover_uploads, _load_aaps_format,
+)
+
+logger = logging.getLogger(__name__)
+
+CSV_CHUNK_ROWS = 20_000          # devicestatus CSV rows parsed at a time
+_PRED_CURVES = ('COB', 'UAM', 'IOB', 'ZT')   # grid.py priority order
+
+# Scalar openaps fields read from the flattened CSV, by group
+_SUGGESTED = ('bg', 'eventualBG', 'targetBG', 'current_target', 'insulinReq',
+              'rate', 'duration', 'units', 'SMBunits', 'COB', 'IOB',
+              'sensitivityRatio', 'ISF', 'CR', 'TDD')
+_ENACTED = ('rate', 'duration', 'units')
+_IOB = ('iob', 'basaliob', 'bolussnooze', 'bolusiob', 'activity',
+        'netbasalinsulin')
+
+
+# ── Patient conversion ───────────────────────────────────────────────
+
+def convert_odc_patient(patient_dir: str, patient_id: str,
+                        skip_grid: bool = False, verbose: bool = False,
+                        ) -> Optional[Dict[str, pd.DataFrame]]:
+    """Normalized tables (and grid) for one ODC patient directory.
+
+    Returns a dict with 'entries', 'treatments', 'devicestatus',
+    'profiles' and 'grid' (None when skipped or not buildable), or None
+    when the directory has no recognized format or no CGM entries —
+    the cases where load_odc_patient() returns None.
+    """
+    source = GridSource()
+    uploads = _discover_uploads(patient_dir)
+    if uploads:
+        frames = _read_aaps(patient_dir, uploads, patient_id, source, verbose)
+    else:
+        ns_files = _discover_ns_export_files(patient_dir)
+        if not ns_files:
+            if verbose:
+                print(f'  SKIP: no recognized format in {patient_dir}')
+            return None
+        frames = _read_ns_export(patient_dir, ns_files, patient_id, source,
+                                 verbose)
+    if frames is None:
+        return None
+
+    grid = None
+    if not skip_grid:
+        grid = build_grid(patient_dir, patient_id, verbose=verbose,
+                          source=source)
+    frames['grid'] = grid
+    return frames
+
+
+def _read_aaps(patient_dir: str, uploads: List[Path], patient_id: str,
+               source: GridSource, verbose: bool) -> Optional[Dict[str, pd.DataFrame]]:
+    data = _load_aaps_format(patient_dir, uploads, verbose)
+    if data is None:
+        return None
+    source.add_entries(data['entries'])
+    source.add_treatments(data['treatments'])
+    source.add_devicestatus(data['devicestatus'])
+    source.profile = data['profile']
+    return {
+        'entries': normalize_entries(data['entries'], patient_id),
+        'treatments': normalize_treatments(data['treatments'], patient_id),
+        'devicestatus': normalize_devicestatus(data['devicestatus'], patient_id),
+        'profiles': normalize_profiles(data['profile'], patient_id),
+    }
+
+
+def _read_ns_export(patient_dir: str, ns_files: Dict[str, List[Path]],
+                    patient_id: str, source: GridSource,
+                    verbose: bool) -> Optional[Dict[str, pd.DataFrame]]:
+    """Stream {pid}_{collection}_{range}.json parts into frames + ``source``."""
+    if verbose:
+        total = sum(len(v) for v in ns_files.values())
+        colls = ', '.join(f'{k}={len(v)}' for k, v in ns_files.items())
+        print(f'  Found {total} Nightscout-export file(s): {colls}')
+
+    frames = {}
+    counts = {}
+    for name, normalize, time_col in (
+            ('entries', normalize_entries, 'date'),
+            ('treatments', normalize_treatments, 'created_at'),
+            ('devicestatus', normalize_devicestatus, 'created_at')):
+        add_to_grid = getattr(source, f'add_{name}')
+        seen_ids = set()
+        parts = []
+        n = 0
+        for batch in _iter_dedup(ns_files.get(name, [])):
+            parts.append(normalize(batch, patient_id, seen_ids=seen_ids))
+            add_to_grid(batch)
+            n += len(batch)
+        if name == 'entries' and not n:
+            if verbose:
+                print(f'  SKIP: no entries in {patient_dir}')
+            return None
+        if name == 'devicestatus' and not n:
+            # No devicestatus JSON: try the flattened CSV parts
+            frames[name] = read_devicestatus_csv(patient_dir, patient_id,
+                                                 source, verbose)
+            counts[name] = frames[name].attrs['quality'].get('total_records', 0)
+            continue
+        frames[name] = (concat_normalized(parts, time_col) if parts
+                        else normalize([], patient_id))
+        counts[name] = n
+
+    profile = [r for batch in _iter_dedup(ns_files.get('profile', []))
+               for r in batch]
+    counts['profile'] = len(profile)
+    source.profile = profile
+    frames['profiles'] = normalize_profiles(profile, patient_id)
+
+    if verbose:
+        for k, v in counts.items():
+            if v:
+                print(f'  {k}: {v} records')
+    return frames
+
+
+def _iter_dedup(paths: List[Path],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[dict]]:
+    """Batches of dict records from JSON files, first occurrence of each _id only."""
+    seen_ids = set()
+    for fp in paths:
+        try:
+            for batch in iter_json_batches(fp, batch_size):
+                out = []
+                for r in batch:
+                    if not isinstance(r, dict):
+                        continue
+                    rid = r.get('_id')
+                    if rid:
+                        if rid in seen_ids:
+                            continue
+                        seen_ids.add(rid)
+                    out.append(r)
+                if out:
+                    yield out
+        except (ValueError, IOError):
+            logger.warning('Failed to read %s', fp)
+
+
+# ── Flattened devicestatus CSV ───────────────────────────────────────
+
+def _csv_parts(patient_dir: str) -> List[str]:
+    paths = []
+    for root, dirs, files in os.walk(patient_dir):
+        for fn in sorted(files):
+            if fn.endswith('.csv') and 'devicestatus' in root.lower():
+                paths.append(os.path.join(root, fn))
+    return paths
+
+
+class _CSVLayout:
+    """Column groups of one flattened devicestatus CSV header.
+
+    Mirrors odc_loader._load_flattened_devicestatus_csv: ``sug``/``ena``/
+    ``iob`` are the scalar columns of each openaps group (a group is
+    present when any of them is non-empty), ``pred`` maps each suggested
+    predBGs curve to its index-ordered columns.
+    """
+
+    def __init__(self, cols: List[str]):
+        self.sug = [c for c in cols
+                    if c.startswith('openaps/suggested/') and 'predBGs' not in c]
+        self.ena = [c for c in cols
+                    if c.startswith('openaps/enacted/')
+                    and 'predBGs' not in c and 'requested' not in c]
+        self.iob = [c for c in cols
+                    if c.startswith('openaps/iob/')
+                    and 'iobWithZeroTemp' not in c and 'lastTemp' not in c]
+        pred: Dict[str, Dict[int, str]] = {}
+        for c in cols:
+            parts = c.split('/')
+            if 'predBGs' not in c or len(parts) < 5 or parts[1] != 'suggested':
+                continue
+            try:
+                pred.setdefault(parts[3], {})[int(parts[4])] = c
+            except ValueError:
+                continue
+        self.pred = {curve: [m[i] for i in sorted(m)] for curve, m in pred.items()}
+        meta = [c for c in ('_id', 'created_at', 'device') if c in cols]
+        self.usecols = list(dict.fromkeys(
+            meta + self.sug + self.ena + self.iob
+            + [c for cs in self.pred.values() for c in cs]))
+
+
+def read_devicestatus_csv(patient_dir: str, patient_id: str,
+                          grid_source: Optional[GridSource] = None,
+                          verbose: bool = False,
+                          chunk_rows: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """Normalized devicestatus from ODC flattened CSV parts, read columnar.
+
+    Same rows and values as normalize_devicestatus() over
+    odc_loader._load_flattened_devicestatus_csv(), without building a
+    dict per row. Grid fields of records with IOB go to ``grid_source``.
+    Sets df.attrs['quality'] like normalize_devicestatus.
+    """
+    paths = _csv_parts(patient_dir)
+    if verbose and paths:
+        print(f'  Found {len(paths)} devicestatus CSV parts')
+
+    seen_ids: set = set()
+    frames = []
+    for path in paths:
+        try:
+            layout = _CSVLayout(list(pd.read_csv(path, nrows=0).columns))
+            for chunk in pd.read_csv(path, dtype=str, keep_default_na=False,
+                                     na_filter=False, usecols=layout.usecols,
+                                     chunksize=chunk_rows):
+                df, grid_ns, grid_fields = _map_csv_chunk(
+                    chunk, layout, patient_id, seen_ids)
+                frames.append(df)
+                if grid_source is not None:
+                    grid_source.add_devicestatus_columns(
+                        grid_ns, grid_fields,
+                        n_records=df.attrs['quality']['total_records'])
+        except Exception as e:
+            logger.warning('Failed to read %s: %s', path, e)
+            continue
+
+    df = concat_normalized(frames, 'created_at')
+    if verbose:
+        print(f'  Parsed {df.attrs["quality"].get("total_records", 0)} '
+              f'devicestatus records with algorithm data '
+              f'(from {len(seen_ids)} unique)')
+    return df
+
+
+def _cell_number(col: pd.Series) -> np.ndarray:
+    return pd.to_numeric(col, errors='coerce').to_numpy(np.float64)
+
+
+def _map_csv_chunk(chunk: pd.DataFrame, layout: _CSVLayout, patient_id: str,
+                   seen_ids: set) -> Tuple[pd.DataFrame, np.ndarray, dict]:
+    """One CSV chunk → (devicestatus rows, grid ns, grid fields of rows with IOB).
+
+    The rows frame carries normalize_devicestatus-style quality attrs.
+    """
+    n_all = len(chunk)
+    ids = (chunk['_id'] if '_id' in chunk else pd.Series([''] * n_all, index=chunk.index))
+    has_id = (ids != '').to_numpy()
+    dup = has_id & (ids.duplicated().to_numpy() | ids.isin(seen_ids).to_numpy())
+    seen_ids.update(ids[has_id & ~dup])
+
+    nonempty = chunk != ''
+
+    def any_of(cols):
+        return (nonempty[cols].to_numpy().any(axis=1) if cols
+                else np.zeros(n_all, dtype=bool))
+
+    keep = ~dup & (any_of(layout.sug[:3]) | any_of(layout.ena[:3]))
+    chunk = chunk[keep]
+    nonempty = nonempty[keep]
+    n = len(chunk)
+    empty = np.zeros(n, dtype=bool)
+    nan = np.full(n, np.nan)
+
+    def group(prefix, keys, cols):
+        present, values = {}, {}
+        for k in keys:
+            c = prefix + k
+            if c in cols:
+                present[k] = nonempty[c].to_numpy()
+                values[k] = _cell_number(chunk[c])
+            else:
+                present[k], values[k] = empty, nan
+        return present, values
+
+    sug_any = nonempty[layout.sug].to_numpy().any(axis=1) if layout.sug else empty
+    ena_any = nonempty[layout.ena].to_numpy().any(axis=1) if layout.ena else empty
+    iob_any = nonempty[layout.iob].to_numpy().any(axis=1) if layout.iob else empty
+    sp, sv = group('openaps/suggested/', _SUGGESTED, layout.sug)
+    ep, ev = group('openaps/enacted/', _ENACTED, layout.ena)
+    ip, iv = group('openaps/iob/', _IOB, layout.iob)
+
+    def val(p, v, k):
+        return np.where(p[k], v[k], np.nan)
+
+    # predBGs: each curve runs up to its first empty/non-numeric cell and
+    # only exists when the suggested group does
+    curves = {}
+    for curve, cols in layout.pred.items():
+        m = np.column_stack([_cell_number(chunk[c]) for c in cols]) if n else \
+            np.empty((0, len(cols)))
+        valid = ~np.isnan(m)
+        length = np.where(valid.all(axis=1), m.shape[1], valid.argmin(axis=1))
+        length = np.where(sug_any, length, 0)
+        m[np.arange(m.shape[1]) >= length[:, None]] = np.nan
+        curves[curve] = (m, length)
+
+    def at(curve, i):
+        if curve not in curves:
+            return nan
+        m, length = curves[curve]
+        return m[:, i] if m.shape[1] > i else nan
+
+    best = np.full(n, -1)
+    for j, curve in reversed(list(enumerate(_PRED_CURVES))):
+        if curve in curves:
+            best = np.where(curves[curve][1] > 0, j, best)
+    pred_30, pred_60, pred_min = nan.copy(), nan.copy(), nan.copy()
+    hypo = np.zeros(n)
+    for j, curve in enumerate(_PRED_CURVES):
+        sel = best == j
+        if not sel.any():
+            continue
+        m = curves[curve][0][sel]
+        pred_30[sel] = at(curve, 6)[sel]
+        pred_60[sel] = at(curve, 12)[sel]
+        pred_min[sel] = np.nanmin(m, axis=1)
+        hypo[sel] = (m < 70).sum(axis=1)
+    has_curve = best >= 0
+
+    created = chunk['created_at'] if 'created_at' in chunk else pd.Series([''] * n)
+    created_ns = _utc_ns(created.tolist()) if n else np.empty(0, dtype=np.int64)
+
+    # ── Grid fields (grid._devicestatus_row on the same record) ──
+    iob_val = np.where(ip['iob'], iv['iob'], np.where(sp['IOB'], sv['IOB'], np.nan))
+    with_iob = ip['iob'] | sp['IOB']
+    isf = val(sp, sv, 'ISF')
+    cr = val(sp, sv, 'CR')
+    grid_fields = {
+        'iob': iob_val,
+        'cob': np.where(sp['COB'], sv['COB'], 0.0),
+        'predicted_30': pred_30,
+        'predicted_60': pred_60,
+        'predicted_min': pred_min,
+        'hypo_risk': hypo,
+        'recommended_bolus': np.zeros(n),
+        'enacted_rate': val(ep, ev, 'rate'),
+        'enacted_bolus': np.where(ep['units'], ev['units'], 0.0),
+        'eventual_bg': val(sp, sv, 'eventualBG'),
+        'sensitivity_ratio': val(sp, sv, 'sensitivityRatio'),
+        'insulin_req': val(sp, sv, 'insulinReq'),
+        'algorithm_isf': np.where(isf == 0, np.nan, isf),
+        'algorithm_cr': np.where(cr == 0, np.nan, cr),
+        'algorithm_tdd': val(sp, sv, 'TDD'),
+        'bolus_iob': val(ip, iv, 'bolusiob'),
+        'insulin_activity': val(ip, iv, 'activity'),
+    }
+    grid_fields = {k: v[with_iob] for k, v in grid_fields.items()}
+    grid_ns = created_ns[with_iob]
+
+    # ── Devicestatus rows (normalize._extract_oref0_ds) ──
+    def opt(mask, values):
+        return [v if m else None for m, v in zip(mask.tolist(), values.tolist())]
+
+    def first_truthy(k1, k2):
+        # `a or b` on dict lookups: a unless missing or 0
+        use1 = sp[k1] & (sv[k1] != 0)
+        return use1 | sp[k2], np.where(use1, sv[k1], sv[k2])
+
+    target_p, target_v = first_truthy('targetBG', 'current_target')
+    smb_p, smb_v = first_truthy('units', 'SMBunits')
+    isf_p = sp['ISF'] & (sv['ISF'] != 0)
+    cr_p = sp['CR'] & (sv['CR'] != 0)
+
+    # mmol/L algorithm output → mg/dL (ISF < 15 heuristic)
+    mmol = isf_p & (sv['ISF'] < 15)
+    isf_out = np.array([round(v * MMOLL_TO_MGDL, 1) if m else v
+                        for m, v in zip(mmol.tolist(), sv['ISF'].tolist())])
+    bg, ebg, tbg = (np.trunc(v) for v in (sv['bg'], sv['eventualBG'], target_v))
+    bg = np.where(mmol & (bg < 30), np.round(bg * MMOLL_TO_MGDL), bg)
+    ebg = np.where(mmol & (ebg < 30), np.round(ebg * MMOLL_TO_MGDL), ebg)
+    tbg = np.where(mmol & (tbg < 30), np.round(tbg * MMOLL_TO_MGDL), tbg)
+
+    def as_int(mask, values):
+        return [int(v) if m else None for m, v in zip(mask.tolist(), values.tolist())]
+
+    def pred_at(curve):
+        if curve not in curves:
+            return [None] * n
+        return opt(curves[curve][1] > 6, at(curve, 6))
+
+    received = (chunk['openaps/enacted/received'] if 'openaps/enacted/received' in chunk
+                else pd.Series([''] * n, index=chunk.index))
+    reason = (chunk['openaps/suggested/reason'] if 'openaps/suggested/reason' in chunk
+              else pd.Series([''] * n, index=chunk.index))
+    device = (chunk['device'] if 'device' in chunk
+              else pd.Series([''] * n, index=chunk.index))
+    controllers = {d: _detect_controller(d) for d in device.unique()}
+    none = [None] * n
+
+    rows = {
+        'patient_id': patient_id,
+        '_id': ids[keep].tolist(),
+        'created_at': pd.to_datetime(created_ns, unit='ns', utc=True),
+        'device': device.tolist(),
+        'controller': [c if c != 'unknown' else 'openaps'
+                       for c in device.map(controllers)],
+        'iob': opt(iob_any, np.where(ip['iob'], iv['iob'], 0.0)),
+        'basal_iob': opt(ip['basaliob'], iv['basaliob']),
+        'bolussnooze': opt(ip['bolussnooze'], iv['bolussnooze']),
+        'cob': opt(sp['COB'], sv['COB']),
+        'bg': as_int(sp['bg'], bg),
+        'eventual_bg': as_int(sp['eventualBG'], ebg),
+        'target_bg': as_int(target_p, tbg),
+        'sensitivity_ratio': opt(sp['sensitivityRatio'], sv['sensitivityRatio']),
+        'insulin_req': opt(sp['insulinReq'], sv['insulinReq']),
+        'suggested_rate': opt(sp['rate'], sv['rate']),
+        'suggested_duration_min': opt(sp['duration'], sv['duration']),
+        'suggested_smb': opt(smb_p, smb_v),
+        'enacted_rate': opt(ep['rate'], ev['rate']),
+        'enacted_duration_min': opt(ep['duration'], ev['duration']),
+        'enacted_smb': opt(ena_any, np.where(ep['units'], ev['units'], 0.0)),
+        'enacted_received': [_received(r) if a else None
+                             for a, r in zip(ena_any.tolist(), received)],
+        'predicted_30': opt(has_curve & ~np.isnan(pred_30), pred_30),
+        'predicted_60': opt(has_curve & ~np.isnan(pred_60), pred_60),
+        'predicted_min': opt(has_curve, pred_min),
+        'hypo_risk_count': as_int(has_curve, hypo),
+        'pred_iob_30': pred_at('IOB'),
+        'pred_cob_30': pred_at('COB'),
+        'pred_uam_30': pred_at('UAM'),
+        'pred_zt_30': pred_at('ZT'),
+        'loop_failure_reason': none,
+        'loop_version': none,
+        'recommended_bolus': none,
+        'override_active': none,
+        'override_name': none,
+        'override_multiplier': none,
+        'reason': [_cell_value(r) for r in reason],
+        'algorithm_isf': opt(isf_p, isf_out),
+        'algorithm_cr': opt(cr_p, sv['CR']),
+        'algorithm_tdd': opt(sp['TDD'], sv['TDD']),
+        'algorithm_version': none,
+        'bolus_iob': opt(ip['bolusiob'], iv['bolusiob']),
+        'insulin_activity': opt(ip['activity'], iv['activity']),
+        'net_basal_insulin': opt(ip['netbasalinsulin'], iv['netbasalinsulin']),
+        'pump_battery_pct': none,
+        'pump_reservoir': none,
+        'pump_status': none,
+        'pump_clock': none,
+        'uploader_battery_pct': none,
+        'utc_offset': none,
+    }
+    df = pd.DataFrame(rows)
+    df = df[created_ns != _NAT].reset_index(drop=True)
+    df = df.sort_values('created_at').reset_index(drop=True)
+    df.attrs['quality'] = {
+        'total_records': n,
+        'accepted': len(df),
+        'skipped_duplicate': 0,
+        'skipped_no_timestamp': n - len(df),
+        'minimal_records': 0,
+    }
+    return df, grid_ns, grid_fields
+
+
+def _cell_value(s: str):
+    """odc_loader._unflatten_group's cell parse: float if numeric, else the string."""
+    if not s:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return s
+
+
+def _received(s: str) -> Optional[bool]:
+    v = _cell_value(s)
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return v.lower() in ('true', '1', 'yes')
+    return bool(v)
+
+
+# ── Parallel driver ──────────────────────────────────────────────────
+
+def _convert_worker(args) -> Optional[Dict[str, pd.DataFrame]]:
+    patient_dir, patient_id, skip_grid = args
+    return convert_odc_patient(patient_dir, patient_id, skip_grid=skip_grid)
+
+
+def convert_odc_patients(patients: List[Tuple[str, str, str]],
+                         workers: int = 1, skip_grid: bool = False,
+                         verbose: bool = False,
+                         ) -> Iterator[Tuple[str, Optional[Dict[str, pd.DataFrame]],
+                                             Optional[Exception]]]:
+    """Convert (odc_pid, patient_dir, patient_id) triples, ``workers`` at a time.
+
+    Yields (odc_pid, frames or None, error or None) per patient in input
+    order. With ``workers=1`` patients are converted in this process (with
+    ``verbose`` progress); otherwise by quiet worker processes, at most
+    ``2 × workers`` submitted ahead of the consumer so finished frames
+    don't pile up in memory.
+    """
+    if workers <= 1:
+        for odc_pid, patient_dir, patient_id in patients:
+            if verbose:
+                print(f'── ODC Patient {odc_pid} → {patient_id} ──')
+            try:
+                yield odc_pid, convert_odc_patient(
+                    patient_dir, patient_id, skip_grid, verbose), None
+            except Exception as e:
+                yield odc_pid, None, e
+        return
+
+    # Results are taken in input order (the writer's append dedup is
+    # order-sensitive), with at most 2 × workers patients submitted ahead
+    pending = deque()
+
+    def result(odc_pid, fut):
+        try:
+            return odc_pid, fut.result(), None
+        except Exception as e:
+            return odc_pid, None, e
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for odc_pid, patient_dir, patient_id in patients:
+            pending.append((odc_pid, pool.submit(
+                _convert_worker, (patient_dir, patient_id, skip_grid))))
+            if len(pending) >= 2 * workers:
+                yield result(*pending.popleft())
+        while pending:
+            yield result(*pending.popleft())
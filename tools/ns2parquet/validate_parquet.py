@@ -9,19 +9,55 @@ Three-level validation:
      from both sources and compare
   3. TREATMENT COUNTS — Compare bolus/carb event counts
 
+Patients are validated ``--workers`` at a time in a process pool. Column
+comparisons run as Arrow compute kernels: one pass per column gives the
+within-tolerance count, null mismatches (value on one side only) and
+min/max/mean deltas.
+
+``--sample-days N`` validates N random days per patient (``--seed``
+fixes the draw; each patient gets its own stream). The patient's JSON
+is trimmed to those days plus SAMPLE_LOOKBACK / SAMPLE_LOOKAHEAD of
+context before the JSON grid is rebuilt, which is where the time goes.
+The compared columns only depend on nearby records (30-min
+interpolation, temp basals up to their duration) except ``temp_rate``,
+which the grid builder forward-fills without limit: each window is
+seeded with a one-slot Temp Basal at its start carrying the rate a full
+run would have there. Sampled days then compare as in a full run,
+unless a window starts inside a CGM gap (the seed slot is then off the
+trimmed grid and the schedule fills in until the next temp basal).
+
+``--report PATH`` writes the results, with per-patient timing, as JSON.
+
 Usage:
-    python3 tools/ns2parquet/validate_parquet.py --parquet-dir /path/to/parquet
+    python3 -m tools.ns2parquet.validate_parquet --parquet-dir /path/to/parquet
+    python3 -m tools.ns2parquet.validate_parquet -p out/ --sample-days 14 \\
+        --workers 8 --report validation.json
     python3 tools/ns2parquet/validate_parquet.py  # uses PARQUET_DIR env var or default
 """
 
 import argparse
+import json
 import os
+import shutil
 import sys
+import tempfile
 import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from pathlib import Path
 
+try:
+    from .catalog import Terrarium
+    from .json_stream import iter_json_batches
+except ImportError:  # run as a script
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from tools.ns2parquet.catalog import Terrarium
+    from tools.ns2parquet.json_stream import iter_json_batches
+
 PATIENTS_DIR = Path(__file__).resolve().parent.parent.parent / 'externals' / 'ns-data' / 'patients'
 DEFAULT_PARQUET_DIR = os.environ.get(
     'NS2PARQUET_VALIDATE_DIR',
@@ -31,6 +67,27 @@ DEFAULT_PARQUET_DIR = os.environ.get(
 TARGET_LOW = 70
 TARGET_HIGH = 180
 
+# (column, absolute tolerance) compared between the two grids
+COLUMN_SPECS = [
+    ('glucose', 0.5),
+    ('iob', 0.05),
+    ('cob', 0.5),
+    ('bolus', 0.01),
+    ('carbs', 0.1),
+    ('net_basal', 0.05),
+]
+
+# JSON context kept around each sampled day
+SAMPLE_LOOKBACK = pd.Timedelta(days=1)
+SAMPLE_LOOKAHEAD = pd.Timedelta(hours=1)
+
+# Collections trimmed in sampling mode → fields holding the record time
+_TRIMMED = {
+    'entries.json': ('date', 'dateString'),
+    'treatments.json': ('created_at', 'timestamp'),
+    'devicestatus.json': ('created_at',),
+}
+
 
 def glucose_metrics(glucose):
     """Standard clinical metrics — identical to exp_pharmacokinetics_2021.py:49."""
@@ -54,37 +111,266 @@ def load_json_grid(patient_dir):
     try:
         from cgmencode.real_data_adapter import build_nightscout_grid
     except ImportError:
-        print('  WARNING: cgmencode not available — skipping JSON comparison',
-              file=sys.stderr)
-        return None, None
+        try:
+            from tools.cgmencode.real_data_adapter import build_nightscout_grid
+        except ImportError:
+            print('  WARNING: cgmencode not available — skipping JSON comparison',
+                  file=sys.stderr)
+            return None, None
     df, features_8ch = build_nightscout_grid(str(patient_dir), verbose=False)
     return df, features_8ch
 
 
-def load_parquet_grid(parquet_dir, patient_id):
-    """Load from parquet grid."""
-    return pd.read_parquet(
-        parquet_dir / 'grid.parquet',
-        filters=[('patient_id', '=', patient_id)],
+def load_parquet_grid(parquet_dir, patient_id, columns=None):
+    """Load one patient from the parquet grid (catalog-backed when available)."""
+    return Terrarium(parquet_dir).read('grid', patient_id, columns=columns)
+
+
+# ── Column comparison (Arrow kernels) ────────────────────────────────
+
+def _finite(arr):
+    return pc.fill_null(pc.is_finite(arr), False)
+
+
+def _as_arrow(values):
+    return pa.array(np.asarray(values, dtype=np.float64), from_pandas=True)
+
+
+def column_diff_stats(json_vals, parquet_vals, atol=0.5):
+    """One-pass comparison of two aligned float columns.
+
+    Over rows finite on both sides: ``compared``, ``mismatches``
+    (|diff| >= atol), ``match_pct``, ``max_diff`` / ``mean_diff`` of
+    |diff| and ``min_delta`` / ``max_delta`` / ``mean_delta`` (parquet
+    minus JSON column min/max/mean). ``null_mismatches`` counts rows
+    finite on exactly one side.
+    """
+    j, p = _as_arrow(json_vals), _as_arrow(parquet_vals)
+    j_ok, p_ok = _finite(j), _finite(p)
+    both = pc.and_(j_ok, p_ok)
+    jf, pf = pc.filter(j, both), pc.filter(p, both)
+    stats = {
+        'compared': len(jf),
+        'null_mismatches': int(pc.sum(pc.xor(j_ok, p_ok)).as_py() or 0),
+    }
+    if not len(jf):
+        stats.update(match_pct=0.0, mismatches=0, max_diff=np.nan, mean_diff=np.nan,
+                     min_delta=np.nan, max_delta=np.nan, mean_delta=np.nan)
+        return stats
+    diff = pc.abs(pc.subtract(pf, jf))
+    n_match = int(pc.sum(pc.less(diff, atol)).as_py() or 0)
+    j_mm, p_mm = pc.min_max(jf), pc.min_max(pf)
+    stats.update(
+        match_pct=n_match / len(jf) * 100,
+        mismatches=len(jf) - n_match,
+        max_diff=pc.max(diff).as_py(),
+        mean_diff=pc.mean(diff).as_py(),
+        min_delta=p_mm['min'].as_py() - j_mm['min'].as_py(),
+        max_delta=p_mm['max'].as_py() - j_mm['max'].as_py(),
+        mean_delta=pc.mean(pf).as_py() - pc.mean(jf).as_py(),
     )
+    return stats
 
 
 def compare_column(json_vals, parquet_vals, col_name, atol=0.5):
     """Compare two arrays, return (match_pct, max_diff, mean_diff)."""
-    # Align by dropping NaN from both
-    mask = np.isfinite(json_vals) & np.isfinite(parquet_vals)
-    if mask.sum() == 0:
-        return 0.0, np.nan, np.nan
-    j = json_vals[mask]
-    p = parquet_vals[mask]
-    diffs = np.abs(j - p)
-    match_pct = float(np.mean(diffs < atol) * 100)
-    return match_pct, float(np.max(diffs)), float(np.mean(diffs))
-
-
-def validate_patient(patient_id, parquet_dir, verbose=True):
-    """Run all validation checks for one patient."""
-    patient_dir = PATIENTS_DIR / patient_id / 'training'
+    s = column_diff_stats(json_vals, parquet_vals, atol)
+    return float(s['match_pct']), float(s['max_diff']), float(s['mean_diff'])
+
+
+def _nonzero_overlap(j, p, atol):
+    """(JSON non-zero count, parquet non-zero count, % of JSON non-zero
+    rows matched by parquet) — the IOB/COB "IMPROVED" check."""
+    j_nz = pc.and_(_finite(j), pc.fill_null(pc.greater(pc.abs(j), 0.01), False))
+    p_nz = pc.and_(_finite(p), pc.fill_null(pc.greater(pc.abs(p), 0.01), False))
+    d = pc.abs(pc.subtract(pc.filter(p, j_nz), pc.filter(j, j_nz)))
+    n = len(d)
+    hits = int(pc.sum(pc.fill_null(pc.less(d, atol), False)).as_py() or 0)
+    return (int(pc.sum(j_nz).as_py() or 0), int(pc.sum(p_nz).as_py() or 0),
+            hits / n * 100 if n else 100.0)
+
+
+def _round(v, nd):
+    return round(float(v), nd) if v is not None and np.isfinite(v) else None
+
+
+def compare_columns(json_aligned, pq_aligned, specs=COLUMN_SPECS):
+    """Per-column results (match %, diff/delta stats, status) for aligned grids."""
+    col_results = {}
+    for col, atol in specs:
+        if col not in json_aligned.columns or col not in pq_aligned.columns:
+            col_results[col] = {'match_pct': np.nan, 'status': 'MISSING'}
+            continue
+        j = _as_arrow(json_aligned[col].to_numpy(dtype=float))
+        p = _as_arrow(pq_aligned[col].to_numpy(dtype=float))
+        s = column_diff_stats(j, p, atol)
+        match_pct = s['match_pct']
+
+        # Detect "IMPROVED" case: parquet has more non-zero data than JSON
+        # (e.g., oref0 IOB extracted by parquet but not by JSON pipeline)
+        status = 'PASS' if match_pct >= 99.0 else 'WARN' if match_pct >= 95.0 else 'FAIL'
+        if status == 'FAIL' and col in ('iob', 'cob'):
+            j_nonzero, p_nonzero, overlap_match = _nonzero_overlap(j, p, atol)
+            if p_nonzero > j_nonzero and overlap_match >= 99.0:
+                status = 'IMPROVED'
+
+        col_results[col] = {
+            'match_pct': round(match_pct, 1),
+            'max_diff': _round(s['max_diff'], 3),
+            'mean_diff': _round(s['mean_diff'], 4),
+            'compared': s['compared'],
+            'mismatches': s['mismatches'],
+            'null_mismatches': s['null_mismatches'],
+            'min_delta': _round(s['min_delta'], 4),
+            'max_delta': _round(s['max_delta'], 4),
+            'mean_delta': _round(s['mean_delta'], 4),
+            'status': status,
+        }
+    return col_results
+
+
+# ── Day sampling ─────────────────────────────────────────────────────
+
+def sample_days(days, n_days, seed=0, patient_id=''):
+    """Draw ``n_days`` of ``days`` (sorted) without replacement.
+
+    The draw depends only on ``seed`` and ``patient_id`` (not on the
+    process or the other patients), so reruns and workers agree.
+    """
+    days = sorted(days)
+    if n_days >= len(days):
+        return days
+    rng = np.random.default_rng([seed, zlib.crc32(str(patient_id).encode())])
+    picked = rng.choice(len(days), size=n_days, replace=False)
+    return [days[i] for i in sorted(picked)]
+
+
+def _day_windows(days, lookback, lookahead):
+    """Merged [start, end) ns windows around each UTC day."""
+    starts = [pd.Timestamp(d, tz='UTC') - lookback for d in days]
+    ends = [pd.Timestamp(d, tz='UTC') + pd.Timedelta(days=1) + lookahead for d in days]
+    merged = []
+    for s, e in sorted(zip(starts, ends)):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return (np.array([s.value for s, _ in merged], dtype=np.int64),
+            np.array([e.value for _, e in merged], dtype=np.int64))
+
+
+def _record_times(records, fields):
+    """UTC ns per record from the first present time field (NaT → None)."""
+    if fields[0] == 'date':
+        ms = pd.to_numeric(pd.Series([r.get('date') for r in records], dtype=object),
+                           errors='coerce')
+        ts = pd.to_datetime(ms, unit='ms', utc=True)
+        alt = pd.to_datetime(pd.Series([r.get('dateString') for r in records], dtype=object),
+                             utc=True, errors='coerce', format='mixed')
+        ts = ts.fillna(alt)
+    else:
+        raw = [next((r.get(f) for f in fields if r.get(f)), None) for r in records]
+        ts = pd.to_datetime(pd.Series(raw, dtype=object), utc=True,
+                            errors='coerce', format='mixed')
+    return ts
+
+
+def _temp_basal_seeds(treatments_path, starts):
+    """One-slot Temp Basal records carrying the rate in effect at ``starts``.
+
+    Replays build_nightscout_grid's slot assignment (rounded to 5 min,
+    ``duration`` minutes, later records overwrite) for the last slot set
+    before each window start — the value its unlimited ffill carries in.
+    """
+    slot = pd.Timedelta(minutes=5).value
+    ts, ends, rates = [], [], []
+    for batch in iter_json_batches(treatments_path):
+        for tx in batch:
+            if not (isinstance(tx, dict) and tx.get('eventType') == 'Temp Basal'
+                    and 'rate' in tx):
+                continue
+            t = tx.get('created_at') or tx.get('timestamp')
+            if not t:
+                continue
+            try:
+                t = pd.to_datetime(t, utc=True)
+                rate = float(tx['rate'])
+                n_slots = max(1, int(float(tx.get('duration', 5)) / 5))
+            except (TypeError, ValueError):
+                continue
+            t = t.round('5min').value
+            ts.append(t)
+            ends.append(t + n_slots * slot)
+            rates.append(rate)
+    if not ts:
+        return []
+    ts, ends, rates = np.array(ts), np.array(ends), np.array(rates)
+    seeds = []
+    for start in starts:
+        before = ts < start
+        if not before.any():
+            continue
+        last = (np.minimum(ends[before], start) - slot).max()
+        covering = np.flatnonzero(before & (ts <= last) & (ends > last))
+        seeds.append({'eventType': 'Temp Basal',
+                      'created_at': pd.Timestamp(int(start), tz='UTC').isoformat(),
+                      'rate': float(rates[covering[-1]]), 'duration': 5})
+    return seeds
+
+
+def trim_json_dir(patient_dir, out_dir, days,
+                  lookback=SAMPLE_LOOKBACK, lookahead=SAMPLE_LOOKAHEAD):
+    """Copy a patient JSON directory keeping only records near ``days``.
+
+    entries / treatments / devicestatus are streamed and filtered to the
+    merged day windows (records without a parseable time are kept, the
+    grid builder skips them as before); other files are copied.
+    treatments.json starts with a temp basal seed per window (see
+    _temp_basal_seeds). Returns the number of entries kept.
+    """
+    patient_dir, out_dir = Path(patient_dir), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    starts, ends = _day_windows(days, lookback, lookahead)
+    kept_entries = 0
+    for src in patient_dir.glob('*.json'):
+        fields = _TRIMMED.get(src.name)
+        if fields is None:
+            shutil.copy(src, out_dir / src.name)
+            continue
+        seeds = (_temp_basal_seeds(src, starts)
+                 if src.name == 'treatments.json' else [])
+        with open(out_dir / src.name, 'w') as out:
+            out.write('[' + ','.join(json.dumps(r) for r in seeds))
+            first = not seeds
+            for batch in iter_json_batches(src):
+                batch = [r for r in batch if isinstance(r, dict)]
+                if not batch:
+                    continue
+                ts = _record_times(batch, fields)
+                ns = ts.to_numpy(dtype='datetime64[ns]').view(np.int64)
+                pos = np.searchsorted(starts, ns, side='right') - 1
+                keep = ts.isna().to_numpy() | ((pos >= 0) & (ns < ends[np.maximum(pos, 0)]))
+                for r in (r for r, k in zip(batch, keep) if k):
+                    out.write(('' if first else ',') + json.dumps(r))
+                    first = False
+                if src.name == 'entries.json':
+                    kept_entries += int(keep.sum())
+            out.write(']')
+    return kept_entries
+
+
+# ── Validation ───────────────────────────────────────────────────────
+
+def validate_patient(patient_id, parquet_dir, verbose=True, patients_dir=None,
+                     n_sample_days=None, seed=0):
+    """Run all validation checks for one patient.
+
+    With ``n_sample_days`` only that many random days (see
+    ``sample_days``) are rebuilt from JSON and compared. Results carry
+    per-stage ``timing`` in ms.
+    """
+    t_start = time.time()
+    patient_dir = Path(patients_dir or PATIENTS_DIR) / patient_id / 'training'
     if not (patient_dir / 'entries.json').exists():
         return None
 
@@ -92,17 +378,32 @@ def validate_patient(patient_id, parquet_dir, verbose=True):
 
     # ── Load from both sources ──────────────────────────────────────
     t0 = time.time()
-    json_df, json_features = load_json_grid(patient_dir)
+    pq_df = load_parquet_grid(Path(parquet_dir), patient_id,
+                              columns=['time'] + [c for c, _ in COLUMN_SPECS])
+    parquet_time = time.time() - t0
+
+    days = None
+    if n_sample_days:
+        pq_day = pd.to_datetime(pq_df['time'], utc=True).dt.floor('D')
+        days = sample_days(pq_day.dt.date.unique(), n_sample_days, seed, patient_id)
+        pq_df = pq_df[pq_day.dt.date.isin(set(days)).to_numpy()]
+        results['sampled_days'] = [str(d) for d in days]
+
+    t0 = time.time()
+    if days is None:
+        json_df, json_features = load_json_grid(patient_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix='validate-') as tmp:
+            if not days or not trim_json_dir(patient_dir, tmp, days):
+                results['status'] = 'NO_OVERLAP'
+                return results
+            json_df, json_features = load_json_grid(tmp)
     json_time = time.time() - t0
 
     if json_df is None:
         results['status'] = 'SKIP_NO_CGMENCODE'
         return results
 
-    t0 = time.time()
-    pq_df = load_parquet_grid(parquet_dir, patient_id)
-    parquet_time = time.time() - t0
-
     results['json_rows'] = len(json_df)
     results['parquet_rows'] = len(pq_df)
     results['json_load_ms'] = round(json_time * 1000)
@@ -110,6 +411,7 @@ def validate_patient(patient_id, parquet_dir, verbose=True):
     results['speedup'] = round(json_time / max(parquet_time, 0.001), 1)
 
     # ── 1. COLUMN MATCH ─────────────────────────────────────────────
+    t0 = time.time()
     # Align by timestamp: round both to 5-min grid
     json_df = json_df.copy()
     json_df.index = json_df.index.round('5min')
@@ -131,47 +433,7 @@ def validate_patient(patient_id, parquet_dir, verbose=True):
     json_aligned = json_df.loc[common_idx]
     pq_aligned = pq_df.loc[common_idx]
 
-    col_results = {}
-    for col, pq_col, atol in [
-        ('glucose', 'glucose', 0.5),
-        ('iob', 'iob', 0.05),
-        ('cob', 'cob', 0.5),
-        ('bolus', 'bolus', 0.01),
-        ('carbs', 'carbs', 0.1),
-        ('net_basal', 'net_basal', 0.05),
-    ]:
-        if col not in json_aligned.columns or pq_col not in pq_aligned.columns:
-            col_results[col] = {'match_pct': np.nan, 'status': 'MISSING'}
-            continue
-
-        j_vals = json_aligned[col].values.astype(float)
-        p_vals = pq_aligned[pq_col].values.astype(float)
-        match_pct, max_diff, mean_diff = compare_column(j_vals, p_vals, col, atol)
-
-        # Detect "IMPROVED" case: parquet has more non-zero data than JSON
-        # (e.g., oref0 IOB extracted by parquet but not by JSON pipeline)
-        status = 'PASS' if match_pct >= 99.0 else 'WARN' if match_pct >= 95.0 else 'FAIL'
-        if status == 'FAIL' and col in ('iob', 'cob'):
-            j_nonzero = np.sum(np.abs(j_vals[np.isfinite(j_vals)]) > 0.01)
-            p_nonzero = np.sum(np.abs(p_vals[np.isfinite(p_vals)]) > 0.01)
-            # Where JSON has non-zero values, do they match parquet?
-            j_has_data = np.isfinite(j_vals) & (np.abs(j_vals) > 0.01)
-            p_at_j = p_vals[j_has_data]
-            j_at_j = j_vals[j_has_data]
-            if len(j_at_j) > 0:
-                overlap_match = float(np.mean(np.abs(j_at_j - p_at_j) < atol) * 100)
-            else:
-                overlap_match = 100.0
-            if p_nonzero > j_nonzero and overlap_match >= 99.0:
-                status = 'IMPROVED'
-
-        col_results[col] = {
-            'match_pct': round(match_pct, 1),
-            'max_diff': round(max_diff, 3) if np.isfinite(max_diff) else None,
-            'mean_diff': round(mean_diff, 4) if np.isfinite(mean_diff) else None,
-            'status': status,
-        }
-
+    col_results = compare_columns(json_aligned, pq_aligned)
     results['columns'] = col_results
 
     # ── 2. CLINICAL METRICS ──────────────────────────────────────────
@@ -219,10 +481,62 @@ def validate_patient(patient_id, parquet_dir, verbose=True):
     has_improvements = any(v.get('status') == 'IMPROVED' for v in col_results.values()
                           if isinstance(v, dict))
     results['status'] = ('IMPROVED' if has_improvements else 'PASS') if (all_col_pass and all_metric_pass) else 'FAIL'
+    results['timing'] = {
+        'parquet_ms': round(parquet_time * 1000),
+        'json_ms': round(json_time * 1000),
+        'compare_ms': round((time.time() - t0) * 1000),
+        'total_ms': round((time.time() - t_start) * 1000),
+    }
 
     return results
 
 
+def _validate_worker(job):
+    patient_id, parquet_dir, patients_dir, n_sample_days, seed = job
+    try:
+        return validate_patient(patient_id, parquet_dir, verbose=False,
+                                patients_dir=patients_dir,
+                                n_sample_days=n_sample_days, seed=seed)
+    except Exception as e:
+        return {'patient': patient_id, 'status': 'ERROR', 'error': str(e)}
+
+
+def validate_patients(patient_ids, parquet_dir, patients_dir=None, workers=1,
+                      n_sample_days=None, seed=0):
+    """Validate patients ``workers`` at a time; yield results in input order.
+
+    A patient whose validation raises yields an ERROR result; a patient
+    without JSON yields None (as ``validate_patient``).
+    """
+    jobs = [(pid, str(parquet_dir), str(patients_dir or PATIENTS_DIR),
+             n_sample_days, seed) for pid in patient_ids]
+    if workers <= 1:
+        for job in jobs:
+            yield _validate_worker(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for fut in [pool.submit(_validate_worker, job) for job in jobs]:
+            yield fut.result()
+
+
+def write_report(path, all_results, **meta):
+    """Write the validation results (plus run metadata) as JSON."""
+    def _plain(v):
+        if isinstance(v, np.generic):
+            return v.item()
+        raise TypeError(f'not JSON serializable: {type(v).__name__}')
+
+    report = {
+        **meta,
+        'passed': sum(1 for r in all_results
+                      if r and r.get('status') in ('PASS', 'IMPROVED')),
+        'patients': [r for r in all_results if r],
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=_plain)
+    return report
+
+
 def print_results(all_results):
     """Print formatted validation report."""
     print()
@@ -318,6 +632,14 @@ def main():
     parser.add_argument('--patients-dir',
                         default=str(PATIENTS_DIR),
                         help='Directory containing patient subdirectories')
+    parser.add_argument('--workers', '-j', type=int, default=os.cpu_count() or 1,
+                        help='Patients validated in parallel processes (default: CPU count)')
+    parser.add_argument('--sample-days', type=int, default=None,
+                        help='Validate only this many random days per patient')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for --sample-days (default: 0)')
+    parser.add_argument('--report',
+                        help='Write machine-readable results (with timing) to this JSON file')
     args = parser.parse_args()
 
     parquet_dir = Path(args.parquet_dir)
@@ -338,20 +660,30 @@ def main():
     print(f'Validating {len(patient_ids)} patients: {", ".join(patient_ids)}')
     print(f'JSON source: {patients_dir}')
     print(f'Parquet source: {parquet_dir}')
+    if args.sample_days:
+        print(f'Sampling {args.sample_days} day(s) per patient (seed {args.seed})')
 
+    t0 = time.time()
     all_results = []
-    for pid in patient_ids:
-        print(f'  Validating {pid}...', end='', flush=True)
-        try:
-            r = validate_patient(pid, parquet_dir)
-            status = r.get('status', '?') if r else 'SKIP'
-            print(f' {status}')
-            all_results.append(r)
-        except Exception as e:
-            print(f' ERROR: {e}')
-            all_results.append({'patient': pid, 'status': 'ERROR', 'error': str(e)})
+    for pid, r in zip(patient_ids, validate_patients(
+            patient_ids, parquet_dir, patients_dir, workers=args.workers,
+            n_sample_days=args.sample_days, seed=args.seed)):
+        status = r.get('status', '?') if r else 'SKIP'
+        if status == 'ERROR':
+            status += f': {r.get("error")}'
+        elif r and 'timing' in r:
+            status += f' ({r["timing"]["total_ms"]} ms)'
+        print(f'  Validating {pid}... {status}')
+        all_results.append(r)
+    elapsed = time.time() - t0
 
     print_results(all_results)
+    if args.report:
+        write_report(args.report, all_results,
+                     parquet_dir=str(parquet_dir), patients_dir=str(patients_dir),
+                     workers=args.workers, sample_days=args.sample_days,
+                     seed=args.seed, elapsed_s=round(elapsed, 2))
+        print(f'Report: {args.report}')
     return 0
 
 
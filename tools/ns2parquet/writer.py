@@ -1,20 +1,63 @@
 """
 writer.py — Write normalized DataFrames to Parquet files.
 
-Supports two modes:
-1. Overwrite: Write fresh parquet file
-2. Append: Read existing, concatenate, deduplicate, write back
-
-Deduplication uses (patient_id, timestamp) as composite key for each collection.
+Two on-disk layouts per collection:
+
+1. file:    ``<collection>.parquet`` — one file. Append reads the whole
+            file, concatenates, deduplicates and rewrites it, so
+            converting P patients one by one costs O(P²) I/O.
+2. dataset: ``<collection>/patient_id=<id>/year_month=<YYYY-MM>/part-*.parquet``
+            — hive-partitioned, append-only. Appends write new fragments
+            into the partitions they touch and never read existing data;
+            adding a patient touches only that patient's partitions.
+            Collections without a timestamp (profiles, settings) are
+            partitioned by patient only.
+
+Deduplication uses (patient_id, timestamp) as composite key for each
+collection. In the dataset layout it is per partition: readers drop
+duplicates across a partition's fragments (newest fragment wins) until
+``compact_dataset`` rewrites each partition as a single fragment.
+
+``write_parquet(layout=None)`` keeps whichever layout the output
+directory already uses for that collection (file for new outputs), and
+``read_parquet`` / ``parquet_info`` read either layout transparently.
+
+Every write also updates the collection's patient catalog
+(``_catalog/<collection>.parquet``, see catalog.py): the file layout
+stores each patient's rows as a contiguous run of row groups, and the
+catalog maps patients to those row groups / dataset fragments with row
+counts and time bounds.
 """
 
+import os
+import shutil
+import time
+import uuid
 import warnings
+from urllib.parse import quote, unquote
 
+import numpy as np
 import pandas as pd
 import pyarrow as pa
+import pyarrow.dataset as pads
 import pyarrow.parquet as pq
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+
+LAYOUTS = ('file', 'dataset')
+
+# Column whose UTC month names the year_month partition
+PARTITION_TIME_COLUMNS = {
+    'entries': 'date',
+    'treatments': 'created_at',
+    'devicestatus': 'created_at',
+    'grid': 'time',
+}
+
+_HIVE = pads.partitioning(
+    pa.schema([('patient_id', pa.string()), ('year_month', pa.string())]),
+    flavor='hive',
+)
 
 
 def _dedup_key(collection: str) -> list:
@@ -32,22 +75,35 @@ def write_parquet(df: pd.DataFrame, output_path: str,
                   collection: str,
                   schema: Optional[pa.Schema] = None,
                   append: bool = True,
-                  verbose: bool = False) -> str:
-    """Write a DataFrame to a Parquet file.
+                  verbose: bool = False,
+                  layout: Optional[str] = None,
+                  source: Optional[str] = None) -> str:
+    """Write a DataFrame to a Parquet file or partitioned dataset.
 
     Args:
         df: DataFrame to write
         output_path: Directory to write to
         collection: Collection name (entries, treatments, etc.)
         schema: Optional PyArrow schema to enforce
-        append: If True and file exists, append and deduplicate
+        append: If True and data exists, append and deduplicate
+            (dataset layout: add fragments; False replaces the collection)
         verbose: Print progress
+        layout: 'file', 'dataset', or None to keep the layout already
+            used in ``output_path`` (file when the collection is new)
+        source: Optional provenance (input directory) for the catalog
 
     Returns:
-        Path to written parquet file
+        Path to written parquet file or dataset directory
     """
     out_dir = Path(output_path)
     out_dir.mkdir(parents=True, exist_ok=True)
+    layout = layout or collection_layout(out_dir, collection) or 'file'
+    if layout not in LAYOUTS:
+        raise ValueError(f'Unknown layout {layout!r}; expected one of {LAYOUTS}')
+    if layout == 'dataset':
+        return _write_dataset(df, out_dir, collection, schema, append, verbose,
+                              source)
+
     out_file = out_dir / f'{collection}.parquet'
 
     if df is None or df.empty:
@@ -56,7 +112,11 @@ def write_parquet(df: pd.DataFrame, output_path: str,
         return str(out_file)
 
     # Append mode: merge with existing
+    incoming = set(df['patient_id'].astype(str)) if 'patient_id' in df.columns else None
+    previous = None
     if append and out_file.exists():
+        from .catalog import Terrarium
+        previous = Terrarium(out_dir).catalog(collection)
         existing = pd.read_parquet(out_file)
         n_incoming = len(df)
         df = pd.concat([existing, df], ignore_index=True)
@@ -73,7 +133,60 @@ def write_parquet(df: pd.DataFrame, output_path: str,
                   f'{n_incoming} incoming → {len(df)} total '
                   f'({n_incoming - n_new} duplicates removed)')
 
-    # Write with compression
+    runs = [(0, len(df))]
+    if 'patient_id' in df.columns:
+        # One contiguous run of row groups per patient (first-seen order)
+        codes, _ = pd.factorize(df['patient_id'].astype(str))
+        if (codes[1:] < codes[:-1]).any():
+            order = np.argsort(codes, kind='stable')
+            df, codes = df.iloc[order], codes[order]
+        cuts = np.flatnonzero(np.diff(codes)) + 1
+        runs = list(zip(np.r_[0, cuts], np.r_[cuts, len(df)]))
+
+    table = _to_table(df, collection, schema)
+    tmp = out_dir / f'.{out_file.name}.tmp'
+    with pq.ParquetWriter(tmp, table.schema, compression='zstd') as pw:
+        for start, stop in runs:
+            pw.write_table(table.slice(start, stop - start))
+    os.replace(tmp, out_file)
+    _catalog_file(df, out_file, collection, incoming, previous, source)
+
+    if verbose:
+        size_mb = out_file.stat().st_size / (1024 * 1024)
+        print(f'  WRITE {collection}: {len(df)} rows → {out_file} ({size_mb:.1f} MB)')
+
+    return str(out_file)
+
+
+def _catalog_file(df: pd.DataFrame, out_file: Path, collection: str,
+                  incoming: Optional[set], previous: Optional[pd.DataFrame],
+                  source: Optional[str]) -> None:
+    """Catalog a rewritten file; patients the write did not touch keep
+    their previous entries (their rows are unchanged, only row groups move)."""
+    from .catalog import catalog_entries, file_row_groups, update_catalog
+    if 'patient_id' not in df.columns:
+        return
+    st = out_file.stat()
+    rgs = file_row_groups(pq.read_metadata(out_file), df['patient_id'])
+    entries = []
+    changed = df
+    if previous is not None and incoming is not None:
+        prev = previous[previous['location'] == out_file.name]
+        kept = prev[~prev['patient_id'].isin(incoming)
+                    & prev['patient_id'].isin(rgs.keys())]
+        for e in kept.to_dict('records'):
+            e.update(location_bytes=st.st_size, location_mtime_ns=st.st_mtime_ns,
+                     row_groups=rgs[e['patient_id']])
+            entries.append(e)
+        changed = df[~df['patient_id'].astype(str).isin(set(kept['patient_id']))]
+    entries += catalog_entries(changed, collection, out_file.name, st.st_size,
+                               rgs, source, st.st_mtime_ns)
+    update_catalog(out_file.parent, collection, entries)
+
+
+def _to_table(df: pd.DataFrame, collection: str,
+              schema: Optional[pa.Schema]) -> pa.Table:
+    """Arrow table with schema enforcement and provenance metadata."""
     if schema:
         try:
             table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
@@ -82,7 +195,7 @@ def write_parquet(df: pd.DataFrame, output_path: str,
             warnings.warn(
                 f'Schema enforcement failed for {collection}: {exc}. '
                 f'Writing without schema — column types may be inferred.',
-                stacklevel=2,
+                stacklevel=3,
             )
             table = pa.Table.from_pandas(df, preserve_index=False)
     else:
@@ -97,21 +210,197 @@ def write_parquet(df: pd.DataFrame, output_path: str,
         b'ns2parquet.schema_fields': ','.join(
             f.name for f in schema).encode() if schema else b'',
     }
-    table = table.replace_schema_metadata({**existing_meta, **extra_meta})
+    return table.replace_schema_metadata({**existing_meta, **extra_meta})
 
-    pq.write_table(table, out_file, compression='zstd')
 
-    if verbose:
-        size_mb = out_file.stat().st_size / (1024 * 1024)
-        print(f'  WRITE {collection}: {len(df)} rows → {out_file} ({size_mb:.1f} MB)')
+# ── Partitioned dataset layout ───────────────────────────────────────
+
+def collection_layout(input_path, collection: str) -> Optional[str]:
+    """'dataset' or 'file' for an existing collection, else None."""
+    if (Path(input_path) / collection).is_dir():
+        return 'dataset'
+    if (Path(input_path) / f'{collection}.parquet').exists():
+        return 'file'
+    return None
 
-    return str(out_file)
+
+def list_collections(input_path) -> List[str]:
+    """Collections present in a directory, in either layout."""
+    in_dir = Path(input_path)
+    if not in_dir.is_dir():
+        return []
+    names = {pf.stem for pf in in_dir.glob('*.parquet') if pf.is_file()}
+    names.update(d.name for d in in_dir.iterdir()
+                 if d.is_dir() and any(d.glob('patient_id=*')))
+    return sorted(names)
+
+
+def _partition_dir(ds_dir: Path, patient_id: str,
+                   year_month: Optional[str] = None) -> Path:
+    d = ds_dir / f'patient_id={quote(str(patient_id), safe="")}'
+    return d / f'year_month={year_month}' if year_month else d
+
+
+def _fragments(ds_dir: Path, patient_id: Optional[str] = None) -> List[Path]:
+    """Fragment files in (partition, write) order."""
+    root = _partition_dir(ds_dir, patient_id) if patient_id else ds_dir
+    return sorted(root.glob('**/part-*.parquet'))
+
+
+def _partitions(ds_dir: Path, patient_id: Optional[str] = None) -> Dict[Path, List[Path]]:
+    parts: Dict[Path, List[Path]] = {}
+    for f in _fragments(ds_dir, patient_id):
+        parts.setdefault(f.parent, []).append(f)
+    return parts
+
+
+def _write_fragment(table: pa.Table, part_dir: Path) -> Path:
+    """Atomically write one fragment; names sort in write order."""
+    part_dir.mkdir(parents=True, exist_ok=True)
+    name = f'part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet'
+    tmp = part_dir / f'.{name}.tmp'
+    pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, part_dir / name)
+    return part_dir / name
+
+
+def _write_dataset(df: pd.DataFrame, out_dir: Path, collection: str,
+                   schema: Optional[pa.Schema], append: bool,
+                   verbose: bool, source: Optional[str] = None) -> str:
+    from .catalog import catalog_entries, update_catalog
+    ds_dir = out_dir / collection
+    replaced = not append and ds_dir.exists()
+    if replaced:
+        shutil.rmtree(ds_dir)
+    if df is None or df.empty:
+        if replaced:
+            update_catalog(out_dir, collection, [], drop_prefix=f'{collection}/')
+        if verbose:
+            print(f'  SKIP {collection}: empty DataFrame')
+        return str(ds_dir)
+    if 'patient_id' not in df.columns:
+        raise ValueError(f'{collection}: dataset layout requires a patient_id column')
+
+    valid_cols = [c for c in _dedup_key(collection) if c in df.columns]
+    if valid_cols:
+        df = df.drop_duplicates(subset=valid_cols, keep='last')
+    df = df.reset_index(drop=True)
+
+    table = _to_table(df, collection, schema).drop_columns(['patient_id'])
+    meta = {k: v for k, v in (table.schema.metadata or {}).items() if k != b'pandas'}
+    table = table.replace_schema_metadata(meta)
+
+    keys = [df['patient_id'].astype(str)]
+    time_col = PARTITION_TIME_COLUMNS.get(collection)
+    if time_col in df.columns:
+        ts = pd.to_datetime(df[time_col], utc=True, errors='coerce')
+        keys.append(ts.dt.strftime('%Y-%m').fillna('unknown'))
+    groups = df.groupby(keys, sort=True).indices
+
+    entries = []
+    for key, idx in groups.items():
+        pid, ym = (key, None) if len(keys) == 1 else key
+        if isinstance(pid, tuple):
+            pid = pid[0]
+        frag = _write_fragment(table.take(idx), _partition_dir(ds_dir, pid, ym))
+        st = frag.stat()
+        entries += catalog_entries(df.iloc[idx], collection,
+                                   frag.relative_to(out_dir).as_posix(),
+                                   st.st_size, source=source,
+                                   location_mtime_ns=st.st_mtime_ns)
+    update_catalog(out_dir, collection, entries,
+                   drop_prefix=f'{collection}/' if replaced else None)
+
+    if verbose:
+        print(f'  WRITE {collection}: {len(df)} rows → {ds_dir}/ '
+              f'({len(groups)} partition fragment(s))')
+    return str(ds_dir)
+
+
+def _read_dataset(ds_dir: Path, patient_id: Optional[str] = None,
+                  columns: Optional[list] = None,
+                  files: Optional[List[Path]] = None) -> Optional[pd.DataFrame]:
+    if files is None:
+        files = _fragments(ds_dir, patient_id)
+    if not files:
+        return None
+    file_schema = pa.unify_schemas([pq.read_schema(f) for f in files],
+                                   promote_options='permissive')
+    full_schema = pa.unify_schemas([file_schema, _HIVE.schema])
+    dataset = pads.dataset([str(f) for f in files], schema=full_schema,
+                           format='parquet', partitioning=_HIVE,
+                           partition_base_dir=str(ds_dir))
+    names = ['patient_id'] + [n for n in file_schema.names if n != 'patient_id']
+    if columns is not None:
+        names = [c for c in columns if c in full_schema.names]
+    return dataset.to_table(columns=names).to_pandas()
+
+
+def compact_dataset(input_path: str, collection: str,
+                    patient_id: Optional[str] = None,
+                    verbose: bool = False) -> dict:
+    """Rewrite each multi-fragment partition as one deduplicated fragment.
+
+    Returns counts of partitions compacted, fragments removed and
+    duplicate rows dropped. Safe to interrupt: the new fragment is in
+    place before the old ones are deleted, and readers deduplicate.
+    """
+    from .catalog import catalog_entries, read_catalog, update_catalog
+    ds_dir = Path(input_path) / collection
+    stats = {'partitions': 0, 'fragments_removed': 0, 'rows_removed': 0}
+    entries, removed = [], []
+    cat = read_catalog(input_path, collection)
+    sources = {} if cat is None else dict(zip(cat['location'], cat['source']))
+    key = [c for c in _dedup_key(collection) if c != 'patient_id']
+    time_col = PARTITION_TIME_COLUMNS.get(collection)
+    for part_dir, files in _partitions(ds_dir, patient_id).items():
+        if len(files) < 2:
+            continue
+        tables = [pq.read_table(f) for f in files]
+        merged = pa.concat_tables(tables, promote_options='permissive')
+        df = merged.to_pandas()
+        n = len(df)
+        valid = [c for c in key if c in df.columns]
+        if valid:
+            df = df.drop_duplicates(subset=valid, keep='last')
+        if time_col in df.columns:
+            df = df.sort_values(time_col, kind='stable')
+        out = pa.Table.from_pandas(df, schema=merged.schema, preserve_index=False)
+        out = out.replace_schema_metadata(tables[-1].schema.metadata)
+        frag = _write_fragment(out, part_dir)
+        for f in files:
+            f.unlink()
+        locations = [f.relative_to(input_path).as_posix() for f in files]
+        removed += locations
+        pid = unquote(part_dir.relative_to(ds_dir).parts[0].split('=', 1)[1])
+        source = next((sources[loc] for loc in reversed(locations)
+                       if sources.get(loc)), None)
+        st = frag.stat()
+        entries += catalog_entries(df.assign(patient_id=pid), collection,
+                                   frag.relative_to(input_path).as_posix(),
+                                   st.st_size, source=source,
+                                   location_mtime_ns=st.st_mtime_ns)
+        stats['partitions'] += 1
+        stats['fragments_removed'] += len(files) - 1
+        stats['rows_removed'] += n - len(df)
+    if entries:
+        update_catalog(input_path, collection, entries, drop_locations=removed)
+    if verbose:
+        print(f'  COMPACT {collection}: {stats["partitions"]} partition(s), '
+              f'{stats["fragments_removed"]} fragment(s) and '
+              f'{stats["rows_removed"]} duplicate row(s) removed')
+    return stats
 
 
 def read_parquet(input_path: str, collection: str,
                  patient_id: Optional[str] = None,
                  columns: Optional[list] = None) -> pd.DataFrame:
-    """Read a Parquet file, optionally filtering by patient_id.
+    """Read a collection, optionally filtering by patient_id.
+
+    Reads ``<collection>.parquet``, the ``<collection>/`` dataset, or
+    both (file rows first). A patient filter on a dataset only opens that
+    patient's partitions. Rows duplicated across uncompacted fragments
+    are dropped (last write wins).
 
     Args:
         input_path: Directory containing parquet files
@@ -123,36 +412,75 @@ def read_parquet(input_path: str, collection: str,
         DataFrame
     """
     in_file = Path(input_path) / f'{collection}.parquet'
-    if not in_file.exists():
+    ds_dir = Path(input_path) / collection
+    has_file, has_dataset = in_file.exists(), ds_dir.is_dir()
+    dirty = has_dataset and (has_file or any(
+        len(f) > 1 for f in _partitions(ds_dir, patient_id).values()))
+    read_cols = columns
+    if columns is not None and dirty:
+        read_cols = list(dict.fromkeys([*columns, *_dedup_key(collection)]))
+
+    frames = []
+    if has_file:
+        filters = None
+        if patient_id:
+            filters = [('patient_id', '=', patient_id)]
+        file_cols = read_cols
+        if dirty:
+            names = pq.read_schema(in_file).names
+            file_cols = [c for c in read_cols if c in names] if read_cols else None
+        frames.append(pd.read_parquet(in_file, columns=file_cols, filters=filters))
+    if has_dataset:
+        df = _read_dataset(ds_dir, patient_id, read_cols)
+        if df is not None:
+            frames.append(df)
+
+    if not frames:
         return pd.DataFrame()
+    if not dirty:
+        return frames[0]
 
-    filters = None
-    if patient_id:
-        filters = [('patient_id', '=', patient_id)]
-
-    return pd.read_parquet(in_file, columns=columns, filters=filters)
+    df = pd.concat(frames, ignore_index=True)
+    valid_cols = [c for c in _dedup_key(collection) if c in df.columns]
+    if valid_cols:
+        df = df.drop_duplicates(subset=valid_cols, keep='last').reset_index(drop=True)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
 
 
 def parquet_info(input_path: str) -> dict:
     """Get summary info about parquet files in a directory.
 
     Returns dict with collection names as keys and stats as values.
+    Dataset-layout collections report fragment totals (rows are counted
+    before cross-fragment deduplication) plus partition/fragment counts;
+    a collection present in both layouts reports the sum. File-layout
+    patients come from the catalog when it is current.
     """
+    from .catalog import Terrarium
     in_dir = Path(input_path)
     info = {}
 
     for pf in sorted(in_dir.glob('*.parquet')):
+        if not pf.is_file():
+            continue
         pf_meta = pq.read_metadata(pf)
         collection = pf.stem
 
-        # Read patient_id column to count unique patients
-        try:
-            patient_ids = pd.read_parquet(pf, columns=['patient_id'])['patient_id'].unique()
-        except Exception:
-            patient_ids = []
+        # Patients from the catalog; read the patient_id column without one
+        cat = Terrarium(in_dir).catalog(collection)
+        if cat is not None:
+            patient_ids = cat.loc[cat['location'] == pf.name, 'patient_id'].unique()
+        else:
+            try:
+                patient_ids = pd.read_parquet(pf, columns=['patient_id'])['patient_id'].unique()
+            except Exception:
+                patient_ids = []
 
         info[collection] = {
             'file': str(pf),
+            'layout': 'file',
             'rows': pf_meta.num_rows,
             'columns': pf_meta.num_columns,
             'size_bytes': pf.stat().st_size,
@@ -163,4 +491,40 @@ def parquet_info(input_path: str) -> dict:
             'compression': pf_meta.row_group(0).column(0).compression if pf_meta.num_row_groups > 0 else 'unknown',
         }
 
-    return info
+    for collection in list_collections(in_dir):
+        ds_dir = in_dir / collection
+        partitions = _partitions(ds_dir) if ds_dir.is_dir() else {}
+        files = [f for fs in partitions.values() for f in fs]
+        if not files:
+            continue
+        metas = [pq.read_metadata(f) for f in files]
+        size = sum(f.stat().st_size for f in files)
+        # Patients come from directory names; no data is read
+        patients = sorted({unquote(p.name.split('=', 1)[1])
+                           for p in ds_dir.glob('patient_id=*')
+                           if any(p.glob('**/part-*.parquet'))})
+        stats = {
+            'file': str(ds_dir),
+            'layout': 'dataset',
+            'rows': sum(m.num_rows for m in metas),
+            'columns': metas[0].num_columns + 1,   # + patient_id partition
+            'size_bytes': size,
+            'size_mb': size / (1024 * 1024),
+            'patients': patients,
+            'num_patients': len(patients),
+            'num_row_groups': sum(m.num_row_groups for m in metas),
+            'compression': (metas[0].row_group(0).column(0).compression
+                            if metas[0].num_row_groups > 0 else 'unknown'),
+            'num_partitions': len(partitions),
+            'num_fragments': len(files),
+        }
+        if collection in info:
+            prev = info[collection]
+            stats['layout'] = 'file+dataset'
+            stats['patients'] = sorted(set(prev['patients']) | set(patients))
+            stats['num_patients'] = len(stats['patients'])
+            for k in ('rows', 'size_bytes', 'size_mb', 'num_row_groups'):
+                stats[k] += prev[k]
+        info[collection] = stats
+
+    return dict(sorted(info.items()))
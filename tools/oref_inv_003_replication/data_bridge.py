@@ -211,20 +211,40 @@ def _load_patient_dia(parquet_path: str = "externals/ns-parquet/training") -> di
 # Loading helpers
 # ---------------------------------------------------------------------------
 
-def load_grid(parquet_path: str = "externals/ns-parquet/training") -> pd.DataFrame:
+def load_grid(parquet_path: str = "externals/ns-parquet/training",
+              patients: Optional[List[str]] = None,
+              columns: Optional[List[str]] = None) -> pd.DataFrame:
     """Load grid.parquet from *parquet_path* and return a DataFrame.
 
     Expects either a directory containing ``grid.parquet`` or a direct path
     to a ``.parquet`` file.  Prints row/column counts on load.
+
+    *patients* and *columns* restrict the read. For a terrarium directory
+    with a current ``_catalog`` sidecar only the row groups of those
+    patients are opened (``ns2parquet.catalog.Terrarium``); otherwise the
+    file is read in full and filtered. Unknown columns are skipped.
     """
-    p = Path(parquet_path)
-    if p.is_dir():
-        p = p / "grid.parquet"
+    root = Path(parquet_path)
+    p = root / "grid.parquet" if root.is_dir() else root
     if not p.exists():
         raise FileNotFoundError(f"Grid parquet not found at {p}")
 
     print(f"[data_bridge] Loading {p} …")
-    df = pd.read_parquet(p)
+    if patients is None and columns is None:
+        df = pd.read_parquet(p)
+    elif root.is_dir():
+        try:
+            from ..ns2parquet.catalog import Terrarium
+        except ImportError:
+            from ns2parquet.catalog import Terrarium
+        df = Terrarium(root).read("grid", patients, columns=columns)
+    else:
+        df = pd.read_parquet(p)
+        if patients is not None:
+            df = df[df["patient_id"].astype(str).isin({str(x) for x in patients})]
+            df = df.reset_index(drop=True)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
     print(f"[data_bridge] Loaded {len(df):,} rows × {len(df.columns)} cols")
     return df
 
@@ -56,9 +56,11 @@ _PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.
 if _PROJECT_ROOT not in sys.path:
     sys.path.insert(0, _PROJECT_ROOT)
 
+from tools.cgmencode.pk_convolution import convolve_doses
+# _build_iob_kernel (IOB remaining = 1 - cumulative absorption, in units
+# like oref0's basaliob/bolusiob) is cached alongside the activity kernel.
 from tools.cgmencode.continuous_pk import (
-    _build_activity_kernel,
-    _convolve_doses_with_kernel,
+    _build_iob_kernel,
     compute_insulin_activity,
     compute_carb_absorption_rate,
     compute_hepatic_production,
@@ -67,31 +69,6 @@ from tools.cgmencode.continuous_pk import (
     PK_CHANNEL_NAMES,
 )
 
-# ── IOB Remaining Kernel ─────────────────────────────────────────────
-
-def _build_iob_kernel(dia_hours: float = 5.0, peak_min: float = 55.0,
-                      interval_min: int = 5) -> np.ndarray:
-    """Build IOB-remaining kernel: fraction of dose still on board at time t.
-
-    IOB(t) = 1 - cumulative_absorption(t)
-
-    where cumulative_absorption = integral of activity curve from 0 to t.
-    At t=0, IOB=1.0 (full dose). At t=DIA, IOB≈0.0 (fully absorbed).
-
-    This is the correct kernel for computing basaliob/bolusiob in UNITS
-    (matching oref0's semantics), rather than activity RATES (U/min).
-
-    Returns:
-        (K,) array where K = DIA/interval_min, IOB fraction remaining.
-    """
-    activity_kernel = _build_activity_kernel(dia_hours, peak_min, interval_min)
-    # Cumulative absorption: sum(activity_per_unit * interval_min) at each step
-    cumulative = np.cumsum(activity_kernel) * interval_min
-    # IOB remaining = 1 - fraction absorbed
-    iob_kernel = np.clip(1.0 - cumulative, 0.0, 1.0)
-    return iob_kernel
-
-
 # ── PK Feature Definitions ───────────────────────────────────────────
 
 # Features that REPLACE approximated OREF features (same units & semantics)
@@ -229,9 +206,9 @@ def compute_pk_for_patient(pt_df: pd.DataFrame,
     actual_basal_vals = actual_basal.values
     net_basal_micro = (actual_basal_vals - sched_basal) * interval_min / 60.0
 
-    # Convolve each source with IOB-remaining kernel
-    pk_bolus_iob = _convolve_doses_with_kernel(bolus_vals, iob_kernel)  # always ≥ 0
-    pk_basal_iob = _convolve_doses_with_kernel(net_basal_micro, iob_kernel)  # can be negative
+    # Convolve each source with IOB-remaining kernel (bolus ≥ 0, basal can be < 0)
+    pk_bolus_iob, pk_basal_iob = convolve_doses(
+        np.stack([bolus_vals, net_basal_micro]), iob_kernel)
 
     # 3. Net insulin activity rate (U per 5-min step)
     #    oref0: activity = sum(treatment_activity_contributions)
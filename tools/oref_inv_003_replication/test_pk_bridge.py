@@ -507,6 +507,48 @@ class TestPatientDIA:
                 "ODC patients should have different DIA values"
 
 
+class TestLoadGrid:
+    """Tests for load_grid(patients=, columns=)."""
+
+    @pytest.fixture
+    def terrarium(self, tmp_path):
+        from tools.ns2parquet.writer import write_parquet
+        for i, pid in enumerate(['a', 'b', 'c']):
+            write_parquet(pd.DataFrame({
+                'patient_id': pid,
+                'time': pd.date_range('2026-01-01', periods=24, freq='5min', tz='UTC'),
+                'glucose': np.arange(24, dtype=float) + 100 * i,
+                'iob': np.full(24, float(i)),
+            }), str(tmp_path), 'grid')
+        return tmp_path
+
+    def _expected(self, path):
+        full = pd.read_parquet(path / 'grid.parquet')
+        return full[full['patient_id'].isin(['a', 'c'])][['patient_id', 'glucose']] \
+            .reset_index(drop=True)
+
+    def test_catalog_read_skips_full_decode(self, terrarium, monkeypatch):
+        from tools.oref_inv_003_replication import data_bridge
+        expected = self._expected(terrarium)
+
+        def no_full_read(*args, **kwargs):
+            raise AssertionError('full grid read')
+        monkeypatch.setattr(data_bridge.pd, 'read_parquet', no_full_read)
+        grid = data_bridge.load_grid(str(terrarium), patients=['c', 'a'],
+                                     columns=['patient_id', 'glucose', 'missing'])
+        pd.testing.assert_frame_equal(grid, expected)
+
+    def test_falls_back_without_catalog(self, terrarium):
+        import shutil
+        from tools.oref_inv_003_replication.data_bridge import load_grid
+        expected = self._expected(terrarium)
+        shutil.rmtree(terrarium / '_catalog')
+        for path in (terrarium, terrarium / 'grid.parquet'):
+            grid = load_grid(str(path), patients=['a', 'c'],
+                             columns=['patient_id', 'glucose'])
+            pd.testing.assert_frame_equal(grid, expected)
+
+
 class TestPeakParameter:
     """Tests for insulin peak parameter alignment.
 
@@ -249,7 +249,8 @@ def analyze_therapy(patient, result) -> TherapyInsights:
                                for e in cr_entries])) if cr_entries else 10.0
 
     # ── Per-night overnight analysis ──
-    nights = _analyze_nights(timestamps, glucose)
+    clock = patient.time_index('UTC')
+    nights = _analyze_nights(clock, glucose)
     rising = sum(1 for n in nights if n.direction == "rising")
     falling = sum(1 for n in nights if n.direction == "falling")
     flat = sum(1 for n in nights if n.direction == "flat")
@@ -267,7 +268,7 @@ def analyze_therapy(patient, result) -> TherapyInsights:
         basal_assessment = "appropriate"
 
     # ── IOB profile ──
-    iob_profile = _analyze_iob(timestamps, patient.iob)
+    iob_profile = _analyze_iob(clock, patient.iob)
 
     # ── Bolus / carb counting ──
     bolus_vals = patient.bolus[np.isfinite(patient.bolus) & (patient.bolus > 0)]
@@ -315,9 +316,7 @@ def analyze_therapy(patient, result) -> TherapyInsights:
     corr_energy = fid.correction_energy if fid else 0.0
 
     # ── Period analysis (with BG percentiles and IOB) ──
-    hours_arr = np.array([(datetime.fromtimestamp(t/1000, tz=timezone.utc).hour +
-                           datetime.fromtimestamp(t/1000, tz=timezone.utc).minute/60.0)
-                          for t in timestamps])
+    hours_arr = clock.hours
     period_analyses = _analyze_periods(glucose, patient.iob, hours_arr, result)
 
     # ── Counterfactual simulations ──
@@ -374,26 +373,26 @@ def analyze_therapy(patient, result) -> TherapyInsights:
 
 # ── Internal helpers ──
 
-def _analyze_nights(timestamps, glucose, window_hours=(0, 6)) -> List[NightAnalysis]:
-    """Analyze overnight glucose drift for each individual night."""
-    nights_data = defaultdict(list)
-    for i, t in enumerate(timestamps):
-        if not np.isfinite(glucose[i]):
-            continue
-        dt = datetime.fromtimestamp(t / 1000, tz=timezone.utc)
-        if window_hours[0] <= dt.hour < window_hours[1]:
-            date_key = dt.strftime('%Y-%m-%d')
-            nights_data[date_key].append(
-                (dt.hour + dt.minute / 60.0, float(glucose[i]))
-            )
+def _analyze_nights(clock, glucose, window_hours=(0, 6)) -> List[NightAnalysis]:
+    """Analyze overnight glucose drift for each individual night.
+
+    ``clock`` is the patient's TimeIndex (``PatientData.time_index``).
+    """
+    glucose = np.asarray(glucose, dtype=float)
+    keep = (np.isfinite(glucose)
+            & (clock.hours >= window_hours[0]) & (clock.hours < window_hours[1]))
+    idx = np.flatnonzero(keep)
+    # Group by night: np.split needs the rows ordered by (day, hour)
+    idx = idx[np.lexsort((clock.hours[idx], clock.day[idx]))]
+    days, starts = np.unique(clock.day[idx], return_index=True)
 
     results = []
-    for date in sorted(nights_data.keys()):
-        pts = nights_data[date]
-        if len(pts) < 12:  # need at least 1 hour
+    for day, seg in zip(days, np.split(idx, starts[1:])):
+        if len(seg) < 12:  # need at least 1 hour
             continue
-        hrs = np.array([p[0] for p in pts])
-        bgs = np.array([p[1] for p in pts])
+        date = str(np.datetime64(int(day), 'D'))
+        hrs = clock.hours[seg]
+        bgs = glucose[seg]
         slope = float(np.polyfit(hrs, bgs, 1)[0])
         tir_val = float(np.mean((bgs >= 70) & (bgs <= 180)))
         tbr_val = float(np.mean(bgs < 70))
@@ -405,21 +404,20 @@ def _analyze_nights(timestamps, glucose, window_hours=(0, 6)) -> List[NightAnaly
             tir=tir_val,
             tbr=tbr_val,
             nadir=float(np.min(bgs)),
-            n_points=len(pts),
+            n_points=len(seg),
         ))
     return results
 
 
-def _analyze_iob(timestamps, iob) -> IOBProfile:
-    """Build IOB circadian profile."""
-    hourly = defaultdict(list)
-    for i, t in enumerate(timestamps):
-        if np.isfinite(iob[i]):
-            dt = datetime.fromtimestamp(t / 1000, tz=timezone.utc)
-            hourly[dt.hour].append(float(iob[i]))
+def _analyze_iob(clock, iob) -> IOBProfile:
+    """Build IOB circadian profile (``clock`` is the patient TimeIndex)."""
+    iob = np.asarray(iob, dtype=float)
+    finite = np.isfinite(iob)
+    hour_of = clock.hours.astype(int)
+    hourly = {h: iob[finite & (hour_of == h)] for h in range(24)}
 
-    means = [float(np.mean(hourly[h])) if hourly[h] else 0.0 for h in range(24)]
-    medians = [float(np.median(hourly[h])) if hourly[h] else 0.0 for h in range(24)]
+    means = [float(np.mean(hourly[h])) if len(hourly[h]) else 0.0 for h in range(24)]
+    medians = [float(np.median(hourly[h])) if len(hourly[h]) else 0.0 for h in range(24)]
     counts = [len(hourly[h]) for h in range(24)]
 
     valid_iob = iob[np.isfinite(iob)]